@@ -94,5 +94,23 @@ STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Exports (codes de vérification...): hors MEDIA_ROOT, servis par une vue
+# réservée au staff
+EXPORTS_ROOT = os.environ.get('EXPORTS_ROOT', os.path.join(BASE_DIR, 'private', 'exports'))
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Proxys (répartiteur de charge...) devant l'application: chacun ajoute
+# l'adresse qu'il voit à X-Forwarded-For. 0: REMOTE_ADDR seul fait foi
+TRUSTED_PROXY_COUNT = int(os.environ.get('TRUSTED_PROXY_COUNT', 0))
+
+# Redis (tampons, files d'attente); optionnel: repli en mémoire si vide
+REDIS_URL = os.environ.get('REDIS_URL', '')
+
+# Tampon des compteurs de vues/likes/partages (secondes entre deux vidages)
+COUNTER_FLUSH_INTERVAL = int(os.environ.get('COUNTER_FLUSH_INTERVAL', 60))
+
+# Celery (payments.celery); sans broker, la file de vérification des paiements
+# est traitée par `manage.py run_payment_jobs`
+CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL', REDIS_URL)
@@ -1,6 +1,4 @@
-import csv
 from django.contrib import admin
-from django.http import HttpResponse
 from django.utils import timezone
 from django.contrib import messages
 from django.utils.translation import gettext_lazy as _
@@ -12,23 +10,24 @@ from .models import (
     PaymentTransaction, 
     SubscriptionPlan, 
     StoreSubscription, 
-    PaymentVerificationCode
+    PaymentVerificationCode,
+    CodeBatch
 )
+from .codes import mint_codes
+from .exports import model_export_rows, streaming_csv_response
 from .mobile_money import MobileMoneyConfig
 
 class ExportCsvMixin:
-    """Mixin to add export as CSV action"""
+    """Mixin to add export as CSV action (streamed, rows read in chunks)"""
     def export_as_csv(self, request, queryset):
         meta = self.model._meta
         field_names = [field.name for field in meta.fields]
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = f'attachment; filename={meta.verbose_name_plural}.csv'
-        
-        writer = csv.writer(response)
-        writer.writerow(field_names)
-        for obj in queryset:
-            writer.writerow([getattr(obj, field) for field in field_names])
-        return response
+        return streaming_csv_response(
+            f'{meta.verbose_name_plural}.csv',
+            field_names,
+            model_export_rows(queryset, field_names),
+            delimiter=',',
+        )
     
     export_as_csv.short_description = _("Export Selected as CSV")
 
@@ -106,6 +105,15 @@ class StoreSubscriptionAdmin(admin.ModelAdmin, ExportCsvMixin):
     extend_subscription.short_description = _('Extend selected subscriptions by X days')
 
 
+@admin.register(CodeBatch)
+class CodeBatchAdmin(admin.ModelAdmin):
+    list_display = ('id', 'code_type', 'count', 'created_by', 'created_at', 'duration_ms')
+    list_filter = ('code_type',)
+    search_fields = ('notes', 'created_by__username')
+    readonly_fields = ('created_at', 'duration_ms')
+    list_select_related = ('created_by',)
+
+
 @admin.register(PaymentVerificationCode)
 class PaymentVerificationCodeAdmin(admin.ModelAdmin, ExportCsvMixin):
     list_display = ('code', 'subscription_info', 'status', 'created_by', 'created_at', 'expires_at', 'is_valid')
@@ -135,13 +143,14 @@ class PaymentVerificationCodeAdmin(admin.ModelAdmin, ExportCsvMixin):
             
         created = 0
         for subscription in queryset:
-            for _ in range(count):
-                code = PaymentVerificationCode.objects.create(
-                    subscription=subscription,
-                    created_by=request.user,
-                    expires_at=timezone.now() + timezone.timedelta(days=days_valid)
-                )
-                created += 1
+            mint_codes(
+                count,
+                subscription=subscription,
+                created_by=request.user,
+                expires_at=timezone.now() + timezone.timedelta(days=days_valid),
+                ip_address=request.META.get('REMOTE_ADDR'),
+            )
+            created += count
                 
         self.message_user(
             request, 
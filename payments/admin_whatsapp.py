@@ -27,10 +27,10 @@ class WhatsAppConfigAdmin(admin.ModelAdmin):
 
 @admin.register(WhatsAppMessage)
 class WhatsAppMessageAdmin(admin.ModelAdmin):
-    list_display = ('product', 'recipient', 'status', 'created_at', 'status_updated_at')
+    list_display = ('product', 'recipient', 'status', 'attempts', 'created_at', 'status_updated_at')
     list_filter = ('status', 'created_at')
-    search_fields = ('recipient', 'product__name', 'message')
-    readonly_fields = ('created_at', 'sent_at', 'status_updated_at', 'status')
+    search_fields = ('recipient', 'product__name', 'message', 'external_id')
+    readonly_fields = ('created_at', 'sent_at', 'status_updated_at', 'status', 'attempts', 'next_attempt_at', 'external_id')
     fieldsets = (
         (None, {
             'fields': ('product', 'recipient', 'status')
@@ -38,6 +38,10 @@ class WhatsAppMessageAdmin(admin.ModelAdmin):
         (_('Contenu du message'), {
             'fields': ('message', 'error_message')
         }),
+        (_('Envoi'), {
+            'fields': ('attempts', 'next_attempt_at', 'external_id'),
+            'classes': ('collapse',)
+        }),
         (_('Dates'), {
             'fields': ('created_at', 'sent_at', 'status_updated_at'),
             'classes': ('collapse',)
@@ -12,6 +12,7 @@ from rest_framework.response import Response
 
 from .models import PaymentTransaction
 from .mobile_money import process_mobile_money_payment, MobileMoneyConfig
+from .sms_parsing import process_sms_batch
 
 logger = logging.getLogger(__name__)
 
@@ -28,9 +29,16 @@ def sms_webhook(request):
         "device_id": "unique_device_id",
         "timestamp": 1634567890
     }
+    
+    Arriéré (application restée hors ligne), analysé et enregistré en lot:
+    {"messages": [{"sender": "...", "message": "..."}, ...], "device_id": "..."}
     """
     try:
         data = json.loads(request.body.decode('utf-8'))
+        
+        if isinstance(data.get('messages'), list):
+            return _sms_backlog(request, data['messages'])
+        
         sender = data.get('sender', '').strip()
         message = data.get('message', '').strip()
         device_id = data.get('device_id')
@@ -78,6 +86,36 @@ def sms_webhook(request):
             status=500
         )
 
+def _sms_backlog(request, messages):
+    """Lot de SMS: une analyse avec les règles en cache, une écriture groupée"""
+    api_key = request.headers.get('X-API-Key')
+    if not api_key or api_key != getattr(settings, 'SMS_GATEWAY_API_KEY', ''):
+        return JsonResponse(
+            {'error': 'Clé API invalide ou manquante'}, 
+            status=403
+        )
+    
+    items = [
+        (str(item.get('sender', '')).strip(), str(item.get('message', '')).strip())
+        for item in messages if isinstance(item, dict)
+    ]
+    parsed, transactions, created = process_sms_batch(items)
+    
+    return JsonResponse({
+        'status': 'success',
+        'received': len(items),
+        'recognized': sum(1 for data in parsed if data),
+        'created': len(created),
+        'transactions': [
+            {
+                'transaction_id': tx.transaction_id,
+                'amount': str(tx.amount),
+                'status': tx.status,
+            }
+            for tx in transactions.values()
+        ],
+    })
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_payment_status(request, transaction_id):
@@ -5,3 +5,7 @@ class PaymentsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'payments'
     verbose_name = 'Gestion des Paiements'
+
+    def ready(self):
+        # Enregistrer les signaux (cache des règles d'analyse des SMS)
+        from . import signals  # noqa: F401
@@ -21,6 +21,70 @@ app.conf.beat_schedule = {
         'task': 'payments.tasks.clean_expired_codes',
         'schedule': 86400.0,  # Tous les jours
     },
+    'refresh-feed-scores-hourly': {
+        'task': 'stores.tasks.refresh_feed_scores',
+        'schedule': 3600.0,  # Toutes les heures
+    },
+    'flush-counters-every-minute': {
+        'task': 'stores.tasks.flush_counter_buffer',
+        'schedule': 60.0,  # Toutes les minutes
+    },
+    'refresh-geo-centroids-daily': {
+        'task': 'stores.tasks.refresh_geo_centroids',
+        'schedule': 86400.0,  # Tous les jours
+    },
+    'refresh-store-leaderboard': {
+        'task': 'stores.tasks.refresh_store_leaderboard',
+        'schedule': 900.0,  # Toutes les 15 minutes
+    },
+    'refresh-similar-products': {
+        'task': 'stores.tasks.refresh_similar_products',
+        'schedule': 900.0,  # Toutes les 15 minutes
+    },
+    'rebuild-similar-products-daily': {
+        'task': 'stores.tasks.rebuild_similar_products',
+        'schedule': 86400.0,  # Tous les jours
+    },
+    'retrain-recommender': {
+        'task': 'stores.tasks.retrain_recommender',
+        'schedule': 21600.0,  # Toutes les 6 heures
+    },
+    'refresh-store-daily-stats': {
+        'task': 'stores.tasks.refresh_store_daily_stats',
+        'schedule': 86400.0,  # Tous les jours
+    },
+    'dispatch-payment-verifications': {
+        'task': 'stores.tasks.dispatch_payment_verifications',
+        'schedule': 30.0,  # Toutes les 30 secondes
+    },
+    'reconcile-pending-payments': {
+        'task': 'stores.tasks.reconcile_payments',
+        'schedule': 900.0,  # Toutes les 15 minutes
+    },
+    'dispatch-webhook-events': {
+        'task': 'stores.tasks.dispatch_webhook_events',
+        'schedule': 60.0,  # Toutes les minutes
+    },
+    'persist-live-presence': {
+        'task': 'stores.tasks.persist_live_presence',
+        'schedule': 15.0,  # Toutes les 15 secondes
+    },
+    'transcode-live-videos': {
+        'task': 'stores.tasks.transcode_live_videos',
+        'schedule': 300.0,  # Toutes les 5 minutes (reprises)
+    },
+    'generate-image-variants': {
+        'task': 'stores.tasks.generate_image_variants',
+        'schedule': 300.0,  # Toutes les 5 minutes (reprises)
+    },
+    'match-sms-payments': {
+        'task': 'payments.tasks.match_sms_payments',
+        'schedule': 60.0,  # Toutes les minutes
+    },
+    'send-whatsapp-messages': {
+        'task': 'payments.tasks.send_whatsapp_messages',
+        'schedule': 30.0,  # Toutes les 30 secondes (relances dues)
+    },
 }
 
 @app.task(bind=True)
@@ -0,0 +1,122 @@
+"""
+Génération en masse des codes de vérification.
+
+Les candidats sont tirés en mémoire avec `secrets`, confrontés à la base par
+une seule requête `code__in` par tranche, puis insérés avec `bulk_create`.
+Les collisions (rares: 32^12 combinaisons) sont rejouées par ensembles, pas
+code par code. Les métadonnées communes (notes, auteur, IP) sont stockées une
+seule fois dans un CodeBatch.
+"""
+
+import logging
+import secrets
+import time
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Pas de 0/O ni 1/I (confusions à la lecture); 32 symboles, donc un octet
+# aléatoire modulo 32 reste uniforme
+CODE_ALPHABET = '23456789ABCDEFGHJKLMNPQRSTUVWXYZ'
+CODE_GROUPS = 3
+GROUP_LENGTH = 4
+
+# Codes vérifiés puis insérés par tranche
+CHUNK_SIZE = 5000
+
+# Tours de tirage au-delà desquels on abandonne (collisions en série)
+MAX_ROUNDS = 10
+
+
+def random_codes(count):
+    """`count` codes XXXX-XXXX-XXXX tirés avec un générateur cryptographique"""
+    length = CODE_GROUPS * GROUP_LENGTH
+    raw = secrets.token_bytes(count * length)
+    symbols = ''.join(CODE_ALPHABET[byte % len(CODE_ALPHABET)] for byte in raw)
+    codes = []
+    for start in range(0, len(symbols), length):
+        chars = symbols[start:start + length]
+        codes.append('-'.join(chars[i:i + GROUP_LENGTH] for i in range(0, length, GROUP_LENGTH)))
+    return codes
+
+
+def unused_codes(count):
+    """`count` codes absents de la base (une requête par tranche de candidats)"""
+    from .models import PaymentVerificationCode
+
+    found = set()
+    for _ in range(MAX_ROUNDS):
+        missing = count - len(found)
+        if missing <= 0:
+            break
+        candidates = set(random_codes(missing)) - found
+        for chunk in _chunks(list(candidates), CHUNK_SIZE):
+            taken = set(PaymentVerificationCode.objects.filter(code__in=chunk).values_list('code', flat=True))
+            found.update(code for code in chunk if code not in taken)
+    if len(found) < count:
+        raise RuntimeError(f"Impossible de générer {count} codes uniques")
+    return list(found)[:count]
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def mint_codes(count, code_type='certification', expires_at=None, created_by=None,
+               notes='', ip_address=None, user_agent='', **fields):
+    """
+    Crée un lot de `count` codes en attente. `fields` est appliqué à chaque
+    code (subscription, product, discount_type, discount_value, usage_limit,
+    max_attempts...). Retourne le CodeBatch.
+    """
+    from .models import CodeBatch, PaymentVerificationCode
+
+    started = time.perf_counter()
+    expires_at = expires_at or timezone.now() + timedelta(days=30)
+
+    with transaction.atomic():
+        batch = CodeBatch.objects.create(
+            code_type=code_type,
+            count=count,
+            notes=notes,
+            created_by=created_by,
+            ip_address=ip_address,
+            user_agent=user_agent or '',
+        )
+        created = 0
+        for _ in range(MAX_ROUNDS):
+            missing = count - created
+            if missing <= 0:
+                break
+            for chunk in _chunks(unused_codes(missing), CHUNK_SIZE):
+                # ignore_conflicts: un code pris entre-temps par un autre lot est
+                # simplement sauté, le tour suivant complète le lot
+                PaymentVerificationCode.objects.bulk_create(
+                    [
+                        PaymentVerificationCode(
+                            code=code,
+                            code_type=code_type,
+                            batch=batch,
+                            status='pending',
+                            expires_at=expires_at,
+                            created_by=created_by,
+                            **fields,
+                        )
+                        for code in chunk
+                    ],
+                    batch_size=CHUNK_SIZE,
+                    ignore_conflicts=True,
+                )
+            created = batch.codes.count()
+        if created < count:
+            raise RuntimeError(f"Impossible de générer {count} codes uniques")
+
+        batch.duration_ms = round((time.perf_counter() - started) * 1000)
+        batch.save(update_fields=['duration_ms'])
+
+    logger.info(f"Code batch #{batch.pk}: {count} codes in {batch.duration_ms} ms")
+    return batch
@@ -0,0 +1,216 @@
+"""
+Exports CSV / XLSX en flux.
+
+Les lignes sont lues par tranches (`.iterator(chunk_size=...)`, relations
+multiples préchargées tranche par tranche), écrites au fil de l'eau dans un
+StreamingHttpResponse (gzip optionnel) ou dans un fichier pour les très gros
+volumes (tâche Celery): la mémoire reste constante quel que soit le nombre
+de lignes.
+"""
+
+import csv
+import logging
+import os
+import secrets
+import zlib
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+try:
+    from openpyxl import Workbook
+    OPENPYXL_AVAILABLE = True
+except ImportError:
+    OPENPYXL_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Lignes lues en base par aller-retour
+CHUNK_SIZE = 2000
+
+# Lignes CSV regroupées par morceau envoyé au client
+ROWS_PER_CHUNK = 500
+
+
+DATE_FORMAT = '%Y-%m-%d %H:%M'
+
+
+class _Echo:
+    """Pseudo-fichier pour csv.writer: retourne la ligne au lieu de l'écrire"""
+
+    def write(self, value):
+        return value
+
+
+def csv_chunks(header, rows, delimiter=';', bom=True):
+    """Morceaux encodés en UTF-8 (BOM pour Excel), ROWS_PER_CHUNK lignes à la fois"""
+    writer = csv.writer(_Echo(), delimiter=delimiter)
+    if bom:
+        yield '\ufeff'.encode('utf8')
+    buffer = [writer.writerow(header)]
+    for row in rows:
+        buffer.append(writer.writerow(row))
+        if len(buffer) >= ROWS_PER_CHUNK:
+            yield ''.join(buffer).encode('utf8')
+            buffer = []
+    if buffer:
+        yield ''.join(buffer).encode('utf8')
+
+
+def gzip_chunks(chunks):
+    """Compresse un flux de morceaux au format gzip, sans le charger en entier"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def streaming_csv_response(filename, header, rows, compress=False, delimiter=';'):
+    """
+    Réponse CSV en flux. `rows` est un itérable paresseux (générateur sur un
+    `.iterator()`); avec `compress`, le fichier est servi en .csv.gz.
+    """
+    chunks = csv_chunks(header, rows, delimiter=delimiter)
+    if compress:
+        response = StreamingHttpResponse(gzip_chunks(chunks), content_type='application/gzip')
+        filename = f'{filename}.gz'
+    else:
+        response = StreamingHttpResponse(chunks, content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def write_export(path, header, rows, fmt='csv'):
+    """
+    Écrit l'export dans `path` ('csv', 'csv.gz' ou 'xlsx'); retourne le
+    nombre de lignes. Le classeur XLSX est produit en mode write_only
+    (lignes écrites au fur et à mesure).
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    count = 0
+
+    def counted():
+        nonlocal count
+        for row in rows:
+            count += 1
+            yield row
+
+    if fmt == 'xlsx':
+        if not OPENPYXL_AVAILABLE:
+            raise RuntimeError("openpyxl n'est pas installé: export XLSX indisponible")
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet()
+        sheet.append(header)
+        for row in counted():
+            sheet.append(row)
+        workbook.save(path)
+        return count
+
+    chunks = csv_chunks(header, counted())
+    if fmt == 'csv.gz':
+        chunks = gzip_chunks(chunks)
+    with open(path, 'wb') as output:
+        for chunk in chunks:
+            output.write(chunk)
+    return count
+
+
+def exports_root():
+    """Répertoire privé des exports produits en tâche de fond (jamais sous MEDIA_ROOT)"""
+    return getattr(settings, 'EXPORTS_ROOT', None) or os.path.join(settings.BASE_DIR, 'private', 'exports')
+
+
+def export_path(basename, fmt):
+    """Chemin absolu et nom de fichier d'un nouvel export (horodaté, suffixe aléatoire)"""
+    timestamp = timezone.now().strftime('%Y%m%d_%H%M%S')
+    filename = f'{basename}_{timestamp}_{secrets.token_hex(8)}.{fmt}'
+    return os.path.join(exports_root(), filename), filename
+
+
+def find_export(filename):
+    """Chemin d'un export existant, ou None (nom invalide ou fichier absent)"""
+    if not filename or os.path.basename(filename) != filename or filename.startswith('.'):
+        return None
+    path = os.path.join(exports_root(), filename)
+    return path if os.path.isfile(path) else None
+
+
+# ---------------------------------------------------------------------------
+# Codes de vérification
+# ---------------------------------------------------------------------------
+
+CODE_EXPORT_HEADER = [
+    'Code', 'Statut', 'Boutique', 'Type de plan',
+    'Créé par', 'Créé le', 'Expire le',
+    'Utilisé par', 'Utilisé le', 'Notes',
+]
+
+CODE_SORTS = ('created_at', '-created_at', 'expires_at', '-expires_at', 'status', '-status', 'code', '-code')
+
+
+def code_export_queryset(status=None, store_id=None, sort='-created_at'):
+    """Codes filtrés comme dans le tableau de bord, relations chargées pour l'export"""
+    from .models import PaymentVerificationCode
+
+    queryset = PaymentVerificationCode.objects.all()
+    if status in ('pending', 'used', 'expired'):
+        queryset = queryset.filter(status=status)
+    if store_id:
+        queryset = queryset.filter(subscription__store_id=store_id)
+    if sort not in CODE_SORTS:
+        sort = '-created_at'
+    # used_by est un ManyToMany: préchargé (par tranche d'itération), pas joint
+    return (
+        queryset.order_by(sort, 'pk')
+        .select_related('subscription__store', 'subscription__plan', 'created_by', 'batch')
+        .prefetch_related('used_by')
+    )
+
+
+def _date(value):
+    return value.strftime(DATE_FORMAT) if value else ''
+
+
+def code_export_rows(queryset, chunk_size=CHUNK_SIZE):
+    for code in queryset.iterator(chunk_size=chunk_size):
+        subscription = code.subscription
+        yield [
+            code.code,
+            code.get_status_display(),
+            subscription.store.name if subscription and subscription.store else '',
+            subscription.plan.name if subscription and subscription.plan else '',
+            str(code.created_by) if code.created_by else '',
+            _date(code.created_at),
+            _date(code.expires_at),
+            ', '.join(str(user) for user in code.used_by.all()),
+            _date(code.used_at),
+            # Codes générés par lot: notes portées par le lot
+            (code.notes or (code.batch.notes if code.batch else '')).replace('\n', ' ').replace('\r', ''),
+        ]
+
+
+def export_codes_to_file(filters, fmt='csv'):
+    """Export complet des codes dans le répertoire privé; retourne (nom du fichier, lignes)"""
+    path, filename = export_path('verification_codes', fmt)
+    count = write_export(path, CODE_EXPORT_HEADER, code_export_rows(code_export_queryset(**filters)), fmt)
+    logger.info(f"Verification codes export: {count} rows written to {filename}")
+    return filename, count
+
+
+# ---------------------------------------------------------------------------
+# Administration
+# ---------------------------------------------------------------------------
+
+def model_export_rows(queryset, field_names, chunk_size=CHUNK_SIZE):
+    """Valeurs des champs de chaque objet (clés étrangères jointes, pas de requête par ligne)"""
+    relations = [
+        field.name for field in queryset.model._meta.fields
+        if field.name in field_names and field.is_relation
+    ]
+    if relations:
+        queryset = queryset.select_related(*relations)
+    for obj in queryset.iterator(chunk_size=chunk_size):
+        yield [getattr(obj, field) for field in field_names]
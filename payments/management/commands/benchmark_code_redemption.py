@@ -0,0 +1,102 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+
+from payments.codes import mint_codes
+from payments.models import CodeBatch, PaymentVerificationCode
+from payments.redemption import consume
+
+
+def legacy_redeem(code_id):
+    """Ancien chemin: lecture, test en Python puis écriture du compteur"""
+    code = PaymentVerificationCode.objects.get(pk=code_id)
+    if code.status != 'pending' or code.usage_count >= code.usage_limit:
+        return False
+    code.usage_count += 1
+    if code.usage_count >= code.usage_limit:
+        code.status = 'used'
+    PaymentVerificationCode.objects.filter(pk=code_id).update(usage_count=code.usage_count, status=code.status)
+    return True
+
+
+class Command(BaseCommand):
+    help = (
+        "Utilisations simultanées d'un même code promo: compare l'ancien "
+        "chemin (lecture puis écriture) et l'UPDATE conditionnel, et vérifie "
+        "qu'aucun code n'est utilisé au-delà de sa limite"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=100, help="Utilisations autorisées du code")
+        parser.add_argument('--attempts', type=int, default=1000, help="Tentatives par scénario")
+        parser.add_argument('--workers', type=int, default=16, help="Tentatives simultanées")
+
+    def handle(self, *args, **options):
+        batch = mint_codes(2, code_type='promotion', usage_limit=options['limit'], notes='benchmark')
+        code_ids = list(batch.codes.values_list('pk', flat=True))
+        try:
+            results = [
+                ('avant (lecture puis écriture)', self._run(legacy_redeem, code_ids[0], options)),
+                ('après (UPDATE conditionnel)', self._run(consume, code_ids[1], options)),
+            ]
+        finally:
+            CodeBatch.objects.filter(pk=batch.pk).delete()
+            PaymentVerificationCode.objects.filter(pk__in=code_ids).delete()
+
+        for label, result in results:
+            over = result['accepted'] - options['limit']
+            self.stdout.write(self.style.MIGRATE_HEADING(label))
+            self.stdout.write(
+                f"  {result['attempts']} tentatives en {result['seconds']} s "
+                f"({result['throughput']} tentatives/s), {result['errors']} erreurs"
+            )
+            self.stdout.write(
+                f"  acceptées: {result['accepted']} / limite {options['limit']}, "
+                f"compteur en base: {result['usage_count']}"
+            )
+            if over > 0:
+                self.stdout.write(self.style.ERROR(f"  {over} utilisations au-delà de la limite"))
+            else:
+                self.stdout.write(self.style.SUCCESS("  aucune utilisation au-delà de la limite"))
+
+    def _run(self, redeem, code_id, options):
+        accepted, errors = 0, 0
+        lock = threading.Lock()
+        start = threading.Barrier(options['workers'])
+
+        def worker(attempts):
+            nonlocal accepted, errors
+            start.wait()
+            try:
+                for _ in range(attempts):
+                    try:
+                        ok = redeem(code_id)
+                    except Exception:
+                        ok = None
+                    with lock:
+                        if ok:
+                            accepted += 1
+                        elif ok is None:
+                            errors += 1
+            finally:
+                close_old_connections()
+                connections.close_all()
+
+        workers = options['workers']
+        shares = [options['attempts'] // workers + (i < options['attempts'] % workers) for i in range(workers)]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(worker, shares))
+        seconds = time.perf_counter() - started
+
+        return {
+            'attempts': options['attempts'],
+            'seconds': round(seconds, 2),
+            'throughput': round(options['attempts'] / seconds, 1),
+            'accepted': accepted,
+            'errors': errors,
+            'usage_count': PaymentVerificationCode.objects.get(pk=code_id).usage_count,
+        }
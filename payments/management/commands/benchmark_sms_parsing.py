@@ -0,0 +1,76 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from payments.mobile_money import MobileMoneyConfig
+from payments.sms_corpus import SMS_CORPUS
+from payments.sms_parsing import DEFAULT_RULES, get_rules, invalidate_rules, parse_batch, parse_sms
+
+BENCH_SENDERS = {'orange': 'OrangeMoney', 'moov': 'MoovMoney', 'mtn': 'MobileMoney', 'wave': 'Wave'}
+
+
+def legacy_parse(sender, message):
+    """Ancien chemin: recherche de la configuration puis compilation de sa regex à chaque SMS"""
+    config = MobileMoneyConfig.objects.filter(sms_sender__iexact=sender, is_active=True).first()
+    if config is None:
+        for candidate in MobileMoneyConfig.objects.filter(is_active=True):
+            if candidate.sms_sender.lower() in sender.lower():
+                config = candidate
+                break
+        else:
+            return None
+    return config.get_regex().search(message)
+
+
+class Command(BaseCommand):
+    help = (
+        "Vérifie le moteur d'analyse des SMS sur le corpus de formats réels puis "
+        "compare son débit à l'ancien chemin (requête + compilation par SMS)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=500, help="Passages sur le corpus")
+
+    def handle(self, *args, **options):
+        failures = []
+        for sender, message, expected in SMS_CORPUS:
+            data = parse_sms(sender, message)
+            got = data and {key: data[key] for key in ('operator', 'amount', 'phone', 'code')}
+            if got != expected:
+                failures.append((sender, message, expected, got))
+        for sender, message, expected, got in failures:
+            self.stdout.write(self.style.ERROR(f"{sender}: {message}\n  attendu {expected}\n  obtenu  {got}"))
+        self.stdout.write(f"Corpus: {len(SMS_CORPUS) - len(failures)}/{len(SMS_CORPUS)} SMS analysés correctement")
+
+        messages = [(sender, message) for sender, message, _ in SMS_CORPUS] * options['repeat']
+
+        # Configurations temporaires (annulées en fin de mesure) pour l'ancien chemin
+        with transaction.atomic():
+            for operator, sender in BENCH_SENDERS.items():
+                MobileMoneyConfig.objects.update_or_create(
+                    operator=operator,
+                    defaults={'sms_sender': sender, 'sms_regex_pattern': DEFAULT_RULES[operator][0], 'is_active': True},
+                )
+            results = [
+                ('avant (requête + compilation par SMS)', self._run(lambda: [legacy_parse(*m) for m in messages])),
+                ('après (règles en cache, lot)', self._run(lambda: parse_batch(messages), warm=True)),
+            ]
+            transaction.set_rollback(True)
+        invalidate_rules()
+
+        for label, seconds in results:
+            self.stdout.write(self.style.MIGRATE_HEADING(label))
+            self.stdout.write(
+                f"  {len(messages)} SMS en {seconds:.2f} s ({len(messages) / seconds:,.0f} SMS/s)"
+            )
+        if failures:
+            raise CommandError(f"{len(failures)} SMS du corpus mal analysés")
+
+    def _run(self, parse, warm=False):
+        if warm:
+            invalidate_rules()
+            get_rules()
+        started = time.perf_counter()
+        parse()
+        return time.perf_counter() - started
@@ -0,0 +1,41 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from payments.sms_matching import ensure_index, match_pending, replay
+
+
+class Command(BaseCommand):
+    help = (
+        "Rapproche les paiements reçus par SMS des commandes, abonnements et promotions "
+        "en attente; avec --replay, rejoue l'historique sans écrire pour mesurer le taux de rapprochement"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--replay', action='store_true', help="Rejeu de l'historique (lecture seule)")
+        parser.add_argument('--since-days', type=int, default=30, help="Profondeur du rejeu, en jours")
+
+    def handle(self, *args, **options):
+        if options['replay']:
+            since = timezone.now() - timedelta(days=options['since_days'])
+            stats = replay(since)
+            self.stdout.write(self.style.MIGRATE_HEADING(f"Rejeu depuis le {since:%Y-%m-%d %H:%M}"))
+            self.stdout.write(
+                f"  {stats['transactions']} paiements: {stats['matched']} rapprochés, "
+                f"{stats['ambiguous']} ambigus, {stats['unmatched']} sans correspondance"
+            )
+            self.stdout.write(
+                f"  Taux de rapprochement: {stats['match_rate']:.1%} "
+                f"({stats['per_minute']:,.0f} SMS/min)"
+            )
+            return
+
+        ensure_index(rebuild=True)
+        counts = match_pending()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{counts['matched']} rapprochés, {counts['ambiguous']} ambigus, "
+                f"{counts['unmatched']} sans correspondance"
+            )
+        )
@@ -0,0 +1,54 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+
+from payments.models import WhatsAppConfig, WhatsAppMessage
+from payments.whatsapp_outbox import dispatch_outbox
+
+
+class Command(BaseCommand):
+    help = "Envoie les messages WhatsApp en file (worker local, sans Celery)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help="Un seul passage puis arrêt (par défaut: boucle continue)",
+        )
+        parser.add_argument(
+            '--interval', type=float, default=2,
+            help="Secondes entre deux passages (défaut: 2)",
+        )
+        parser.add_argument(
+            '--fake-api', action='store_true',
+            help="Envoie vers un faux serveur WhatsApp local (développement)",
+        )
+        parser.add_argument(
+            '--stats', action='store_true',
+            help="Affiche l'état de la file puis s'arrête",
+        )
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            rows = WhatsAppMessage.objects.order_by().values('status').annotate(total=Count('id')).order_by('status')
+            for row in rows:
+                self.stdout.write(f"{row['status']:<10} {row['total']}")
+            return
+
+        if options['fake_api']:
+            from payments.whatsapp_fake import start_fake_api
+
+            server = start_fake_api()
+            WhatsAppConfig.objects.create(api_url=server.url, api_key='fake', is_active=True)
+            self.stdout.write(f"Faux serveur WhatsApp: {server.url}")
+
+        while True:
+            totals = dispatch_outbox()
+            if any(totals.values()):
+                self.stdout.write(
+                    f"{totals['sent']} envoyés, {totals['retry']} à relancer, "
+                    f"{totals['failed']} en échec, {totals['throttled']} reportés"
+                )
+            if options['once']:
+                break
+            time.sleep(options['interval'])
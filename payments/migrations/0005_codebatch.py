@@ -0,0 +1,40 @@
+# Generated by Django 5.2.7 on 2025-12-14 15:31
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0004_whatsappconfig_whatsappmessage'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CodeBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code_type', models.CharField(default='certification', max_length=20, verbose_name='Type de code')),
+                ('count', models.PositiveIntegerField(verbose_name='Nombre de codes')),
+                ('notes', models.TextField(blank=True, verbose_name='Notes')),
+                ('ip_address', models.GenericIPAddressField(blank=True, null=True, verbose_name='Adresse IP')),
+                ('user_agent', models.TextField(blank=True, verbose_name='User Agent')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Date de création')),
+                ('duration_ms', models.PositiveIntegerField(default=0, verbose_name='Durée de génération (ms)')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='code_batches', to=settings.AUTH_USER_MODEL, verbose_name='Créé par')),
+            ],
+            options={
+                'verbose_name': 'Lot de codes',
+                'verbose_name_plural': 'Lots de codes',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='paymentverificationcode',
+            name='batch',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='codes', to='payments.codebatch', verbose_name='Lot'),
+        ),
+    ]
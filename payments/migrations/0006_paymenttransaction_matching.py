@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2025-12-16 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0005_codebatch'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='paymenttransaction',
+            name='service_type',
+            field=models.CharField(choices=[('store', 'Boutique'), ('promo', 'Promotion'), ('certif', 'Certification'), ('formation', 'Formation'), ('order', 'Commande')], default='store', max_length=20, verbose_name='Type de service'),
+        ),
+        migrations.AddField(
+            model_name='paymenttransaction',
+            name='match_status',
+            field=models.CharField(choices=[('unmatched', 'Non rapproché'), ('matched', 'Rapproché'), ('ambiguous', 'Ambigu')], db_index=True, default='unmatched', max_length=20, verbose_name='Rapprochement'),
+        ),
+        migrations.AddField(
+            model_name='paymenttransaction',
+            name='match_candidates',
+            field=models.JSONField(blank=True, default=list, help_text="Obligations possibles d'un paiement ambigu (type:id)", verbose_name='Candidats au rapprochement'),
+        ),
+        migrations.AddField(
+            model_name='paymenttransaction',
+            name='matched_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Date de rapprochement'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.7 on 2025-12-18 09:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0006_paymenttransaction_matching'),
+        ('stores', '0011_webhookevent'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='whatsappmessage',
+            name='product',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='whatsapp_messages', to='stores.product', verbose_name='Produit'),
+        ),
+        migrations.AddField(
+            model_name='whatsappmessage',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0, verbose_name='Tentatives'),
+        ),
+        migrations.AddField(
+            model_name='whatsappmessage',
+            name='next_attempt_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Prochain envoi'),
+        ),
+        migrations.AddField(
+            model_name='whatsappmessage',
+            name='external_id',
+            field=models.CharField(blank=True, db_index=True, max_length=100, verbose_name='ID chez le fournisseur'),
+        ),
+        migrations.AddField(
+            model_name='whatsappmessage',
+            name='details',
+            field=models.JSONField(blank=True, default=dict, verbose_name='Détails'),
+        ),
+        migrations.AddIndex(
+            model_name='whatsappmessage',
+            index=models.Index(fields=['status', 'next_attempt_at'], name='payments_wa_outbox_idx'),
+        ),
+    ]
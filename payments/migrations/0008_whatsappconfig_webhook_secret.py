@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 03:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0007_whatsappmessage_outbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='whatsappconfig',
+            name='webhook_secret',
+            field=models.CharField(blank=True, help_text='Secret partagé signant les accusés de réception (HMAC-SHA256 du corps); sans secret, ils sont refusés', max_length=255, verbose_name='Secret du webhook'),
+        ),
+    ]
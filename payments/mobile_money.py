@@ -2,7 +2,6 @@ import re
 from datetime import datetime, timedelta
 from django.db import models
 from django.conf import settings
-from django.utils import timezone
 
 class MobileMoneyConfig(models.Model):
     """Configuration pour les opérateurs Mobile Money"""
@@ -54,62 +53,27 @@ class MobileMoneyConfig(models.Model):
 def parse_mobile_money_sms(sender, message, operator_config=None):
     """
     Parse un SMS de paiement Mobile Money et retourne les données extraites
+    (règles compilées en cache, voir payments.sms_parsing)
     
     Args:
         sender (str): L'expéditeur du SMS
         message (str): Le contenu du SMS
-        operator_config (MobileMoneyConfig, optional): Configuration de l'opérateur. Si None, on essaie de la détecter.
+        operator_config (MobileMoneyConfig, optional): Configuration de l'opérateur. Si None, on la déduit de l'expéditeur.
     
     Returns:
         dict: Dictionnaire avec les données extraites ou None si non reconnu
     """
     from .models import PaymentTransaction
+    from .sms_parsing import parse_sms
     
-    if operator_config is None:
-        # Essayer de trouver la configuration correspondant à l'expéditeur
-        try:
-            operator_config = MobileMoneyConfig.objects.filter(
-                sms_sender__iexact=sender,
-                is_active=True
-            ).first()
-        except MobileMoneyConfig.DoesNotExist:
-            operator_config = None
-    
-    if operator_config is None:
-        # Si aucune configuration spécifique, essayer avec les configurations actives
-        active_configs = MobileMoneyConfig.objects.filter(is_active=True)
-        for config in active_configs:
-            if config.sms_sender.lower() in sender.lower():
-                operator_config = config
-                break
-        else:
-            # Aucune configuration trouvée
-            return None
-    
-    # Utiliser l'expression régulière pour extraire les données
-    regex = operator_config.get_regex()
-    match = regex.search(message)
+    if operator_config is not None:
+        # Aiguillage vers les règles de l'opérateur choisi
+        sender = operator_config.sms_sender
     
-    if not match:
+    data = parse_sms(sender, message)
+    if data is None:
         return None
     
-    # Extraire les données avec des valeurs par défaut
-    data = {
-        'operator': operator_config.operator,
-        'amount': match.groupdict().get('amount', '0').replace(',', '.'),
-        'phone': match.groupdict().get('phone', '').strip(),
-        'code': match.groupdict().get('code', '').strip().upper(),
-        'raw_message': message,
-        'sender': sender,
-        'config_used': operator_config.id
-    }
-    
-    # Nettoyer et convertir les données
-    try:
-        data['amount'] = float(data['amount'])
-    except (ValueError, TypeError):
-        data['amount'] = 0.0
-    
     # Rechercher une transaction existante avec ce code
     existing_tx = PaymentTransaction.objects.filter(
         transaction_id=data['code'],
@@ -133,35 +97,9 @@ def process_mobile_money_payment(sender, message):
     Returns:
         PaymentTransaction: La transaction créée ou mise à jour, ou None si non reconnue
     """
-    from .models import PaymentTransaction
+    from .sms_parsing import process_sms_batch
     
-    # Parser le SMS
-    payment_data = parse_mobile_money_sms(sender, message)
+    (payment_data,), transactions, _ = process_sms_batch([(sender, message)])
     if not payment_data:
         return None
-    
-    # Vérifier si la transaction existe déjà
-    existing_tx = payment_data.get('existing_transaction')
-    
-    if existing_tx:
-        # Mettre à jour la transaction existante
-        if existing_tx.status != 'completed' and payment_data['amount'] >= existing_tx.amount:
-            existing_tx.status = 'completed'
-            existing_tx.verified_at = timezone.now()
-            existing_tx.notes = f"Paiement confirmé par SMS reçu de {sender}"
-            existing_tx.save(update_fields=['status', 'verified_at', 'notes'])
-        return existing_tx
-    
-    # Créer une nouvelle transaction
-    # Note: Dans un cas réel, vous voudrez peut-être associer cela à un utilisateur/commande spécifique
-    transaction = PaymentTransaction.objects.create(
-        transaction_id=payment_data['code'],
-        payment_method=payment_data['operator'],
-        amount=payment_data['amount'],
-        phone_number=payment_data['phone'],
-        status='completed',
-        verified_at=timezone.now(),
-        notes=f"Paiement Mobile Money détecté automatiquement. SMS reçu de {sender}"
-    )
-    
-    return transaction
+    return transactions.get(payment_data['code'])
@@ -1,5 +1,3 @@
-import uuid
-import random
 import string
 from django.db import models
 from django.utils import timezone
@@ -23,7 +21,8 @@ class PaymentTransaction(models.Model):
         ('store', 'Boutique'),
         ('promo', 'Promotion'),
         ('certif', 'Certification'),
-        ('formation', 'Formation')
+        ('formation', 'Formation'),
+        ('order', 'Commande')
     )
     
     STATUS_CHOICES = (
@@ -33,6 +32,13 @@ class PaymentTransaction(models.Model):
         ('cancelled', 'Annulé')
     )
     
+    # Rapprochement des paiements reçus par SMS (voir payments.sms_matching)
+    MATCH_STATUSES = (
+        ('unmatched', 'Non rapproché'),
+        ('matched', 'Rapproché'),
+        ('ambiguous', 'Ambigu'),
+    )
+    
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True)
     transaction_id = models.CharField('ID de transaction', max_length=50, unique=True)
     payment_method = models.CharField('Méthode de paiement', max_length=20, choices=TRANSACTION_TYPES)
@@ -45,6 +51,11 @@ class PaymentTransaction(models.Model):
     created_at = models.DateTimeField('Date de création', default=timezone.now)
     verified_at = models.DateTimeField('Date de vérification', null=True, blank=True)
     notes = models.TextField('Notes', blank=True, null=True)
+    match_status = models.CharField('Rapprochement', max_length=20, choices=MATCH_STATUSES,
+                                    default='unmatched', db_index=True)
+    match_candidates = models.JSONField('Candidats au rapprochement', default=list, blank=True,
+                                        help_text="Obligations possibles d'un paiement ambigu (type:id)")
+    matched_at = models.DateTimeField('Date de rapprochement', null=True, blank=True)
     
     class Meta:
         app_label = 'payments'
@@ -59,30 +70,13 @@ class PaymentTransaction(models.Model):
 def generate_verification_code():
     """
     Génère un code de vérification unique au format XXXX-XXXX-XXXX
-    - Utilise un mélange de chiffres et de lettres majuscules
+    - Utilise un mélange de chiffres et de lettres majuscules (tirage `secrets`)
     - Évite les caractères ambigus (0/O, 1/I)
     - Vérifie l'unicité dans la base de données
+    Pour générer des lots, voir payments.codes.mint_codes.
     """
-    chars = '23456789ABCDEFGHJKLMNPQRSTUVWXYZ'  # Exclut 0,1,O,I pour éviter les confusions
-    max_attempts = 10
-    
-    for _ in range(max_attempts):
-        # Génère 3 groupes de 4 caractères
-        code_parts = []
-        for _ in range(3):
-            part = ''.join(random.choices(chars, k=4))
-            code_parts.append(part)
-        
-        code = '-'.join(code_parts)
-        
-        # Vérifie si le code existe déjà dans la base de données
-        if not PaymentVerificationCode.objects.filter(code=code).exists():
-            return code
-    
-    # Si on arrive ici, on n'a pas trouvé de code unique après plusieurs tentatives
-    # On génère un code avec un UUID comme solution de secours
-    fallback_code = f"{uuid.uuid4().hex[:4].upper()}-{uuid.uuid4().hex[:4].upper()}-{uuid.uuid4().hex[:4].upper()}"
-    return fallback_code
+    from .codes import unused_codes
+    return unused_codes(1)[0]
 
 
 class SubscriptionPlan(models.Model):
@@ -136,6 +130,34 @@ class StoreSubscription(models.Model):
         return self.status == 'active' and self.end_date and timezone.now() <= self.end_date
 
 
+class CodeBatch(models.Model):
+    """Lot de codes générés en une fois (métadonnées communes stockées une seule fois)"""
+    code_type = models.CharField(_('Type de code'), max_length=20, default='certification')
+    count = models.PositiveIntegerField(_('Nombre de codes'))
+    notes = models.TextField(_('Notes'), blank=True)
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='code_batches',
+        verbose_name=_('Créé par')
+    )
+    ip_address = models.GenericIPAddressField(_('Adresse IP'), null=True, blank=True)
+    user_agent = models.TextField(_('User Agent'), blank=True)
+    created_at = models.DateTimeField(_('Date de création'), auto_now_add=True)
+    duration_ms = models.PositiveIntegerField(_('Durée de génération (ms)'), default=0)
+
+    class Meta:
+        app_label = 'payments'
+        verbose_name = _('Lot de codes')
+        verbose_name_plural = _('Lots de codes')
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Lot #{self.pk} - {self.count} codes ({self.code_type})"
+
+
 class PaymentVerificationCode(models.Model):
     """Modèle pour stocker les codes de vérification de paiement et les codes promotionnels"""
     CODE_TYPES = (
@@ -251,6 +273,16 @@ class PaymentVerificationCode(models.Model):
         blank=True
     )
     
+    # Lot de génération (notes, auteur, IP communs à tous les codes du lot)
+    batch = models.ForeignKey(
+        CodeBatch,
+        on_delete=models.SET_NULL,
+        related_name='codes',
+        verbose_name=_('Lot'),
+        null=True,
+        blank=True
+    )
+
     # Autres métadonnées
     notes = models.TextField(_('Notes'), blank=True, 
                             help_text=_('Informations supplémentaires sur ce code'))
@@ -312,10 +344,8 @@ class PaymentVerificationCode(models.Model):
         if self.status != 'pending':
             return False
             
-        # Vérifie la date d'expiration
+        # Vérifie la date d'expiration (le statut est mis à jour par clean_expired_codes)
         if self.expires_at and self.expires_at <= now:
-            self.status = 'expired'
-            self.save(update_fields=['status', 'updated_at'])
             return False
             
         # Vérifie le nombre d'utilisations
@@ -337,39 +367,16 @@ class PaymentVerificationCode(models.Model):
     
     def record_usage(self, user, request=None):
         """
-        Enregistre l'utilisation du code par un utilisateur
+        Enregistre l'utilisation du code par un utilisateur (UPDATE conditionnel,
+        voir payments.redemption)
         """
-        if not self.is_valid():
-            return False
-            
-        # Crée un enregistrement d'utilisation
-        usage = CodeUsage(
-            code=self,
-            user=user,
-            ip_address=request.META.get('REMOTE_ADDR') if request else None,
-            user_agent=request.META.get('HTTP_USER_AGENT') if request else None
-        )
-        usage.save()
+        from .redemption import consume, log_usage
         
-        # Met à jour le compteur d'utilisations
-        self.usage_count += 1
-        
-        # Si c'était la dernière utilisation possible
-        if self.usage_limit > 0 and self.usage_count >= self.usage_limit:
-            self.status = 'used'
-            self.used_at = timezone.now()
-        
-        # Sauvegarde les modifications
-        update_fields = ['usage_count', 'status', 'used_at']
-        if request:
-            self.last_verification_attempt = timezone.now()
-            update_fields.append('last_verification_attempt')
-            
-        self.save(update_fields=update_fields)
-        
-        # Ajoute l'utilisateur à la relation many-to-many
-        self.used_by.add(user)
+        if not self.is_valid() or not consume(self.pk):
+            return False
         
+        self.refresh_from_db(fields=['usage_count', 'status', 'used_at', 'last_verification_attempt'])
+        log_usage(self, user, request)
         return True
     
     def record_failed_attempt(self, request=None):
@@ -518,7 +525,9 @@ class WhatsAppMessage(models.Model):
         'stores.Product',
         on_delete=models.CASCADE,
         related_name='whatsapp_messages',
-        verbose_name=_('Produit')
+        verbose_name=_('Produit'),
+        null=True,
+        blank=True
     )
     recipient = models.CharField(_('Destinataire'), max_length=20, help_text=_('Numéro de téléphone au format international'))
     message = models.TextField(_('Message'))
@@ -527,31 +536,54 @@ class WhatsAppMessage(models.Model):
     sent_at = models.DateTimeField(_('Date d\'envoi'), null=True, blank=True)
     status_updated_at = models.DateTimeField(_('Dernière mise à jour'), auto_now=True)
     error_message = models.TextField(_('Message d\'erreur'), blank=True, null=True)
+    # File d'envoi (voir payments.whatsapp_outbox)
+    attempts = models.PositiveIntegerField(_('Tentatives'), default=0)
+    next_attempt_at = models.DateTimeField(_('Prochain envoi'), null=True, blank=True)
+    external_id = models.CharField(_('ID chez le fournisseur'), max_length=100, blank=True, db_index=True)
+    details = models.JSONField(_('Détails'), default=dict, blank=True)
     
     class Meta:
         verbose_name = _('Message WhatsApp')
         verbose_name_plural = _('Messages WhatsApp')
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='payments_wa_outbox_idx'),
+        ]
     
     def __str__(self):
-        return f"Message pour {self.product.name} à {self.recipient} - {self.get_status_display()}"
+        subject = self.product.name if self.product_id else _('notification')
+        return f"Message pour {subject} à {self.recipient} - {self.get_status_display()}"
     
-    def mark_as_sent(self):
+    # Avec commit=False, les champs sont seulement positionnés: la file
+    # d'envoi enregistre ensuite tout un lot par bulk_update (STATUS_FIELDS)
+    STATUS_FIELDS = ['status', 'sent_at', 'error_message', 'attempts', 'next_attempt_at', 'external_id', 'status_updated_at']
+    
+    def mark_as_sent(self, external_id='', commit=True):
         """Marquer le message comme envoyé"""
         self.status = 'sent'
-        self.sent_at = timezone.now()
-        self.save()
-    
-    def mark_as_delivered(self):
+        self.sent_at = self.status_updated_at = timezone.now()
+        self.error_message = None
+        self.next_attempt_at = None
+        if external_id:
+            self.external_id = external_id
+        if commit:
+            self.save()
+    
+    def mark_as_delivered(self, commit=True):
         """Marquer le message comme livré"""
         self.status = 'delivered'
-        self.save()
+        self.status_updated_at = timezone.now()
+        if commit:
+            self.save()
     
-    def mark_as_failed(self, error_message):
+    def mark_as_failed(self, error_message, commit=True):
         """Marquer le message comme échoué avec un message d'erreur"""
         self.status = 'failed'
         self.error_message = error_message
-        self.save()
+        self.next_attempt_at = None
+        self.status_updated_at = timezone.now()
+        if commit:
+            self.save()
 
 
 class WhatsAppConfig(models.Model):
@@ -573,6 +605,12 @@ class WhatsAppConfig(models.Model):
         default='https://api.whatsapp.com/send',
         help_text=_('URL de base de l\'API WhatsApp')
     )
+    webhook_secret = models.CharField(
+        _('Secret du webhook'),
+        max_length=255,
+        blank=True,
+        help_text=_('Secret partagé signant les accusés de réception (HMAC-SHA256 du corps); sans secret, ils sont refusés')
+    )
     is_active = models.BooleanField(
         _('Actif'),
         default=True,
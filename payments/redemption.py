@@ -0,0 +1,300 @@
+"""
+Utilisation des codes de vérification et des codes promotionnels.
+
+Un code est consommé par un seul UPDATE conditionnel (en attente, non expiré,
+usage_count < usage_limit) avec incrément F(): pas de verrou de ligne tenu
+pendant la vérification, et jamais plus d'utilisations que la limite, même
+quand un code promo circule dans des groupes WhatsApp. L'historique
+(CodeUsage) est écrit hors requête et les tentatives sont limitées par des
+seaux à jetons Redis (par IP et par IP + code) plutôt que par des compteurs
+en base.
+"""
+
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, Q, Value, When
+from django.utils import timezone
+
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Seaux de tentatives échouées: (capacité, jetons rendus par seconde)
+THROTTLE_BUCKETS = {
+    'ip': (20, 20 / 600),       # 20 échecs, rechargés en 10 minutes
+    'ip_code': (5, 5 / 900),    # 5 échecs sur un même code, rechargés en 15 minutes
+}
+
+REFUSALS = {
+    'throttled': "Trop de tentatives. Réessayez dans quelques minutes.",
+    'invalid': "Code invalide, expiré ou déjà utilisé.",
+    'used': "Ce code a déjà été utilisé.",
+    'expired': "Ce code a expiré.",
+    'exhausted': "Ce code a atteint son nombre maximal d'utilisations.",
+    'blocked': "Ce code est bloqué après trop de tentatives.",
+    'wrong_store': "Ce code ne correspond pas à votre boutique.",
+}
+
+# Refus qui consomment un jeton (essais de codes au hasard)
+GUESS_REFUSALS = ('invalid', 'wrong_store')
+
+
+class RedemptionRefused(Exception):
+    """Code refusé; `reason` est une clé de REFUSALS"""
+
+    def __init__(self, reason):
+        self.reason = reason
+        super().__init__(REFUSALS[reason])
+
+
+def normalize_code(code):
+    return (code or '').strip().upper()
+
+
+def client_ip(request):
+    """
+    Adresse du client pour la limitation des tentatives. Les premières
+    valeurs de X-Forwarded-For sont fournies par le client: seule celle
+    ajoutée par le plus éloigné des TRUSTED_PROXY_COUNT proxys est retenue,
+    REMOTE_ADDR sinon.
+    """
+    proxies = getattr(settings, 'TRUSTED_PROXY_COUNT', 0)
+    forwarded = request.META.get('HTTP_X_FORWARDED_FOR')
+    if proxies and forwarded:
+        hops = [hop.strip() for hop in forwarded.split(',') if hop.strip()]
+        if len(hops) >= proxies:
+            return hops[-proxies]
+    return request.META.get('REMOTE_ADDR')
+
+
+# ---------------------------------------------------------------------------
+# Limitation des tentatives
+# ---------------------------------------------------------------------------
+
+class MemoryTokenBuckets:
+    """Seaux locaux au processus (développement, tests)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}
+
+    def take(self, key, capacity, rate, cost):
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            allowed = tokens >= 1
+            self._buckets[key] = (max(0, tokens - cost), now)
+            return allowed
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class RedisTokenBuckets:
+    """Seaux partagés entre tous les processus (un hash Redis par clé, script atomique)"""
+
+    PREFIX = 'codes:throttle:'
+
+    SCRIPT = """
+    local capacity = tonumber(ARGV[1])
+    local rate = tonumber(ARGV[2])
+    local now = tonumber(ARGV[3])
+    local cost = tonumber(ARGV[4])
+    local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+    local tokens = tonumber(state[1]) or capacity
+    local ts = tonumber(state[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+    local allowed = 0
+    if tokens >= 1 then allowed = 1 end
+    tokens = math.max(0, tokens - cost)
+    redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+    redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+    return allowed
+    """
+
+    def __init__(self, url):
+        self.client = redis.Redis.from_url(url)
+        self._take = self.client.register_script(self.SCRIPT)
+
+    def take(self, key, capacity, rate, cost):
+        return bool(self._take(keys=[f'{self.PREFIX}{key}'], args=[capacity, rate, time.time(), cost]))
+
+    def clear(self):
+        keys = list(self.client.scan_iter(f'{self.PREFIX}*'))
+        if keys:
+            self.client.delete(*keys)
+
+
+_buckets = None
+_buckets_lock = threading.Lock()
+
+
+def get_buckets():
+    """Redis si REDIS_URL est configuré, sinon seaux en mémoire"""
+    global _buckets
+    if _buckets is None:
+        with _buckets_lock:
+            if _buckets is None:
+                url = getattr(settings, 'REDIS_URL', '')
+                if url and REDIS_AVAILABLE:
+                    _buckets = RedisTokenBuckets(url)
+                else:
+                    _buckets = MemoryTokenBuckets()
+    return _buckets
+
+
+def _bucket_keys(ip, code):
+    return [('ip', ip), ('ip_code', f'{ip}:{code}')]
+
+
+def attempts_allowed(ip, code):
+    """Il reste au moins un jeton dans chaque seau (sans en consommer)"""
+    buckets = get_buckets()
+    return all(
+        buckets.take(f'{name}:{key}', *THROTTLE_BUCKETS[name], 0)
+        for name, key in _bucket_keys(ip, code)
+    )
+
+
+def record_failure(ip, code):
+    buckets = get_buckets()
+    for name, key in _bucket_keys(ip, code):
+        buckets.take(f'{name}:{key}', *THROTTLE_BUCKETS[name], 1)
+
+
+# ---------------------------------------------------------------------------
+# Historique
+# ---------------------------------------------------------------------------
+
+def write_usage(code_id, user_id=None, ip_address=None, user_agent='', success=True, details=None):
+    from .models import CodeUsage
+
+    CodeUsage.objects.create(
+        code_id=code_id,
+        user_id=user_id,
+        ip_address=ip_address,
+        user_agent=(user_agent or '')[:500],
+        success=success,
+        details=details or {},
+    )
+
+
+def log_usage(code, user=None, request=None, success=True, **details):
+    """
+    Planifie l'écriture d'un CodeUsage après validation de la transaction:
+    via Celery si un broker est configuré, sinon dans le processus courant
+    """
+    from stores.payment_jobs import celery_enabled
+
+    usage = {
+        'code_id': code.pk,
+        'user_id': user.pk if user is not None and user.is_authenticated else None,
+        'ip_address': client_ip(request) if request else None,
+        'user_agent': request.META.get('HTTP_USER_AGENT', '') if request else '',
+        'success': success,
+        'details': details,
+    }
+    if celery_enabled():
+        from .tasks import record_code_usage
+        transaction.on_commit(lambda: record_code_usage.delay(**usage))
+    else:
+        transaction.on_commit(lambda: write_usage(**usage))
+
+
+# ---------------------------------------------------------------------------
+# Utilisation
+# ---------------------------------------------------------------------------
+
+def _refusal(code, store=None, now=None):
+    """Raison du refus lisible sans écrire (None si le code peut être tenté)"""
+    now = now or timezone.now()
+    if code is None:
+        return 'invalid'
+    if code.status == 'used':
+        return 'used'
+    if code.status != 'pending' or (code.expires_at and code.expires_at <= now):
+        return 'expired'
+    if code.usage_limit > 0 and code.usage_count >= code.usage_limit:
+        return 'exhausted'
+    if code.failed_attempts >= code.max_attempts:
+        return 'blocked'
+    if code.code_type == 'certification' and not code.subscription_id:
+        return 'invalid'
+    if code.code_type == 'promotion' and not code.product_id:
+        return 'invalid'
+    if store is not None and code.code_type == 'certification' and code.subscription.store_id != store.pk:
+        return 'wrong_store'
+    return None
+
+
+def consume(code_id, now=None):
+    """
+    Une utilisation, en un UPDATE conditionnel: compte sous la limite, statut
+    'used' posé par la même requête quand la dernière utilisation est prise.
+    Retourne False si le code n'était plus utilisable.
+    """
+    from .models import PaymentVerificationCode
+
+    now = now or timezone.now()
+    last_use = Q(usage_limit__gt=0) & Q(usage_limit__lte=F('usage_count') + 1)
+    return bool(
+        PaymentVerificationCode.objects.filter(
+            Q(usage_limit=0) | Q(usage_count__lt=F('usage_limit')),
+            pk=code_id,
+            status='pending',
+            expires_at__gt=now,
+            failed_attempts__lt=F('max_attempts'),
+        ).update(
+            usage_count=F('usage_count') + 1,
+            status=Case(When(last_use, then=Value('used')), default=F('status')),
+            used_at=Case(When(last_use, then=Value(now)), default=F('used_at')),
+            last_verification_attempt=now,
+            updated_at=now,
+        )
+    )
+
+
+def redeem_code(code, user=None, request=None, store=None, throttle=True):
+    """
+    Utilise le code `code` (saisi par l'utilisateur). `store`: boutique qui
+    doit posséder l'abonnement d'un code de certification. Retourne le code
+    mis à jour; lève RedemptionRefused sinon.
+    """
+    from .models import PaymentVerificationCode
+
+    code = normalize_code(code)
+    ip = client_ip(request) if request and throttle else None
+    if ip and not attempts_allowed(ip, code):
+        raise RedemptionRefused('throttled')
+
+    now = timezone.now()
+    verification_code = (
+        PaymentVerificationCode.objects.filter(code=code)
+        .select_related('subscription__store', 'product')
+        .first()
+    )
+    reason = _refusal(verification_code, store, now)
+    if reason is None and not consume(verification_code.pk, now):
+        # Dernière utilisation prise par une requête concurrente
+        reason = 'exhausted'
+
+    if reason:
+        if ip and reason in GUESS_REFUSALS:
+            record_failure(ip, code)
+        if verification_code is not None:
+            log_usage(verification_code, user, request, success=False, reason=reason)
+        raise RedemptionRefused(reason)
+
+    verification_code.refresh_from_db(fields=['usage_count', 'status', 'used_at', 'last_verification_attempt'])
+    log_usage(verification_code, user, request)
+    return verification_code
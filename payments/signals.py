@@ -1,7 +1,15 @@
 """
 Signals pour l'application payments.
 """
-from django.dispatch import Signal
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from stores.models import Order, Promotion
+
+from .mobile_money import MobileMoneyConfig
+from .models import StoreSubscription
+from .sms_matching import sync_obligation
+from .sms_parsing import invalidate_rules
 
 # Exemple de signal personnalisé (à décommenter et utiliser si nécessaire)
 # payment_verified = Signal(providing_args=["instance", "created"])
@@ -13,3 +21,24 @@ from django.dispatch import Signal
 #     if instance.status == 'completed' and not instance.verified_at:
 #         instance.verified_at = timezone.now()
 #         instance.save()
+
+
+@receiver([post_save, post_delete], sender=MobileMoneyConfig)
+def invalidate_sms_rules(sender, **kwargs):
+    """Règles d'analyse des SMS recompilées après modification d'une configuration"""
+    invalidate_rules()
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_save, sender=StoreSubscription)
+@receiver(post_save, sender=Promotion)
+def index_payment_obligation(sender, instance, **kwargs):
+    """Obligation en attente ajoutée à l'index de rapprochement des SMS (retirée une fois réglée)"""
+    sync_obligation(instance)
+
+
+@receiver(post_delete, sender=Order)
+@receiver(post_delete, sender=StoreSubscription)
+@receiver(post_delete, sender=Promotion)
+def unindex_payment_obligation(sender, instance, **kwargs):
+    sync_obligation(instance, deleted=True)
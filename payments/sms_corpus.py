@@ -0,0 +1,114 @@
+"""
+Corpus de SMS Mobile Money (formats relevés chez Orange, Moov, MTN et Wave,
+numéros et références anonymisés). Sert aux tests du moteur d'analyse et à
+`manage.py benchmark_sms_parsing`.
+
+Chaque entrée: (expéditeur, message, résultat attendu ou None si le SMS ne
+doit pas être reconnu comme un paiement reçu).
+"""
+
+from decimal import Decimal
+
+SMS_CORPUS = [
+    # Orange Money
+    (
+        'OrangeMoney',
+        "Vous avez recu un transfert de 5000 FCFA du 0707070707. Votre nouveau solde est de "
+        "15000 FCFA. Trans ID: CI240115.1030.A12345.",
+        {'operator': 'orange', 'amount': Decimal('5000'), 'phone': '0707070707', 'code': 'CI240115.1030.A12345'},
+    ),
+    (
+        'Orange Money',
+        "Vous avez reçu 10.000 FCFA du numero 22670123456. Ref: PP240115.1030.B67890. "
+        "Nouveau solde: 25.500 FCFA",
+        {'operator': 'orange', 'amount': Decimal('10000'), 'phone': '22670123456', 'code': 'PP240115.1030.B67890'},
+    ),
+    (
+        'ORANGE',
+        "Transfert recu de 2 500 FCFA du 77 123 45 67 (AMINATA SOW). ID transaction: "
+        "MP240115.1030.C11223. Solde 7 500 FCFA",
+        {'operator': 'orange', 'amount': Decimal('2500'), 'phone': '771234567', 'code': 'MP240115.1030.C11223'},
+    ),
+    (
+        '+22507000000',
+        "Vous avez reçu 5000 FCFA de +22507000000. Ref: OM12345678",
+        {'operator': 'orange', 'amount': Decimal('5000'), 'phone': '+22507000000', 'code': 'OM12345678'},
+    ),
+    (
+        'OrangeMoney',
+        "Vous avez envoye 3000 FCFA au 0708091011. Frais: 30 FCFA. Trans ID: CI240115.1100.D44556.",
+        None,
+    ),
+    (
+        'OrangeMoney',
+        "Votre solde Orange Money est de 12 000 FCFA. Composez #144# pour plus d'options.",
+        None,
+    ),
+    # Moov Money / Flooz
+    (
+        'MoovMoney',
+        "Vous avez recu 5000 FCFA du 22660123456. Ref: 1234567890. Solde: 12000 FCFA",
+        {'operator': 'moov', 'amount': Decimal('5000'), 'phone': '22660123456', 'code': '1234567890'},
+    ),
+    (
+        'Moov',
+        "Depot recu: 15 000 FCFA de 01020304 le 15/01/2024 10:30. Txn ID: MM240115.1030.X1Y2. "
+        "Nouveau solde: 20 000 FCFA",
+        {'operator': 'moov', 'amount': Decimal('15000'), 'phone': '01020304', 'code': 'MM240115.1030.X1Y2'},
+    ),
+    (
+        'Flooz',
+        "Flooz: Vous avez recu 3.500F du 99 12 34 56. ID Transaction: 0123456789. Frais: 0F",
+        {'operator': 'moov', 'amount': Decimal('3500'), 'phone': '99123456', 'code': '0123456789'},
+    ),
+    (
+        'Flooz',
+        "Flooz: Retrait de 2000F effectue chez l'agent 99887766. ID Transaction: 0123456790.",
+        None,
+    ),
+    # MTN Mobile Money
+    (
+        'MTN MoMo',
+        "Y'ello! Vous avez recu 5000 XOF de KOUASSI JEAN (2250505050505) le 2024-01-15 10:30:00. "
+        "Nouveau solde: 20000 XOF. ID transaction: 2345678901.",
+        {'operator': 'mtn', 'amount': Decimal('5000'), 'phone': '2250505050505', 'code': '2345678901'},
+    ),
+    (
+        'MobileMoney',
+        "You have received 5,000.00 XOF from 22997123456. Financial Transaction Id: 987654321. "
+        "New balance: 12,000.00 XOF.",
+        {'operator': 'mtn', 'amount': Decimal('5000.00'), 'phone': '22997123456', 'code': '987654321'},
+    ),
+    (
+        'MTN',
+        "Paiement recu de 1 000 FCFA du 0505050505. Ref: MTN240115ABC. Merci d'utiliser MTN MoMo.",
+        {'operator': 'mtn', 'amount': Decimal('1000'), 'phone': '0505050505', 'code': 'MTN240115ABC'},
+    ),
+    (
+        'MobileMoney',
+        "Y'ello! Votre code de confirmation est 482913. Il expire dans 5 minutes.",
+        None,
+    ),
+    # Wave
+    (
+        'Wave',
+        "Vous avez reçu 5.000F de Awa Diallo (+221 77 123 45 67). Nouveau solde: 12.500F. "
+        "ID: T_ABC123DEF456",
+        {'operator': 'wave', 'amount': Decimal('5000'), 'phone': '+221771234567', 'code': 'T_ABC123DEF456'},
+    ),
+    (
+        'Wave',
+        "Vous avez reçu 10 000 F CFA de 07 07 07 07 07. Transaction: TX9Q8W7E6R",
+        {'operator': 'wave', 'amount': Decimal('10000'), 'phone': '0707070707', 'code': 'TX9Q8W7E6R'},
+    ),
+    (
+        'WAVE',
+        "You received 2,500F from Moussa (+221771234567). Transaction ID: T_XYZ987654",
+        {'operator': 'wave', 'amount': Decimal('2500'), 'phone': '+221771234567', 'code': 'T_XYZ987654'},
+    ),
+    (
+        'Wave',
+        "Vous avez envoyé 1.000F à Fatou (+221 76 000 00 00). ID: T_SENT000111",
+        None,
+    ),
+]
@@ -0,0 +1,527 @@
+"""
+Rapprochement des paiements reçus par SMS avec les obligations en attente
+(commandes, abonnements de boutique, promotions).
+
+Les obligations en attente des MATCH_WINDOW dernières heures sont indexées
+par (montant, 8 derniers chiffres du téléphone) et par montant seul, en
+mémoire ou dans Redis: chaque SMS est rapproché par une recherche de clé,
+sans requête. L'index est tenu à jour par signaux et reconstruit toutes les
+INDEX_TTL secondes.
+
+- un seul candidat (montant + téléphone): payé, activé;
+- plusieurs candidats: transaction marquée 'ambiguous' (candidats notés
+  pour l'administrateur);
+- aucun: un candidat unique au même montant dans AMOUNT_ONLY_WINDOW n'est
+  pas activé (n'importe qui peut payer ce montant) mais proposé à
+  l'administrateur ('ambiguous'), sinon la transaction reste 'unmatched' et
+  sera retentée.
+
+`replay()` rejoue l'historique sans rien écrire pour mesurer le taux de
+rapprochement.
+"""
+
+import logging
+import threading
+import time
+from collections import namedtuple
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Ancienneté maximale d'une obligation rapprochable
+MATCH_WINDOW = timedelta(hours=72)
+
+# Rapprochement sur le montant seul (téléphone du payeur différent)
+AMOUNT_ONLY_WINDOW = timedelta(hours=2)
+
+# Décalage toléré entre l'horodatage du SMS et la création de l'obligation
+CLOCK_SLACK = timedelta(minutes=5)
+
+# Reconstruction complète de l'index (secondes)
+INDEX_TTL = 300
+
+PHONE_DIGITS = 8
+
+# Type d'obligation -> service_type de la PaymentTransaction
+SERVICE_TYPES = {'order': 'order', 'subscription': 'certif', 'promotion': 'promo'}
+
+Obligation = namedtuple('Obligation', 'ref amount phone created_at')
+
+
+def amount_key(amount):
+    return f'{Decimal(amount or 0):.2f}'
+
+
+def phone_key(phone):
+    digits = ''.join(char for char in (phone or '') if char.isdigit())
+    return digits[-PHONE_DIGITS:] if len(digits) >= 6 else ''
+
+
+def make_ref(kind, pk):
+    return f'{kind}:{pk}'
+
+
+def split_ref(ref):
+    kind, pk = ref.split(':')
+    return kind, int(pk)
+
+
+# ---------------------------------------------------------------------------
+# Obligations
+# ---------------------------------------------------------------------------
+
+def _orders(since, pending_only):
+    from stores.models import Order
+
+    queryset = Order.objects.filter(created_at__gte=since).exclude(status='cancelled')
+    if pending_only:
+        queryset = queryset.filter(payment_status='pending', status='pending')
+    for pk, total, fee, phone, created_at in queryset.values_list(
+        'pk', 'total_price', 'delivery_fee', 'customer_phone', 'created_at'
+    ).iterator():
+        yield Obligation(make_ref('order', pk), total + fee, phone, created_at)
+
+
+def _subscriptions(since, pending_only):
+    from .models import StoreSubscription
+
+    queryset = StoreSubscription.objects.filter(created_at__gte=since).exclude(status='cancelled')
+    if pending_only:
+        queryset = queryset.filter(status='pending')
+    for pk, price, phone, created_at in queryset.values_list(
+        'pk', 'plan__price', 'store__whatsapp_number', 'created_at'
+    ).iterator():
+        yield Obligation(make_ref('subscription', pk), price, phone, created_at)
+
+
+def _promotions(since, pending_only):
+    from stores.models import Promotion
+
+    queryset = Promotion.objects.filter(created_at__gte=since).exclude(status='cancelled')
+    if pending_only:
+        queryset = queryset.filter(status='pending')
+    for pk, amount, store_phone, product_phone, created_at in queryset.values_list(
+        'pk', 'amount', 'store__whatsapp_number', 'product__store__whatsapp_number', 'created_at'
+    ).iterator():
+        yield Obligation(make_ref('promotion', pk), amount, store_phone or product_phone, created_at)
+
+
+def obligations(since, pending_only=True):
+    """Obligations créées depuis `since` (en attente seulement, ou toutes pour le rejeu)"""
+    for source in (_orders, _subscriptions, _promotions):
+        yield from source(since, pending_only)
+
+
+def describe(instance):
+    """Obligation d'une instance enregistrée, ou None si elle n'attend plus de paiement"""
+    from stores.models import Order, Promotion
+    from .models import StoreSubscription
+
+    if isinstance(instance, Order):
+        if instance.payment_status == 'pending' and instance.status == 'pending':
+            return Obligation(
+                make_ref('order', instance.pk), instance.get_total_with_delivery(),
+                instance.customer_phone, instance.created_at,
+            )
+    elif isinstance(instance, StoreSubscription):
+        if instance.status == 'pending':
+            return Obligation(
+                make_ref('subscription', instance.pk), instance.plan.price,
+                instance.store.whatsapp_number, instance.created_at,
+            )
+    elif isinstance(instance, Promotion):
+        if instance.status == 'pending':
+            store = instance.store or (instance.product.store if instance.product_id else None)
+            return Obligation(
+                make_ref('promotion', instance.pk), instance.amount,
+                store.whatsapp_number if store else '', instance.created_at,
+            )
+    return None
+
+
+# ---------------------------------------------------------------------------
+# Index
+# ---------------------------------------------------------------------------
+
+class MemoryObligationIndex:
+    """Index local au processus (développement, tests, rejeu)"""
+
+    def __init__(self, ttl=INDEX_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._built_at = None
+        self._entries = {}
+        self._by_phone = {}
+        self._by_amount = {}
+
+    @property
+    def stale(self):
+        return self._built_at is None or time.monotonic() - self._built_at > self.ttl
+
+    def build(self, items):
+        with self._lock:
+            self._entries, self._by_phone, self._by_amount = {}, {}, {}
+            for obligation in items:
+                self._add(obligation)
+            self._built_at = time.monotonic()
+
+    def add(self, obligation):
+        with self._lock:
+            if self._built_at is not None:
+                self._remove(obligation.ref)
+                self._add(obligation)
+
+    def remove(self, ref):
+        with self._lock:
+            self._remove(ref)
+
+    def lookup(self, amount, phone):
+        with self._lock:
+            refs = self._by_phone.get((amount, phone), ()) if phone else ()
+            return [(ref, self._entries[ref][2]) for ref in refs]
+
+    def lookup_amount(self, amount):
+        with self._lock:
+            return [(ref, self._entries[ref][2]) for ref in self._by_amount.get(amount, ())]
+
+    def clear(self):
+        with self._lock:
+            self._entries, self._by_phone, self._by_amount = {}, {}, {}
+            self._built_at = None
+
+    def _add(self, obligation):
+        amount, phone = amount_key(obligation.amount), phone_key(obligation.phone)
+        self._entries[obligation.ref] = (amount, phone, obligation.created_at.timestamp())
+        self._by_amount.setdefault(amount, set()).add(obligation.ref)
+        if phone:
+            self._by_phone.setdefault((amount, phone), set()).add(obligation.ref)
+
+    def _remove(self, ref):
+        entry = self._entries.pop(ref, None)
+        if entry is None:
+            return
+        amount, phone, _ = entry
+        self._by_amount.get(amount, set()).discard(ref)
+        if phone:
+            self._by_phone.get((amount, phone), set()).discard(ref)
+
+
+class RedisObligationIndex:
+    """
+    Index partagé entre tous les processus: un hash ref -> "montant|téléphone|ts"
+    et un ensemble de refs par clé (montant + téléphone, montant seul)
+    """
+
+    PREFIX = 'sms_match:'
+
+    def __init__(self, url, ttl=INDEX_TTL):
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+        self.ttl = ttl
+
+    @property
+    def stale(self):
+        return not self.client.exists(f'{self.PREFIX}built')
+
+    def _keys(self, amount, phone):
+        keys = [f'{self.PREFIX}a:{amount}']
+        if phone:
+            keys.append(f'{self.PREFIX}k:{amount}:{phone}')
+        return keys
+
+    def _write(self, pipe, obligation):
+        amount, phone = amount_key(obligation.amount), phone_key(obligation.phone)
+        pipe.hset(f'{self.PREFIX}refs', obligation.ref, f'{amount}|{phone}|{obligation.created_at.timestamp()}')
+        for key in self._keys(amount, phone):
+            pipe.sadd(key, obligation.ref)
+
+    def build(self, items):
+        self.clear()
+        pipe = self.client.pipeline(transaction=False)
+        for count, obligation in enumerate(items, 1):
+            self._write(pipe, obligation)
+            if count % 1000 == 0:
+                pipe.execute()
+        pipe.set(f'{self.PREFIX}built', 1, ex=self.ttl)
+        pipe.execute()
+
+    def add(self, obligation):
+        if self.stale:
+            return
+        self.remove(obligation.ref)
+        pipe = self.client.pipeline()
+        self._write(pipe, obligation)
+        pipe.execute()
+
+    def remove(self, ref):
+        entry = self.client.hget(f'{self.PREFIX}refs', ref)
+        if entry is None:
+            return
+        amount, phone, _ = entry.split('|')
+        pipe = self.client.pipeline()
+        for key in self._keys(amount, phone):
+            pipe.srem(key, ref)
+        pipe.hdel(f'{self.PREFIX}refs', ref)
+        pipe.execute()
+
+    def _entries(self, key):
+        refs = sorted(self.client.smembers(key))
+        if not refs:
+            return []
+        entries = self.client.hmget(f'{self.PREFIX}refs', refs)
+        return [(ref, float(entry.split('|')[2])) for ref, entry in zip(refs, entries) if entry]
+
+    def lookup(self, amount, phone):
+        return self._entries(f'{self.PREFIX}k:{amount}:{phone}') if phone else []
+
+    def lookup_amount(self, amount):
+        return self._entries(f'{self.PREFIX}a:{amount}')
+
+    def clear(self):
+        keys = list(self.client.scan_iter(f'{self.PREFIX}*'))
+        if keys:
+            self.client.delete(*keys)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """Redis si REDIS_URL est configuré, sinon index en mémoire"""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                url = getattr(settings, 'REDIS_URL', '')
+                if url and REDIS_AVAILABLE:
+                    _index = RedisObligationIndex(url)
+                else:
+                    _index = MemoryObligationIndex()
+    return _index
+
+
+def ensure_index(rebuild=False):
+    """Index courant, reconstruit depuis la base s'il a expiré"""
+    index = get_index()
+    if rebuild or index.stale:
+        started = time.perf_counter()
+        index.build(obligations(timezone.now() - MATCH_WINDOW))
+        logger.info(f"SMS matching index rebuilt in {(time.perf_counter() - started) * 1000:.0f} ms")
+    return index
+
+
+def sync_obligation(instance, deleted=False):
+    """Mise à jour de l'index après enregistrement ou suppression d'une obligation"""
+    index = get_index()
+    if index.stale:
+        # Rien à synchroniser: la prochaine reconstruction relira la base
+        return
+    ref = make_ref(
+        {'Order': 'order', 'StoreSubscription': 'subscription', 'Promotion': 'promotion'}[type(instance).__name__],
+        instance.pk,
+    )
+    obligation = None if deleted else describe(instance)
+    if obligation is None:
+        index.remove(ref)
+    else:
+        index.add(obligation)
+
+
+# ---------------------------------------------------------------------------
+# Rapprochement
+# ---------------------------------------------------------------------------
+
+def decide(index, amount, phone, paid_at):
+    """
+    ('matched', [ref]), ('ambiguous', refs) ou ('unmatched', []) pour un
+    paiement de `amount` reçu de `phone` à `paid_at`
+    """
+    paid = paid_at.timestamp()
+    latest = paid + CLOCK_SLACK.total_seconds()
+    amount = amount_key(amount)
+
+    oldest = paid - MATCH_WINDOW.total_seconds()
+    candidates = sorted(ref for ref, created in index.lookup(amount, phone_key(phone)) if oldest <= created <= latest)
+    if len(candidates) == 1:
+        return 'matched', candidates
+    if candidates:
+        return 'ambiguous', candidates
+
+    oldest = paid - AMOUNT_ONLY_WINDOW.total_seconds()
+    candidates = [ref for ref, created in index.lookup_amount(amount) if oldest <= created <= latest]
+    if len(candidates) == 1:
+        # Montant seul: à confirmer par l'administrateur, jamais activé
+        return 'ambiguous', candidates
+    return 'unmatched', []
+
+
+def _activate(ref, tx, now):
+    """
+    Marque l'obligation payée par un UPDATE conditionnel (toujours en
+    attente); False si elle a été réglée entre-temps
+    """
+    from stores.analytics import refresh_store_day
+    from stores.models import Notification, Order, Promotion
+    from .models import StoreSubscription
+
+    kind, pk = split_ref(ref)
+    if kind == 'order':
+        updated = Order.objects.filter(pk=pk, payment_status='pending', status='pending').update(
+            payment_status='completed', status='confirmed', updated_at=now,
+        )
+        store_id, owner_id, created_at = (
+            Order.objects.filter(pk=pk).values_list('store_id', 'store__owner_id', 'created_at').first()
+            or (None, None, None)
+        )
+        if updated:
+            # update() ne déclenche pas les signaux des statistiques
+            refresh_store_day(store_id, created_at)
+        message = f"Commande #{pk} payée par {tx.get_payment_method_display()} ({tx.amount} FCFA, réf. {tx.transaction_id})"
+    elif kind == 'subscription':
+        subscription = StoreSubscription.objects.select_related('plan', 'store').get(pk=pk)
+        updated = StoreSubscription.objects.filter(pk=pk, status='pending').update(
+            status='active', start_date=now,
+            end_date=now + timedelta(days=subscription.plan.duration_days), updated_at=now,
+        )
+        owner_id = subscription.store.owner_id
+        message = f"Abonnement {subscription.plan.name} activé (paiement {tx.transaction_id})"
+    else:
+        updated = Promotion.objects.filter(pk=pk, status='pending').update(
+            status='active', transaction_id=tx.transaction_id,
+        )
+        owner_id = (
+            Promotion.objects.filter(pk=pk)
+            .values_list('store__owner_id', 'product__store__owner_id').first() or (None, None)
+        )
+        owner_id = owner_id[0] or owner_id[1]
+        message = f"Promotion #{pk} activée (paiement {tx.transaction_id})"
+
+    if updated and owner_id:
+        Notification.objects.create(user_id=owner_id, notification_type='order', message=message)
+    return bool(updated)
+
+
+def match_transactions(transactions):
+    """
+    Rapproche des PaymentTransaction reçues par SMS. Retourne le nombre de
+    transactions par statut de rapprochement.
+    """
+    from .models import PaymentTransaction
+
+    index = ensure_index()
+    now = timezone.now()
+    counts = {'matched': 0, 'ambiguous': 0, 'unmatched': 0}
+    changed = []
+
+    for tx in transactions:
+        status, refs = decide(index, tx.amount, tx.phone_number, tx.created_at)
+        if status == 'matched':
+            ref = refs[0]
+            with transaction.atomic():
+                activated = _activate(ref, tx, now)
+            index.remove(ref)
+            if not activated:
+                # Obligation réglée par ailleurs: retentée au prochain passage
+                status = 'unmatched'
+            else:
+                kind, pk = split_ref(ref)
+                tx.service_type = SERVICE_TYPES[kind]
+                tx.reference_id = pk
+                tx.matched_at = now
+        tx.match_status = status
+        tx.match_candidates = refs if status == 'ambiguous' else []
+        counts[status] += 1
+        changed.append(tx)
+
+    PaymentTransaction.objects.bulk_update(
+        changed, ['match_status', 'match_candidates', 'matched_at', 'service_type', 'reference_id'], batch_size=500,
+    )
+    if changed:
+        logger.info(f"SMS matching: {counts}")
+    return counts
+
+
+def unmatched_transactions(since=None):
+    """Paiements reçus par SMS pas encore rattachés à une obligation"""
+    from .models import PaymentTransaction
+
+    return PaymentTransaction.objects.filter(
+        match_status='unmatched',
+        status='completed',
+        reference_id__isnull=True,
+        created_at__gte=since or timezone.now() - MATCH_WINDOW,
+    ).order_by('created_at')
+
+
+def match_pending(transaction_ids=None):
+    """Rapproche les transactions données (ou toutes celles en attente de rapprochement)"""
+    queryset = unmatched_transactions()
+    if transaction_ids is not None:
+        queryset = queryset.filter(pk__in=transaction_ids)
+    return match_transactions(list(queryset))
+
+
+def schedule_matching(transaction_ids):
+    """Rapprochement après validation: via Celery si un broker est configuré, sinon dans le processus"""
+    from stores.payment_jobs import celery_enabled
+
+    transaction_ids = list(transaction_ids)
+    if not transaction_ids:
+        return
+    if celery_enabled():
+        from .tasks import match_sms_payments
+        transaction.on_commit(lambda: match_sms_payments.delay(transaction_ids))
+    else:
+        transaction.on_commit(lambda: match_pending(transaction_ids))
+
+
+# ---------------------------------------------------------------------------
+# Rejeu
+# ---------------------------------------------------------------------------
+
+def replay(since, until=None):
+    """
+    Rejoue les paiements reçus par SMS entre `since` et `until` contre les
+    obligations de la période (tous statuts sauf annulées), sans rien écrire.
+    Une obligation rapprochée sort de l'index, comme en production.
+    """
+    from .models import PaymentTransaction
+
+    until = until or timezone.now()
+    index = MemoryObligationIndex(ttl=float('inf'))
+    index.build(
+        obligation for obligation in obligations(since - MATCH_WINDOW, pending_only=False)
+        if obligation.created_at <= until
+    )
+    transactions = PaymentTransaction.objects.filter(
+        created_at__gte=since, created_at__lte=until, status='completed',
+    ).order_by('created_at').values_list('amount', 'phone_number', 'created_at')
+
+    counts = {'matched': 0, 'ambiguous': 0, 'unmatched': 0}
+    started = time.perf_counter()
+    for amount, phone, created_at in transactions.iterator():
+        status, refs = decide(index, amount, phone, created_at)
+        if status == 'matched':
+            index.remove(refs[0])
+        counts[status] += 1
+    elapsed = time.perf_counter() - started
+
+    total = sum(counts.values())
+    return {
+        **counts,
+        'transactions': total,
+        'match_rate': counts['matched'] / total if total else 0.0,
+        'seconds': elapsed,
+        'per_minute': total / elapsed * 60 if elapsed else 0.0,
+    }
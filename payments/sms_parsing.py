@@ -0,0 +1,327 @@
+"""
+Analyse des SMS de paiement Mobile Money.
+
+Les règles (expressions régulières compilées) sont gardées en mémoire par
+processus et indexées par expéditeur: un SMS est aiguillé vers les règles de
+son opérateur par une simple recherche dans un dictionnaire, sans requête.
+Les règles d'une MobileMoneyConfig passent avant les règles intégrées de son
+opérateur; l'enregistrement d'une configuration invalide le cache (version
+partagée dans le cache Django, relue au plus toutes les RULES_CHECK_INTERVAL
+secondes par les autres processus).
+
+Les arriérés de SMS (application Android restée hors ligne) sont analysés
+en lot et les PaymentTransaction écrites par bulk_create / bulk_update.
+Seuls les expéditeurs connus (DEFAULT_SENDERS, configurations) confirment un
+paiement: le SMS d'un autre expéditeur, facile à contrefaire, ne crée
+qu'une transaction en attente de vérification par un administrateur.
+"""
+
+import logging
+import re
+import threading
+import time
+import uuid
+from decimal import Decimal, InvalidOperation
+
+from django.core.cache import cache
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+OPERATORS = ('orange', 'moov', 'mtn', 'wave')
+
+RULES_VERSION_KEY = 'payments:sms_rules_version'
+
+# Délai maximal (secondes) avant qu'un processus voie une configuration modifiée ailleurs
+RULES_CHECK_INTERVAL = 5
+
+# Expéditeurs connus (normalisés: minuscules, lettres et chiffres seulement)
+DEFAULT_SENDERS = {
+    'orange': 'orange',
+    'orangemoney': 'orange',
+    'moov': 'moov',
+    'moovmoney': 'moov',
+    'flooz': 'moov',
+    'mtn': 'mtn',
+    'mtnmomo': 'mtn',
+    'momo': 'mtn',
+    'mobilemoney': 'mtn',
+    'wave': 'wave',
+}
+
+# Expéditeur inconnu (numéro relayé par l'application Android): opérateur
+# déduit du préfixe de la référence puis des mots-clés du message, pour la
+# vérification manuelle seulement
+CODE_PREFIXES = (('OM', 'orange'), ('MTN', 'mtn'), ('MOOV', 'moov'), ('WV', 'wave'), ('T_', 'wave'))
+MESSAGE_KEYWORDS = (
+    ('orange money', 'orange'), ('flooz', 'moov'), ('moov', 'moov'),
+    ("y'ello", 'mtn'), ('momo', 'mtn'), ('mtn', 'mtn'), ('wave', 'wave'),
+)
+
+_AMOUNT = r'(?P<amount>\d{1,3}(?:[ \u00a0.,]\d{3})+(?:[.,]\d{1,2})?|\d+(?:[.,]\d{1,2})?)'
+_CURRENCY = r'\s*(?:F\s?CFA|FCFA|XOF|CFA|F)\b'
+_PHONE = r'(?P<phone>\+?\d[\d ]{5,16}\d)'
+_PAYER = r'(?:du|de|from)\s+(?:num[eé]ro\s+)?(?:(?P<name>[^\d(+][^(]*?)\s*\(\s*)?' + _PHONE + r'\s*\)?'
+_REFERENCE = (
+    r'\b(?:Trans(?:action)?\s*ID|ID\s+(?:de\s+)?transaction|Txn\s*ID|Transaction|R[eé]f(?:[eé]rence)?|ID)'
+    r'\s*:?\s*(?=[A-Z0-9_.]{6,})(?P<code>[A-Z0-9_]+(?:\.[A-Z0-9_]+)*)'
+)
+
+# « Vous avez reçu 5.000 F de ... Ref: ... », « Depot recu: ... », « You have received ... »
+RECEIVED = (
+    r'(?:re[cç]u|received)\w*\s*:?\s+(?:un\s+transfert\s+)?(?:de\s+)?'
+    + _AMOUNT + _CURRENCY + r'\s+' + _PAYER + r'.*?' + _REFERENCE
+)
+
+DEFAULT_RULES = {
+    'orange': (RECEIVED,),
+    'moov': (RECEIVED,),
+    'mtn': (RECEIVED,),
+    'wave': (RECEIVED,),
+}
+
+REGEX_FLAGS = re.IGNORECASE | re.MULTILINE | re.DOTALL
+
+
+def normalize_sender(sender):
+    return re.sub(r'[^a-z0-9]', '', (sender or '').lower())
+
+
+def parse_amount(text):
+    """'5 000', '10.000', '5,000.00', '2500' -> Decimal (séparateurs de milliers retirés)"""
+    value = re.sub(r'[\s\u00a0]', '', text or '')
+    if re.fullmatch(r'\d{1,3}(?:[.,]\d{3})+', value):
+        value = re.sub(r'[.,]', '', value)
+    elif re.fullmatch(r'\d{1,3}(?:[.,]\d{3})+[.,]\d{1,2}', value):
+        integer, decimals = re.split(r'[.,](?=\d{1,2}$)', value)
+        value = f"{re.sub(r'[.,]', '', integer)}.{decimals}"
+    else:
+        value = value.replace(',', '.')
+    try:
+        return Decimal(value)
+    except InvalidOperation:
+        return Decimal('0')
+
+
+# ---------------------------------------------------------------------------
+# Règles compilées
+# ---------------------------------------------------------------------------
+
+class RuleSet:
+    """Règles compilées par opérateur et index expéditeur -> opérateur"""
+
+    def __init__(self, version, configs=()):
+        self.version = version
+        self.checked_at = time.monotonic()
+        self.senders = dict(DEFAULT_SENDERS)
+        self.rules = {operator: [] for operator in OPERATORS}
+        self.config_ids = {}
+
+        for config in configs:
+            if not config.is_active:
+                # Opérateur désactivé: ses SMS ne sont plus reconnus
+                self.rules.pop(config.operator, None)
+                continue
+            self.config_ids[config.operator] = config.id
+            sender = normalize_sender(config.sms_sender)
+            if sender:
+                self.senders[sender] = config.operator
+            try:
+                self.rules[config.operator].append(re.compile(config.sms_regex_pattern, REGEX_FLAGS))
+            except (re.error, TypeError) as e:
+                logger.warning(f"Invalid SMS pattern for {config.operator} (config #{config.id}): {e}")
+
+        for operator in self.rules:
+            self.rules[operator].extend(re.compile(pattern, REGEX_FLAGS) for pattern in DEFAULT_RULES[operator])
+        self.senders = {sender: op for sender, op in self.senders.items() if op in self.rules}
+
+    def operator_for(self, sender):
+        return self.senders.get(normalize_sender(sender))
+
+
+_rules = None
+_rules_lock = threading.Lock()
+
+
+def get_rules():
+    """Règles courantes du processus (reconstruites si une configuration a changé)"""
+    global _rules
+    rules = _rules
+    if rules is not None and time.monotonic() - rules.checked_at < RULES_CHECK_INTERVAL:
+        return rules
+
+    version = cache.get(RULES_VERSION_KEY)
+    if rules is not None and rules.version == version:
+        rules.checked_at = time.monotonic()
+        return rules
+
+    with _rules_lock:
+        if _rules is None or _rules.version != version:
+            from .mobile_money import MobileMoneyConfig
+            _rules = RuleSet(version, MobileMoneyConfig.objects.all())
+        return _rules
+
+
+def invalidate_rules():
+    """Configuration modifiée: reconstruction immédiate ici, sous RULES_CHECK_INTERVAL ailleurs"""
+    global _rules
+    cache.set(RULES_VERSION_KEY, uuid.uuid4().hex, None)
+    with _rules_lock:
+        _rules = None
+
+
+# ---------------------------------------------------------------------------
+# Analyse
+# ---------------------------------------------------------------------------
+
+def _guess_operator(code, message):
+    upper = code.upper()
+    for prefix, operator in CODE_PREFIXES:
+        if upper.startswith(prefix):
+            return operator
+    lower = message.lower()
+    for keyword, operator in MESSAGE_KEYWORDS:
+        if keyword in lower:
+            return operator
+    return None
+
+
+def _match(patterns, message):
+    for pattern in patterns:
+        match = pattern.search(message)
+        if match:
+            return match
+    return None
+
+
+def parse_sms(sender, message, rules=None):
+    """
+    Données d'un SMS de paiement reçu (opérateur, montant, téléphone,
+    référence, nom du payeur) ou None si le SMS n'est pas reconnu.
+    `trusted` est faux quand l'expéditeur n'est pas connu: opérateur deviné,
+    paiement à vérifier à la main
+    """
+    rules = rules or get_rules()
+    sender = (sender or '').strip()
+    message = message or ''
+
+    operator = rules.operator_for(sender)
+    trusted = operator is not None
+    if operator:
+        match = _match(rules.rules[operator], message)
+    else:
+        match = None
+        for patterns in rules.rules.values():
+            match = _match(patterns, message)
+            if match:
+                break
+
+    if not match:
+        return None
+
+    groups = match.groupdict()
+    code = (groups.get('code') or '').strip().upper()
+    if not operator:
+        operator = _guess_operator(code, message)
+        if operator not in rules.rules:
+            return None
+    if not code:
+        return None
+
+    return {
+        'operator': operator,
+        'amount': parse_amount(groups.get('amount') or '0'),
+        'phone': re.sub(r'\s', '', groups.get('phone') or ''),
+        'code': code,
+        'payer_name': (groups.get('name') or '').strip(),
+        'raw_message': message,
+        'sender': sender,
+        'trusted': trusted,
+        'config_used': rules.config_ids.get(operator),
+    }
+
+
+def parse_batch(messages):
+    """[(expéditeur, message)] -> [données ou None], dans le même ordre"""
+    rules = get_rules()
+    return [parse_sms(sender, message, rules) for sender, message in messages]
+
+
+# ---------------------------------------------------------------------------
+# Transactions
+# ---------------------------------------------------------------------------
+
+def upsert_transactions(parsed):
+    """
+    Crée ou confirme les PaymentTransaction des SMS analysés, en lot:
+    - référence inconnue: transaction créée, confirmée (en attente de
+      vérification si l'expéditeur n'est pas connu);
+    - transaction en attente et montant suffisant: confirmée (expéditeur
+      connu seulement).
+    Le premier SMS d'une référence l'emporte, celui d'un expéditeur connu
+    avant tout autre. Retourne ({référence: transaction}, références créées).
+    """
+    from .models import PaymentTransaction
+
+    by_code = {}
+    for data in parsed:
+        if data and data['code']:
+            first = by_code.setdefault(data['code'], data)
+            if data['trusted'] and not first['trusted']:
+                by_code[data['code']] = data
+    if not by_code:
+        return {}, set()
+
+    now = timezone.now()
+    existing = PaymentTransaction.objects.in_bulk(list(by_code), field_name='transaction_id')
+
+    confirmed = []
+    for code, tx in existing.items():
+        data = by_code[code]
+        if data['trusted'] and tx.status != 'completed' and data['amount'] >= tx.amount:
+            tx.status = 'completed'
+            tx.verified_at = now
+            tx.notes = f"Paiement confirmé par SMS reçu de {data['sender']}"
+            confirmed.append(tx)
+    PaymentTransaction.objects.bulk_update(confirmed, ['status', 'verified_at', 'notes'], batch_size=500)
+
+    created = set(by_code) - set(existing)
+    PaymentTransaction.objects.bulk_create(
+        [
+            PaymentTransaction(
+                transaction_id=code,
+                payment_method=data['operator'],
+                amount=data['amount'],
+                phone_number=data['phone'][:20],
+                status='completed' if data['trusted'] else 'pending',
+                verified_at=now if data['trusted'] else None,
+                notes=(
+                    f"Paiement Mobile Money détecté automatiquement. SMS reçu de {data['sender']}"
+                    if data['trusted'] else
+                    f"SMS d'un expéditeur inconnu ({data['sender']}): paiement à vérifier"
+                ),
+            )
+            for code, data in by_code.items()
+            if code in created
+        ],
+        batch_size=500,
+        ignore_conflicts=True,
+    )
+
+    logger.info(f"SMS transactions: {len(created)} created, {len(confirmed)} confirmed")
+    return PaymentTransaction.objects.in_bulk(list(by_code), field_name='transaction_id'), created
+
+
+def process_sms_batch(messages):
+    """
+    Analyse et enregistre un lot de SMS [(expéditeur, message)]; les
+    nouveaux paiements confirmés sont rapprochés des obligations en attente après
+    validation. Retourne (données analysées alignées sur `messages`,
+    {référence: transaction}, références créées).
+    """
+    from .sms_matching import schedule_matching
+
+    parsed = parse_batch(messages)
+    transactions, created = upsert_transactions(parsed)
+    schedule_matching(tx.pk for code, tx in transactions.items() if code in created and tx.status == 'completed')
+    return parsed, transactions, created
@@ -49,3 +49,49 @@ def get_code_statistics():
     stats['by_store'] = list(by_store)
     
     return stats
+
+@shared_task
+def export_codes_to_file(filters, fmt='csv', user_id=None):
+    """
+    Export des codes de vérification en tâche de fond (gros volumes): fichier
+    écrit dans le répertoire privé des exports, lien (vue réservée au staff)
+    envoyé en notification au demandeur
+    """
+    from django.urls import reverse
+    from stores.models import Notification
+    from .exports import export_codes_to_file as write_codes
+
+    filename, count = write_codes(filters, fmt)
+    if user_id:
+        Notification.objects.create(
+            user_id=user_id,
+            notification_type='order',
+            message=f"Export des codes prêt: {count} lignes",
+            link=reverse('payments:download_export', args=[filename]),
+        )
+    return filename
+
+@shared_task
+def record_code_usage(code_id, user_id=None, ip_address=None, user_agent='', success=True, details=None):
+    """Historique d'utilisation d'un code, écrit hors de la requête"""
+    from .redemption import write_usage
+
+    write_usage(code_id, user_id, ip_address, user_agent, success, details)
+
+@shared_task
+def match_sms_payments(transaction_ids=None):
+    """
+    Rapproche les paiements reçus par SMS des commandes, abonnements et
+    promotions en attente. Sans identifiants (tâche périodique): retente
+    toutes les transactions non rapprochées de la fenêtre.
+    """
+    from .sms_matching import match_pending
+
+    return match_pending(transaction_ids)
+
+@shared_task
+def send_whatsapp_messages(max_batches=None):
+    """Envoie les messages WhatsApp en file (réveillée à chaque mise en file, et balayage périodique)"""
+    from .whatsapp_outbox import dispatch_outbox
+
+    return dispatch_outbox(max_batches)
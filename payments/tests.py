@@ -1,3 +1,455 @@
-from django.test import TestCase
+import gzip
+import hashlib
+import hmac
+import json
+import os
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.test import RequestFactory, TestCase
+from django.utils import timezone
+
+from stores import payment_transport
+from stores.models import Order, Product, Store, StoreDailyStats
+
+from . import codes, exports, redemption, sms_matching, sms_parsing, whatsapp_outbox
+from .mobile_money import MobileMoneyConfig
+from .models import (
+    CodeBatch, CodeUsage, PaymentTransaction, PaymentVerificationCode, StoreSubscription, SubscriptionPlan,
+    WhatsAppConfig, WhatsAppMessage,
+)
+from .sms_corpus import SMS_CORPUS
+from .whatsapp_fake import start_fake_api
+from .whatsapp_service import WhatsAppService
+
+
+class CodeMintingTests(TestCase):
+
+    def test_batch_codes_are_unique_and_share_metadata(self):
+        user = User.objects.create_user('admin', password='x')
+        batch = codes.mint_codes(500, created_by=user, notes='Salon', usage_limit=3)
+
+        self.assertEqual(batch.codes.count(), 500)
+        self.assertEqual(len(set(batch.codes.values_list('code', flat=True))), 500)
+        self.assertEqual(batch.codes.filter(usage_limit=3, status='pending', created_by=user).count(), 500)
+        self.assertEqual(CodeBatch.objects.get().notes, 'Salon')
+        self.assertFalse(batch.codes.exclude(notes='').exists())
+
+    def test_collisions_are_drawn_again(self):
+        user = User.objects.create_user('admin', password='x')
+        PaymentVerificationCode.objects.create(code='AAAA-AAAA-AAAA', created_by=user)
+        draws = iter([['AAAA-AAAA-AAAA', 'BBBB-BBBB-BBBB'], ['CCCC-CCCC-CCCC']])
+
+        with mock.patch.object(codes, 'random_codes', side_effect=lambda count: next(draws)):
+            batch = codes.mint_codes(2, created_by=user)
+
+        self.assertEqual(
+            sorted(batch.codes.values_list('code', flat=True)),
+            ['BBBB-BBBB-BBBB', 'CCCC-CCCC-CCCC'],
+        )
+
+
+class CodeExportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('admin', password='x')
+        cls.batch = codes.mint_codes(30, created_by=cls.user)
+        buyer = User.objects.create_user('client', password='x')
+        for code in cls.batch.codes.all()[:5]:
+            CodeUsage.objects.create(code=code, user=buyer)
+
+    def _csv(self, chunk_size=10):
+        queryset = exports.code_export_queryset()
+        return b''.join(exports.csv_chunks(exports.CODE_EXPORT_HEADER, exports.code_export_rows(queryset, chunk_size)))
+
+    def test_rows_streamed_in_chunks_with_prefetched_users(self):
+        # Un curseur sur les codes + un préchargement par tranche de 10
+        with self.assertNumQueries(4):
+            content = self._csv().decode('utf-8-sig')
+
+        lines = content.splitlines()
+        self.assertEqual(len(lines), 31)
+        self.assertTrue(lines[0].startswith('Code;Statut'))
+        self.assertEqual(sum('client' in line for line in lines), 5)
+
+    def test_gzip_stream_matches_plain_csv(self):
+        compressed = b''.join(exports.gzip_chunks(iter([self._csv()])))
+        self.assertEqual(gzip.decompress(compressed), self._csv())
+
+    def test_batch_notes_are_exported(self):
+        codes.mint_codes(1, created_by=self.user, notes='Salon\nAbidjan')
+        content = self._csv().decode('utf-8-sig')
+        self.assertEqual(sum(line.endswith(';Salon Abidjan') for line in content.splitlines()), 1)
+
+    def test_background_export_is_private(self):
+        with tempfile.TemporaryDirectory() as root, self.settings(EXPORTS_ROOT=root, MEDIA_ROOT=os.path.join(root, 'media')):
+            filename, count = exports.export_codes_to_file({'status': 'pending'}, 'csv.gz')
+            path = exports.find_export(filename)
+            self.assertEqual(path, os.path.join(root, filename))
+            with gzip.open(path, 'rt', encoding='utf-8-sig') as export:
+                self.assertEqual(len(export.read().splitlines()), count + 1)
+            self.assertFalse(os.path.exists(os.path.join(root, 'media')))
+            self.assertIsNone(exports.find_export('../' + filename))
+            self.assertIsNone(exports.find_export('absent.csv'))
+        self.assertEqual(count, 30)
+
+
+class CodeRedemptionTests(TestCase):
+
+    def setUp(self):
+        redemption.get_buckets().clear()
+        self.user = User.objects.create_user('client', password='x')
+        self.code = codes.mint_codes(1, code_type='promotion', usage_limit=2, created_by=self.user).codes.get()
+        self.request = RequestFactory().post('/', REMOTE_ADDR='10.0.0.1')
+        self.request.user = self.user
+
+    def test_consume_never_exceeds_limit(self):
+        results = [redemption.consume(self.code.pk) for _ in range(4)]
+
+        self.code.refresh_from_db()
+        self.assertEqual(results, [True, True, False, False])
+        self.assertEqual(self.code.usage_count, 2)
+        self.assertEqual(self.code.status, 'used')
+        self.assertIsNotNone(self.code.used_at)
+
+    def test_redeem_logs_usage_after_commit(self):
+        with mock.patch.object(redemption, '_refusal', return_value=None), \
+                self.captureOnCommitCallbacks(execute=True):
+            redeemed = redemption.redeem_code(self.code.code.lower(), self.user, self.request)
+
+        self.assertEqual(redeemed.usage_count, 1)
+        usage = CodeUsage.objects.get()
+        self.assertEqual((usage.user, usage.ip_address, usage.success), (self.user, '10.0.0.1', True))
+
+    def test_guesses_are_throttled_per_ip(self):
+        for _ in range(redemption.THROTTLE_BUCKETS['ip_code'][0]):
+            with self.assertRaises(redemption.RedemptionRefused) as refused:
+                redemption.redeem_code('XXXX-XXXX-XXXX', self.user, self.request)
+            self.assertEqual(refused.exception.reason, 'invalid')
+
+        with self.assertRaises(redemption.RedemptionRefused) as refused:
+            redemption.redeem_code('XXXX-XXXX-XXXX', self.user, self.request)
+        self.assertEqual(refused.exception.reason, 'throttled')
+
+    def test_client_ip_ignores_client_supplied_forwarded_for(self):
+        request = RequestFactory().post('/', REMOTE_ADDR='10.0.0.1', HTTP_X_FORWARDED_FOR='1.2.3.4, 203.0.113.7')
+        self.assertEqual(redemption.client_ip(request), '10.0.0.1')
+        with self.settings(TRUSTED_PROXY_COUNT=1):
+            self.assertEqual(redemption.client_ip(request), '203.0.113.7')
+        with self.settings(TRUSTED_PROXY_COUNT=3):
+            self.assertEqual(redemption.client_ip(request), '10.0.0.1')
+
+    def test_is_valid_does_not_write(self):
+        PaymentVerificationCode.objects.filter(pk=self.code.pk).update(expires_at=timezone.now())
+        self.code.refresh_from_db()
+
+        with self.assertNumQueries(0):
+            self.assertFalse(self.code.is_valid())
+        self.assertEqual(self.code.status, 'pending')
+
+
+class SmsParsingTests(TestCase):
+
+    def setUp(self):
+        sms_parsing.invalidate_rules()
+
+    def test_corpus(self):
+        for sender, message, expected in SMS_CORPUS:
+            with self.subTest(sender=sender, message=message[:40]):
+                data = sms_parsing.parse_sms(sender, message)
+                got = data and {key: data[key] for key in ('operator', 'amount', 'phone', 'code')}
+                self.assertEqual(got, expected)
+
+    def test_amount_formats(self):
+        for text, amount in [('5 000', '5000'), ('10.000', '10000'), ('5,000.00', '5000.00'), ('2,5', '2.5')]:
+            self.assertEqual(sms_parsing.parse_amount(text), Decimal(amount))
+
+    def test_rules_cached_until_config_saved(self):
+        sms_parsing.get_rules()
+        with self.assertNumQueries(0):
+            sms_parsing.parse_batch([(sender, message) for sender, message, _ in SMS_CORPUS])
+
+        MobileMoneyConfig.objects.create(
+            operator='orange', sms_sender='OMCI',
+            sms_regex_pattern=r'Paiement (?P<amount>\d+) F (?P<phone>\d+) (?P<code>[A-Z0-9]{6,})',
+        )
+        data = sms_parsing.parse_sms('OMCI', 'Paiement 700 F 0707070707 ABC1234')
+        self.assertEqual((data['operator'], data['amount'], data['code']), ('orange', Decimal('700'), 'ABC1234'))
+
+        MobileMoneyConfig.objects.filter(operator='orange').update(is_active=False)
+        MobileMoneyConfig.objects.get(operator='orange').save()
+        self.assertIsNone(sms_parsing.parse_sms('OrangeMoney', SMS_CORPUS[0][1]))
+
+    def test_batch_upsert(self):
+        PaymentTransaction.objects.create(transaction_id='1234567890', payment_method='moov', amount=5000)
+        messages = [(sender, message) for sender, message, _ in SMS_CORPUS]
+        sms_parsing.get_rules()
+
+        # Lecture des existantes, confirmation groupée, insertion groupée, relecture
+        with self.assertNumQueries(4):
+            parsed, transactions, created = sms_parsing.process_sms_batch(messages * 2)
+
+        recognized = [expected for _, _, expected in SMS_CORPUS if expected]
+        self.assertEqual(len(transactions), len(recognized))
+        self.assertEqual(len(created), len(recognized) - 1)
+        self.assertEqual(PaymentTransaction.objects.get(transaction_id='1234567890').status, 'completed')
+        # Seul le SMS relayé par un numéro (expéditeur inconnu) reste à vérifier
+        self.assertEqual(
+            list(PaymentTransaction.objects.exclude(status='completed').values_list('transaction_id', flat=True)),
+            ['OM12345678'],
+        )
+
+    def test_unknown_sender_never_completes_a_payment(self):
+        PaymentTransaction.objects.create(transaction_id='CI240115.1030.A12345', payment_method='orange', amount=5000)
+        forged = 'Orange Money: ' + SMS_CORPUS[0][1]
+        with self.captureOnCommitCallbacks(execute=True):
+            parsed, transactions, created = sms_parsing.process_sms_batch([
+                ('+22501020304', forged),
+                ('+22501020304', forged.replace('A12345', 'A99999')),
+            ])
+
+        self.assertEqual([data['trusted'] for data in parsed], [False, False])
+        self.assertEqual(created, {'CI240115.1030.A99999'})
+        self.assertEqual(
+            {code: (tx.status, tx.verified_at) for code, tx in transactions.items()},
+            {'CI240115.1030.A12345': ('pending', None), 'CI240115.1030.A99999': ('pending', None)},
+        )
+
+        # Le même SMS reçu de l'opérateur confirme le paiement
+        sms_parsing.process_sms_batch([('OrangeMoney', forged)])
+        self.assertEqual(PaymentTransaction.objects.get(transaction_id='CI240115.1030.A12345').status, 'completed')
+
+
+class SmsMatchingTests(TestCase):
+
+    def setUp(self):
+        sms_matching.get_index().clear()
+        owner = User.objects.create_user('vendeur', password='x')
+        self.store = Store.objects.create(owner=owner, name='Boutique', slug='boutique', whatsapp_number='+225 01 02 03 04')
+        self.product = Product.objects.create(store=self.store, name='Pagne', price=5000, image='p.jpg')
+
+    def order(self, phone='0707070707', total=5000, fee=1000):
+        return Order.objects.create(
+            product=self.product, store=self.store, total_price=total, delivery_fee=fee, customer_phone=phone,
+        )
+
+    def payment(self, code, amount, phone):
+        return PaymentTransaction.objects.create(
+            transaction_id=code, payment_method='orange', amount=amount, phone_number=phone, status='completed',
+        )
+
+    def test_order_matched_by_amount_and_phone(self):
+        order = self.order()
+        self.order(phone='0505050505')
+        tx = self.payment('CI1', 6000, '+2250707070707')
+
+        self.assertEqual(sms_matching.match_pending(), {'matched': 1, 'ambiguous': 0, 'unmatched': 0})
+
+        order.refresh_from_db()
+        tx.refresh_from_db()
+        self.assertEqual((order.payment_status, order.status), ('completed', 'confirmed'))
+        self.assertEqual((tx.match_status, tx.service_type, tx.reference_id), ('matched', 'order', order.pk))
+        self.assertEqual(self.store.owner.notifications.count(), 1)
+
+    def test_amount_only_match_needs_review(self):
+        order = self.order()
+        tx = self.payment('CI6', 6000, '0101010101')
+
+        self.assertEqual(sms_matching.match_pending(), {'matched': 0, 'ambiguous': 1, 'unmatched': 0})
+
+        order.refresh_from_db()
+        tx.refresh_from_db()
+        self.assertEqual((order.payment_status, order.status), ('pending', 'pending'))
+        self.assertEqual((tx.match_status, tx.match_candidates), ('ambiguous', [f'order:{order.pk}']))
+        self.assertIsNone(tx.reference_id)
+
+    def test_matched_order_refreshes_daily_stats(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.order()
+        stats = StoreDailyStats.objects.get(store=self.store)
+        self.assertEqual(stats.pending_orders, 1)
+        self.payment('CI7', 6000, '0707070707')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            sms_matching.match_pending()
+
+        stats.refresh_from_db()
+        self.assertEqual((stats.orders_count, stats.pending_orders), (1, 0))
+
+    def test_index_lookup_needs_no_query(self):
+        self.order()
+        index = sms_matching.ensure_index()
+        with self.assertNumQueries(0):
+            status, refs = sms_matching.decide(index, Decimal('6000'), '0707070707', timezone.now())
+        self.assertEqual(status, 'matched')
+
+    def test_ambiguous_payment_is_flagged(self):
+        first, second = self.order(), self.order()
+        tx = self.payment('CI2', 6000, '0707070707')
+
+        sms_matching.match_pending()
+
+        tx.refresh_from_db()
+        self.assertEqual(tx.match_status, 'ambiguous')
+        self.assertEqual(tx.match_candidates, [f'order:{first.pk}', f'order:{second.pk}'])
+        self.assertFalse(Order.objects.exclude(payment_status='pending').exists())
+
+    def test_subscription_activated(self):
+        plan = SubscriptionPlan.objects.create(name='Pro', description='', price=10000, duration_days=30)
+        sms_matching.ensure_index()
+        # Ajoutée à l'index par signal, sans reconstruction
+        subscription = StoreSubscription.objects.create(store=self.store, plan=plan)
+        self.payment('CI3', 10000, '01020304')
+
+        sms_matching.match_pending()
+
+        subscription.refresh_from_db()
+        self.assertEqual(subscription.status, 'active')
+        self.assertEqual((subscription.end_date - subscription.start_date).days, 30)
+        self.assertTrue(PaymentTransaction.objects.filter(service_type='certif', reference_id=subscription.pk).exists())
+
+    def test_replay_measures_match_rate(self):
+        order = self.order()
+        Order.objects.filter(pk=order.pk).update(payment_status='completed')
+        self.payment('CI4', 6000, '0707070707')
+        self.payment('CI5', 750, '0101010101')
+
+        stats = sms_matching.replay(timezone.now() - timedelta(days=1))
+
+        self.assertEqual((stats['transactions'], stats['matched'], stats['unmatched']), (2, 1, 1))
+        self.assertEqual(stats['match_rate'], 0.5)
+        self.assertFalse(PaymentTransaction.objects.exclude(match_status='unmatched').exists())
+
+
+class WhatsAppOutboxTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = start_fake_api()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.server.received.clear()
+        self.server.responses.clear()
+        redemption.get_buckets().clear()
+        payment_transport.reset_transport()
+        self.addCleanup(payment_transport.reset_transport)
+        WhatsAppConfig.objects.create(api_url=self.server.url, api_key='secret')
+
+    def test_handlers_only_enqueue(self):
+        owner = User.objects.create_user('vendeur', password='x')
+        store = Store.objects.create(owner=owner, name='Boutique', slug='boutique', whatsapp_number='0000')
+        product = Product.objects.create(store=store, name='Pagne', price=5000, image='p.jpg')
+
+        message = WhatsAppService().send_product_message(product, '70 12 34 56', 'Disponible ?')
+
+        self.assertEqual((message.status, message.recipient), ('pending', '22670123456'))
+        self.assertEqual(self.server.received, [])
+
+    def test_batch_sent_to_api(self):
+        whatsapp_outbox.enqueue_many([(f'7000{i:04d}', f'Message {i}') for i in range(20)])
+
+        totals = whatsapp_outbox.dispatch_outbox()
+
+        self.assertEqual(totals['sent'], 20)
+        self.assertEqual(len(self.server.received), 20)
+        self.assertEqual(self.server.authorizations, {'Bearer secret'})
+        self.assertFalse(WhatsAppMessage.objects.exclude(status='sent').exists())
+        self.assertFalse(WhatsAppMessage.objects.filter(external_id='').exists())
+
+    def test_server_errors_retried_with_backoff(self):
+        message = whatsapp_outbox.enqueue('22670000001', 'Bonjour')
+        self.server.responses['22670000001'] = [503]
+
+        whatsapp_outbox.dispatch_outbox()
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.attempts), ('pending', 1))
+        self.assertGreater(message.next_attempt_at, timezone.now() + timedelta(seconds=20))
+        self.assertIn('503', message.error_message)
+
+        WhatsAppMessage.objects.update(next_attempt_at=timezone.now())
+        whatsapp_outbox.dispatch_outbox()
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.attempts), ('sent', 2))
+
+    def test_open_breaker_defers_without_counting_attempts(self):
+        message = whatsapp_outbox.enqueue('22670000006', 'Bonjour')
+        breaker = payment_transport.get_breaker(whatsapp_outbox.PROVIDER)
+        for _ in range(breaker.failure_threshold):
+            breaker.record_failure()
+
+        for _ in range(whatsapp_outbox.get_outbox_policy()['max_attempts'] + 1):
+            redemption.get_buckets().clear()
+            WhatsAppMessage.objects.update(next_attempt_at=timezone.now())
+            self.assertEqual(whatsapp_outbox.dispatch_outbox()['deferred'], 1)
+
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.attempts), ('pending', 0))
+        self.assertGreater(message.next_attempt_at, timezone.now())
+        self.assertEqual(self.server.received, [])
+
+    def test_client_errors_fail_at_once(self):
+        message = whatsapp_outbox.enqueue('22670000002', 'Bonjour')
+        self.server.responses['22670000002'] = [400]
+
+        whatsapp_outbox.dispatch_outbox()
+
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.attempts), ('failed', 1))
+
+    def test_recipient_rate_limit(self):
+        whatsapp_outbox.enqueue_many([('22670000003', f'Message {i}') for i in range(7)])
+
+        totals = whatsapp_outbox.dispatch_outbox()
+
+        self.assertEqual((totals['sent'], totals['throttled']), (5, 2))
+        self.assertEqual(WhatsAppMessage.objects.filter(status='pending', attempts=0).count(), 2)
+
+    def test_delivery_receipts(self):
+        whatsapp_outbox.enqueue_many([('22670000004', 'A'), ('22670000005', 'B')])
+        whatsapp_outbox.dispatch_outbox()
+        first, second = WhatsAppMessage.objects.order_by('pk')
+
+        updated = whatsapp_outbox.apply_statuses([
+            {'id': first.external_id, 'status': 'delivered'},
+            {'id': second.external_id, 'status': 'failed', 'error': 'Numéro inconnu'},
+        ])
+
+        self.assertEqual(updated, 2)
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.status, second.status, second.error_message), ('delivered', 'failed', 'Numéro inconnu'))
+
+    def test_webhook_requires_signature(self):
+        from .views.whatsapp_order import whatsapp_webhook
+
+        whatsapp_outbox.enqueue('22670000007', 'A')
+        whatsapp_outbox.dispatch_outbox()
+        message = WhatsAppMessage.objects.get()
+        body = json.dumps({'statuses': [{'id': message.external_id, 'status': 'failed'}]}).encode()
+
+        def post(signature):
+            request = RequestFactory().post('/', body, content_type='application/json', HTTP_X_SIGNATURE=signature)
+            return whatsapp_webhook(request)
+
+        # Pas de secret configuré, puis signature absente ou fausse: refusé
+        self.assertEqual(post('').status_code, 403)
+        WhatsAppConfig.objects.update(webhook_secret='whsec')
+        self.assertEqual(post('').status_code, 403)
+        self.assertEqual(post(hmac.new(b'autre', body, hashlib.sha256).hexdigest()).status_code, 403)
+        message.refresh_from_db()
+        self.assertEqual(message.status, 'sent')
+
+        response = post('sha256=' + hmac.new(b'whsec', body, hashlib.sha256).hexdigest())
+        self.assertEqual(response.status_code, 200)
+        message.refresh_from_db()
+        self.assertEqual(message.status, 'failed')
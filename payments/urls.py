@@ -10,7 +10,7 @@ from .views.views import (
     verify_payment, payment_status, payment_success, payment_cancel,
     stripe_webhook, my_transactions, generate_verification_codes,
     view_generated_codes, verify_payment_code, delete_code, CodeDashboard, 
-    export_codes, mark_code_used, PromoteView
+    export_codes, download_export, mark_code_used, PromoteView
 )
 from .views import whatsapp_views
 from .views.whatsapp_order import process_whatsapp_order, whatsapp_webhook
@@ -90,6 +90,13 @@ urlpatterns = [
         name='export_codes'
     ),
     
+    # Exports produits en tâche de fond (staff uniquement)
+    path(
+        'exports/<str:filename>/',
+        download_export,
+        name='download_export'
+    ),
+    
     # Marquer un code comme utilisé (API)
     path(
         'codes/<int:code_id>/mark-used/', 
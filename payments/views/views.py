@@ -1,8 +1,6 @@
-import csv
 import random
 import string
 import logging
-import requests
 from urllib.parse import quote_plus
 from django.utils.translation import gettext_lazy as _
 
@@ -14,7 +12,7 @@ from django.views.generic import ListView, CreateView, UpdateView, DeleteView, T
 from django.urls import reverse_lazy, reverse
 from django.utils import timezone
 from django.db import transaction
-from django.http import JsonResponse, HttpResponseForbidden, Http404, HttpResponseRedirect, HttpResponse
+from django.http import JsonResponse, HttpResponseForbidden, Http404, HttpResponseRedirect
 from django.core.exceptions import PermissionDenied, ValidationError
 from django.utils.translation import gettext_lazy as _
 from django.views.decorators.http import require_http_methods, require_POST, require_GET
@@ -29,6 +27,9 @@ from payments.models import (
     PaymentTransaction, PaymentVerificationCode, 
     StoreSubscription, SubscriptionPlan, CodeUsage, WhatsAppConfig
 )
+from payments.codes import mint_codes
+from payments.redemption import RedemptionRefused, log_usage, redeem_code
+from payments.whatsapp_outbox import enqueue as enqueue_whatsapp
 from payments.forms import (
     PaymentVerificationForm, VerificationCodeForm,
     GenerateCodesForm, PaymentForm,
@@ -89,9 +90,10 @@ class CodeDashboard(LoginRequiredMixin, ListView):
         return self.request.user.is_staff
 
 def send_whatsapp_notification(verification_code, user, store):
-    """Send WhatsApp notification to admin about the payment verification"""
-    if not getattr(settings, 'WHATSAPP_API_KEY', None):
-        logger.warning("WhatsApp API key not configured")
+    """Queue a WhatsApp notification to admin about the payment verification"""
+    admin_number = getattr(settings, 'ADMIN_WHATSAPP_NUMBER', '')
+    if not admin_number:
+        logger.warning("Admin WhatsApp number not configured")
         return False
         
     message = (
@@ -103,20 +105,9 @@ def send_whatsapp_notification(verification_code, user, store):
         f"📅 *Date:* {timezone.now().strftime('%d/%m/%Y %H:%M')}"
     )
     
-    try:
-        response = requests.post(
-            'https://api.whatsapp.com/send',
-            json={
-                'api_key': settings.WHATSAPP_API_KEY,
-                'to': settings.ADMIN_WHATSAPP_NUMBER,
-                'message': message
-            },
-            timeout=10
-        )
-        return response.status_code == 200
-    except Exception as e:
-        logger.error(f"Failed to send WhatsApp notification: {str(e)}")
-        return False
+    # Envoi par le worker de la file WhatsApp (payments.whatsapp_outbox)
+    enqueue_whatsapp(admin_number, message, code_id=verification_code.pk, store_id=store.pk)
+    return True
 
 def process_payment(request, plan_id=None):
     """View to handle payment processing"""
@@ -242,47 +233,31 @@ def verify_payment_code(request):
     if request.method == 'POST':
         form = PaymentVerificationForm(request.POST)
         if form.is_valid():
-            code = form.cleaned_data['code'].strip().upper()
-            try:
-                with transaction.atomic():
-                    # Lock the record to prevent concurrent access
-                    verification_code = PaymentVerificationCode.objects.select_for_update().get(
-                        code=code,
-                        status='pending',
-                        expires_at__gt=timezone.now()
+            # Transaction courte: le code n'est consommé que si l'abonnement
+            # est activé (l'UPDATE conditionnel suffit, pas de verrou). Le
+            # refus est intercepté dans le bloc: son historique est conservé
+            with transaction.atomic():
+                try:
+                    verification_code = redeem_code(
+                        form.cleaned_data['code'], user=request.user, request=request, store=store,
                     )
-                    
-                    # Double check the code hasn't been used
-                    if verification_code.status != 'pending':
-                        messages.error(request, gettext_lazy('Ce code a déjà été utilisé ou a expiré.'))
-                        return redirect('payments:verify_payment_code')
-                    
-                    # Verify the code belongs to the user's store
+                except RedemptionRefused as refused:
+                    verification_code = None
+                    messages.error(request, str(refused))
+                else:
                     subscription = verification_code.subscription
-                    if subscription.store != store:
-                        messages.error(request, gettext_lazy('Ce code ne correspond pas à votre boutique.'))
-                        return redirect('payments:verify_payment_code')
-                    
-                    # Update the subscription
                     subscription.status = 'active'
                     subscription.starts_at = timezone.now()
                     subscription.expires_at = timezone.now() + timezone.timedelta(days=30)
                     subscription.save()
-                    
-                    # Mark the code as used
-                    verification_code.status = 'used'
-                    verification_code.used_by = request.user
-                    verification_code.used_at = timezone.now()
-                    verification_code.save()
-                    
-                    # Send WhatsApp notification
-                    send_whatsapp_notification(verification_code, request.user, store)
-                    
-                    messages.success(request, gettext_lazy('Paiement vérifié avec succès ! Votre abonnement est maintenant actif.'))
-                    return redirect('stores:dashboard')
-                
-            except PaymentVerificationCode.DoesNotExist:
-                messages.error(request, gettext_lazy('Code invalide, expiré ou déjà utilisé.'))
+            if verification_code is None:
+                return redirect('payments:verify_payment_code')
+            
+            # Send WhatsApp notification
+            send_whatsapp_notification(verification_code, request.user, store)
+            
+            messages.success(request, gettext_lazy('Paiement vérifié avec succès ! Votre abonnement est maintenant actif.'))
+            return redirect('stores:dashboard')
     else:
         form = PaymentVerificationForm()
     
@@ -347,60 +322,57 @@ class AdminCodeDashboard(LoginRequiredMixin, ListView):
 
 
 @login_required
+@user_passes_test(lambda u: u.is_staff)
 def export_codes(request):
     """
-    Exporte les codes de vérification au format CSV
+    Exporte les codes de vérification (CSV en flux, `gzip=1` pour un .csv.gz).
+    `format=xlsx` ou `background=1`: fichier produit hors requête, lien envoyé
+    en notification.
     """
-    from .models import PaymentVerificationCode
+    from payments.exports import (
+        CODE_EXPORT_HEADER, code_export_queryset, code_export_rows, streaming_csv_response,
+    )
+    from payments.tasks import export_codes_to_file
+    from stores.payment_jobs import celery_enabled
     
     # Récupérer les paramètres de filtrage
-    status = request.GET.get('status')
-    store_id = request.GET.get('store')
-    sort = request.GET.get('sort', '-created_at')
-    
-    # Construire la requête
-    queryset = PaymentVerificationCode.objects.all()
-    
-    if status in ['pending', 'used', 'expired']:
-        queryset = queryset.filter(status=status)
-        
-    if store_id:
-        queryset = queryset.filter(subscription__store_id=store_id)
-    
-    queryset = queryset.order_by(sort).select_related('subscription__store', 'created_by', 'used_by')
+    filters = {
+        'status': request.GET.get('status'),
+        'store_id': request.GET.get('store'),
+        'sort': request.GET.get('sort', '-created_at'),
+    }
+    fmt = 'xlsx' if request.GET.get('format') == 'xlsx' else 'csv'
+    if fmt == 'csv' and request.GET.get('gzip') == '1':
+        fmt = 'csv.gz'
+    
+    # Gros volumes et XLSX: écriture dans un fichier par un worker
+    if fmt == 'xlsx' or request.GET.get('background') == '1':
+        if celery_enabled():
+            export_codes_to_file.delay(filters, fmt, request.user.id)
+        else:
+            export_codes_to_file(filters, fmt, request.user.id)
+        messages.success(request, _("L'export est en cours: vous recevrez une notification avec le lien du fichier."))
+        return redirect('payments:code_dashboard')
     
-    # Créer la réponse HTTP avec l'en-tête CSV
-    response = HttpResponse(content_type='text/csv; charset=utf-8')
     timestamp = timezone.now().strftime('%Y%m%d_%H%M%S')
-    response['Content-Disposition'] = f'attachment; filename="verification_codes_{timestamp}.csv"'
-    
-    # Écrire les données CSV avec encodage UTF-8
-    response.write('\ufeff'.encode('utf8'))  # BOM pour Excel
-    writer = csv.writer(response, delimiter=';')
-    
-    # En-têtes
-    writer.writerow([
-        'Code', 'Statut', 'Boutique', 'Type de plan',
-        'Créé par', 'Créé le', 'Expire le',
-        'Utilisé par', 'Utilisé le', 'Notes'
-    ])
-    
-    # Données
-    for code in queryset:
-        writer.writerow([
-            code.code,
-            code.get_status_display(),
-            code.subscription.store.name if code.subscription and code.subscription.store else '',
-            code.subscription.get_plan_type_display() if code.subscription else '',
-            str(code.created_by) if code.created_by else '',
-            code.created_at.strftime('%Y-%m-%d %H:%M') if code.created_at else '',
-            code.expires_at.strftime('%Y-%m-%d %H:%M') if code.expires_at else '',
-            str(code.used_by) if code.used_by else '',
-            code.used_at.strftime('%Y-%m-%d %H:%M') if code.used_at else '',
-            (code.notes or '').replace('\n', ' ').replace('\r', '')
-        ])
-    
-    return response
+    return streaming_csv_response(
+        f'verification_codes_{timestamp}.csv',
+        CODE_EXPORT_HEADER,
+        code_export_rows(code_export_queryset(**filters)),
+        compress=fmt == 'csv.gz',
+    )
+
+@login_required
+@user_passes_test(lambda u: u.is_staff)
+def download_export(request, filename):
+    """Fichier d'export produit en tâche de fond (répertoire privé, staff uniquement)"""
+    from django.http import FileResponse
+    from payments.exports import find_export
+
+    path = find_export(filename)
+    if path is None:
+        raise Http404(_("Export introuvable"))
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=filename)
 
 import logging
 logger = logging.getLogger(__name__)
@@ -494,46 +466,27 @@ def generate_verification_codes(request):
             discount_type = form.cleaned_data.get('discount_type')
             discount_value = form.cleaned_data.get('discount_value')
             
-            # Générer les codes dans une transaction pour garantir l'intégrité
+            # Générer le lot en une fois (tirage en mémoire, bulk_create)
+            code_fields = {'usage_limit': usage_limit, 'max_attempts': max_attempts}
+            if code_type == 'certification' and subscription:
+                code_fields['subscription'] = subscription
+            elif code_type == 'promotion' and product:
+                code_fields.update(product=product, discount_type=discount_type, discount_value=discount_value)
+
             try:
-                with transaction.atomic():
-                    codes = []
-                    logger.info(f"Début de la génération de {count} codes de type {code_type}")
-                    
-                    for i in range(count):
-                        # Créer le code avec les paramètres avancés
-                        code_data = {
-                            'code_type': code_type,
-                            'created_by': request.user,
-                            'expires_at': expires_at,
-                            'usage_limit': usage_limit,
-                            'max_attempts': max_attempts,
-                            'notes': f"{notes} - Lot de {count} codes - {i+1}/{count}" if notes else f"Lot de {count} codes - {i+1}/{count}",
-                            'ip_address': request.META.get('REMOTE_ADDR'),
-                            'user_agent': request.META.get('HTTP_USER_AGENT', ''),
-                            'status': 'pending'
-                        }
-                        
-                        # Ajouter les champs spécifiques au type de code
-                        if code_type == 'certification' and subscription:
-                            code_data['subscription'] = subscription
-                            logger.debug(f"Code {i+1}: Ajout de l'abonnement {subscription.id}")
-                        elif code_type == 'promotion' and product:
-                            code_data['product'] = product
-                            code_data['discount_type'] = discount_type
-                            code_data['discount_value'] = discount_value
-                            logger.debug(f"Code {i+1}: Ajout du produit {product.id} avec réduction {discount_value}{'%' if discount_type == 'percentage' else 'FCFA'}")
-                        
-                        try:
-                            verification_code = PaymentVerificationCode.objects.create(**code_data)
-                            codes.append(verification_code)
-                            logger.debug(f"Code {i+1} généré: {verification_code.code}")
-                        except Exception as e:
-                            logger.error(f"Erreur lors de la création du code {i+1}: {str(e)}")
-                            raise
-                    
-                    logger.info(f"{len(codes)} codes générés avec succès")
-                    
+                logger.info(f"Début de la génération de {count} codes de type {code_type}")
+                batch = mint_codes(
+                    count,
+                    code_type=code_type,
+                    expires_at=expires_at,
+                    created_by=request.user,
+                    notes=notes or '',
+                    ip_address=request.META.get('REMOTE_ADDR'),
+                    user_agent=request.META.get('HTTP_USER_AGENT', ''),
+                    **code_fields
+                )
+                codes = list(batch.codes.order_by('id'))
+                logger.info(f"{len(codes)} codes générés avec succès (lot #{batch.id}, {batch.duration_ms} ms)")
             except Exception as e:
                 logger.error(f"Erreur lors de la génération des codes: {str(e)}")
                 messages.error(request, _('Une erreur est survenue lors de la génération des codes.'))
@@ -634,20 +587,18 @@ def mark_code_used(request, code_id):
     """
     try:
         with transaction.atomic():
-            # Verrouiller l'enregistrement pour éviter les accès concurrents
-            code = PaymentVerificationCode.objects.select_for_update().get(id=code_id)
+            code = PaymentVerificationCode.objects.select_related('subscription').get(id=code_id)
             
-            if code.status != 'pending':
+            # UPDATE conditionnel: un seul appel concurrent passe le code à 'used'
+            now = timezone.now()
+            if not PaymentVerificationCode.objects.filter(pk=code.pk, status='pending').update(
+                status='used', used_at=now, updated_at=now,
+            ):
                 return JsonResponse({
                     'success': False,
                     'error': gettext_lazy('Ce code a déjà été utilisé ou a expiré.')
                 })
-            
-            # Marquer le code comme utilisé
-            code.status = 'used'
-            code.used_by = request.user
-            code.used_at = timezone.now()
-            code.save()
+            log_usage(code, request.user, request, marked_by_staff=True)
             
             # Mettre à jour la souscription associée
             subscription = code.subscription
@@ -1,12 +1,16 @@
+import json
+
 from django.shortcuts import get_object_or_404, redirect
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.utils.translation import gettext_lazy as _
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import csrf_exempt
 
 from stores.models import Product
+from ..models import WhatsAppConfig
+from ..whatsapp_outbox import apply_statuses, verify_webhook_signature
 from .whatsapp_views import send_whatsapp_ajax
 
 @login_required
@@ -60,10 +64,22 @@ def process_whatsapp_order(request, product_id):
 def whatsapp_webhook(request):
     """
     Webhook pour recevoir les mises à jour de statut des messages WhatsApp
+    
+    Format attendu: {"statuses": [{"id": "wamid...", "status": "delivered"}, ...]},
+    signé (en-tête X-Signature) avec le secret de la configuration active
     """
     if request.method == 'POST':
-        # Traiter les mises à jour de statut des messages
-        # Cette partie dépendra de l'API WhatsApp que vous utilisez
-        pass
+        config = WhatsAppConfig.objects.filter(is_active=True).first()
+        if not verify_webhook_signature(config, request.body, request.headers.get('X-Signature', '')):
+            return HttpResponse('Invalid signature', status=403)
+        try:
+            data = json.loads(request.body.decode('utf-8') or '{}')
+        except (ValueError, UnicodeDecodeError):
+            return JsonResponse({'status': 'error', 'message': 'JSON invalide'}, status=400)
+        statuses = data.get('statuses') if isinstance(data, dict) else None
+        if isinstance(statuses, list):
+            # Statuts appliqués par lot (une lecture, une écriture)
+            updated = apply_statuses([item for item in statuses if isinstance(item, dict)])
+            return JsonResponse({'status': 'ok', 'updated': updated})
     
     return JsonResponse({'status': 'ok'})
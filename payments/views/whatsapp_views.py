@@ -30,19 +30,15 @@ def send_whatsapp_message(request, product_id):
             messages.error(request, _("Le numéro de téléphone est requis."))
             return redirect('product_detail', pk=product_id)
         
-        # Envoyer le message via le service WhatsApp
+        # Mettre le message en file d'envoi via le service WhatsApp
         whatsapp_service = WhatsAppService()
-        result = whatsapp_service.send_product_message(
+        whatsapp_service.send_product_message(
             product=product,
             phone_number=phone_number,
             message=custom_message
         )
         
-        if result.status == 'sent':
-            messages.success(request, _("Message WhatsApp envoyé avec succès !"))
-        else:
-            messages.error(request, _("Erreur lors de l'envoi du message WhatsApp: %(error)s") % {'error': result.error_message})
-        
+        messages.success(request, _("Message WhatsApp en cours d'envoi !"))
         return redirect('product_detail', pk=product_id)
     
     # Afficher le formulaire d'envoi de message
@@ -79,17 +75,12 @@ def send_whatsapp_ajax(request, product_id):
             message=custom_message
         )
         
-        if result.status == 'sent':
-            return JsonResponse({
-                'success': True,
-                'message': _('Message WhatsApp envoyé avec succès !'),
-                'message_id': result.id
-            })
-        else:
-            return JsonResponse({
-                'success': False,
-                'error': _("Erreur lors de l'envoi du message WhatsApp: %(error)s") % {'error': result.error_message}
-            }, status=400)
+        return JsonResponse({
+            'success': True,
+            'message': _("Message WhatsApp en cours d'envoi !"),
+            'message_id': result.id,
+            'status': result.status
+        })
             
     except Exception as e:
         return JsonResponse({
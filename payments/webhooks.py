@@ -1,8 +1,7 @@
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST, require_http_methods
 from django.http import JsonResponse
-import re
-from .models import PaymentTransaction
+from .sms_parsing import process_sms_batch
 import logging
 
 logger = logging.getLogger(__name__)
@@ -27,43 +26,19 @@ def sms_webhook(request):
         # Journalisation pour le débogage
         logger.info(f"Reçu un SMS de {sender}: {message}")
         
-        # Extraire les informations du message
-        pattern = r"Vous avez reçu (\d+) FCFA de (\+?\d+).*?Ref: ([A-Z0-9]+)"
-        match = re.search(pattern, message, re.IGNORECASE)
+        # Extraire les informations du message (règles compilées en cache)
+        (payment_data,), transactions, created_codes = process_sms_batch([(sender, message)])
         
-        if not match:
+        if not payment_data:
             logger.warning(f"Format de message non reconnu: {message}")
             return JsonResponse(
                 {'status': 'error', 'message': 'Format de message non reconnu'}, 
                 status=400
             )
         
-        amount = int(match.group(1))
-        phone_number = match.group(2)
-        transaction_id = match.group(3)
-        
-        # Déterminer le type de paiement
-        if transaction_id.upper().startswith('OM'):
-            payment_method = 'orange'
-        elif transaction_id.upper().startswith('MTN'):
-            payment_method = 'mtn'
-        elif transaction_id.upper().startswith('MOOV'):
-            payment_method = 'moov'
-        elif transaction_id.upper().startswith('WV'):
-            payment_method = 'wave'
-        else:
-            payment_method = 'unknown'
-        
-        # Créer ou mettre à jour la transaction
-        transaction, created = PaymentTransaction.objects.update_or_create(
-            transaction_id=transaction_id,
-            defaults={
-                'payment_method': payment_method,
-                'amount': amount,
-                'phone_number': phone_number,
-                'status': 'completed'
-            }
-        )
+        transaction_id = payment_data['code']
+        transaction = transactions[transaction_id]
+        created = transaction_id in created_codes
         
         # Si la transaction est nouvelle, déclencher les actions correspondantes
         if created:
@@ -0,0 +1,57 @@
+"""
+Faux serveur d'API WhatsApp, local, pour les tests et
+`manage.py run_whatsapp_outbox --fake-api`.
+
+POST / avec {"to": ..., "message": ...}: répond {"id": "wamid.N"} et garde le
+message dans `server.received`. `server.responses` force un code HTTP par
+destinataire (liste consommée à chaque appel, ex. [503, 200]).
+"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeWhatsAppHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'{}')
+        server = self.server
+        time.sleep(server.delay)
+        with server.lock:
+            forced = server.responses.get(body.get('to'))
+            status = forced.pop(0) if forced else 200
+            if status < 300:
+                server.received.append(body)
+                payload = {'id': f'wamid.{len(server.received)}'}
+            else:
+                payload = {'error': 'fake error'}
+            server.authorizations.add(self.headers.get('Authorization', ''))
+
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_fake_api(delay=0.0):
+    """Démarre le faux serveur dans un thread; `server.url` est l'URL à configurer"""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeWhatsAppHandler)
+    server.daemon_threads = True
+    server.delay = delay
+    server.lock = threading.Lock()
+    server.received = []
+    server.responses = {}
+    server.authorizations = set()
+    server.url = f'http://127.0.0.1:{server.server_address[1]}/'
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
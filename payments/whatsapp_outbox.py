@@ -0,0 +1,303 @@
+"""
+File d'envoi des messages WhatsApp.
+
+Les vues et signaux ne font qu'enregistrer un WhatsAppMessage 'pending'
+(`enqueue`); l'envoi est fait par un worker: tâche Celery quand un broker est
+configuré, sinon `manage.py run_whatsapp_outbox`. Le worker réserve un lot de
+messages dus, les envoie en parallèle sur la session HTTP partagée
+(stores.payment_transport: connexions keep-alive, disjoncteur), limite le
+débit par destinataire (seaux à jetons) et relance avec un délai croissant.
+Disjoncteur ouvert: les messages sont reportés à sa réouverture, sans
+compter d'essai (une panne du fournisseur n'épuise pas max_attempts).
+Les statuts du lot sont enregistrés par un seul bulk_update.
+"""
+
+import hashlib
+import hmac
+import logging
+import random
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Nom du fournisseur pour le transport partagé (session, disjoncteur, latences)
+PROVIDER = 'whatsapp'
+
+# Surcharge possible via settings.WHATSAPP_OUTBOX = {'batch_size': 200, ...}
+DEFAULT_OUTBOX = {
+    'batch_size': 100,         # messages réservés par passage
+    'concurrency': 8,          # envois simultanés
+    'max_attempts': 6,         # au-delà: échec définitif
+    'base_interval': 30,       # délai après le premier échec (secondes)
+    'factor': 2.0,             # multiplicateur à chaque essai
+    'max_interval': 3600,      # délai maximal entre deux essais
+    'recipient_burst': 5,      # messages envoyables d'affilée à un même numéro
+    'recipient_interval': 6,   # puis un message toutes les N secondes
+    'lease_seconds': 120,      # réservation d'un lot (au-delà: repris par un autre worker)
+}
+
+# Aléa ajouté aux délais (évite que les relances partent en rafale)
+JITTER = 0.1
+
+# Indicatif ajouté aux numéros locaux
+DEFAULT_COUNTRY_CODE = '226'
+
+# Réponses du fournisseur à retenter (les autres 4xx sont définitives)
+RETRY_STATUSES = (408, 425, 429)
+
+
+def get_outbox_policy():
+    policy = dict(DEFAULT_OUTBOX)
+    policy.update(getattr(settings, 'WHATSAPP_OUTBOX', {}))
+    return policy
+
+
+def backoff_delay(attempts, policy=None):
+    """Délai avant l'essai suivant, après `attempts` essais infructueux"""
+    policy = policy or get_outbox_policy()
+    delay = min(policy['base_interval'] * policy['factor'] ** max(attempts - 1, 0), policy['max_interval'])
+    return delay * (1 + random.uniform(-JITTER, JITTER))
+
+
+def normalize_recipient(phone):
+    """'+226 70 12 34 56', '0022670123456', '70123456' -> '22670123456'"""
+    digits = ''.join(char for char in (phone or '') if char.isdigit())
+    if digits.startswith('00'):
+        digits = digits[2:]
+    if 0 < len(digits) <= 8:
+        digits = getattr(settings, 'WHATSAPP_DEFAULT_COUNTRY_CODE', DEFAULT_COUNTRY_CODE) + digits
+    return digits
+
+
+# ---------------------------------------------------------------------------
+# Mise en file
+# ---------------------------------------------------------------------------
+
+def _wake_worker():
+    from stores.payment_jobs import celery_enabled
+
+    if celery_enabled():
+        from .tasks import send_whatsapp_messages
+        transaction.on_commit(lambda: send_whatsapp_messages.delay())
+
+
+def enqueue(recipient, message, product=None, **details):
+    """Met un message en file (un INSERT); retourne le WhatsAppMessage 'pending'"""
+    from .models import WhatsAppMessage
+
+    whatsapp_message = WhatsAppMessage.objects.create(
+        product=product,
+        recipient=normalize_recipient(recipient)[:20],
+        message=message,
+        status='pending',
+        next_attempt_at=timezone.now(),
+        details=details,
+    )
+    _wake_worker()
+    return whatsapp_message
+
+
+def enqueue_many(items):
+    """Mise en file groupée: [(destinataire, message)] ou [(destinataire, message, produit)]"""
+    from .models import WhatsAppMessage
+
+    now = timezone.now()
+    created = WhatsAppMessage.objects.bulk_create(
+        [
+            WhatsAppMessage(
+                product=item[2] if len(item) > 2 else None,
+                recipient=normalize_recipient(item[0])[:20],
+                message=item[1],
+                status='pending',
+                next_attempt_at=now,
+            )
+            for item in items
+        ],
+        batch_size=500,
+    )
+    if created:
+        _wake_worker()
+    return created
+
+
+# ---------------------------------------------------------------------------
+# Envoi
+# ---------------------------------------------------------------------------
+
+def claim_batch(limit, policy=None):
+    """
+    Réserve les messages dus: leur prochain envoi est repoussé de
+    lease_seconds, un autre worker ne les reprend qu'à l'expiration
+    """
+    from .models import WhatsAppMessage
+
+    policy = policy or get_outbox_policy()
+    now = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            WhatsAppMessage.objects.select_for_update(skip_locked=True)
+            .filter(status='pending', next_attempt_at__lte=now)
+            .order_by('next_attempt_at')
+            .values_list('pk', flat=True)[:limit]
+        )
+        WhatsAppMessage.objects.filter(pk__in=ids).update(
+            next_attempt_at=now + timedelta(seconds=policy['lease_seconds'])
+        )
+    return list(WhatsAppMessage.objects.filter(pk__in=ids).order_by('pk'))
+
+
+def _post(config, whatsapp_message):
+    """
+    Un appel à l'API. Retourne ('sent', id fournisseur), ('retry', erreur),
+    ('failed', erreur) ou ('deferred', erreur) si le disjoncteur est ouvert
+    (aucun appel fait).
+    """
+    from stores.payment_transport import ProviderUnavailable, request
+
+    try:
+        response = request(
+            PROVIDER, 'send', 'POST', config.api_url,
+            json={'to': whatsapp_message.recipient, 'message': whatsapp_message.message},
+            headers={'Authorization': f'Bearer {config.api_key}'},
+        )
+    except ProviderUnavailable as e:
+        return 'deferred', str(e)
+    except requests.RequestException as e:
+        return 'retry', str(e)
+
+    if response.status_code < 300:
+        try:
+            payload = response.json()
+        except ValueError:
+            payload = {}
+        return 'sent', str(payload.get('id') or payload.get('message_id') or '')
+    error = f"Erreur {response.status_code}: {response.text[:200]}"
+    if response.status_code >= 500 or response.status_code in RETRY_STATUSES:
+        return 'retry', error
+    return 'failed', error
+
+
+def send_batch(messages, config=None, policy=None):
+    """
+    Envoie un lot réservé et enregistre les statuts en une requête. Retourne
+    le nombre de messages par issue ('sent', 'retry', 'failed', 'throttled',
+    'deferred').
+    """
+    from stores.payment_transport import get_breaker
+    from .models import WhatsAppConfig, WhatsAppMessage
+    from .redemption import get_buckets
+
+    config = config or WhatsAppConfig.get_active_config()
+    policy = policy or get_outbox_policy()
+    buckets = get_buckets()
+    rate = 1 / policy['recipient_interval']
+    now = timezone.now()
+    counts = {'sent': 0, 'retry': 0, 'failed': 0, 'throttled': 0, 'deferred': 0}
+
+    ready = []
+    for whatsapp_message in messages:
+        if buckets.take(f'whatsapp:{whatsapp_message.recipient}', policy['recipient_burst'], rate, 1):
+            ready.append(whatsapp_message)
+        else:
+            # Débit du destinataire dépassé: reporté, sans compter d'essai
+            whatsapp_message.next_attempt_at = now + timedelta(seconds=policy['recipient_interval'])
+            counts['throttled'] += 1
+
+    with ThreadPoolExecutor(max_workers=policy['concurrency']) as executor:
+        results = list(executor.map(lambda m: _post(config, m), ready))
+
+    for whatsapp_message, (outcome, info) in zip(ready, results):
+        if outcome == 'deferred':
+            # Fournisseur non appelé: reporté à la réouverture du disjoncteur, sans compter d'essai
+            whatsapp_message.error_message = info
+            whatsapp_message.next_attempt_at = now + timedelta(seconds=max(1, get_breaker(PROVIDER).retry_in()))
+            counts[outcome] += 1
+            continue
+        whatsapp_message.attempts += 1
+        if outcome == 'sent':
+            whatsapp_message.mark_as_sent(info, commit=False)
+        else:
+            if outcome == 'failed' or whatsapp_message.attempts >= policy['max_attempts']:
+                outcome = 'failed'
+                whatsapp_message.mark_as_failed(info, commit=False)
+            else:
+                whatsapp_message.error_message = info
+                whatsapp_message.next_attempt_at = now + timedelta(
+                    seconds=backoff_delay(whatsapp_message.attempts, policy)
+                )
+        counts[outcome] += 1
+
+    WhatsAppMessage.objects.bulk_update(messages, WhatsAppMessage.STATUS_FIELDS, batch_size=500)
+    return counts
+
+
+def dispatch_outbox(max_batches=None):
+    """
+    Vide la file des messages dus, lot par lot. Sans configuration active
+    munie d'une clé d'API, rien n'est envoyé (les messages restent en file).
+    """
+    from .models import WhatsAppConfig
+
+    config = WhatsAppConfig.objects.filter(is_active=True).first()
+    if config is None or not config.api_key:
+        logger.warning("WhatsApp outbox: no active configuration with an API key, messages kept queued")
+        return {}
+
+    policy = get_outbox_policy()
+    totals = {'sent': 0, 'retry': 0, 'failed': 0, 'throttled': 0, 'deferred': 0}
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        messages = claim_batch(policy['batch_size'], policy)
+        if not messages:
+            break
+        for outcome, count in send_batch(messages, config, policy).items():
+            totals[outcome] += count
+        batches += 1
+    if batches:
+        logger.info(f"WhatsApp outbox: {totals}")
+    return totals
+
+
+# ---------------------------------------------------------------------------
+# Accusés de réception
+# ---------------------------------------------------------------------------
+
+def verify_webhook_signature(config, body, signature):
+    """
+    Accusé de réception authentique: `signature` (en-tête X-Signature,
+    préfixe 'sha256=' toléré) est le HMAC-SHA256 hexadécimal du corps brut
+    avec le secret de la configuration. Sans secret configuré: refusé.
+    """
+    if config is None or not config.webhook_secret or not signature:
+        return False
+    expected = hmac.new(config.webhook_secret.encode(), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(signature.removeprefix('sha256='), expected)
+
+
+def apply_statuses(statuses):
+    """
+    Statuts renvoyés par le fournisseur ([{'id': ..., 'status': 'delivered'
+    ou 'failed', 'error': ...}]), appliqués par lot. Retourne le nombre de
+    messages mis à jour.
+    """
+    from .models import WhatsAppMessage
+
+    by_id = {
+        str(item.get('id')): item for item in statuses
+        if item.get('id') and item.get('status') in ('delivered', 'failed')
+    }
+    messages = list(WhatsAppMessage.objects.filter(external_id__in=list(by_id)).exclude(status='delivered'))
+    for whatsapp_message in messages:
+        item = by_id[whatsapp_message.external_id]
+        if item['status'] == 'delivered':
+            whatsapp_message.mark_as_delivered(commit=False)
+        else:
+            whatsapp_message.mark_as_failed(str(item.get('error') or 'Échec signalé par le fournisseur'), commit=False)
+    WhatsAppMessage.objects.bulk_update(messages, WhatsAppMessage.STATUS_FIELDS, batch_size=500)
+    return len(messages)
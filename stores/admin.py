@@ -2,9 +2,9 @@ from django.contrib import admin
 from .models import (
     Store, Product, ProductImage, Subscription, Promotion, Category, Tag,
     Follow, Like, Comment, Share, Review, Favorite, Notification, SearchHistory,
-    Payment, Order, GeneralProfile,
+    Payment, PaymentVerificationJob, WebhookEvent, Order, GeneralProfile,
     # Nouvelles fonctionnalités
-    LiveStream, LiveProduct, LiveComment, LivePurchase,
+    LiveStream, LiveProduct, LiveComment, LivePurchase, VideoTranscodeJob, ImageDerivative,
     StudentProfile, Skill, Portfolio, Project, Recommendation,
     Job, JobApplication, JobCategory,
     Classroom, ClassPost, ClassNote, Tutorial,
@@ -256,6 +256,38 @@ class PaymentAdmin(admin.ModelAdmin):
     )
 
 
+@admin.register(PaymentVerificationJob)
+class PaymentVerificationJobAdmin(admin.ModelAdmin):
+    list_display = ['payment', 'provider', 'status', 'attempts', 'next_attempt_at', 'updated_at']
+    list_filter = ['status', 'provider']
+    search_fields = ['payment__transaction_id', 'last_error']
+    readonly_fields = ['created_at', 'updated_at', 'completed_at', 'lease_expires_at']
+    actions = ['requeue']
+
+    @admin.action(description="Relancer la vérification")
+    def requeue(self, request, queryset):
+        from django.utils import timezone
+        count = queryset.exclude(status='running').update(
+            status='scheduled', attempts=0, next_attempt_at=timezone.now(), last_error=''
+        )
+        self.message_user(request, f"{count} vérifications relancées")
+
+
+@admin.register(WebhookEvent)
+class WebhookEventAdmin(admin.ModelAdmin):
+    list_display = ['provider', 'event_type', 'transaction_ref', 'status', 'attempts', 'received_at', 'processed_at']
+    list_filter = ['status', 'provider']
+    search_fields = ['event_id', 'transaction_ref', 'last_error']
+    readonly_fields = ['received_at', 'processed_at', 'lease_expires_at']
+    actions = ['replay']
+
+    @admin.action(description="Rejouer les événements")
+    def replay(self, request, queryset):
+        from .webhook_events import replay_events
+        count = replay_events(queryset)
+        self.message_user(request, f"{count} événements rejoués")
+
+
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
     list_display = ['id', 'product', 'store', 'customer_name', 'total_price', 'status', 'payment_status', 'created_at']
@@ -348,6 +380,22 @@ class LivePurchaseAdmin(admin.ModelAdmin):
     search_fields = ['product__name', 'customer__username']
 
 
+@admin.register(VideoTranscodeJob)
+class VideoTranscodeJobAdmin(admin.ModelAdmin):
+    list_display = ['live_stream', 'status', 'attempts', 'duration', 'updated_at', 'completed_at']
+    list_filter = ['status']
+    search_fields = ['live_stream__title', 'source']
+    readonly_fields = ['live_stream', 'source', 'attempts', 'lease_expires_at', 'last_error', 'duration', 'renditions', 'completed_at']
+
+
+@admin.register(ImageDerivative)
+class ImageDerivativeAdmin(admin.ModelAdmin):
+    list_display = ['source', 'status', 'attempts', 'width', 'height', 'updated_at']
+    list_filter = ['status']
+    search_fields = ['source']
+    readonly_fields = ['source', 'attempts', 'lease_expires_at', 'last_error', 'width', 'height', 'variants', 'completed_at']
+
+
 # ============================================================================
 # 📄 PROFIL ÉTUDIANT
 # ============================================================================
@@ -8,134 +8,113 @@ from datetime import timedelta
 from django.utils import timezone
 import math
 
-# Géolocalisation avec geopy (plus simple que django.contrib.gis)
-try:
-    from geopy.distance import geodesic
-    GEOPY_AVAILABLE = True
-except ImportError:
-    GEOPY_AVAILABLE = False
-    # Fonction factice si geopy n'est pas disponible
-    def geodesic(point1, point2):
-        class Distance:
-            kilometers = 0
-        return Distance()
 
-
-def calculate_product_score(product, user=None):
+def calculate_product_score(product, user=None, followed_store_ids=None, liked_category_ids=None):
     """
     Calcule un score algorithmique pour un produit
     Utilisé pour le feed intelligent (comme TikTok)
+
+    Le score de base est lu dans l'index dénormalisé ProductScore
+    (maintenu par les signaux, voir scoring.py). Passer
+    `followed_store_ids` / `liked_category_ids` évite les requêtes de
+    personnalisation quand on score plusieurs produits d'affilée.
     """
-    score = 0
-    
-    # Likes (poids: 3)
-    score += product.likes_count * 3
-    
-    # Commentaires (poids: 2)
-    score += product.comments.count() * 2
-    
-    # Partages (poids: 5 - très important)
-    score += product.shares_count * 5
-    
-    # Vues (poids: 0.1)
-    score += product.views_count * 0.1
-    
-    # Produit en vedette (poids: 10)
-    if product.is_currently_featured():
-        score += 10
-    
-    # Boutique vérifiée (poids: 5)
-    if product.store.is_verified:
-        score += 5
-    
-    # Fraîcheur (produits récents ont un bonus)
-    days_old = (timezone.now() - product.created_at).days
-    freshness_bonus = max(0, 10 - days_old * 0.5)
-    score += freshness_bonus
-    
-    # Note moyenne (poids: 2)
-    avg_rating = product.get_average_rating()
-    score += avg_rating * 2
+    from .models import ProductScore
+    from .scoring import refresh_product_score
+
+    try:
+        score = product.feed_score.score
+    except ProductScore.DoesNotExist:
+        refresh_product_score(product.pk)
+        score = ProductScore.objects.filter(product_id=product.pk).values_list('score', flat=True).first() or 0
     
     # Personnalisation si utilisateur connecté
     if user and user.is_authenticated:
+        if followed_store_ids is None:
+            followed_store_ids = set(user.following.values_list('store_id', flat=True))
+        if liked_category_ids is None:
+            liked_category_ids = set(
+                product.__class__.objects.filter(likes__user=user)
+                .values_list('category_id', flat=True).distinct()
+            )
+        
         # Bonus si l'utilisateur suit la boutique
-        if product.store.followers.filter(user=user).exists():
+        if product.store_id in followed_store_ids:
             score += 15
         
         # Bonus si l'utilisateur a liké des produits similaires
-        user_liked_categories = product.__class__.objects.filter(
-            likes__user=user
-        ).values_list('category_id', flat=True).distinct()
-        
-        if product.category_id in user_liked_categories:
+        if product.category_id in liked_category_ids:
             score += 8
     
     return score
 
 
-def get_personalized_recommendations(user, limit=20):
+def get_ranked_feed(user=None, limit=20, exclude_ids=None):
     """
-    Recommandations personnalisées basées sur:
-    - Historique de likes
-    - Boutiques suivies
-    - Catégories préférées
-    - Produits similaires
+    Feed classé en une seule requête sur l'index ProductScore
+    (score de base + bonus de personnalisation calculés en SQL)
     """
-    from .models import Product, Like, Follow, Favorite
-    
-    if not user.is_authenticated:
-        # Pour non-connectés: produits populaires
-        return Product.objects.annotate(
-            score=Count('likes') * 3 + Count('comments') * 2
-        ).order_by('-score', '-created_at')
-    
-    # Catégories préférées de l'utilisateur
-    liked_products = Like.objects.filter(user=user).values_list('product_id', flat=True)
-    liked_categories = Product.objects.filter(
-        id__in=liked_products
-    ).values_list('category_id', flat=True).distinct()
-    
-    # Boutiques suivies
-    followed_stores = Follow.objects.filter(user=user).values_list('store_id', flat=True)
+    from .models import Product, Follow, Like
+    from django.db.models.functions import Coalesce
+    from django.db.models import FloatField, Value
+
+    rank = Coalesce(F('feed_score__score'), Value(0.0), output_field=FloatField())
+    
+    if user is not None and user.is_authenticated:
+        followed_stores = Follow.objects.filter(user=user).values('store_id')
+        liked_categories = Like.objects.filter(
+            user=user, product__category__isnull=False
+        ).values('product__category_id')
+        rank = rank + Case(
+            When(store_id__in=followed_stores, then=Value(15.0)),
+            default=Value(0.0),
+            output_field=FloatField()
+        ) + Case(
+            When(category_id__in=liked_categories, then=Value(8.0)),
+            default=Value(0.0),
+            output_field=FloatField()
+        )
     
-    # Produits favoris (pour trouver des produits similaires)
-    favorite_products = Favorite.objects.filter(user=user).values_list('product_id', flat=True)
+    feed = Product.objects.select_related('store', 'feed_score').annotate(
+        feed_rank=rank
+    )
+    if exclude_ids:
+        feed = feed.exclude(id__in=exclude_ids)
+    feed = feed.order_by('-feed_rank', '-created_at')
     
-    # Construire la requête (sans slice pour permettre les filtres supplémentaires)
-    recommendations = Product.objects.annotate(
+    if limit:
+        return feed[:limit]
+    return feed
+
+
+def get_personalized_recommendations(user, limit=20):
+    """
+    Recommandations personnalisées (filtrage collaboratif, voir collaborative.py):
+    - Facteurs appris hors ligne sur likes, favoris, partages, commandes, abonnements
+    - Top-N par produit scalaire en mémoire, puis une requête pour charger les produits
+    - Démarrage à froid (utilisateur inconnu du modèle): produits populaires
+    """
+    from .models import Product
+    from .collaborative import recommend_product_ids
+    from django.db.models import FloatField, Value
+
+    product_ids = recommend_product_ids(user, limit)
+    if not product_ids:
+        # Non connectés, nouveaux utilisateurs: produits populaires (index ProductScore)
+        return get_ranked_feed(limit=limit)
+
+    # Garde l'ordre du modèle (sans slice pour permettre les filtres supplémentaires)
+    recommendations = Product.objects.filter(
+        id__in=product_ids
+    ).select_related('store', 'feed_score').annotate(
         score=Case(
-            # Produits des boutiques suivies (très prioritaire)
-            When(store_id__in=followed_stores, then=20),
-            default=0,
-            output_field=IntegerField()
-        ) +
-        Case(
-            # Produits des catégories préférées
-            When(category_id__in=liked_categories, then=10),
-            default=0,
-            output_field=IntegerField()
-        ) +
-        # Score algorithmique de base
-        Count('likes') * 3 +
-        Count('comments') * 2 +
-        Count('shares') * 5 +
-        F('views_count') * 0.1 +
-        Case(
-            When(is_featured=True, then=10),
-            default=0,
-            output_field=IntegerField()
-        ) +
-        Case(
-            When(store__is_verified=True, then=5),
-            default=0,
-            output_field=IntegerField()
+            *[When(id=product_id, then=Value(float(len(product_ids) - position)))
+              for position, product_id in enumerate(product_ids)],
+            default=Value(0.0),
+            output_field=FloatField()
         )
-    ).exclude(
-        id__in=liked_products  # Exclure les produits déjà likés
-    ).order_by('-score', '-created_at')
-    
-    # Appliquer la limite seulement à la fin si nécessaire
+    ).order_by('-score')
+
     if limit:
         return recommendations[:limit]
     return recommendations
@@ -144,55 +123,20 @@ def get_personalized_recommendations(user, limit=20):
 def get_geo_products(user_lat, user_lng, radius_km=50, limit=20):
     """
     Découverte géographique: produits proches de la position
+    Les produits sont groupés par boutique (les plus proches d'abord),
+    voir geo.get_geo_stores
     """
-    from .models import Product, Store, Order
-    
-    if not GEOPY_AVAILABLE:
-        # Si geopy n'est pas disponible, retourner les produits récents
-        return Product.objects.order_by('-created_at')[:limit]
+    from .models import Product
+    from .geo import get_geo_stores
     
     if not user_lat or not user_lng:
         return Product.objects.none()
     
-    user_location = (float(user_lat), float(user_lng))
-    
-    # Récupérer tous les produits avec leurs boutiques
-    products = Product.objects.select_related('store').all()
-    
     nearby_products = []
-    
-    for product in products:
-        # Si la boutique a une localisation
-        if hasattr(product.store, 'latitude') and hasattr(product.store, 'longitude'):
-            if product.store.latitude and product.store.longitude:
-                store_location = (float(product.store.latitude), float(product.store.longitude))
-                distance = geodesic(user_location, store_location).kilometers
-                
-                if distance <= radius_km:
-                    product.distance_km = round(distance, 2)
-                    nearby_products.append(product)
-        
-        # Sinon, utiliser les commandes récentes pour estimer la localisation
-        # (si des commandes ont été passées depuis cette zone)
-        recent_orders = Order.objects.filter(
-            product=product,
-            latitude__isnull=False,
-            longitude__isnull=False
-        ).exclude(latitude=0, longitude=0)[:5]
-        
-        if recent_orders.exists():
-            for order in recent_orders:
-                order_location = (float(order.latitude), float(order.longitude))
-                distance = geodesic(user_location, order_location).kilometers
-                
-                if distance <= radius_km:
-                    product.distance_km = round(distance, 2)
-                    if product not in nearby_products:
-                        nearby_products.append(product)
-                    break
-    
-    # Trier par distance
-    nearby_products.sort(key=lambda x: getattr(x, 'distance_km', 999))
+    for store in get_geo_stores(float(user_lat), float(user_lng), radius_km, limit=limit):
+        nearby_products.extend(store.nearby_products)
+        if len(nearby_products) >= limit:
+            break
     
     return nearby_products[:limit]
 
@@ -0,0 +1,278 @@
+"""
+📊 Statistiques quotidiennes des boutiques (StoreDailyStats)
+Une ligne par boutique et par jour: vues, likes, commandes par statut,
+revenus, avis. Les vues arrivent avec le vidage des compteurs, les likes par
+signaux (F()), commandes/paiements/avis par recalcul ciblé du jour concerné;
+une tâche nocturne recalcule les derniers jours depuis les tables sources.
+Le tableau de bord lit uniquement cet agrégat.
+"""
+
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Sum, Q, F
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+# Statut de commande -> colonne de StoreDailyStats
+ORDER_STATUS_COLUMNS = {
+    'pending': 'pending_orders',
+    'delivered': 'delivered_orders',
+    'cancelled': 'cancelled_orders',
+    'refunded': 'cancelled_orders',
+}
+
+# Colonnes recalculées depuis les tables sources (les vues n'ont pas d'historique)
+REBUILT_FIELDS = [
+    'likes', 'orders_count', 'pending_orders', 'delivered_orders', 'cancelled_orders',
+    'revenue', 'reviews_count', 'rating_sum',
+]
+
+# Jours recalculés par la tâche nocturne (rattrape les retards et les suppressions)
+NIGHTLY_WINDOW_DAYS = 3
+
+# Périodes proposées sur le tableau de bord
+PERIOD_CHOICES = (7, 30, 90)
+
+
+def _local_date(value=None):
+    return timezone.localdate(value) if value else timezone.localdate()
+
+
+def bump_store_stats(store_id, day, create_missing=True, **deltas):
+    """
+    Ajoute des deltas à la ligne (boutique, jour), créée si besoin (sauf
+    `create_missing=False`: chemins de suppression, où la boutique peut
+    être en cours de suppression en cascade)
+    """
+    from .models import StoreDailyStats
+
+    deltas = {field: amount for field, amount in deltas.items() if amount}
+    if not deltas or store_id is None:
+        return
+    updates = {field: F(field) + amount for field, amount in deltas.items()}
+    if StoreDailyStats.objects.filter(store_id=store_id, date=day).update(**updates):
+        return
+    if not create_missing:
+        return
+    try:
+        with transaction.atomic():
+            StoreDailyStats.objects.create(store_id=store_id, date=day, **deltas)
+    except IntegrityError:
+        # Créée entre-temps par un autre processus
+        StoreDailyStats.objects.filter(store_id=store_id, date=day).update(**updates)
+
+
+def record_product_views(product_ids, amount):
+    """Vues vidées du tampon de compteurs: réparties par boutique, au jour du vidage"""
+    from .models import Product
+
+    today = _local_date()
+    for row in (
+        Product.objects.filter(pk__in=product_ids)
+        .order_by().values('store_id').annotate(products=Count('id'))
+    ):
+        bump_store_stats(row['store_id'], today, views=row['products'] * amount)
+
+
+def _grouped(queryset, date_expression, **aggregates):
+    return (
+        queryset.order_by()
+        .annotate(day=TruncDate(date_expression))
+        .values('store_id', 'day')
+        .annotate(**aggregates)
+    )
+
+
+def rebuild_store_stats(start=None, end=None, store_ids=None):
+    """
+    Recalcule likes, commandes, revenus et avis depuis les tables sources,
+    pour les jours [start, end] (toute l'historique par défaut) et les
+    boutiques `store_ids` (toutes par défaut). Retourne le nombre de lignes écrites.
+    """
+    from .models import Like, Order, Payment, Review, StoreDailyStats
+
+    def window(queryset, store_field, date_field):
+        if store_ids is not None:
+            queryset = queryset.filter(**{f'{store_field}__in': store_ids})
+        if start is not None:
+            queryset = queryset.filter(**{f'{date_field}__date__gte': start})
+        if end is not None:
+            queryset = queryset.filter(**{f'{date_field}__date__lte': end})
+        return queryset
+
+    rows = defaultdict(lambda: dict.fromkeys(REBUILT_FIELDS, 0))
+
+    # Lignes existantes de la fenêtre: remises à zéro si leurs sources ont disparu
+    existing = StoreDailyStats.objects.all()
+    if store_ids is not None:
+        existing = existing.filter(store_id__in=store_ids)
+    if start is not None:
+        existing = existing.filter(date__gte=start)
+    if end is not None:
+        existing = existing.filter(date__lte=end)
+    for store_id, day in existing.values_list('store_id', 'date'):
+        rows[(store_id, day)]
+
+    likes = window(Like.objects.annotate(store_id=F('product__store_id')), 'product__store_id', 'created_at')
+    for row in _grouped(likes, 'created_at', total=Count('id')):
+        rows[(row['store_id'], row['day'])]['likes'] = row['total']
+
+    status_counts = {
+        column: Count('id', filter=Q(status__in=[s for s, c in ORDER_STATUS_COLUMNS.items() if c == column]))
+        for column in set(ORDER_STATUS_COLUMNS.values())
+    }
+    orders = window(Order.objects.all(), 'store_id', 'created_at')
+    for row in _grouped(orders, 'created_at', orders_count=Count('id'), **status_counts):
+        target = rows[(row['store_id'], row['day'])]
+        target['orders_count'] = row['orders_count']
+        for column in status_counts:
+            target[column] = row[column]
+
+    paid_at = Coalesce('paid_at', 'created_at')
+    payments = Payment.objects.filter(status='completed', order__isnull=False).annotate(
+        store_id=F('order__store_id'), paid_on=paid_at,
+    )
+    payments = window(payments, 'order__store_id', 'paid_on')
+    for row in _grouped(payments, paid_at, total=Sum('amount')):
+        rows[(row['store_id'], row['day'])]['revenue'] = row['total'] or Decimal('0')
+
+    reviews = window(Review.objects.annotate(store_id=F('product__store_id')), 'product__store_id', 'created_at')
+    for row in _grouped(reviews, 'created_at', total=Count('id'), ratings=Sum('rating')):
+        target = rows[(row['store_id'], row['day'])]
+        target['reviews_count'] = row['total']
+        target['rating_sum'] = row['ratings'] or 0
+
+    StoreDailyStats.objects.bulk_create(
+        [
+            StoreDailyStats(store_id=store_id, date=day, **values)
+            for (store_id, day), values in rows.items()
+        ],
+        batch_size=500,
+        update_conflicts=True,
+        unique_fields=['store', 'date'],
+        update_fields=REBUILT_FIELDS,
+    )
+    return len(rows)
+
+
+def refresh_store_day(store_id, when=None):
+    """Recalcule un seul jour d'une boutique, après validation de la transaction"""
+    if store_id is None:
+        return
+    day = _local_date(when)
+    transaction.on_commit(lambda: rebuild_store_stats(day, day, [store_id]))
+
+
+def reconcile_store_views(store_ids=None):
+    """
+    Les vues antérieures à l'agrégat n'ont pas de date: l'écart entre les
+    compteurs des produits et la somme des lignes est porté au jour de
+    création de la boutique. Retourne le nombre de boutiques corrigées.
+    """
+    from .models import Store, StoreDailyStats
+
+    stores = Store.objects.annotate(
+        product_views=Coalesce(Sum('products__views_count'), 0),
+    ).values_list('id', 'created_at', 'product_views')
+    if store_ids is not None:
+        stores = stores.filter(id__in=store_ids)
+
+    recorded = dict(
+        StoreDailyStats.objects.order_by().values('store_id')
+        .annotate(total=Sum('views')).values_list('store_id', 'total')
+    )
+    corrected = 0
+    for store_id, created_at, product_views in stores:
+        difference = product_views - (recorded.get(store_id) or 0)
+        if difference:
+            bump_store_stats(store_id, _local_date(created_at), views=difference)
+            corrected += 1
+    return corrected
+
+
+def refresh_store_stats(days=NIGHTLY_WINDOW_DAYS):
+    """Passage nocturne: derniers jours recalculés, vues réconciliées"""
+    start = _local_date() - timedelta(days=days - 1)
+    rows = rebuild_store_stats(start=start)
+    reconcile_store_views()
+    return rows
+
+
+def _period_start(days):
+    return _local_date() - timedelta(days=days - 1) if days else None
+
+
+def get_store_stats(store, days=None):
+    """
+    Totaux de la boutique (tout l'historique, ou les `days` derniers jours)
+    en une requête sur StoreDailyStats.
+    """
+    from .models import StoreDailyStats
+
+    def aggregate():
+        queryset = StoreDailyStats.objects.filter(store=store)
+        start = _period_start(days)
+        if start is not None:
+            queryset = queryset.filter(date__gte=start)
+        return queryset.aggregate(
+            rows=Count('id'),
+            total_views=Coalesce(Sum('views'), 0),
+            total_likes=Coalesce(Sum('likes'), 0),
+            total_orders=Coalesce(Sum('orders_count'), 0),
+            pending_orders=Coalesce(Sum('pending_orders'), 0),
+            completed_orders=Coalesce(Sum('delivered_orders'), 0),
+            cancelled_orders=Coalesce(Sum('cancelled_orders'), 0),
+            total_revenue=Coalesce(Sum('revenue'), Decimal('0')),
+            total_reviews=Coalesce(Sum('reviews_count'), 0),
+            rating_sum=Coalesce(Sum('rating_sum'), 0),
+        )
+
+    stats = aggregate()
+    if not stats['rows'] and not days:
+        # Boutique pas encore agrégée (avant le premier passage nocturne)
+        rebuild_store_stats(store_ids=[store.pk])
+        reconcile_store_views([store.pk])
+        stats = aggregate()
+
+    stats.pop('rows')
+    rating_sum = stats.pop('rating_sum')
+    stats['average_rating'] = round(rating_sum / stats['total_reviews'], 1) if stats['total_reviews'] else 0
+    return stats
+
+
+def get_store_daily_series(store, days=30):
+    """Série jour par jour (jours sans activité inclus) pour les graphiques"""
+    from .models import StoreDailyStats
+
+    start = _period_start(days)
+    by_day = {
+        row['date']: row
+        for row in StoreDailyStats.objects.filter(store=store, date__gte=start).values(
+            'date', 'views', 'likes', 'orders_count', 'revenue', 'reviews_count',
+        )
+    }
+    series = []
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        row = by_day.get(day, {})
+        series.append({
+            'date': day,
+            'views': row.get('views', 0),
+            'likes': row.get('likes', 0),
+            'orders': row.get('orders_count', 0),
+            'revenue': row.get('revenue', Decimal('0')),
+            'reviews': row.get('reviews_count', 0),
+        })
+    return series
+
+
+def parse_period(value):
+    """Période demandée (?days=7|30|90), None pour tout l'historique"""
+    try:
+        days = int(value)
+    except (TypeError, ValueError):
+        return None
+    return days if days in PERIOD_CHOICES else None
@@ -19,7 +19,6 @@ from .models import (
     StudentProfile,
     Job,
     Classroom,
-    Payment,
     Promotion,
     Subscription,
 )
@@ -39,8 +38,10 @@ from .api_serializers import (
     ClassroomSerializer,
 )
 from .recommendations import get_similar_products
+from .search import search_products
+from .analytics import get_store_daily_series, get_store_stats, parse_period
 from django.utils import timezone
-from django.db.models import Sum, Q
+from django.db.models import Q
 
 
 class IsStoreOwner(permissions.BasePermission):
@@ -101,8 +102,6 @@ class ProductViewSet(viewsets.ModelViewSet):
         min_price = self.request.query_params.get("min_price")
         max_price = self.request.query_params.get("max_price")
 
-        if search:
-            qs = qs.filter(name__icontains=search)
         if category:
             qs = qs.filter(category_id=category)
         if store:
@@ -112,6 +111,10 @@ class ProductViewSet(viewsets.ModelViewSet):
         if max_price:
             qs = qs.filter(price__lte=max_price)
 
+        if search:
+            # Après les filtres: ils font partie de la requête des candidats
+            qs = search_products(search, qs)
+            return qs.order_by("-search_rank", "-created_at")
         return qs.order_by("-created_at")
 
     @action(detail=True, methods=["get"], permission_classes=[permissions.AllowAny])
@@ -307,32 +310,9 @@ def dashboard_stats(request):
     products = store.products.all()
 
     total_products = products.count()
-    stats = products.aggregate(
-        total_views=Sum("views_count"),
-        total_likes=Sum("likes_count"),
-    )
-    total_views = stats["total_views"] or 0
-    total_likes = stats["total_likes"] or 0
-
-    all_reviews = []
-    for product in products:
-        all_reviews.extend(list(product.reviews.all()))
-    total_reviews = len(all_reviews)
-    if total_reviews:
-        average_rating = round(sum(r.rating for r in all_reviews) / total_reviews, 1)
-    else:
-        average_rating = 0
-
-    orders = Order.objects.filter(store=store)
-    total_orders = orders.count()
-    pending_orders = orders.filter(status="pending").count()
-    completed_orders = orders.filter(status="delivered").count()
-
-    completed_payments = Payment.objects.filter(
-        order__store=store,
-        status="completed",
-    )
-    total_revenue = completed_payments.aggregate(Sum("amount"))["amount__sum"] or 0
+    # Agrégat quotidien: tout l'historique, ou ?days=7|30|90
+    period = parse_period(request.query_params.get("days"))
+    stats = get_store_stats(store, days=period)
 
     active_promotions = Promotion.objects.filter(
         (Q(store=store) | Q(product__store=store)),
@@ -353,17 +333,23 @@ def dashboard_stats(request):
                 "is_verified": store.is_verified,
                 "is_featured": store.is_featured,
             },
+            "period_days": period,
             "total_products": total_products,
-            "total_views": total_views,
-            "total_likes": total_likes,
-            "total_reviews": total_reviews,
-            "average_rating": average_rating,
-            "total_orders": total_orders,
-            "pending_orders": pending_orders,
-            "completed_orders": completed_orders,
-            "total_revenue": float(total_revenue),
+            "total_views": stats["total_views"],
+            "total_likes": stats["total_likes"],
+            "total_reviews": stats["total_reviews"],
+            "average_rating": stats["average_rating"],
+            "total_orders": stats["total_orders"],
+            "pending_orders": stats["pending_orders"],
+            "completed_orders": stats["completed_orders"],
+            "cancelled_orders": stats["cancelled_orders"],
+            "total_revenue": float(stats["total_revenue"]),
             "active_promotions_count": active_promotions,
             "has_active_subscription": bool(active_subscription),
+            "daily": [
+                {**day, "date": day["date"].isoformat(), "revenue": float(day["revenue"])}
+                for day in get_store_daily_series(store, period)
+            ] if period else [],
         }
     )
 
@@ -6,3 +6,6 @@ class StoresConfig(AppConfig):
     name = 'stores'
     verbose_name = 'Boutiques'
 
+    def ready(self):
+        # Enregistrer les signaux (index de score du feed, etc.)
+        from . import signals  # noqa: F401
@@ -0,0 +1,267 @@
+"""
+🤝 Filtrage collaboratif (retours implicites)
+Matrice creuse utilisateurs x produits construite à partir des likes, favoris,
+partages, commandes et abonnements, factorisée hors ligne par ALS implicite
+(moindres carrés alternés, NumPy, CPU). Les facteurs float32 sont stockés dans
+RecommenderSnapshot; en ligne, un produit scalaire donne le top-N.
+"""
+
+import io
+import logging
+import threading
+import time
+
+try:
+    import numpy as np
+    from scipy import sparse
+    SCIPY_AVAILABLE = True
+except ImportError:
+    SCIPY_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Poids de chaque signal dans la matrice d'interactions
+INTERACTION_WEIGHTS = {
+    'like': 1.0,
+    'favorite': 2.0,
+    'share': 1.5,
+    'order': 4.0,
+    # Suivre une boutique: réparti sur tous ses produits
+    'follow': 0.5,
+}
+
+# Commandes ignorées (pas un signal d'intérêt)
+IGNORED_ORDER_STATUSES = ('cancelled', 'refunded')
+
+# Hyperparamètres ALS
+FACTORS = 32
+REGULARIZATION = 0.05
+ITERATIONS = 10
+CONFIDENCE_ALPHA = 20.0
+
+# Snapshots conservés en base (le plus récent est servi)
+KEEP_SNAPSHOTS = 2
+
+# Délai entre deux vérifications d'un nouveau snapshot (secondes, par processus)
+RELOAD_INTERVAL = 60
+
+# Candidats renvoyés quand l'appelant ne fixe pas de limite
+DEFAULT_CANDIDATES = 100
+
+
+def _pairs(queryset, user_field, item_field):
+    return list(queryset.values_list(user_field, item_field))
+
+
+def build_interaction_matrix():
+    """
+    Matrice CSR (utilisateurs x produits) des poids d'interaction.
+    Retourne (matrice, ids utilisateurs, ids produits); une requête par signal.
+    """
+    from .models import Like, Favorite, Share, Order, Follow, Product
+
+    signals = [
+        ('like', _pairs(Like.objects.all(), 'user_id', 'product_id')),
+        ('favorite', _pairs(Favorite.objects.all(), 'user_id', 'product_id')),
+        ('share', _pairs(Share.objects.filter(user__isnull=False), 'user_id', 'product_id')),
+        ('order', _pairs(
+            Order.objects.filter(customer__isnull=False).exclude(status__in=IGNORED_ORDER_STATUSES),
+            'customer_id', 'product_id',
+        )),
+    ]
+    follows = _pairs(Follow.objects.all(), 'user_id', 'store_id')
+    store_products = _pairs(Product.objects.filter(store_id__in={s for _, s in follows}), 'store_id', 'id')
+
+    user_ids = sorted({u for _, pairs in signals for u, _ in pairs} | {u for u, _ in follows})
+    item_ids = sorted({p for _, pairs in signals for _, p in pairs} | {p for _, p in store_products})
+    user_index = {user_id: i for i, user_id in enumerate(user_ids)}
+    item_index = {item_id: i for i, item_id in enumerate(item_ids)}
+    shape = (len(user_ids), len(item_ids))
+
+    rows, cols, data = [], [], []
+    for name, pairs in signals:
+        weight = INTERACTION_WEIGHTS[name]
+        for user_id, product_id in pairs:
+            rows.append(user_index[user_id])
+            cols.append(item_index[product_id])
+            data.append(weight)
+    # Doublons additionnés par la conversion COO -> CSR
+    matrix = sparse.coo_matrix((np.asarray(data, dtype=np.float32), (rows, cols)), shape=shape).tocsr()
+
+    if follows and store_products:
+        store_ids = sorted({s for _, s in follows})
+        store_index = {store_id: i for i, store_id in enumerate(store_ids)}
+        user_store = sparse.coo_matrix((
+            np.full(len(follows), INTERACTION_WEIGHTS['follow'], dtype=np.float32),
+            ([user_index[u] for u, _ in follows], [store_index[s] for _, s in follows]),
+        ), shape=(len(user_ids), len(store_ids))).tocsr()
+        store_item = sparse.coo_matrix((
+            np.ones(len(store_products), dtype=np.float32),
+            ([store_index[s] for s, _ in store_products], [item_index[p] for _, p in store_products]),
+        ), shape=(len(store_ids), len(item_ids))).tocsr()
+        matrix = (matrix + user_store @ store_item).tocsr()
+
+    matrix.eliminate_zeros()
+    return matrix, np.asarray(user_ids, dtype=np.int64), np.asarray(item_ids, dtype=np.int64)
+
+
+def _least_squares(confidence, fixed, regularization):
+    """
+    Une demi-itération ALS implicite (Hu, Koren, Volinsky): pour chaque ligne u,
+    x_u = (YᵀY + Yᵀ(C_u - I)Y + λI)⁻¹ Yᵀ C_u p_u
+    """
+    factors = fixed.shape[1]
+    gram = fixed.T @ fixed + regularization * np.eye(factors)
+    solved = np.zeros((confidence.shape[0], factors))
+    indptr, indices, data = confidence.indptr, confidence.indices, confidence.data
+
+    for row in range(confidence.shape[0]):
+        start, end = indptr[row], indptr[row + 1]
+        if start == end:
+            continue
+        local = fixed[indices[start:end]]
+        weights = data[start:end]
+        system = gram + (local.T * weights) @ local
+        solved[row] = np.linalg.solve(system, local.T @ (1.0 + weights))
+    return solved
+
+
+def train_als(matrix, factors=FACTORS, regularization=REGULARIZATION,
+              iterations=ITERATIONS, alpha=CONFIDENCE_ALPHA, seed=0):
+    """Facteurs (utilisateurs, produits) en float32 pour une matrice d'interactions"""
+    confidence = (matrix * alpha).astype(np.float64).tocsr()
+    confidence_t = confidence.T.tocsr()
+
+    rng = np.random.default_rng(seed)
+    user_factors = rng.normal(scale=0.01, size=(matrix.shape[0], factors))
+    item_factors = rng.normal(scale=0.01, size=(matrix.shape[1], factors))
+
+    for _ in range(iterations):
+        user_factors = _least_squares(confidence, item_factors, regularization)
+        item_factors = _least_squares(confidence_t, user_factors, regularization)
+    return user_factors.astype(np.float32), item_factors.astype(np.float32)
+
+
+def train_recommender(factors=FACTORS, regularization=REGULARIZATION, iterations=ITERATIONS):
+    """
+    Entraîne le modèle sur toutes les interactions et enregistre un
+    RecommenderSnapshot. Retourne le snapshot (None si rien à entraîner).
+    """
+    from .models import RecommenderSnapshot
+
+    if not SCIPY_AVAILABLE:
+        logger.warning("NumPy/SciPy indisponibles: recommandeur non entraîné")
+        return None
+
+    started = time.time()
+    matrix, user_ids, item_ids = build_interaction_matrix()
+    if matrix.nnz == 0:
+        return None
+
+    user_factors, item_factors = train_als(matrix, factors, regularization, iterations)
+
+    buffer = io.BytesIO()
+    np.savez_compressed(
+        buffer,
+        user_ids=user_ids,
+        item_ids=item_ids,
+        user_factors=user_factors,
+        item_factors=item_factors,
+        seen_indptr=matrix.indptr.astype(np.int32),
+        seen_indices=matrix.indices.astype(np.int32),
+    )
+    snapshot = RecommenderSnapshot.objects.create(
+        factors=buffer.getvalue(),
+        users_count=len(user_ids),
+        products_count=len(item_ids),
+        interactions_count=matrix.nnz,
+        rank=factors,
+        training_seconds=round(time.time() - started, 2),
+    )
+
+    stale = RecommenderSnapshot.objects.order_by('-trained_at', '-id').values_list('id', flat=True)[KEEP_SNAPSHOTS:]
+    RecommenderSnapshot.objects.filter(id__in=list(stale)).delete()
+    return snapshot
+
+
+class TrainedModel:
+    """Snapshot désérialisé, gardé en mémoire par processus"""
+
+    def __init__(self, snapshot_id, payload):
+        arrays = np.load(io.BytesIO(bytes(payload)))
+        self.snapshot_id = snapshot_id
+        self.item_ids = arrays['item_ids']
+        self.user_factors = arrays['user_factors']
+        self.item_factors = arrays['item_factors']
+        self.seen_indptr = arrays['seen_indptr']
+        self.seen_indices = arrays['seen_indices']
+        self.user_index = {int(user_id): i for i, user_id in enumerate(arrays['user_ids'])}
+        self.item_index = {int(item_id): i for i, item_id in enumerate(self.item_ids)}
+
+    def recommend(self, user_id, limit, exclude_ids=()):
+        """Ids produits triés par score (None si l'utilisateur est inconnu du modèle)"""
+        row = self.user_index.get(user_id)
+        if row is None:
+            return None
+
+        scores = self.item_factors @ self.user_factors[row]
+        scores[self.seen_indices[self.seen_indptr[row]:self.seen_indptr[row + 1]]] = -np.inf
+        for product_id in exclude_ids:
+            column = self.item_index.get(product_id)
+            if column is not None:
+                scores[column] = -np.inf
+
+        limit = min(limit, len(scores))
+        if limit <= 0:
+            return []
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [int(self.item_ids[column]) for column in top if np.isfinite(scores[column])]
+
+
+_model = None
+_checked_at = 0.0
+_model_lock = threading.Lock()
+
+
+def get_trained_model():
+    """Dernier snapshot chargé en mémoire (vérifié au plus une fois par RELOAD_INTERVAL)"""
+    global _model, _checked_at
+    from .models import RecommenderSnapshot
+
+    if not SCIPY_AVAILABLE:
+        return None
+    if time.time() - _checked_at < RELOAD_INTERVAL:
+        return _model
+
+    with _model_lock:
+        if time.time() - _checked_at >= RELOAD_INTERVAL:
+            latest = RecommenderSnapshot.objects.order_by('-trained_at', '-id').values_list('id', flat=True).first()
+            if latest is None:
+                _model = None
+            elif _model is None or _model.snapshot_id != latest:
+                payload = RecommenderSnapshot.objects.values_list('factors', flat=True).get(id=latest)
+                _model = TrainedModel(latest, payload)
+            _checked_at = time.time()
+    return _model
+
+
+def reset_trained_model():
+    """Force le rechargement au prochain appel (après un entraînement)"""
+    global _model, _checked_at
+    with _model_lock:
+        _model, _checked_at = None, 0.0
+
+
+def recommend_product_ids(user, limit=None, exclude_ids=()):
+    """
+    Top-N produits pour un utilisateur connu du modèle, sinon None
+    (démarrage à froid: l'appelant se rabat sur la popularité).
+    """
+    if user is None or not user.is_authenticated:
+        return None
+    model = get_trained_model()
+    if model is None:
+        return None
+    return model.recommend(user.pk, limit or DEFAULT_CANDIDATES, exclude_ids)
+
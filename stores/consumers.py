@@ -2,8 +2,11 @@
 WebSocket consumers pour Live Commerce
 """
 
+import asyncio
 import json
 
+from asgiref.sync import sync_to_async
+
 try:
     from channels.generic.websocket import AsyncWebsocketConsumer
     from channels.db import database_sync_to_async
@@ -16,8 +19,8 @@ except ImportError:
     def database_sync_to_async(func):
         return func
 
-from django.contrib.auth.models import User
-from .models import LiveStream, LiveComment, LiveProduct
+from .models import LiveStream, LiveProduct
+from . import live_chat, presence
 
 
 class LiveStreamConsumer(AsyncWebsocketConsumer):
@@ -27,6 +30,11 @@ class LiveStreamConsumer(AsyncWebsocketConsumer):
         self.live_id = self.scope['url_route']['kwargs']['live_id']
         self.room_group_name = f'live_{self.live_id}'
         
+        # Live vérifié une fois ici, plus à chaque commentaire
+        if not await self.live_exists():
+            await self.close(code=4404)
+            return
+        
         # Rejoindre le groupe
         await self.channel_layer.group_add(
             self.room_group_name,
@@ -35,35 +43,49 @@ class LiveStreamConsumer(AsyncWebsocketConsumer):
         
         await self.accept()
         
-        # Mettre à jour le nombre de viewers
+        # Présence (Redis ou mémoire), rafraîchie tant que la connexion vit
         await self.update_viewers_count(1)
+        self.heartbeat_task = asyncio.ensure_future(self.heartbeat())
     
     async def disconnect(self, close_code):
+        if not hasattr(self, 'heartbeat_task'):
+            # Refusée dans connect (live inexistant): rien à défaire
+            return
+        
         # Quitter le groupe
         await self.channel_layer.group_discard(
             self.room_group_name,
             self.channel_name
         )
         
-        # Mettre à jour le nombre de viewers
+        self.heartbeat_task.cancel()
         await self.update_viewers_count(-1)
     
+    async def heartbeat(self):
+        """Battement de cœur: sans lui, la connexion sort du compte après PRESENCE_TTL"""
+        while True:
+            await asyncio.sleep(presence.HEARTBEAT_INTERVAL)
+            await sync_to_async(presence.touch)(self.live_id, self.channel_name)
+    
     async def receive(self, text_data):
         """Recevoir un message du client"""
         data = json.loads(text_data)
         message_type = data.get('type')
         
         if message_type == 'comment':
-            # Nouveau commentaire
-            comment = await self.create_comment(data)
-            if comment:
-                await self.channel_layer.group_send(
-                    self.room_group_name,
-                    {
-                        'type': 'comment_message',
-                        'comment': comment
-                    }
+            # Nouveau commentaire: auteur = utilisateur de la connexion,
+            # diffusion groupée et écriture différée (live_chat)
+            try:
+                await live_chat.get_pipeline().post(
+                    self.channel_layer, int(self.live_id), self.scope.get('user'), data
                 )
+            except live_chat.CommentRejected as e:
+                await self.send(text_data=json.dumps({
+                    'type': 'comment_rejected',
+                    'reason': e.reason,
+                    'message': str(e),
+                    'retry_in': e.retry_in
+                }))
         
         elif message_type == 'viewer_count':
             # Mise à jour du nombre de viewers
@@ -72,6 +94,16 @@ class LiveStreamConsumer(AsyncWebsocketConsumer):
                 'type': 'viewer_count',
                 'count': count
             }))
+        
+        elif message_type == 'heartbeat':
+            await sync_to_async(presence.touch)(self.live_id, self.channel_name)
+    
+    async def viewer_count(self, event):
+        """Nombre de viewers (envoi groupé, limité à un par BROADCAST_INTERVAL)"""
+        await self.send(text_data=json.dumps({
+            'type': 'viewer_count',
+            'count': event['count']
+        }))
     
     async def comment_message(self, event):
         """Envoyer un commentaire au client"""
@@ -80,6 +112,10 @@ class LiveStreamConsumer(AsyncWebsocketConsumer):
             'comment': event['comment']
         }))
     
+    async def comment_batch(self, event):
+        """Commentaires regroupés sur FANOUT_INTERVAL: trame déjà encodée"""
+        await self.send(text_data=event['text'])
+    
     async def product_update(self, event):
         """Mise à jour d'un produit"""
         await self.send(text_data=json.dumps({
@@ -95,47 +131,22 @@ class LiveStreamConsumer(AsyncWebsocketConsumer):
         }))
     
     @database_sync_to_async
-    def create_comment(self, data):
-        """Créer un commentaire"""
-        try:
-            live_stream = LiveStream.objects.get(id=self.live_id)
-            user = User.objects.get(id=data.get('user_id'))
-            
-            comment = LiveComment.objects.create(
-                live_stream=live_stream,
-                user=user,
-                content=data.get('content', ''),
-                is_question=data.get('is_question', False)
-            )
-            
-            return {
-                'id': comment.id,
-                'user': user.username,
-                'content': comment.content,
-                'is_question': comment.is_question,
-                'created_at': comment.created_at.isoformat()
-            }
-        except Exception as e:
-            return None
+    def live_exists(self):
+        return str(self.live_id).isdigit() and LiveStream.objects.filter(id=self.live_id).exists()
     
-    @database_sync_to_async
-    def update_viewers_count(self, delta):
-        """Mettre à jour le nombre de viewers"""
-        try:
-            live_stream = LiveStream.objects.get(id=self.live_id)
-            live_stream.viewers_count = max(0, live_stream.viewers_count + delta)
-            if live_stream.viewers_count > live_stream.peak_viewers:
-                live_stream.peak_viewers = live_stream.viewers_count
-            live_stream.save()
-        except:
-            pass
+    async def update_viewers_count(self, delta):
+        """
+        Entrée (+1) ou sortie (-1) du live: présence mise à jour sans toucher
+        la base, compte poussé au groupe; écriture en base périodique
+        (presence.persist_presence)
+        """
+        if delta > 0:
+            await sync_to_async(presence.touch)(self.live_id, self.channel_name)
+        else:
+            await sync_to_async(presence.leave)(self.live_id, self.channel_name)
+        await presence.push_viewer_count(self.channel_layer, self.live_id)
+        await database_sync_to_async(presence.maybe_persist)()
     
-    @database_sync_to_async
-    def get_viewers_count(self):
+    async def get_viewers_count(self):
         """Obtenir le nombre de viewers"""
-        try:
-            live_stream = LiveStream.objects.get(id=self.live_id)
-            return live_stream.viewers_count
-        except:
-            return 0
-
+        return await sync_to_async(presence.viewers)(self.live_id)
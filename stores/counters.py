@@ -0,0 +1,252 @@
+"""
+🔢 Tampon de compteurs (vues, likes, partages)
+Les incréments sont agrégés dans Redis (HINCRBY) ou en mémoire, puis écrits
+en base par lots avec des UPDATE ... SET champ = champ + n (F()).
+"""
+
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+# Compteurs tamponnés: nom -> (modèle, champ)
+COUNTERS = {
+    'product.views': ('stores.Product', 'views_count'),
+    'product.likes': ('stores.Product', 'likes_count'),
+    'product.shares': ('stores.Product', 'shares_count'),
+    'job.views': ('stores.Job', 'views_count'),
+    'student_profile.views': ('stores.StudentProfile', 'profile_views'),
+    'general_profile.views': ('stores.GeneralProfile', 'profile_views'),
+    'tutorial.views': ('stores.Tutorial', 'views_count'),
+}
+
+# Compteurs de Product qui entrent dans le score du feed (ProductScore)
+SCORE_COUNTERS = {
+    'product.views': 'views',
+    'product.likes': 'likes',
+    'product.shares': 'shares',
+}
+
+# Compteurs reportés dans les statistiques quotidiennes des boutiques
+STATS_COUNTERS = {'product.views'}
+
+# Intervalle de vidage (secondes); en mode mémoire le vidage se fait
+# directement dans le processus web une fois l'intervalle dépassé
+FLUSH_INTERVAL = getattr(settings, 'COUNTER_FLUSH_INTERVAL', 60)
+
+METRICS_CACHE_KEY = 'counters:last_flush'
+
+
+class MemoryCounterBackend:
+    """Tampon local au processus (développement, tests)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = defaultdict(lambda: defaultdict(int))
+        self._since = None
+
+    def incr(self, counter, pk, amount):
+        with self._lock:
+            self._pending[counter][pk] += amount
+            if self._since is None:
+                self._since = time.time()
+            return self._pending[counter][pk]
+
+    def get(self, counter, pk):
+        with self._lock:
+            return self._pending.get(counter, {}).get(pk, 0)
+
+    def drain(self):
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(lambda: defaultdict(int))
+            self._since = None
+        return {counter: dict(deltas) for counter, deltas in pending.items()}
+
+    def restore(self, drained):
+        for counter, deltas in drained.items():
+            for pk, amount in deltas.items():
+                self.incr(counter, pk, amount)
+
+    def snapshot(self):
+        with self._lock:
+            keys = sum(len(deltas) for deltas in self._pending.values())
+            total = sum(abs(v) for deltas in self._pending.values() for v in deltas.values())
+            return keys, total, self._since
+
+
+class RedisCounterBackend:
+    """Tampon partagé entre tous les processus (un hash Redis par compteur)"""
+
+    PREFIX = 'counters:'
+
+    def __init__(self, url):
+        self.client = redis.Redis.from_url(url)
+
+    def _key(self, counter):
+        return f'{self.PREFIX}pending:{counter}'
+
+    def incr(self, counter, pk, amount):
+        pipe = self.client.pipeline()
+        pipe.hincrby(self._key(counter), pk, amount)
+        pipe.set(f'{self.PREFIX}since', time.time(), nx=True)
+        return pipe.execute()[0]
+
+    def get(self, counter, pk):
+        return int(self.client.hget(self._key(counter), pk) or 0)
+
+    def drain(self):
+        # RENAME est atomique: les nouveaux incréments repartent dans un hash vide
+        drained = {}
+        self.client.delete(f'{self.PREFIX}since')
+        for counter in COUNTERS:
+            flushing = f'{self.PREFIX}flushing:{counter}:{uuid.uuid4().hex}'
+            try:
+                self.client.rename(self._key(counter), flushing)
+            except redis.ResponseError:
+                continue  # aucune valeur en attente
+            pipe = self.client.pipeline()
+            pipe.hgetall(flushing)
+            pipe.delete(flushing)
+            values, _ = pipe.execute()
+            drained[counter] = {int(pk): int(amount) for pk, amount in values.items()}
+        return drained
+
+    def restore(self, drained):
+        pipe = self.client.pipeline()
+        for counter, deltas in drained.items():
+            for pk, amount in deltas.items():
+                pipe.hincrby(self._key(counter), pk, amount)
+        pipe.set(f'{self.PREFIX}since', time.time(), nx=True)
+        pipe.execute()
+
+    def snapshot(self):
+        keys, total = 0, 0
+        for counter in COUNTERS:
+            values = self.client.hvals(self._key(counter))
+            keys += len(values)
+            total += sum(abs(int(v)) for v in values)
+        since = self.client.get(f'{self.PREFIX}since')
+        return keys, total, float(since) if since else None
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """Redis si REDIS_URL est configuré, sinon tampon en mémoire"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                url = getattr(settings, 'REDIS_URL', '')
+                if url and REDIS_AVAILABLE:
+                    _backend = RedisCounterBackend(url)
+                else:
+                    _backend = MemoryCounterBackend()
+    return _backend
+
+
+def increment(counter, pk, amount=1):
+    """
+    Ajoute `amount` au compteur `counter` de l'objet `pk` sans toucher la base.
+    Retourne le delta en attente pour cet objet (à ajouter à la valeur en base
+    pour un affichage à jour).
+    """
+    if counter not in COUNTERS:
+        raise ValueError(f"Compteur inconnu: {counter}")
+    backend = get_backend()
+    pending = backend.incr(counter, pk, amount)
+
+    if isinstance(backend, MemoryCounterBackend):
+        _, _, since = backend.snapshot()
+        if since and time.time() - since >= FLUSH_INTERVAL:
+            flush_counters()
+    return pending
+
+
+def pending_delta(counter, pk):
+    """Delta en attente (non encore écrit en base) pour un objet"""
+    return get_backend().get(counter, pk)
+
+
+def _apply(counter, deltas):
+    """Écrit les deltas d'un compteur: un UPDATE par valeur de delta distincte"""
+    from .analytics import record_product_views
+    from .scoring import bump_product_scores
+
+    model_label, field = COUNTERS[counter]
+    model = apps.get_model(model_label)
+
+    by_amount = defaultdict(list)
+    for pk, amount in deltas.items():
+        if amount:
+            by_amount[amount].append(pk)
+
+    for amount, pks in by_amount.items():
+        model.objects.filter(pk__in=pks).update(**{field: F(field) + amount})
+        if counter in SCORE_COUNTERS:
+            # Le score suit les compteurs en base (même delta, même moment)
+            bump_product_scores(pks, **{SCORE_COUNTERS[counter]: amount})
+        if counter in STATS_COUNTERS:
+            record_product_views(pks, amount)
+    return sum(len(pks) for pks in by_amount.values())
+
+
+def flush_counters():
+    """
+    Vide le tampon vers la base. En cas d'erreur, les deltas sont remis
+    dans le tampon pour le prochain passage.
+    """
+    backend = get_backend()
+    started = time.time()
+    _, _, since = backend.snapshot()
+    drained = backend.drain()
+
+    rows = 0
+    try:
+        with transaction.atomic():
+            for counter, deltas in drained.items():
+                rows += _apply(counter, deltas)
+    except Exception:
+        backend.restore(drained)
+        raise
+
+    stats = {
+        'flushed_at': time.time(),
+        'duration_ms': round((time.time() - started) * 1000, 2),
+        'rows': rows,
+        'increments': sum(abs(v) for deltas in drained.values() for v in deltas.values()),
+        'lag_seconds': round(started - since, 2) if since else 0,
+    }
+    cache.set(METRICS_CACHE_KEY, stats, None)
+    return stats
+
+
+def counter_metrics():
+    """
+    Métriques du tampon:
+    - pending_keys / pending_increments: objets et incréments non écrits
+    - flush_lag_seconds: âge du plus ancien incrément non écrit
+    - last_flush: statistiques du dernier vidage
+    """
+    keys, total, since = get_backend().snapshot()
+    return {
+        'backend': 'redis' if isinstance(get_backend(), RedisCounterBackend) else 'memory',
+        'pending_keys': keys,
+        'pending_increments': total,
+        'flush_lag_seconds': round(time.time() - since, 2) if since else 0,
+        'last_flush': cache.get(METRICS_CACHE_KEY),
+    }
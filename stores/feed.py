@@ -0,0 +1,143 @@
+"""
+📰 Moteur du fil d'actualité personnalisé
+Les viviers de candidats (boutiques suivies, catégories préférées, produits
+proches des likes, tendances, nouveautés) sont calculés une fois puis mis en
+cache par utilisateur; le fil est un entrelacement déterministe des viviers.
+"""
+
+import random
+import zlib
+
+from django.core.cache import cache
+from django.db.models import Count
+from django.utils import timezone
+
+# Durée de vie des viviers en cache (secondes)
+POOL_TTL = 300
+
+# Taille de chaque vivier (multiple de la taille du fil pour la pagination)
+POOL_SIZE = 60
+
+# Part de chaque vivier dans le fil (les viviers vides cèdent leur place)
+POOL_WEIGHTS = {
+    'followed': 0.3,
+    'categories': 0.3,
+    'similar': 0.2,
+    'trending': 0.15,
+    'new': 0.05,
+}
+
+# Le fil change d'ordre au plus une fois par période (secondes)
+SEED_PERIOD = 3600
+
+
+def pool_cache_key(user_id):
+    return f'feed:pools:{user_id or "anon"}'
+
+
+def invalidate_user_feed(user_id):
+    """Invalide les viviers d'un utilisateur (follow, like, favori)"""
+    cache.delete(pool_cache_key(user_id))
+
+
+def _global_pools():
+    """Viviers communs à tous les utilisateurs (tendances, nouveautés)"""
+    from .models import Product
+    from .algorithms import get_ranked_feed
+
+    def build():
+        return {
+            'trending': list(get_ranked_feed(limit=POOL_SIZE).values_list('id', flat=True)),
+            'new': list(Product.objects.order_by('-created_at').values_list('id', flat=True)[:POOL_SIZE]),
+        }
+
+    return cache.get_or_set(pool_cache_key(None), build, POOL_TTL)
+
+
+def _user_pools(user):
+    """Viviers propres à l'utilisateur: une requête par vivier"""
+    from .models import Product, Category, Like
+
+    followed = Product.objects.filter(
+        store__followers__user=user
+    ).order_by('-created_at').values_list('id', flat=True)[:POOL_SIZE]
+
+    favorite_categories = Category.objects.filter(
+        products__favorites__user=user
+    ).annotate(
+        fav_count=Count('products__favorites')
+    ).order_by('-fav_count').values('id')[:3]
+    categories = Product.objects.filter(
+        category__in=favorite_categories
+    ).order_by('-created_at').values_list('id', flat=True)[:POOL_SIZE]
+
+    # Produits proches des derniers likes (même catégorie), les mieux classés
+    recent_likes = Like.objects.filter(
+        user=user, product__category__isnull=False
+    ).order_by('-created_at').values('product__category_id')[:3]
+    similar = Product.objects.filter(
+        category_id__in=recent_likes
+    ).exclude(
+        likes__user=user
+    ).order_by('-feed_score__score', '-created_at').values_list('id', flat=True)[:POOL_SIZE]
+
+    return {
+        'followed': list(followed),
+        'categories': list(categories),
+        'similar': list(similar),
+    }
+
+
+def get_candidate_pools(user):
+    """Viviers de candidats (listes d'ids), depuis le cache si possible"""
+    pools = {name: [] for name in POOL_WEIGHTS}
+    pools.update(_global_pools())
+    if user is not None and user.is_authenticated:
+        pools.update(cache.get_or_set(pool_cache_key(user.pk), lambda: _user_pools(user), POOL_TTL))
+    return pools
+
+
+def interleave(pools, limit, seed):
+    """
+    Entrelacement pondéré et déterministe: à graine égale, même fil.
+    Chaque position est attribuée à un vivier tiré selon POOL_WEIGHTS;
+    les doublons et les viviers épuisés sont ignorés.
+    """
+    rng = random.Random(seed)
+    queues = {name: list(ids) for name, ids in pools.items() if ids}
+    seen, feed = set(), []
+
+    while queues and len(feed) < limit:
+        names = sorted(queues)
+        name = rng.choices(names, weights=[POOL_WEIGHTS.get(n, 0.1) for n in names])[0]
+        queue = queues[name]
+        while queue and queue[0] in seen:
+            queue.pop(0)
+        if not queue:
+            del queues[name]
+            continue
+        product_id = queue.pop(0)
+        seen.add(product_id)
+        feed.append(product_id)
+    return feed
+
+
+def feed_seed(user):
+    """Graine stable par utilisateur et par période"""
+    period = int(timezone.now().timestamp()) // SEED_PERIOD
+    user_part = user.pk if user is not None and user.is_authenticated else 0
+    return zlib.crc32(f'{user_part}:{period}'.encode())
+
+
+def build_feed(user, limit=20, seed=None):
+    """
+    Fil personnalisé: viviers en cache + une requête pour charger les produits
+    (au plus six requêtes quand le cache est vide).
+    """
+    from .models import Product
+
+    if seed is None:
+        seed = feed_seed(user)
+    ids = interleave(get_candidate_pools(user), limit, seed)
+    products = Product.objects.select_related('store', 'feed_score').in_bulk(ids)
+    return [products[product_id] for product_id in ids if product_id in products]
@@ -0,0 +1,178 @@
+"""
+🗺️ Découverte géographique
+Préfiltre par zone (bounding box indexée), distances calculées en un seul
+passage vectorisé (haversine NumPy) et résultats groupés par boutique
+"""
+
+import math
+from datetime import timedelta
+
+from django.db.models import Avg, Count, F, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Commandes prises en compte pour estimer la position d'une boutique
+CENTROID_WINDOW_DAYS = 180
+
+# Produits affichés par boutique dans les résultats
+PRODUCTS_PER_STORE = 4
+
+
+def bounding_box(lat, lng, radius_km):
+    """
+    Rectangle (min_lat, max_lat, min_lng, max_lng) contenant le cercle.
+    Les longitudes valent None si le cercle touche un pôle ou l'antiméridien.
+    """
+    delta_lat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    min_lat, max_lat = lat - delta_lat, lat + delta_lat
+    if min_lat <= -90 or max_lat >= 90:
+        return max(min_lat, -90), min(max_lat, 90), None, None
+
+    delta_lng = math.degrees(radius_km / (EARTH_RADIUS_KM * math.cos(math.radians(lat))))
+    min_lng, max_lng = lng - delta_lng, lng + delta_lng
+    if min_lng < -180 or max_lng > 180:
+        return min_lat, max_lat, None, None
+    return min_lat, max_lat, min_lng, max_lng
+
+
+def haversine_km(lat, lng, lats, lngs):
+    """Distances (km) entre un point et une liste de points"""
+    if NUMPY_AVAILABLE:
+        lat1, lng1 = np.radians(lat), np.radians(lng)
+        lat2 = np.radians(np.asarray(lats, dtype=np.float64))
+        lng2 = np.radians(np.asarray(lngs, dtype=np.float64))
+        a = (np.sin((lat2 - lat1) / 2) ** 2
+             + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2)
+        return (2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))).tolist()
+
+    lat1, lng1 = math.radians(lat), math.radians(lng)
+    distances = []
+    for other_lat, other_lng in zip(lats, lngs):
+        lat2, lng2 = math.radians(other_lat), math.radians(other_lng)
+        a = (math.sin((lat2 - lat1) / 2) ** 2
+             + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2)
+        distances.append(2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a)))
+    return distances
+
+
+def _in_box(queryset, box, lat_field='latitude', lng_field='longitude'):
+    min_lat, max_lat, min_lng, max_lng = box
+    queryset = queryset.filter(**{f'{lat_field}__range': (min_lat, max_lat)})
+    if min_lng is not None:
+        queryset = queryset.filter(**{f'{lng_field}__range': (min_lng, max_lng)})
+    return queryset
+
+
+def find_nearby_stores(lat, lng, radius_km=50, limit=None):
+    """
+    Boutiques à moins de `radius_km`: [(store_id, distance_km)] triés.
+    Utilise la position déclarée de la boutique et, à défaut ou si elle est
+    plus proche, la position estimée d'après ses commandes.
+    """
+    from .models import Store, StoreGeoCentroid
+
+    box = bounding_box(lat, lng, radius_km)
+    points = list(
+        _in_box(Store.objects.filter(latitude__isnull=False, longitude__isnull=False), box)
+        .values_list('id', 'latitude', 'longitude')
+    )
+    points += list(
+        _in_box(StoreGeoCentroid.objects.all(), box)
+        .values_list('store_id', 'latitude', 'longitude')
+    )
+    if not points:
+        return []
+
+    distances = haversine_km(
+        lat, lng, [float(p[1]) for p in points], [float(p[2]) for p in points]
+    )
+    nearest = {}
+    for (store_id, _, _), distance in zip(points, distances):
+        if distance <= radius_km and distance < nearest.get(store_id, math.inf):
+            nearest[store_id] = distance
+
+    stores = sorted(nearest.items(), key=lambda item: item[1])
+    return stores[:limit] if limit else stores
+
+
+def get_geo_stores(lat, lng, radius_km=50, limit=20, products_per_store=PRODUCTS_PER_STORE):
+    """
+    Boutiques proches avec `distance_km` et leurs derniers produits
+    (`nearby_products`), en trois requêtes quel que soit le nombre de boutiques.
+    """
+    from .models import Store, Product
+
+    nearby = find_nearby_stores(lat, lng, radius_km, limit)
+    if not nearby:
+        return []
+    distances = dict(nearby)
+
+    stores = Store.objects.in_bulk(list(distances))
+    products = Product.objects.filter(store_id__in=distances).annotate(
+        store_rank=Window(
+            expression=RowNumber(),
+            partition_by=[F('store_id')],
+            order_by=F('created_at').desc(),
+        )
+    ).filter(store_rank__lte=products_per_store).order_by('store_id', 'store_rank')
+
+    grouped = {}
+    for product in products:
+        grouped.setdefault(product.store_id, []).append(product)
+
+    results = []
+    for store_id, distance in nearby:
+        store = stores.get(store_id)
+        if store is None:
+            continue
+        store.distance_km = round(distance, 2)
+        store.nearby_products = grouped.get(store_id, [])
+        for product in store.nearby_products:
+            product.store = store
+            product.distance_km = store.distance_km
+        results.append(store)
+    return results
+
+
+def refresh_store_centroids():
+    """
+    Recalcule la position estimée des boutiques à partir des commandes
+    géolocalisées récentes (une requête agrégée + un bulk upsert).
+    """
+    from .models import Order, StoreGeoCentroid
+
+    started = timezone.now()
+    since = started - timedelta(days=CENTROID_WINDOW_DAYS)
+    rows = (
+        Order.objects.filter(
+            created_at__gte=since, latitude__isnull=False, longitude__isnull=False
+        )
+        .exclude(latitude=0, longitude=0)
+        .values('store_id')
+        .annotate(lat=Avg('latitude'), lng=Avg('longitude'), n=Count('id'))
+        .order_by()
+    )
+    centroids = [
+        StoreGeoCentroid(
+            store_id=row['store_id'],
+            latitude=float(row['lat']),
+            longitude=float(row['lng']),
+            orders_count=row['n'],
+        )
+        for row in rows
+    ]
+    StoreGeoCentroid.objects.bulk_create(
+        centroids, update_conflicts=True, unique_fields=['store'],
+        update_fields=['latitude', 'longitude', 'orders_count', 'updated_at'],
+    )
+    # Boutiques sans commande géolocalisée récente
+    StoreGeoCentroid.objects.filter(updated_at__lt=started).delete()
+    return len(centroids)
@@ -0,0 +1,145 @@
+"""
+🏠 Sections de la page d'accueil en cache
+Chaque section est calculée une fois puis servie depuis le cache: sections
+communes sous une clé globale, sections personnalisées sous une clé par
+utilisateur. Une version globale (changée par les signaux Product, Promotion,
+Category, Store) invalide toutes les sections d'un coup; un verrou
+« single-flight » évite que l'expiration d'une clé déclenche des dizaines de
+recalculs simultanés.
+"""
+
+import time
+import uuid
+
+from django.core.cache import cache
+from django.db.models import Count
+
+# Durée de vie des sections communes / personnalisées (secondes)
+SECTION_TTL = 300
+USER_SECTION_TTL = 120
+
+# Dernière valeur connue d'une section, servie pendant qu'un autre
+# processus la recalcule
+STALE_TTL = 3600
+
+# Verrou de recalcul: durée maximale, attente maximale d'un autre processus
+LOCK_TTL = 30
+LOCK_WAIT = 2.0
+LOCK_POLL = 0.05
+
+VERSION_KEY = 'home:version'
+
+
+def home_version():
+    """Version courante des sections (changée à chaque invalidation)"""
+    return cache.get_or_set(VERSION_KEY, lambda: uuid.uuid4().hex, None)
+
+
+def invalidate_home():
+    """Invalide toutes les sections (produit, promotion, catégorie ou boutique modifiés)"""
+    cache.set(VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def _section_key(name, user_id=None):
+    scope = f'user:{user_id}' if user_id else 'all'
+    return f'home:{home_version()}:{scope}:{name}'
+
+
+def invalidate_user_home(user_id):
+    """Invalide les sections personnalisées d'un utilisateur (follow, like, favori)"""
+    cache.delete(_section_key('recommended', user_id))
+
+
+def cached_section(name, builder, ttl=SECTION_TTL, user_id=None):
+    """
+    Valeur d'une section, recalculée par un seul appelant à la fois:
+    - les autres servent la dernière valeur connue (même périmée),
+    - à défaut, attendent au plus LOCK_WAIT secondes le résultat,
+    - puis, en dernier recours, calculent eux-mêmes.
+    """
+    key = _section_key(name, user_id)
+    value = cache.get(key)
+    if value is not None:
+        return value
+
+    stale_key = f'home:stale:{user_id or "all"}:{name}'
+    lock_key = f'{key}:lock'
+    if cache.add(lock_key, 1, LOCK_TTL):
+        try:
+            value = builder()
+            cache.set(key, value, ttl)
+            cache.set(stale_key, value, STALE_TTL)
+        finally:
+            cache.delete(lock_key)
+        return value
+
+    value = cache.get(stale_key)
+    if value is not None:
+        return value
+
+    deadline = time.monotonic() + LOCK_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(LOCK_POLL)
+        value = cache.get(key)
+        if value is not None:
+            return value
+    return builder()
+
+
+def _latest_products():
+    from .models import Product
+    return list(Product.objects.select_related('store', 'feed_score').order_by('-created_at')[:12])
+
+
+def _featured_products():
+    from .models import Product
+    return list(
+        Product.objects.filter(is_featured=True)
+        .select_related('store', 'feed_score')
+        .order_by('-featured_until', '-created_at')[:12]
+    )
+
+
+def _promoted_products():
+    from .recommendations import get_promoted_products
+    return list(get_promoted_products(limit=4).select_related('store', 'feed_score'))
+
+
+def _popular_categories():
+    from .models import Category
+    return list(
+        Category.objects.annotate(product_count=Count('products'))
+        .filter(product_count__gt=0).order_by('-product_count')[:8]
+    )
+
+
+def _popular_stores():
+    from .models import Store
+    return list(
+        Store.objects.annotate(product_count=Count('products'))
+        .filter(product_count__gt=0).order_by('-product_count', '-created_at')[:6]
+    )
+
+
+def get_home_sections(user=None):
+    """Toutes les sections de l'accueil (listes prêtes pour le gabarit)"""
+    from .recommendations import get_personalized_feed
+
+    user_id = user.pk if user is not None and user.is_authenticated else None
+    sections = {
+        'latest_products': cached_section('latest', _latest_products),
+        'featured_products': cached_section('featured', _featured_products),
+        'promoted_products': cached_section('promoted', _promoted_products),
+        'categories': cached_section('categories', _popular_categories),
+        'popular_stores': cached_section('stores', _popular_stores),
+        'recommended_products': cached_section(
+            'recommended',
+            lambda: get_personalized_feed(user if user_id else None, limit=12),
+            USER_SECTION_TTL if user_id else SECTION_TTL,
+            user_id=user_id,
+        ),
+    }
+    # Si pas de produits en vedette, on utilise les recommandés
+    if not sections['featured_products']:
+        sections['featured_products'] = sections['recommended_products'][:8]
+    return sections
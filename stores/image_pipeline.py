@@ -0,0 +1,323 @@
+"""
+🖼️ Variantes des images envoyées
+Les images des produits (principale et supplémentaires), les logos de
+boutique et les photos de profil ne sont plus servies qu'en repli: un worker
+les décline en WebP (et en AVIF quand Pillow le prend en charge) à des
+largeurs fixes (WIDTHS), orientation EXIF appliquée puis métadonnées
+retirées. Le tag `responsive_image` (templatetags/image_tags.py) en fait un
+<picture> avec srcset: une grille de produits ne télécharge que la taille
+affichée.
+
+L'état est en base (ImageDerivative, une ligne par fichier source). Le rendu,
+coûteux en CPU, ne tourne jamais dans la requête d'envoi: processus
+(ProcessPoolExecutor) de `manage.py run_image_pipeline`, ou workers Celery
+quand un broker est configuré.
+"""
+
+import hashlib
+import logging
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+try:
+    from PIL import Image, ImageOps
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+try:
+    # AVIF pour Pillow < 11.2 (greffon optionnel)
+    import pillow_avif  # noqa: F401
+except ImportError:
+    pass
+
+logger = logging.getLogger(__name__)
+
+# Largeurs produites (les largeurs supérieures à l'original sont remplacées
+# par la largeur de l'original)
+WIDTHS = getattr(settings, 'IMAGE_VARIANT_WIDTHS', (320, 640, 960, 1280))
+
+QUALITY = {'avif': 55, 'webp': 80}
+
+MIME_TYPES = {'avif': 'image/avif', 'webp': 'image/webp'}
+
+# Processus de rendu de `manage.py run_image_pipeline`
+WORKERS = getattr(settings, 'IMAGE_PIPELINE_WORKERS', min(4, os.cpu_count() or 1))
+
+# Sous-dossier de MEDIA_ROOT
+OUTPUT_DIR = 'variants'
+
+MAX_ATTEMPTS = 3
+
+# Réservation d'une tâche par un worker (au-delà: reprise)
+LEASE_SECONDS = 600
+
+CACHE_TTL = 24 * 3600
+# Variantes pas encore prêtes: nouvelle lecture en base peu après
+MISS_TTL = 60
+
+# Champs dont les fichiers sont déclinés (modèles de stores)
+IMAGE_FIELDS = {
+    'Product': 'image',
+    'ProductImage': 'image',
+    'Store': 'logo',
+    'GeneralProfile': 'avatar',
+    'StudentProfile': 'profile_picture',
+}
+
+
+class ImagePipelineError(Exception):
+    pass
+
+
+def available_formats():
+    """Formats de sortie, du plus compact au plus répandu"""
+    if not PIL_AVAILABLE:
+        return []
+    # Encodeurs enregistrés (greffon pillow_avif compris); features.check()
+    # ne connaît pas 'avif' avant Pillow 11.2
+    Image.init()
+    return [name for name in ('avif', 'webp') if name.upper() in Image.SAVE]
+
+
+def render_variants(source_path, out_dir, widths=WIDTHS, formats=('webp',)):
+    """
+    Écrit les variantes de `source_path` dans `out_dir` (vidé au préalable).
+    Exécuté dans un processus de rendu: ni base ni cache. Retourne les
+    dimensions de l'original et les fichiers produits; lève
+    ImagePipelineError.
+    """
+    try:
+        with Image.open(source_path) as original:
+            image = ImageOps.exif_transpose(original)
+            has_alpha = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+            image = image.convert('RGBA' if has_alpha else 'RGB')
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        raise ImagePipelineError(f"Image illisible: {e}")
+    # EXIF (position GPS comprise), XMP, commentaires: rien n'est recopié
+    # dans les variantes, sauf le profil de couleur
+    icc_profile = image.info.get('icc_profile')
+    image.info = {}
+    options = {'icc_profile': icc_profile} if icc_profile else {}
+
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.makedirs(out_dir)
+    targets = sorted({width for width in widths if width < image.width} | {min(image.width, max(widths))})
+    variants = []
+    for width in targets:
+        if width == image.width:
+            resized = image
+        else:
+            height = max(1, round(image.height * width / image.width))
+            resized = image.resize((width, height), Image.Resampling.LANCZOS)
+        for fmt in formats:
+            name = f'{width}w.{fmt}'
+            path = os.path.join(out_dir, name)
+            try:
+                resized.save(path, fmt.upper(), quality=QUALITY[fmt], **options)
+            except (OSError, ValueError) as e:
+                raise ImagePipelineError(f"Encodage {fmt} impossible: {e}")
+            variants.append({'width': width, 'format': fmt, 'name': name, 'size': os.path.getsize(path)})
+    return {'width': image.width, 'height': image.height, 'variants': variants}
+
+
+# ---------------------------------------------------------------------------
+# Lecture (gabarits)
+# ---------------------------------------------------------------------------
+
+def _cache_key(source):
+    return 'image_variants:' + hashlib.md5(source.encode()).hexdigest()
+
+
+def get_variants(source):
+    """Variantes prêtes d'un fichier; liste vide tant qu'elles ne le sont pas"""
+    from .models import ImageDerivative
+
+    key = _cache_key(source)
+    variants = cache.get(key)
+    if variants is None:
+        variants = ImageDerivative.objects.filter(source=source, status='ready').values_list(
+            'variants', flat=True,
+        ).first() or []
+        cache.set(key, variants, CACHE_TTL if variants else MISS_TTL)
+    return variants
+
+
+def srcset(source, fmt):
+    """Valeur d'attribut srcset ('url 320w, url 640w') pour un format"""
+    return ', '.join(
+        f"{default_storage.url(variant['name'])} {variant['width']}w"
+        for variant in sorted(get_variants(source), key=lambda variant: variant['width'])
+        if variant['format'] == fmt
+    )
+
+
+# ---------------------------------------------------------------------------
+# File des déclinaisons
+# ---------------------------------------------------------------------------
+
+def variant_dir(source):
+    # Extension conservée: a.jpg et a.png ont chacun leur dossier
+    return f'{OUTPUT_DIR}/{source}'
+
+
+def _media_path(name):
+    return os.path.join(settings.MEDIA_ROOT, name)
+
+
+def _wake_worker():
+    from .payment_jobs import celery_enabled
+
+    if celery_enabled():
+        from .tasks import generate_image_variants
+        transaction.on_commit(lambda: generate_image_variants.delay())
+
+
+def schedule_variants(image, force=False):
+    """
+    Met en file la déclinaison d'une image (fichier d'un ImageField) si elle
+    n'a pas déjà été faite (ou si `force`). Retourne la tâche, ou None sans
+    fichier.
+    """
+    from .models import ImageDerivative
+
+    if not image:
+        return None
+    job, created = ImageDerivative.objects.get_or_create(source=image.name)
+    if not created:
+        if not force:
+            return job
+        job.status, job.attempts, job.last_error, job.lease_expires_at = 'pending', 0, '', None
+        job.save(update_fields=['status', 'attempts', 'last_error', 'lease_expires_at', 'updated_at'])
+    _wake_worker()
+    return job
+
+
+def backfill():
+    """Met en file les images existantes jamais déclinées; retourne leur nombre"""
+    from . import models
+    from .models import ImageDerivative
+
+    known = set(ImageDerivative.objects.values_list('source', flat=True))
+    missing = set()
+    for model_name, field in IMAGE_FIELDS.items():
+        names = getattr(models, model_name).objects.exclude(**{field: ''}).exclude(**{f'{field}__isnull': True})
+        missing.update(name for name in names.values_list(field, flat=True).iterator() if name not in known)
+    ImageDerivative.objects.bulk_create(
+        [ImageDerivative(source=name) for name in sorted(missing)], batch_size=500, ignore_conflicts=True,
+    )
+    if missing:
+        _wake_worker()
+    return len(missing)
+
+
+def claim_jobs(limit):
+    """Réserve des tâches en attente (ou dont la réservation a expiré)"""
+    from .models import ImageDerivative
+
+    now = timezone.now()
+    due = Q(status='pending') | Q(status='processing', lease_expires_at__lte=now)
+    claimed = []
+    for job_id in ImageDerivative.objects.filter(due).order_by('created_at').values_list('pk', flat=True)[:limit]:
+        # UPDATE conditionnel: un autre worker a pu prendre la tâche entre-temps
+        if ImageDerivative.objects.filter(due, pk=job_id).update(
+            status='processing', attempts=F('attempts') + 1,
+            lease_expires_at=now + timedelta(seconds=LEASE_SECONDS),
+        ):
+            claimed.append(job_id)
+    return list(ImageDerivative.objects.filter(pk__in=claimed))
+
+
+def finish_job(job, result=None, error=None):
+    """Enregistre le résultat d'un rendu; retourne le statut final"""
+    from .models import ImageDerivative
+
+    now = timezone.now()
+    if error is not None:
+        shutil.rmtree(_media_path(variant_dir(job.source)), ignore_errors=True)
+        status = 'failed' if job.attempts >= MAX_ATTEMPTS else 'pending'
+        logger.warning(f"Image variants job #{job.pk} ({job.source}) attempt {job.attempts}: {error}")
+        ImageDerivative.objects.filter(pk=job.pk, status='processing').update(
+            status=status, last_error=str(error)[:2000], lease_expires_at=None, updated_at=now,
+        )
+        return status
+
+    prefix = variant_dir(job.source)
+    variants = [dict(variant, name=f"{prefix}/{variant['name']}") for variant in result['variants']]
+    # Remise en file (force) pendant le rendu: la nouvelle passe fera foi
+    if not ImageDerivative.objects.filter(pk=job.pk, status='processing').update(
+        status='ready', width=result['width'], height=result['height'], variants=variants,
+        last_error='', lease_expires_at=None, completed_at=now, updated_at=now,
+    ):
+        return 'skipped'
+    cache.set(_cache_key(job.source), variants, CACHE_TTL)
+    return 'ready'
+
+
+def _outcome(future):
+    error = future.exception()
+    return (None, error) if error else (future.result(), None)
+
+
+def process_pending(limit=None, workers=None):
+    """
+    Décline les images en attente. Avec plus d'un worker, le rendu tourne
+    dans un pool de processus (la base n'est touchée que par l'appelant);
+    sinon dans le processus courant (worker Celery). Sans Pillow, rien n'est
+    fait. Retourne le nombre de tâches par statut final.
+    """
+    formats = available_formats()
+    if not formats:
+        logger.warning("Image pipeline: Pillow without WebP/AVIF support, image jobs kept queued")
+        return {}
+
+    workers = workers or WORKERS
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    totals = {}
+    try:
+        while limit is None or sum(totals.values()) < limit:
+            # Plusieurs images par processus et par passage: rendus courts
+            batch = workers * 4 if limit is None else min(workers * 4, limit - sum(totals.values()))
+            jobs = claim_jobs(batch)
+            if not jobs:
+                break
+            arguments = [
+                (_media_path(job.source), _media_path(variant_dir(job.source)), WIDTHS, formats) for job in jobs
+            ]
+            if executor is None:
+                outcomes = []
+                for args in arguments:
+                    try:
+                        outcomes.append((render_variants(*args), None))
+                    except Exception as e:
+                        outcomes.append((None, e))
+            else:
+                futures = [executor.submit(render_variants, *args) for args in arguments]
+                outcomes = [_outcome(future) for future in futures]
+            for job, (result, error) in zip(jobs, outcomes):
+                status = finish_job(job, result, error)
+                totals[status] = totals.get(status, 0) + 1
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    if totals:
+        logger.info(f"Image pipeline: {totals}")
+    return totals
+
+
+def retry_failed():
+    """Relance les déclinaisons échouées"""
+    from .models import ImageDerivative
+
+    return ImageDerivative.objects.filter(status='failed').update(
+        status='pending', attempts=0, last_error='', updated_at=timezone.now(),
+    )
@@ -0,0 +1,179 @@
+"""
+🏆 Classement des boutiques (Hall of Fame)
+Calculé en une seule requête annotée puis figé dans StoreLeaderboard;
+les pages lisent l'instantané au lieu de recalculer les statistiques.
+"""
+
+import logging
+import threading
+
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import close_old_connections, transaction
+from django.db.models import (
+    Case, When, Value, Count, Sum, F, OuterRef, Subquery, IntegerField,
+)
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .search import fold_text
+
+# Score: vues + 3*likes + 5*followers + bonus si vérifiée/en vedette
+LIKE_WEIGHT = 3
+FOLLOWER_WEIGHT = 5
+VERIFIED_BONUS = 20
+FEATURED_BONUS = 10
+
+PER_PAGE = 24
+
+# Un seul recalcul demandé à la fois depuis les pages (secondes)
+SCHEDULE_LOCK_TTL = 300
+SCHEDULE_LOCK_KEY = 'leaderboard:refresh_scheduled'
+
+logger = logging.getLogger(__name__)
+
+
+def _ranked_stores():
+    """Toutes les boutiques avec leurs statistiques et leur score, triées (une requête)"""
+    from .models import Store, Product, Follow
+
+    def product_sum(field):
+        return Subquery(
+            Product.objects.filter(store=OuterRef('pk'))
+            .values('store').annotate(total=Sum(field)).values('total'),
+            output_field=IntegerField(),
+        )
+
+    followers = Subquery(
+        Follow.objects.filter(store=OuterRef('pk'))
+        .values('store').annotate(total=Count('id')).values('total'),
+        output_field=IntegerField(),
+    )
+
+    return Store.objects.annotate(
+        total_views=Coalesce(product_sum('views_count'), 0),
+        total_likes=Coalesce(product_sum('likes_count'), 0),
+        followers_total=Coalesce(followers, 0),
+    ).annotate(
+        leaderboard_score=(
+            F('total_views')
+            + F('total_likes') * LIKE_WEIGHT
+            + F('followers_total') * FOLLOWER_WEIGHT
+            + Case(When(is_verified=True, then=Value(VERIFIED_BONUS)), default=Value(0))
+            + Case(When(is_featured=True, then=Value(FEATURED_BONUS)), default=Value(0))
+        )
+    ).order_by('-leaderboard_score', 'pk').values(
+        'id', 'city', 'total_views', 'total_likes', 'followers_total', 'leaderboard_score',
+    )
+
+
+def refresh_leaderboard():
+    """
+    Recalcule l'instantané complet (général, par ville, par catégorie)
+    à partir d'un seul calcul de score. Retourne le nombre de lignes écrites.
+    """
+    from .models import Product, StoreLeaderboard
+
+    now = timezone.now()
+    ranked = list(_ranked_stores())
+
+    store_categories = {}
+    for store_id, category_id, category_name in (
+        Product.objects.filter(category__isnull=False)
+        .values_list('store_id', 'category_id', 'category__name')
+        .order_by()
+        .distinct()
+    ):
+        store_categories.setdefault(store_id, []).append((str(category_id), category_name))
+
+    entries = []
+    next_rank = {}
+
+    def add(scope, key, label, row):
+        rank = next_rank.get((scope, key), 0) + 1
+        next_rank[(scope, key)] = rank
+        entries.append(StoreLeaderboard(
+            scope=scope,
+            scope_key=key,
+            scope_label=label,
+            store_id=row['id'],
+            rank=rank,
+            score=row['leaderboard_score'],
+            total_views=max(row['total_views'], 0),
+            total_likes=max(row['total_likes'], 0),
+            followers=row['followers_total'],
+            computed_at=now,
+        ))
+
+    for row in ranked:
+        add('global', '', '', row)
+        city = (row['city'] or '').strip()
+        if city:
+            add('city', fold_text(city)[:100], city[:100], row)
+        for category_id, category_name in store_categories.get(row['id'], []):
+            add('category', category_id, category_name[:100], row)
+
+    with transaction.atomic():
+        StoreLeaderboard.objects.all().delete()
+        StoreLeaderboard.objects.bulk_create(entries, batch_size=1000)
+    return len(entries)
+
+
+def get_leaderboard_page(scope='global', key='', page=1, per_page=PER_PAGE):
+    """Page de classement lue depuis l'instantané"""
+    from .models import StoreLeaderboard
+
+    if not StoreLeaderboard.objects.exists():
+        # Premier affichage avant le passage de la tâche planifiée: page vide,
+        # calcul hors requête
+        schedule_refresh()
+        return Paginator(StoreLeaderboard.objects.none(), per_page).get_page(page)
+
+    if scope == 'city':
+        key = fold_text(key.strip())
+    entries = StoreLeaderboard.objects.filter(
+        scope=scope, scope_key=key
+    ).select_related('store').order_by('rank')
+    return Paginator(entries, per_page).get_page(page)
+
+
+def _refresh_in_thread():
+    try:
+        refresh_leaderboard()
+    except Exception as e:
+        logger.warning(f"Leaderboard refresh failed: {e}")
+        cache.delete(SCHEDULE_LOCK_KEY)
+    finally:
+        close_old_connections()
+
+
+def schedule_refresh():
+    """
+    Demande un recalcul de l'instantané: tâche Celery si un broker est
+    configuré, sinon thread d'arrière-plan. Sans effet si une demande est
+    déjà en cours.
+    """
+    from .payment_jobs import celery_enabled
+
+    if not cache.add(SCHEDULE_LOCK_KEY, 1, SCHEDULE_LOCK_TTL):
+        return False
+    if celery_enabled():
+        from .tasks import refresh_store_leaderboard
+        refresh_store_leaderboard.delay()
+    else:
+        threading.Thread(target=_refresh_in_thread, name='leaderboard-refresh', daemon=True).start()
+    return True
+
+
+def get_leaderboard_filters():
+    """Villes et catégories disponibles dans l'instantané"""
+    from .models import StoreLeaderboard
+
+    def choices(scope):
+        return list(
+            StoreLeaderboard.objects.filter(scope=scope, rank=1)
+            .order_by('scope_label')
+            .values_list('scope_key', 'scope_label')
+        )
+
+    return {'cities': choices('city'), 'categories': choices('category')}
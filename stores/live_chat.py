@@ -0,0 +1,225 @@
+"""
+💬 Chat des lives
+Un commentaire est diffusé tout de suite et écrit plus tard:
+- mode lent: seau à jetons en mémoire par (live, utilisateur), vérifié avant
+  toute autre chose;
+- diffusion: les commentaires d'un live sont regroupés pendant
+  FANOUT_INTERVAL et partent en une seule trame (`comment_batch`) vers le
+  groupe, au lieu d'un group_send par commentaire; la trame est encodée une
+  fois en JSON ici, pas une fois par spectateur;
+- écriture: tampon par processus vidé par bulk_create toutes les
+  FLUSH_INTERVAL secondes (ou dès FLUSH_SIZE commentaires). Un processus
+  arrêté brutalement perd au plus les commentaires du dernier intervalle.
+L'auteur est l'utilisateur de la connexion (scope), jamais celui du message.
+"""
+
+import asyncio
+import json
+import logging
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.utils import timezone
+
+try:
+    from channels.db import database_sync_to_async
+except ImportError:
+    from asgiref.sync import sync_to_async as database_sync_to_async
+
+logger = logging.getLogger(__name__)
+
+# Mode lent: SLOW_MODE_BURST commentaires d'affilée, puis un toutes les
+# SLOW_MODE_INTERVAL secondes
+SLOW_MODE_BURST = getattr(settings, 'LIVE_CHAT_SLOW_MODE_BURST', 3)
+SLOW_MODE_INTERVAL = getattr(settings, 'LIVE_CHAT_SLOW_MODE_INTERVAL', 2)
+
+MAX_COMMENT_LENGTH = 500
+
+# Regroupement des commentaires d'un live avant diffusion (secondes)
+FANOUT_INTERVAL = getattr(settings, 'LIVE_CHAT_FANOUT_INTERVAL', 0.1)
+
+# Écriture différée en base
+FLUSH_INTERVAL = getattr(settings, 'LIVE_CHAT_FLUSH_INTERVAL', 0.5)
+FLUSH_SIZE = 500
+
+# Seaux pleins (utilisateurs inactifs) purgés au-delà de cette taille
+MAX_BUCKETS = 50000
+
+REJECTIONS = {
+    'anonymous': "Connectez-vous pour commenter.",
+    'empty': "Le commentaire est vide.",
+    'slow_mode': "Mode lent: patientez avant de commenter à nouveau.",
+}
+
+
+class CommentRejected(Exception):
+    """Commentaire refusé; `reason` est une clé de REJECTIONS"""
+
+    def __init__(self, reason, retry_in=0):
+        self.reason = reason
+        self.retry_in = retry_in
+        super().__init__(REJECTIONS[reason])
+
+
+class SlowMode:
+    """Seaux à jetons en mémoire, un par (live, utilisateur)"""
+
+    def __init__(self, burst=None, interval=None):
+        self.burst = burst or SLOW_MODE_BURST
+        self.interval = interval or SLOW_MODE_INTERVAL
+        self._lock = threading.Lock()
+        self._buckets = {}
+
+    def take(self, key, now=None):
+        """0 si un commentaire est permis (jeton pris), sinon secondes à attendre"""
+        now = now or time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) / self.interval)
+            if tokens < 1:
+                self._buckets[key] = (tokens, now)
+                return (1 - tokens) * self.interval
+            self._buckets[key] = (tokens - 1, now)
+            if len(self._buckets) > MAX_BUCKETS:
+                self._prune(now)
+            return 0
+
+    def _prune(self, now):
+        full = self.burst * self.interval
+        self._buckets = {key: value for key, value in self._buckets.items() if now - value[1] < full}
+
+
+class CommentBuffer:
+    """Commentaires diffusés mais pas encore écrits en base"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = []
+        self.flushes = 0
+
+    def __len__(self):
+        return len(self._pending)
+
+    def add(self, live_id, user_id, content, is_question):
+        with self._lock:
+            self._pending.append((live_id, user_id, content, is_question))
+            return len(self._pending)
+
+    def flush(self):
+        """bulk_create des commentaires en attente; remis en file en cas d'erreur"""
+        from .models import LiveComment
+
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return 0
+        try:
+            LiveComment.objects.bulk_create(
+                [
+                    LiveComment(live_stream_id=live_id, user_id=user_id, content=content, is_question=is_question)
+                    for live_id, user_id, content, is_question in pending
+                ],
+                batch_size=FLUSH_SIZE,
+            )
+        except Exception:
+            with self._lock:
+                self._pending[:0] = pending
+            raise
+        self.flushes += 1
+        return len(pending)
+
+
+class ChatPipeline:
+    """Mode lent, diffusion regroupée et écriture différée d'un processus ASGI"""
+
+    def __init__(self):
+        self.slow_mode = SlowMode()
+        self.buffer = CommentBuffer()
+        self._outgoing = {}
+        self._fanouts = {}
+        self._flusher = None
+
+    async def post(self, channel_layer, live_id, user, data):
+        """
+        Accepte un commentaire du client: le retourne tel que diffusé, ou
+        lève CommentRejected
+        """
+        if user is None or not user.is_authenticated:
+            raise CommentRejected('anonymous')
+        content = str(data.get('content') or '').strip()[:MAX_COMMENT_LENGTH]
+        if not content:
+            raise CommentRejected('empty')
+        retry_in = self.slow_mode.take((live_id, user.pk))
+        if retry_in:
+            raise CommentRejected('slow_mode', round(retry_in, 1))
+
+        is_question = bool(data.get('is_question', False))
+        comment = {
+            'id': uuid.uuid4().hex,
+            'user': user.username,
+            'content': content,
+            'is_question': is_question,
+            'created_at': timezone.now().isoformat(),
+        }
+        self._fan_out(channel_layer, live_id, comment)
+        if self.buffer.add(live_id, user.pk, content, is_question) >= FLUSH_SIZE:
+            asyncio.ensure_future(database_sync_to_async(self.buffer.flush)())
+        self._schedule_flush()
+        return comment
+
+    def _fan_out(self, channel_layer, live_id, comment):
+        self._outgoing.setdefault(live_id, []).append(comment)
+        if live_id not in self._fanouts:
+            self._fanouts[live_id] = asyncio.ensure_future(self._send_batch(channel_layer, live_id))
+
+    async def _send_batch(self, channel_layer, live_id):
+        try:
+            await asyncio.sleep(FANOUT_INTERVAL)
+        finally:
+            self._fanouts.pop(live_id, None)
+            comments = self._outgoing.pop(live_id, [])
+        if comments:
+            await channel_layer.group_send(f'live_{live_id}', {
+                'type': 'comment_batch',
+                'text': json.dumps({'type': 'comments', 'comments': comments}),
+            })
+
+    def _schedule_flush(self):
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.ensure_future(self._flush_loop())
+
+    async def _flush_loop(self):
+        while len(self.buffer):
+            await asyncio.sleep(FLUSH_INTERVAL)
+            try:
+                await database_sync_to_async(self.buffer.flush)()
+            except Exception as e:
+                logger.error(f"Live comments flush failed: {e}", exc_info=True)
+
+    async def drain(self):
+        """Envoie les trames en attente et écrit le tampon (arrêt, tests, benchmark)"""
+        while self._fanouts:
+            await asyncio.gather(*list(self._fanouts.values()), return_exceptions=True)
+        return await database_sync_to_async(self.buffer.flush)()
+
+
+_pipeline = None
+_pipeline_lock = threading.Lock()
+
+
+def get_pipeline():
+    global _pipeline
+    if _pipeline is None:
+        with _pipeline_lock:
+            if _pipeline is None:
+                _pipeline = ChatPipeline()
+    return _pipeline
+
+
+def reset_pipeline():
+    """Nouveau pipeline (tests, benchmark); le tampon en cours est abandonné"""
+    global _pipeline
+    with _pipeline_lock:
+        _pipeline = None
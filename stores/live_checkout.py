@@ -0,0 +1,134 @@
+"""
+🛒 Achats pendant les lives
+Un achat est une transaction courte:
+- le stock est réservé par un UPDATE conditionnel (stock >= quantité) avec
+  décrément F(): jamais de survente, même quand des centaines de
+  spectateurs achètent le même produit à la même seconde;
+- commande et LivePurchase sont créés dans la même transaction (un refus ou
+  une erreur rend le stock);
+- les compteurs du live et du produit présenté sont incrémentés en base
+  (F()), sans lecture préalable: aucune mise à jour perdue.
+Les verrous de ligne sont toujours pris dans le même ordre (produit, live,
+produit présenté). La notification `purchase_notification` part après le
+commit, depuis un thread dédié: la réponse HTTP n'attend pas la couche de
+canaux.
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import transaction
+from django.db.models import F
+
+logger = logging.getLogger(__name__)
+
+# Quantité maximale par achat
+MAX_QUANTITY = 20
+
+REFUSALS = {
+    'invalid_quantity': "Quantité invalide.",
+    'out_of_stock': "Stock épuisé pour ce produit.",
+}
+
+
+class PurchaseRefused(Exception):
+    """Achat refusé; `reason` est une clé de REFUSALS"""
+
+    def __init__(self, reason):
+        self.reason = reason
+        super().__init__(REFUSALS[reason])
+
+
+def parse_quantity(value):
+    try:
+        quantity = int(value)
+    except (TypeError, ValueError):
+        raise PurchaseRefused('invalid_quantity')
+    if not 1 <= quantity <= MAX_QUANTITY:
+        raise PurchaseRefused('invalid_quantity')
+    return quantity
+
+
+def reserve_stock(product_id, quantity):
+    """Décrément conditionnel; False si le stock ne suffit pas"""
+    from .models import Product
+
+    return Product.objects.filter(pk=product_id, stock__gte=quantity).update(stock=F('stock') - quantity) == 1
+
+
+def purchase(live_stream, live_product, customer, quantity):
+    """
+    Achète `quantity` exemplaires du produit présenté; retourne
+    (Order, LivePurchase) ou lève PurchaseRefused
+    """
+    from .models import LiveProduct, LivePurchase, LiveStream, Order
+
+    product = live_product.product
+    price = live_product.live_price or product.price
+    total = price * quantity
+
+    with transaction.atomic():
+        if not reserve_stock(product.pk, quantity):
+            raise PurchaseRefused('out_of_stock')
+        order = Order.objects.create(
+            product=product,
+            customer=customer,
+            store_id=live_stream.store_id,
+            quantity=quantity,
+            unit_price=price,
+            total_price=total,
+            status='pending',
+        )
+        live_purchase = LivePurchase.objects.create(
+            live_stream=live_stream,
+            product=product,
+            customer=customer,
+            order=order,
+            quantity=quantity,
+            price=price,
+            total=total,
+        )
+        LiveStream.objects.filter(pk=live_stream.pk).update(
+            total_sales=F('total_sales') + total,
+            total_orders=F('total_orders') + 1,
+        )
+        LiveProduct.objects.filter(pk=live_product.pk).update(purchases_count=F('purchases_count') + quantity)
+
+        payload = {
+            'user': customer.username,
+            'product_id': product.pk,
+            'product': product.name,
+            'quantity': quantity,
+        }
+        transaction.on_commit(lambda: broadcast_purchase(live_stream.pk, payload))
+    return order, live_purchase
+
+
+# ---------------------------------------------------------------------------
+# Notification aux spectateurs
+# ---------------------------------------------------------------------------
+
+# Un seul thread: les notifications d'un live partent dans l'ordre des achats
+_broadcaster = ThreadPoolExecutor(max_workers=1, thread_name_prefix='live-purchase')
+
+
+def _send(live_id, payload):
+    try:
+        from asgiref.sync import async_to_sync
+        from channels.layers import get_channel_layer
+    except ImportError:
+        return
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    try:
+        async_to_sync(channel_layer.group_send)(
+            f'live_{live_id}', {'type': 'purchase_notification', 'purchase': payload}
+        )
+    except Exception as e:
+        logger.warning(f"Live purchase broadcast failed for live {live_id}: {e}")
+
+
+def broadcast_purchase(live_id, payload):
+    """Envoi au groupe du live sans bloquer l'appelant"""
+    return _broadcaster.submit(_send, live_id, payload)
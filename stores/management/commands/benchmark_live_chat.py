@@ -0,0 +1,182 @@
+import asyncio
+import json
+import statistics
+import time
+import uuid
+from urllib.parse import parse_qs
+
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.management.base import BaseCommand, CommandError
+
+from stores import live_chat, presence
+from stores.models import LiveComment, LiveStream, Store
+
+try:
+    from channels.layers import DEFAULT_CHANNEL_LAYER, InMemoryChannelLayer, channel_layers
+    from channels.routing import URLRouter
+    from channels.testing import WebsocketCommunicator
+    CHANNELS_AVAILABLE = True
+except ImportError:
+    CHANNELS_AVAILABLE = False
+    InMemoryChannelLayer = object
+
+
+class BenchmarkChannelLayer(InMemoryChannelLayer):
+    """
+    Couche en mémoire dont la purge des messages expirés passe au plus une
+    fois par seconde: celle d'origine parcourt tous les canaux à chaque
+    receive, soit clients² opérations par trame diffusée, ce qui mesurerait
+    la couche de test plutôt que le chat
+    """
+
+    cleaned_at = 0
+
+    def _clean_expired(self):
+        if time.monotonic() - self.cleaned_at >= 1:
+            self.cleaned_at = time.monotonic()
+            super()._clean_expired()
+
+
+class Command(BaseCommand):
+    help = (
+        "Simule des milliers de clients WebSocket sur un live (couche de canaux "
+        "en mémoire): débit des commentaires, trames reçues par client, latence "
+        "de diffusion et écritures en base du chat"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=2000, help="Connexions WebSocket simultanées")
+        parser.add_argument('--writers', type=int, default=50, help="Clients connectés qui commentent")
+        parser.add_argument('--rate', type=float, default=1.0, help="Commentaires par seconde et par auteur")
+        parser.add_argument('--seconds', type=float, default=5, help="Durée de l'envoi")
+
+    def handle(self, *args, **options):
+        if not CHANNELS_AVAILABLE:
+            raise CommandError("channels n'est pas installé (pip install channels)")
+        if not 0 < options['writers'] <= options['clients']:
+            raise CommandError("--writers doit être compris entre 1 et --clients")
+
+        tag = uuid.uuid4().hex[:8]
+        owner = User.objects.create_user(f'bench-chat-{tag}')
+        store = Store.objects.create(owner=owner, name=f'Benchmark chat {tag}', whatsapp_number='0000')
+        live = LiveStream.objects.create(store=store, title='Benchmark chat', stream_key=f'bench-chat-{tag}', status='live')
+        User.objects.bulk_create([User(username=f'bench-chat-{tag}-{i}') for i in range(options['writers'])])
+        writers = list(User.objects.filter(username__startswith=f'bench-chat-{tag}-').order_by('pk'))
+
+        channel_layers.set(DEFAULT_CHANNEL_LAYER, BenchmarkChannelLayer(capacity=10000))
+        live_chat.reset_pipeline()
+        try:
+            result = asyncio.run(self._run(live, writers, options))
+        finally:
+            channel_layers.backends.pop(DEFAULT_CHANNEL_LAYER, None)
+            live_chat.reset_pipeline()
+            presence.get_presence().clear()
+            stored = LiveComment.objects.filter(live_stream=live).count()
+            User.objects.filter(pk__in=[owner.pk] + [user.pk for user in writers]).delete()
+
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"{options['clients']} clients, {options['writers']} auteurs, {options['seconds']} s"
+        ))
+        self.stdout.write(f"  connexions établies en {result['connect_seconds']} s")
+        self.stdout.write(
+            f"  commentaires acceptés: {result['accepted']}, refusés (mode lent): {result['rejected']}, "
+            f"écrits en base: {stored} en {result['flushes']} bulk_create"
+        )
+        self.stdout.write(
+            f"  trames reçues: {result['frames']} ({result['frames_per_client']} par client), "
+            f"commentaires reçus par un spectateur: {result['delivered']}"
+        )
+        self.stdout.write(
+            f"  sans regroupement: {result['accepted'] * options['clients']} trames et "
+            f"{result['accepted']} INSERT"
+        )
+        if result['latencies']:
+            samples = result['latencies']
+            self.stdout.write(
+                f"  latence envoi -> réception p50 {statistics.median(samples):.1f} ms, "
+                f"p95 {samples[int(len(samples) * 0.95) - 1]:.1f} ms, max {samples[-1]:.1f} ms"
+            )
+
+    async def _run(self, live, writers, options):
+        from stores.routing import websocket_urlpatterns
+
+        router = URLRouter(websocket_urlpatterns)
+
+        async def application(scope, receive, send):
+            # Auteur pris dans la query string, comme le ferait AuthMiddlewareStack
+            index = parse_qs(scope['query_string'].decode()).get('u')
+            user = writers[int(index[0])] if index else AnonymousUser()
+            return await router(dict(scope, user=user), receive, send)
+
+        clients = []
+        for i in range(options['clients']):
+            query = f'?u={i}' if i < len(writers) else ''
+            clients.append(WebsocketCommunicator(application, f'/ws/live/{live.pk}/{query}'))
+        started = time.perf_counter()
+        for start in range(0, len(clients), 200):
+            chunk = clients[start:start + 200]
+            results = await asyncio.gather(*(client.connect(timeout=30) for client in chunk))
+            if not all(connected for connected, _ in results):
+                raise CommandError("Connexion WebSocket refusée")
+        # connect() rend la main à l'accept; la présence est enregistrée après
+        while presence.viewers(live.pk) < len(clients):
+            await asyncio.sleep(0.05)
+
+        stats = {'accepted': 0, 'rejected': 0, 'frames': 0, 'delivered': 0}
+        stats['connect_seconds'] = round(time.perf_counter() - started, 2)
+        sent_at = {}
+        latencies = []
+
+        async def read(client, decode, observer):
+            while True:
+                text = await client.receive_from(timeout=3600)
+                if not decode:
+                    # Simple spectateur: trames comptées sans décodage
+                    stats['frames'] += text.startswith('{"type": "comments"')
+                    continue
+                data = json.loads(text)
+                if data['type'] == 'comments':
+                    stats['frames'] += 1
+                    if observer:
+                        stats['delivered'] += len(data['comments'])
+                        now = time.perf_counter()
+                        latencies.extend(
+                            (now - sent_at[comment['content']]) * 1000 for comment in data['comments']
+                        )
+                elif data['type'] == 'comment_rejected':
+                    stats['rejected'] += 1
+
+        async def write(index, client):
+            interval = 1 / options['rate']
+            deadline = time.perf_counter() + options['seconds']
+            # Départs étalés sur le premier intervalle
+            await asyncio.sleep(interval * index / len(writers))
+            sequence = 0
+            while time.perf_counter() < deadline:
+                content = f'bench {index}-{sequence}'
+                sent_at[content] = time.perf_counter()
+                await client.send_to(text_data=json.dumps({'type': 'comment', 'content': content}))
+                sequence += 1
+                await asyncio.sleep(interval)
+            return sequence
+
+        readers = [
+            asyncio.ensure_future(read(client, index < len(writers), index == 0))
+            for index, client in enumerate(clients)
+        ]
+        attempts = sum(await asyncio.gather(*(write(i, clients[i]) for i in range(len(writers)))))
+        await asyncio.sleep(live_chat.FANOUT_INTERVAL * 2)
+        await live_chat.get_pipeline().drain()
+        await asyncio.sleep(0.5)
+
+        for reader in readers:
+            reader.cancel()
+        await asyncio.gather(*readers, return_exceptions=True)
+        for start in range(0, len(clients), 200):
+            await asyncio.gather(*(client.disconnect() for client in clients[start:start + 200]))
+
+        stats['flushes'] = live_chat.get_pipeline().buffer.flushes
+        stats['accepted'] = attempts - stats['rejected']
+        stats['frames_per_client'] = round(stats['frames'] / len(clients), 1)
+        stats['latencies'] = sorted(latencies)
+        return stats
@@ -0,0 +1,155 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+from django.db.models import Count, Sum
+
+from stores.live_checkout import PurchaseRefused, purchase
+from stores.models import LiveProduct, LivePurchase, LiveStream, Order, Product, Store
+
+
+def legacy_purchase(live_stream, live_product, customer, quantity):
+    """Ancien chemin: pas de stock, compteurs lus puis réécrits"""
+    live_stream = LiveStream.objects.get(pk=live_stream.pk)
+    live_product = LiveProduct.objects.select_related('product').get(pk=live_product.pk)
+    price = live_product.live_price or live_product.product.price
+    total = price * quantity
+    order = Order.objects.create(
+        product=live_product.product, customer=customer, store=live_stream.store,
+        quantity=quantity, unit_price=price, total_price=total, status='pending',
+    )
+    LivePurchase.objects.create(
+        live_stream=live_stream, product=live_product.product, customer=customer,
+        order=order, quantity=quantity, price=price, total=total,
+    )
+    live_stream.total_sales += total
+    live_stream.total_orders += 1
+    live_stream.save()
+    live_product.purchases_count += quantity
+    live_product.save()
+    return order
+
+
+class Command(BaseCommand):
+    help = (
+        "Achats simultanés d'un même produit pendant un live: compare l'ancien "
+        "chemin (lecture puis écriture, sans stock) et live_checkout (réservation "
+        "conditionnelle, compteurs F()), et vérifie stock et compteurs"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stock', type=int, default=200, help="Stock initial du produit")
+        parser.add_argument('--attempts', type=int, default=1000, help="Achats tentés par scénario")
+        parser.add_argument('--workers', type=int, default=16, help="Acheteurs simultanés")
+
+    def handle(self, *args, **options):
+        tag = uuid.uuid4().hex[:8]
+        owner = User.objects.create_user(f'bench-live-{tag}')
+        customers = [User.objects.create_user(f'bench-live-{tag}-{i}') for i in range(options['workers'])]
+        store = Store.objects.create(owner=owner, name=f'Benchmark live {tag}', whatsapp_number='0000')
+        try:
+            results = [
+                ('avant (lecture puis écriture)', self._run(legacy_purchase, store, customers, options)),
+                ('après (live_checkout)', self._run(purchase, store, customers, options)),
+            ]
+        finally:
+            User.objects.filter(pk__in=[owner.pk] + [customer.pk for customer in customers]).delete()
+
+        for label, result in results:
+            self.stdout.write(self.style.MIGRATE_HEADING(label))
+            self.stdout.write(
+                f"  {result['attempts']} tentatives en {result['seconds']} s "
+                f"({result['throughput']} achats/s), {result['errors']} erreurs"
+            )
+            self.stdout.write(
+                f"  acceptés: {result['accepted']}, refusés (stock): {result['refused']}, "
+                f"stock restant: {result['stock']} / {options['stock']}"
+            )
+            self.stdout.write(
+                f"  total_orders: {result['total_orders']} pour {result['purchases']} achats, "
+                f"purchases_count: {result['purchases_count']} pour {result['quantity']} exemplaires"
+            )
+            problems = []
+            if result['quantity'] > options['stock']:
+                problems.append(f"{result['quantity'] - options['stock']} exemplaires vendus au-delà du stock")
+            if result['quantity'] + result['stock'] != options['stock'] and result['quantity'] <= options['stock']:
+                problems.append("stock incohérent avec les ventes")
+            if result['total_orders'] != result['purchases'] or result['purchases_count'] != result['quantity']:
+                problems.append("mises à jour de compteurs perdues")
+            if result['total_sales'] != result['sales']:
+                problems.append(f"total_sales {result['total_sales']} pour {result['sales']} encaissés")
+            for problem in problems:
+                self.stdout.write(self.style.ERROR(f"  {problem}"))
+            if not problems:
+                self.stdout.write(self.style.SUCCESS("  ni survente ni mise à jour perdue"))
+
+    def _run(self, buy, store, customers, options):
+        product = Product.objects.create(
+            store=store, name='Produit flash', price=5000, image='products/test.jpg', stock=options['stock'],
+        )
+        live_stream = LiveStream.objects.create(
+            store=store, title='Vente flash', stream_key=f'bench-live-{uuid.uuid4().hex}', status='live',
+        )
+        live_product = LiveProduct.objects.create(live_stream=live_stream, product=product, live_price=4000)
+        live_product = LiveProduct.objects.select_related('product').get(pk=live_product.pk)
+
+        accepted, refused, errors = 0, 0, 0
+        lock = threading.Lock()
+        start = threading.Barrier(options['workers'])
+
+        def worker(args):
+            nonlocal accepted, refused, errors
+            customer, attempts = args
+            start.wait()
+            try:
+                for _ in range(attempts):
+                    try:
+                        buy(live_stream, live_product, customer, 1)
+                        outcome = 'accepted'
+                    except PurchaseRefused:
+                        outcome = 'refused'
+                    except Exception:
+                        outcome = 'error'
+                    with lock:
+                        if outcome == 'accepted':
+                            accepted += 1
+                        elif outcome == 'refused':
+                            refused += 1
+                        else:
+                            errors += 1
+            finally:
+                close_old_connections()
+                connections.close_all()
+
+        workers = options['workers']
+        shares = [options['attempts'] // workers + (i < options['attempts'] % workers) for i in range(workers)]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(worker, zip(customers, shares)))
+        seconds = time.perf_counter() - started
+
+        live_stream.refresh_from_db()
+        live_product.refresh_from_db()
+        product.refresh_from_db()
+        purchases = LivePurchase.objects.filter(live_stream=live_stream).aggregate(
+            count=Count('pk'), quantity=Sum('quantity'), sales=Sum('total'),
+        )
+        return {
+            'attempts': options['attempts'],
+            'seconds': round(seconds, 2),
+            'throughput': round(options['attempts'] / seconds, 1),
+            'accepted': accepted,
+            'refused': refused,
+            'errors': errors,
+            'stock': product.stock,
+            'purchases': purchases['count'] or 0,
+            'quantity': purchases['quantity'] or 0,
+            'sales': purchases['sales'] or 0,
+            'total_orders': live_stream.total_orders,
+            'total_sales': live_stream.total_sales,
+            'purchases_count': live_product.purchases_count,
+        }
@@ -0,0 +1,150 @@
+import json
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+from django.core.management.base import BaseCommand
+
+from stores import payment_transport
+
+PROVIDER = 'benchmark'
+
+
+class StubProviderHandler(BaseHTTPRequestHandler):
+    """Faux fournisseur: /token (OAuth) et /verify/<id>, réponses JSON keep-alive"""
+
+    protocol_version = 'HTTP/1.1'
+    # En-têtes et corps partent en deux écritures: sans ça, Nagle + ACK
+    # retardé ajoutent ~40 ms par réponse sur une connexion réutilisée
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server.stats_lock:
+            self.server.connections += 1
+
+    def _reply(self, payload):
+        with self.server.stats_lock:
+            self.server.requests[self.path.split('/')[1]] += 1
+        time.sleep(self.server.delay)
+        body = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        self._reply({'access_token': 'stub-token', 'expires_in': 3600})
+
+    def do_GET(self):
+        self._reply({'status': 'SUCCESSFUL'})
+
+    def log_message(self, *args):
+        pass
+
+
+def start_stub_server(delay):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubProviderHandler)
+    server.daemon_threads = True
+    server.delay = delay
+    server.stats_lock = threading.Lock()
+    server.connections = 0
+    server.requests = {'token': 0, 'verify': 0}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare, sur un faux fournisseur local, les appels requests.* directs "
+        "(une connexion et un jeton par appel) et le transport partagé (sessions "
+        "keep-alive, jeton en cache)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--calls', type=int, default=200, help="Vérifications par scénario")
+        parser.add_argument('--concurrency', type=int, default=8, help="Appels simultanés")
+        parser.add_argument('--delay-ms', type=float, default=5, help="Temps de réponse simulé du fournisseur")
+
+    def handle(self, *args, **options):
+        server = start_stub_server(options['delay_ms'] / 1000)
+        base_url = f'http://127.0.0.1:{server.server_address[1]}'
+
+        def direct(call):
+            token = requests.post(f'{base_url}/token', timeout=30).json()['access_token']
+            requests.get(f'{base_url}/verify/{call}', headers={'Authorization': f'Bearer {token}'}, timeout=30)
+
+        def fetch_token():
+            data = payment_transport.request(PROVIDER, 'token', 'post', f'{base_url}/token').json()
+            return data['access_token'], data['expires_in']
+
+        def pooled(call):
+            token = payment_transport.get_cached_token(PROVIDER, (base_url,), fetch_token)
+            payment_transport.request(
+                PROVIDER, 'verify', 'get', f'{base_url}/verify/{call}',
+                headers={'Authorization': f'Bearer {token}'},
+            )
+
+        try:
+            payment_transport.reset_transport()
+            payment_transport.invalidate_token(PROVIDER, (base_url,))
+            results = [
+                ('avant (requests.*)', self._run(server, direct, options)),
+                ('après (transport partagé)', self._run(server, pooled, options)),
+            ]
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        for label, result in results:
+            self.stdout.write(self.style.MIGRATE_HEADING(label))
+            self.stdout.write(
+                f"  {result['calls']} appels en {result['seconds']} s "
+                f"({result['throughput']} appels/s)"
+            )
+            self.stdout.write(
+                f"  latence p50 {result['p50_ms']} ms, p95 {result['p95_ms']} ms, max {result['max_ms']} ms"
+            )
+            self.stdout.write(
+                f"  connexions ouvertes: {result['connections']}, "
+                f"jetons demandés: {result['token_requests']}"
+            )
+
+        self.stdout.write(self.style.MIGRATE_HEADING("Histogrammes du transport"))
+        for name, histogram in payment_transport.transport_metrics()['latency'].items():
+            self.stdout.write(
+                f"  {name}: {histogram['count']} appels, p50 ≤ {histogram['p50_ms']} ms, "
+                f"p95 ≤ {histogram['p95_ms']} ms, moyenne {histogram['avg_ms']} ms"
+            )
+        payment_transport.reset_transport()
+
+    def _run(self, server, call, options):
+        with server.stats_lock:
+            server.connections = 0
+            server.requests.update(token=0, verify=0)
+
+        def timed(i):
+            started = time.perf_counter()
+            call(i)
+            return (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            samples = sorted(pool.map(timed, range(options['calls'])))
+        seconds = time.perf_counter() - started
+
+        return {
+            'calls': len(samples),
+            'seconds': round(seconds, 2),
+            'throughput': round(len(samples) / seconds, 1),
+            'p50_ms': round(statistics.median(samples), 2),
+            'p95_ms': round(samples[int(len(samples) * 0.95) - 1], 2),
+            'max_ms': round(samples[-1], 2),
+            'connections': server.connections,
+            'token_requests': server.requests['token'],
+        }
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from stores.similarity import build_similarity_index, refresh_similarity_index
+
+
+class Command(BaseCommand):
+    help = "Calcule l'index de similarité produit-produit (TF-IDF + catégorie/boutique)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true',
+            help="Recalcule tous les produits (par défaut: seulement les produits modifiés)",
+        )
+
+    def handle(self, *args, **options):
+        if options['full']:
+            total = build_similarity_index()
+        else:
+            total = refresh_similarity_index()
+        self.stdout.write(self.style.SUCCESS(f"{total} produits indexés"))
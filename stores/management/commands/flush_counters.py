@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from stores.counters import counter_metrics, flush_counters
+
+
+class Command(BaseCommand):
+    help = "Écrit en base les compteurs tamponnés (vues, likes, partages)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--stats', action='store_true',
+            help="Afficher seulement les métriques du tampon (incréments en attente, retard)",
+        )
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            metrics = counter_metrics()
+            self.stdout.write(f"Backend: {metrics['backend']}")
+            self.stdout.write(f"Objets en attente: {metrics['pending_keys']}")
+            self.stdout.write(f"Incréments en attente: {metrics['pending_increments']}")
+            self.stdout.write(f"Retard de vidage: {metrics['flush_lag_seconds']} s")
+            if metrics['last_flush']:
+                self.stdout.write(f"Dernier vidage: {metrics['last_flush']}")
+            return
+
+        stats = flush_counters()
+        self.stdout.write(self.style.SUCCESS(
+            f"{stats['increments']} incréments écrits sur {stats['rows']} lignes "
+            f"en {stats['duration_ms']} ms (retard {stats['lag_seconds']} s)"
+        ))
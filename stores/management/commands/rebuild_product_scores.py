@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+
+from stores.models import Product
+from stores.scoring import rebuild_product_scores
+
+
+class Command(BaseCommand):
+    help = "Recalcule l'index ProductScore (score du feed) depuis les données sources"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help="Contrôle de cohérence uniquement: compte les scores divergents sans rien écrire",
+        )
+        parser.add_argument(
+            '--store', type=int,
+            help="Limiter le recalcul aux produits d'une boutique (id)",
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help="Nombre de produits traités par lot (défaut: 500)",
+        )
+
+    def handle(self, *args, **options):
+        queryset = Product.objects.all()
+        if options['store']:
+            queryset = queryset.filter(store_id=options['store'])
+
+        stats = rebuild_product_scores(
+            queryset,
+            batch_size=options['batch_size'],
+            dry_run=options['check'],
+        )
+
+        self.stdout.write(
+            f"{stats['processed']} produits traités, "
+            f"{stats['created']} scores manquants, "
+            f"{stats['drift']} scores divergents"
+        )
+        if options['check']:
+            if stats['created'] or stats['drift']:
+                self.stdout.write(self.style.WARNING("Index incohérent: relancez sans --check pour le corriger"))
+            else:
+                self.stdout.write(self.style.SUCCESS("Index cohérent"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"{stats['updated'] + stats['created']} scores recalculés"))
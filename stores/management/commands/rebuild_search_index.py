@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from stores.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = "Reconstruit l'index de recherche des produits (FTS5 ou tsvector/trigrammes)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help="Nombre de produits indexés par lot (défaut: 500)",
+        )
+
+    def handle(self, *args, **options):
+        total = rebuild_search_index(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"{total} produits indexés"))
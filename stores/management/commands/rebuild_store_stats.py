@@ -0,0 +1,31 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from stores.analytics import rebuild_store_stats, reconcile_store_views
+
+
+class Command(BaseCommand):
+    help = "Recalcule les statistiques quotidiennes des boutiques depuis les tables sources"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=0,
+            help="Ne recalcule que les N derniers jours (défaut: tout l'historique)",
+        )
+        parser.add_argument(
+            '--store', type=int,
+            help="Limiter le recalcul à une boutique (id)",
+        )
+
+    def handle(self, *args, **options):
+        start = None
+        if options['days']:
+            start = timezone.localdate() - timedelta(days=options['days'] - 1)
+        store_ids = [options['store']] if options['store'] else None
+        rows = rebuild_store_stats(start=start, store_ids=store_ids)
+        corrected = reconcile_store_views(store_ids)
+        self.stdout.write(self.style.SUCCESS(
+            f"{rows} lignes recalculées, vues réconciliées pour {corrected} boutiques"
+        ))
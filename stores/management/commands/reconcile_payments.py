@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand
+
+from stores.reconciliation import (
+    MIN_AGE_SECONDS, PAGE_SIZE, last_reconciliation, reconcile_pending_payments,
+)
+
+
+class Command(BaseCommand):
+    help = "Vérifie par lots les paiements restés en attente auprès des fournisseurs"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-age', type=int, default=MIN_AGE_SECONDS,
+            help=f"Ignorer les paiements créés il y a moins de N secondes (défaut: {MIN_AGE_SECONDS})",
+        )
+        parser.add_argument(
+            '--page-size', type=int, default=PAGE_SIZE,
+            help=f"Lignes vérifiées puis écrites par lot (défaut: {PAGE_SIZE})",
+        )
+        parser.add_argument('--limit', type=int, help="Nombre maximal de lignes par modèle")
+        parser.add_argument(
+            '--payments-only', action='store_true',
+            help="Ne pas vérifier les PaymentTransaction",
+        )
+        parser.add_argument(
+            '--stats', action='store_true',
+            help="Afficher seulement le rapport du dernier passage",
+        )
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            report = last_reconciliation()
+            if report is None:
+                self.stdout.write("Aucun rapprochement enregistré")
+            else:
+                self._report(report)
+            return
+
+        report = reconcile_pending_payments(
+            min_age=options['min_age'],
+            page_size=options['page_size'],
+            limit=options['limit'],
+            include_transactions=not options['payments_only'],
+        )
+        self._report(report)
+
+    def _report(self, report):
+        self.stdout.write(self.style.SUCCESS(
+            f"{report['checked']} paiements vérifiés en {report['seconds']} s "
+            f"({report['throughput']} vérifications/s): {report['updated']} mis à jour, "
+            f"{report['errors']} erreurs"
+        ))
+        for provider, stats in sorted(report['by_provider'].items()):
+            self.stdout.write(f"  {provider}: {stats['checked']} vérifiés, {stats['errors']} erreurs")
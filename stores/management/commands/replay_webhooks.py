@@ -0,0 +1,69 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.utils import timezone
+
+from stores.models import WebhookEvent
+from stores.webhook_events import replay_events
+
+
+class Command(BaseCommand):
+    help = "Rejoue des webhooks de paiement enregistrés (après correction d'un bug ou d'une donnée)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('ids', nargs='*', type=int, help="Identifiants des événements à rejouer")
+        parser.add_argument('--provider', help="Fournisseur (ex: stripe, orange, wave)")
+        parser.add_argument('--transaction', help="Référence de transaction")
+        parser.add_argument(
+            '--status', action='append', choices=[s for s, _ in WebhookEvent.STATUS_CHOICES],
+            help="Statut des événements à rejouer (répétable; défaut: failed)",
+        )
+        parser.add_argument('--since-hours', type=float, help="Reçus depuis moins de N heures")
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help="Afficher les événements sélectionnés sans les rejouer",
+        )
+        parser.add_argument(
+            '--stats', action='store_true',
+            help="Afficher le nombre d'événements par fournisseur et par statut puis s'arrêter",
+        )
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            rows = (
+                WebhookEvent.objects.order_by()
+                .values('provider', 'status').annotate(total=Count('id'))
+                .order_by('provider', 'status')
+            )
+            for row in rows:
+                self.stdout.write(f"{row['provider']:<15} {row['status']:<10} {row['total']}")
+            return
+
+        events = WebhookEvent.objects.all()
+        if options['ids']:
+            events = events.filter(id__in=options['ids'])
+        elif not (options['provider'] or options['transaction'] or options['status']):
+            options['status'] = ['failed']
+        if options['provider']:
+            events = events.filter(provider=options['provider'])
+        if options['transaction']:
+            events = events.filter(transaction_ref=options['transaction'])
+        if options['status']:
+            events = events.filter(status__in=options['status'])
+        if options['since_hours']:
+            events = events.filter(received_at__gte=timezone.now() - timedelta(hours=options['since_hours']))
+
+        if not events.exists():
+            raise CommandError("Aucun événement ne correspond à cette sélection")
+
+        if options['dry_run']:
+            for event in events.order_by('id'):
+                self.stdout.write(
+                    f"#{event.id} {event.provider} {event.event_type} {event.transaction_ref} "
+                    f"[{event.status}, {event.attempts} essais] {event.last_error}"
+                )
+            return
+
+        count = replay_events(events)
+        self.stdout.write(self.style.SUCCESS(f"{count} événements remis en file"))
@@ -0,0 +1,65 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+
+from stores.image_pipeline import available_formats, backfill, process_pending, retry_failed
+from stores.models import ImageDerivative
+
+
+class Command(BaseCommand):
+    help = "Décline les images envoyées en WebP/AVIF à plusieurs largeurs (pool de processus, sans Celery)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help="Un seul passage puis arrêt (par défaut: boucle continue)",
+        )
+        parser.add_argument(
+            '--interval', type=float, default=5,
+            help="Secondes entre deux passages (défaut: 5)",
+        )
+        parser.add_argument(
+            '--workers', type=int,
+            help="Processus de rendu (défaut: IMAGE_PIPELINE_WORKERS)",
+        )
+        parser.add_argument(
+            '--backfill', action='store_true',
+            help="Met en file les images jamais déclinées puis continue",
+        )
+        parser.add_argument(
+            '--retry-failed', action='store_true',
+            help="Relance les déclinaisons échouées puis s'arrête",
+        )
+        parser.add_argument(
+            '--stats', action='store_true',
+            help="Affiche l'état de la file puis s'arrête",
+        )
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            rows = ImageDerivative.objects.order_by().values('status').annotate(total=Count('id')).order_by('status')
+            for row in rows:
+                self.stdout.write(f"{row['status']:<10} {row['total']}")
+            return
+
+        if options['retry_failed']:
+            count = retry_failed()
+            self.stdout.write(self.style.SUCCESS(f"{count} déclinaisons relancées"))
+            return
+
+        formats = available_formats()
+        if not formats:
+            raise CommandError("Pillow avec prise en charge WebP est requis")
+        self.stdout.write(f"Formats: {', '.join(formats)}")
+
+        if options['backfill']:
+            self.stdout.write(f"{backfill()} images mises en file")
+
+        while True:
+            totals = process_pending(workers=options['workers'])
+            if totals:
+                self.stdout.write(", ".join(f"{count} {status}" for status, count in sorted(totals.items())))
+            if options['once']:
+                break
+            time.sleep(options['interval'])
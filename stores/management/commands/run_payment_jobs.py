@@ -0,0 +1,61 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+
+from stores.models import PaymentVerificationJob
+from stores.payment_jobs import dispatch_due_jobs, requeue_dead_jobs
+from stores.webhook_events import dispatch_pending_events
+
+
+class Command(BaseCommand):
+    help = "Traite la file de vérification des paiements (worker local, sans Celery)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help="Un seul passage puis arrêt (par défaut: boucle continue)",
+        )
+        parser.add_argument(
+            '--interval', type=float, default=5,
+            help="Secondes entre deux passages (défaut: 5)",
+        )
+        parser.add_argument(
+            '--requeue-dead', action='store_true',
+            help="Relance les vérifications abandonnées puis s'arrête",
+        )
+        parser.add_argument(
+            '--provider',
+            help="Limiter --requeue-dead à un fournisseur (ex: paydunya)",
+        )
+        parser.add_argument(
+            '--stats', action='store_true',
+            help="Affiche l'état de la file par fournisseur puis s'arrête",
+        )
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            rows = (
+                PaymentVerificationJob.objects.order_by()
+                .values('provider', 'status').annotate(total=Count('id'))
+                .order_by('provider', 'status')
+            )
+            for row in rows:
+                self.stdout.write(f"{row['provider']:<15} {row['status']:<10} {row['total']}")
+            return
+
+        if options['requeue_dead']:
+            count = requeue_dead_jobs(options['provider'])
+            self.stdout.write(self.style.SUCCESS(f"{count} vérifications relancées"))
+            return
+
+        while True:
+            count = dispatch_due_jobs()
+            if count:
+                self.stdout.write(f"{count} vérifications traitées")
+            count = dispatch_pending_events()
+            if count:
+                self.stdout.write(f"{count} transactions avec webhooks en retard traitées")
+            if options['once']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,73 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+
+from stores.models import LiveStream, VideoTranscodeJob
+from stores.video_pipeline import ffmpeg_available, process_pending, retry_failed, schedule_transcode
+
+
+class Command(BaseCommand):
+    help = "Convertit les vidéos des lives en HLS, affiches et extraits (worker local, sans Celery)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help="Un seul passage puis arrêt (par défaut: boucle continue)",
+        )
+        parser.add_argument(
+            '--interval', type=float, default=10,
+            help="Secondes entre deux passages (défaut: 10)",
+        )
+        parser.add_argument(
+            '--workers', type=int,
+            help="Conversions simultanées (défaut: VIDEO_TRANSCODE_WORKERS)",
+        )
+        parser.add_argument(
+            '--backfill', action='store_true',
+            help="Met en file les vidéos jamais converties puis continue",
+        )
+        parser.add_argument(
+            '--live', type=int, action='append',
+            help="Reconvertit la vidéo de ce live (répétable) puis continue",
+        )
+        parser.add_argument(
+            '--retry-failed', action='store_true',
+            help="Relance les conversions échouées puis s'arrête",
+        )
+        parser.add_argument(
+            '--stats', action='store_true',
+            help="Affiche l'état de la file puis s'arrête",
+        )
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            rows = VideoTranscodeJob.objects.order_by().values('status').annotate(total=Count('id')).order_by('status')
+            for row in rows:
+                self.stdout.write(f"{row['status']:<10} {row['total']}")
+            return
+
+        if options['retry_failed']:
+            count = retry_failed()
+            self.stdout.write(self.style.SUCCESS(f"{count} conversions relancées"))
+            return
+
+        if not ffmpeg_available():
+            raise CommandError("ffmpeg et ffprobe sont requis (FFMPEG_BINARY, FFPROBE_BINARY)")
+
+        if options['backfill']:
+            lives = LiveStream.objects.exclude(video_file='').exclude(video_file__isnull=True).filter(
+                transcode_job__isnull=True,
+            )
+            count = sum(1 for live_stream in lives.iterator() if schedule_transcode(live_stream))
+            self.stdout.write(f"{count} vidéos mises en file")
+        for live_stream in LiveStream.objects.filter(pk__in=options['live'] or []):
+            schedule_transcode(live_stream, force=True)
+
+        while True:
+            totals = process_pending(workers=options['workers'])
+            if totals:
+                self.stdout.write(", ".join(f"{count} {status}" for status, count in sorted(totals.items())))
+            if options['once']:
+                break
+            time.sleep(options['interval'])
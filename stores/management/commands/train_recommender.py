@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from stores.collaborative import FACTORS, ITERATIONS, REGULARIZATION, train_recommender
+
+
+class Command(BaseCommand):
+    help = "Entraîne le recommandeur par filtrage collaboratif (ALS implicite)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--factors', type=int, default=FACTORS,
+            help=f"Nombre de facteurs latents (défaut: {FACTORS})",
+        )
+        parser.add_argument(
+            '--iterations', type=int, default=ITERATIONS,
+            help=f"Nombre d'itérations ALS (défaut: {ITERATIONS})",
+        )
+        parser.add_argument(
+            '--regularization', type=float, default=REGULARIZATION,
+            help=f"Régularisation L2 (défaut: {REGULARIZATION})",
+        )
+
+    def handle(self, *args, **options):
+        snapshot = train_recommender(
+            factors=options['factors'],
+            regularization=options['regularization'],
+            iterations=options['iterations'],
+        )
+        if snapshot is None:
+            self.stdout.write(self.style.WARNING("Aucune interaction (ou NumPy/SciPy absents): rien à entraîner"))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f"{snapshot.users_count} utilisateurs, {snapshot.products_count} produits, "
+            f"{snapshot.interactions_count} interactions en {snapshot.training_seconds}s"
+        ))
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2025-12-02 10:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stores', '0002_classpost_likes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductScore',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('comments_count', models.PositiveIntegerField(default=0, verbose_name='Nombre de commentaires')),
+                ('rating_sum', models.PositiveIntegerField(default=0, verbose_name='Somme des notes')),
+                ('rating_count', models.PositiveIntegerField(default=0, verbose_name="Nombre d'avis")),
+                ('engagement', models.FloatField(default=0, help_text='Partie du score indépendante du temps')),
+                ('freshness', models.FloatField(default=0, help_text='Bonus de fraîcheur au dernier recalcul')),
+                ('score', models.FloatField(db_index=True, default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='feed_score', to='stores.product')),
+            ],
+            options={
+                'verbose_name': 'Score produit',
+                'verbose_name_plural': 'Scores produits',
+                'ordering': ['-score'],
+            },
+        ),
+    ]
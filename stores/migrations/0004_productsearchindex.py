@@ -0,0 +1,83 @@
+# Generated by Django 5.2.7 on 2025-12-04 16:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+SQLITE_FORWARD = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS stores_product_fts USING fts5(
+        title, body, tokenize = 'unicode61 remove_diacritics 2'
+    )""",
+    """CREATE VIRTUAL TABLE IF NOT EXISTS stores_product_fts_vocab
+        USING fts5vocab(stores_product_fts, 'row')""",
+]
+SQLITE_BACKWARD = [
+    "DROP TABLE IF EXISTS stores_product_fts_vocab",
+    "DROP TABLE IF EXISTS stores_product_fts",
+]
+
+POSTGRES_FORWARD = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    """ALTER TABLE stores_productsearchindex ADD COLUMN search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('french', coalesce(title, '')), 'A') ||
+            setweight(to_tsvector('french', coalesce(body, '')), 'B')
+        ) STORED""",
+    """CREATE INDEX stores_productsearch_vector_idx
+        ON stores_productsearchindex USING GIN (search_vector)""",
+    """CREATE INDEX stores_productsearch_title_trgm_idx
+        ON stores_productsearchindex USING GIN (title gin_trgm_ops)""",
+]
+POSTGRES_BACKWARD = [
+    "DROP INDEX IF EXISTS stores_productsearch_title_trgm_idx",
+    "DROP INDEX IF EXISTS stores_productsearch_vector_idx",
+    "ALTER TABLE stores_productsearchindex DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def _run(schema_editor, statements):
+    with schema_editor.connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def create_search_structures(apps, schema_editor):
+    """Structures propres au moteur: FTS5 (SQLite) ou tsvector/trigrammes (PostgreSQL)"""
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        _run(schema_editor, SQLITE_FORWARD)
+    elif vendor == 'postgresql':
+        _run(schema_editor, POSTGRES_FORWARD)
+
+
+def drop_search_structures(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        _run(schema_editor, SQLITE_BACKWARD)
+    elif vendor == 'postgresql':
+        _run(schema_editor, POSTGRES_BACKWARD)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stores', '0003_productscore'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSearchIndex',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(help_text='Nom du produit normalisé', max_length=255)),
+                ('body', models.TextField(blank=True, help_text='Description, tags et catégorie normalisés')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='search_index', to='stores.product')),
+            ],
+            options={
+                'verbose_name': 'Index de recherche produit',
+                'verbose_name_plural': 'Index de recherche produits',
+            },
+        ),
+        migrations.RunPython(create_search_structures, drop_search_structures),
+    ]
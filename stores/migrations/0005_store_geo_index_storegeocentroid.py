@@ -0,0 +1,34 @@
+# Generated by Django 5.2.7 on 2025-12-06 09:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stores', '0004_productsearchindex'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='store',
+            index=models.Index(fields=['latitude', 'longitude'], name='stores_store_lat_lng_idx'),
+        ),
+        migrations.CreateModel(
+            name='StoreGeoCentroid',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('latitude', models.FloatField()),
+                ('longitude', models.FloatField()),
+                ('orders_count', models.PositiveIntegerField(default=0, verbose_name='Commandes géolocalisées')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('store', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='geo_centroid', to='stores.store')),
+            ],
+            options={
+                'verbose_name': 'Position estimée de boutique',
+                'verbose_name_plural': 'Positions estimées de boutiques',
+                'indexes': [models.Index(fields=['latitude', 'longitude'], name='stores_centroid_lat_lng_idx')],
+            },
+        ),
+    ]
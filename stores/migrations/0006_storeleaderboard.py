@@ -0,0 +1,37 @@
+# Generated by Django 5.2.7 on 2025-12-08 11:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stores', '0005_store_geo_index_storegeocentroid'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoreLeaderboard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(choices=[('global', 'Général'), ('city', 'Ville'), ('category', 'Catégorie')], default='global', max_length=20)),
+                ('scope_key', models.CharField(blank=True, help_text='Ville normalisée ou id de catégorie', max_length=100)),
+                ('scope_label', models.CharField(blank=True, max_length=100)),
+                ('rank', models.PositiveIntegerField()),
+                ('score', models.FloatField(default=0)),
+                ('total_views', models.PositiveIntegerField(default=0)),
+                ('total_likes', models.PositiveIntegerField(default=0)),
+                ('followers', models.PositiveIntegerField(default=0)),
+                ('computed_at', models.DateTimeField()),
+                ('store', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_entries', to='stores.store')),
+            ],
+            options={
+                'verbose_name': 'Classement boutique',
+                'verbose_name_plural': 'Classements boutiques',
+                'ordering': ['scope', 'scope_key', 'rank'],
+                'unique_together': {('scope', 'scope_key', 'store')},
+                'indexes': [models.Index(fields=['scope', 'scope_key', 'rank'], name='stores_leaderboard_rank_idx')],
+            },
+        ),
+    ]
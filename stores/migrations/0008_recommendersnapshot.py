@@ -0,0 +1,31 @@
+# Generated by Django 5.2.7 on 2025-12-11 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stores', '0007_productsimilarity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecommenderSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trained_at', models.DateTimeField(auto_now_add=True)),
+                ('factors', models.BinaryField()),
+                ('users_count', models.PositiveIntegerField(default=0)),
+                ('products_count', models.PositiveIntegerField(default=0)),
+                ('interactions_count', models.PositiveIntegerField(default=0)),
+                ('rank', models.PositiveSmallIntegerField(default=0, help_text='Nombre de facteurs latents')),
+                ('training_seconds', models.FloatField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Modèle de recommandation',
+                'verbose_name_plural': 'Modèles de recommandation',
+                'ordering': ['-trained_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.7 on 2025-12-12 10:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stores', '0008_recommendersnapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoreDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('views', models.IntegerField(default=0)),
+                ('likes', models.IntegerField(default=0)),
+                ('orders_count', models.PositiveIntegerField(default=0)),
+                ('pending_orders', models.PositiveIntegerField(default=0)),
+                ('delivered_orders', models.PositiveIntegerField(default=0)),
+                ('cancelled_orders', models.PositiveIntegerField(default=0, help_text='Annulées ou remboursées')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, help_text='Paiements complétés', max_digits=12)),
+                ('reviews_count', models.PositiveIntegerField(default=0)),
+                ('rating_sum', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('store', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='stores.store')),
+            ],
+            options={
+                'verbose_name': 'Statistiques quotidiennes',
+                'verbose_name_plural': 'Statistiques quotidiennes',
+                'ordering': ['store', '-date'],
+                'unique_together': {('store', 'date')},
+            },
+        ),
+    ]
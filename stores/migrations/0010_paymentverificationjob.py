@@ -0,0 +1,36 @@
+# Generated by Django 5.2.7 on 2025-12-13 16:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stores', '0009_storedailystats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentVerificationJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('provider', models.CharField(max_length=20)),
+                ('status', models.CharField(choices=[('scheduled', 'Planifiée'), ('running', 'En cours'), ('completed', 'Terminée'), ('dead', 'Abandonnée')], default='scheduled', max_length=20)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField()),
+                ('lease_expires_at', models.DateTimeField(blank=True, help_text='Fin de réservation par un worker', null=True)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('payment', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='verification_job', to='stores.payment')),
+            ],
+            options={
+                'verbose_name': 'Vérification de paiement',
+                'verbose_name_plural': 'Vérifications de paiement',
+                'ordering': ['next_attempt_at'],
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='stores_payjob_due_idx'), models.Index(fields=['provider', 'status'], name='stores_payjob_provider_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.7 on 2025-12-14 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stores', '0010_paymentverificationjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WebhookEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('provider', models.CharField(max_length=20)),
+                ('event_id', models.CharField(help_text="Identifiant de l'événement chez le fournisseur (ou empreinte du contenu)", max_length=255)),
+                ('event_type', models.CharField(blank=True, max_length=100)),
+                ('transaction_ref', models.CharField(blank=True, help_text='Transaction concernée (ordre de traitement)', max_length=200)),
+                ('payload', models.JSONField(default=dict)),
+                ('status', models.CharField(choices=[('pending', 'En attente'), ('processing', 'En cours'), ('processed', 'Traité'), ('ignored', 'Ignoré'), ('failed', 'Échoué')], default='pending', max_length=20)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('lease_expires_at', models.DateTimeField(blank=True, help_text='Fin de réservation par un worker', null=True)),
+                ('last_error', models.TextField(blank=True)),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Événement webhook',
+                'verbose_name_plural': 'Événements webhook',
+                'ordering': ['-received_at'],
+                'indexes': [models.Index(fields=['provider', 'transaction_ref', 'status'], name='stores_webhook_tx_idx'), models.Index(fields=['status', 'received_at'], name='stores_webhook_status_idx')],
+                'constraints': [models.UniqueConstraint(fields=('provider', 'event_id'), name='stores_webhook_event_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.7 on 2026-10-17 09:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stores', '0011_webhookevent'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='livestream',
+            name='hls_url',
+            field=models.CharField(blank=True, max_length=500),
+        ),
+        migrations.AddField(
+            model_name='livestream',
+            name='preview_clip',
+            field=models.FileField(blank=True, help_text='Extrait court et léger pour le feed (généré)', upload_to='live_previews/'),
+        ),
+        migrations.CreateModel(
+            name='VideoTranscodeJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(help_text='Fichier vidéo converti (video_file.name)', max_length=255)),
+                ('status', models.CharField(choices=[('pending', 'En attente'), ('processing', 'En cours'), ('ready', 'Prête'), ('failed', 'Échouée')], default='pending', max_length=20)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('lease_expires_at', models.DateTimeField(blank=True, help_text='Fin de réservation par un worker', null=True)),
+                ('last_error', models.TextField(blank=True)),
+                ('duration', models.FloatField(blank=True, help_text='Durée de la vidéo (secondes)', null=True)),
+                ('renditions', models.JSONField(blank=True, default=list, help_text='Variantes HLS produites')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('live_stream', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='transcode_job', to='stores.livestream')),
+            ],
+            options={
+                'verbose_name': 'Conversion vidéo',
+                'verbose_name_plural': 'Conversions vidéo',
+                'ordering': ['created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='stores_transcode_due_idx')],
+            },
+        ),
+    ]
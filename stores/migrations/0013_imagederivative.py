@@ -0,0 +1,36 @@
+# Generated by Django 5.2.7 on 2026-10-17 14:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stores', '0012_videotranscodejob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageDerivative',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(help_text="Fichier d'origine (ImageField.name)", max_length=255, unique=True)),
+                ('status', models.CharField(choices=[('pending', 'En attente'), ('processing', 'En cours'), ('ready', 'Prête'), ('failed', 'Échouée')], default='pending', max_length=20)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('lease_expires_at', models.DateTimeField(blank=True, help_text='Fin de réservation par un worker', null=True)),
+                ('last_error', models.TextField(blank=True)),
+                ('width', models.PositiveIntegerField(blank=True, help_text="Largeur de l'original (orientation EXIF appliquée)", null=True)),
+                ('height', models.PositiveIntegerField(blank=True, null=True)),
+                ('variants', models.JSONField(blank=True, default=list, help_text='Fichiers produits: largeur, format, nom, taille')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': "Variantes d'image",
+                'verbose_name_plural': "Variantes d'images",
+                'ordering': ['created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='stores_image_deriv_due_idx')],
+            },
+        ),
+    ]
@@ -56,6 +56,10 @@ class Store(models.Model):
         verbose_name = "Boutique"
         verbose_name_plural = "Boutiques"
         ordering = ['-is_featured', '-created_at']
+        indexes = [
+            # Préfiltre par zone (bounding box) de la découverte géographique
+            models.Index(fields=['latitude', 'longitude'], name='stores_store_lat_lng_idx'),
+        ]
 
     def save(self, *args, **kwargs):
         if not self.slug:  # Only generate slug if it's not set
@@ -453,6 +457,187 @@ class SearchHistory(models.Model):
         ordering = ['-created_at']
 
 
+class ProductScore(models.Model):
+    """Score algorithmique dénormalisé d'un produit (index du feed)
+
+    Maintenu de façon incrémentale: commentaires et avis par les signaux,
+    vues, likes et partages au vidage des compteurs (stores/counters.py).
+    Voir stores/scoring.py.
+    """
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, related_name='feed_score')
+    comments_count = models.PositiveIntegerField(default=0, verbose_name="Nombre de commentaires")
+    rating_sum = models.PositiveIntegerField(default=0, verbose_name="Somme des notes")
+    rating_count = models.PositiveIntegerField(default=0, verbose_name="Nombre d'avis")
+    engagement = models.FloatField(default=0, help_text="Partie du score indépendante du temps")
+    freshness = models.FloatField(default=0, help_text="Bonus de fraîcheur au dernier recalcul")
+    score = models.FloatField(default=0, db_index=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.product_id} - {self.score:.1f}"
+
+    class Meta:
+        verbose_name = "Score produit"
+        verbose_name_plural = "Scores produits"
+        ordering = ['-score']
+
+
+class ProductSearchIndex(models.Model):
+    """Document de recherche d'un produit (texte normalisé sans accents)
+
+    Indexé par FTS5 (SQLite) ou tsvector/GIN + trigrammes (PostgreSQL),
+    voir stores/search.py et la migration 0004.
+    """
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, related_name='search_index')
+    title = models.CharField(max_length=255, help_text="Nom du produit normalisé")
+    body = models.TextField(blank=True, help_text="Description, tags et catégorie normalisés")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.title
+
+    class Meta:
+        verbose_name = "Index de recherche produit"
+        verbose_name_plural = "Index de recherche produits"
+
+
+class ProductSimilarity(models.Model):
+    """Voisins les plus proches d'un produit (index calculé hors ligne)
+
+    TF-IDF nom/description/tags + affinité catégorie/boutique,
+    voir stores/similarity.py.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='neighbours')
+    similar = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='neighbour_of')
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+    computed_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.product_id} -> {self.similar_id} (#{self.rank})"
+
+    class Meta:
+        verbose_name = "Produit similaire"
+        verbose_name_plural = "Produits similaires"
+        ordering = ['product', 'rank']
+        unique_together = ['product', 'similar']
+        indexes = [
+            models.Index(fields=['product', 'rank'], name='stores_similarity_rank_idx'),
+        ]
+
+
+class StoreGeoCentroid(models.Model):
+    """Position estimée d'une boutique d'après ses commandes géolocalisées
+
+    Précalculée périodiquement (voir stores/geo.py) pour ne plus interroger
+    les commandes à chaque recherche géographique.
+    """
+    store = models.OneToOneField(Store, on_delete=models.CASCADE, related_name='geo_centroid')
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+    orders_count = models.PositiveIntegerField(default=0, verbose_name="Commandes géolocalisées")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.store} ({self.latitude:.4f}, {self.longitude:.4f})"
+
+    class Meta:
+        verbose_name = "Position estimée de boutique"
+        verbose_name_plural = "Positions estimées de boutiques"
+        indexes = [
+            models.Index(fields=['latitude', 'longitude'], name='stores_centroid_lat_lng_idx'),
+        ]
+
+
+class StoreLeaderboard(models.Model):
+    """Classement des boutiques (instantané recalculé périodiquement)
+
+    Un même calcul alimente le classement général, par ville et par
+    catégorie: voir stores/leaderboard.py.
+    """
+    SCOPE_CHOICES = [
+        ('global', 'Général'),
+        ('city', 'Ville'),
+        ('category', 'Catégorie'),
+    ]
+
+    scope = models.CharField(max_length=20, choices=SCOPE_CHOICES, default='global')
+    scope_key = models.CharField(max_length=100, blank=True, help_text="Ville normalisée ou id de catégorie")
+    scope_label = models.CharField(max_length=100, blank=True)
+    store = models.ForeignKey(Store, on_delete=models.CASCADE, related_name='leaderboard_entries')
+    rank = models.PositiveIntegerField()
+    score = models.FloatField(default=0)
+    total_views = models.PositiveIntegerField(default=0)
+    total_likes = models.PositiveIntegerField(default=0)
+    followers = models.PositiveIntegerField(default=0)
+    computed_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"#{self.rank} {self.store} ({self.get_scope_display()} {self.scope_label})"
+
+    class Meta:
+        verbose_name = "Classement boutique"
+        verbose_name_plural = "Classements boutiques"
+        ordering = ['scope', 'scope_key', 'rank']
+        unique_together = ['scope', 'scope_key', 'store']
+        indexes = [
+            models.Index(fields=['scope', 'scope_key', 'rank'], name='stores_leaderboard_rank_idx'),
+        ]
+
+
+
+class RecommenderSnapshot(models.Model):
+    """Modèle de recommandation entraîné (filtrage collaboratif implicite)
+
+    Facteurs utilisateurs/produits en float32 sérialisés (npz) dans `factors`,
+    voir stores/collaborative.py. Seul le plus récent est servi.
+    """
+    trained_at = models.DateTimeField(auto_now_add=True)
+    factors = models.BinaryField()
+    users_count = models.PositiveIntegerField(default=0)
+    products_count = models.PositiveIntegerField(default=0)
+    interactions_count = models.PositiveIntegerField(default=0)
+    rank = models.PositiveSmallIntegerField(default=0, help_text="Nombre de facteurs latents")
+    training_seconds = models.FloatField(default=0)
+
+    def __str__(self):
+        return f"Recommandeur du {self.trained_at:%d/%m/%Y %H:%M} ({self.users_count} utilisateurs)"
+
+    class Meta:
+        verbose_name = "Modèle de recommandation"
+        verbose_name_plural = "Modèles de recommandation"
+        ordering = ['-trained_at']
+
+
+class StoreDailyStats(models.Model):
+    """Statistiques quotidiennes d'une boutique (agrégat pour le tableau de bord)
+
+    Alimenté par les signaux et le vidage des compteurs, corrigé chaque nuit:
+    voir stores/analytics.py. Les commandes sont comptées au jour de leur
+    création, dans la colonne de leur statut actuel.
+    """
+    store = models.ForeignKey(Store, on_delete=models.CASCADE, related_name='daily_stats')
+    date = models.DateField()
+    views = models.IntegerField(default=0)
+    likes = models.IntegerField(default=0)
+    orders_count = models.PositiveIntegerField(default=0)
+    pending_orders = models.PositiveIntegerField(default=0)
+    delivered_orders = models.PositiveIntegerField(default=0)
+    cancelled_orders = models.PositiveIntegerField(default=0, help_text="Annulées ou remboursées")
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0, help_text="Paiements complétés")
+    reviews_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.store} - {self.date:%d/%m/%Y}"
+
+    class Meta:
+        verbose_name = "Statistiques quotidiennes"
+        verbose_name_plural = "Statistiques quotidiennes"
+        ordering = ['store', '-date']
+        unique_together = ['store', 'date']
+
 # Constantes pour les méthodes de paiement (utilisées dans plusieurs modèles)
 PAYMENT_METHODS = [
     ('paydunya', 'PayDunya'),
@@ -514,6 +699,86 @@ class Payment(models.Model):
         ordering = ['-created_at']
 
 
+
+class PaymentVerificationJob(models.Model):
+    """Vérification différée d'un paiement auprès de son fournisseur
+
+    État durable de la file de vérification (relances avec délai croissant
+    par fournisseur, file des échecs définitifs): voir stores/payment_jobs.py.
+    """
+    STATUS_CHOICES = [
+        ('scheduled', 'Planifiée'),
+        ('running', 'En cours'),
+        ('completed', 'Terminée'),
+        ('dead', 'Abandonnée'),
+    ]
+
+    payment = models.OneToOneField(Payment, on_delete=models.CASCADE, related_name='verification_job')
+    provider = models.CharField(max_length=20)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='scheduled')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField()
+    lease_expires_at = models.DateTimeField(null=True, blank=True, help_text="Fin de réservation par un worker")
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Vérification paiement #{self.payment_id} ({self.get_status_display()}, {self.attempts} essais)"
+
+    class Meta:
+        verbose_name = "Vérification de paiement"
+        verbose_name_plural = "Vérifications de paiement"
+        ordering = ['next_attempt_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='stores_payjob_due_idx'),
+            models.Index(fields=['provider', 'status'], name='stores_payjob_provider_idx'),
+        ]
+
+
+class WebhookEvent(models.Model):
+    """Notification reçue d'un fournisseur de paiement (webhook)
+
+    Enregistrée telle quelle dès réception (signature vérifiée, doublons
+    écartés par l'identifiant d'événement), puis traitée en différé dans
+    l'ordre d'arrivée pour une même transaction: voir stores/webhook_events.py.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'En attente'),
+        ('processing', 'En cours'),
+        ('processed', 'Traité'),
+        ('ignored', 'Ignoré'),
+        ('failed', 'Échoué'),
+    ]
+
+    provider = models.CharField(max_length=20)
+    event_id = models.CharField(max_length=255, help_text="Identifiant de l'événement chez le fournisseur (ou empreinte du contenu)")
+    event_type = models.CharField(max_length=100, blank=True)
+    transaction_ref = models.CharField(max_length=200, blank=True, help_text="Transaction concernée (ordre de traitement)")
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    lease_expires_at = models.DateTimeField(null=True, blank=True, help_text="Fin de réservation par un worker")
+    last_error = models.TextField(blank=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Webhook {self.provider} {self.event_type or self.event_id} ({self.get_status_display()})"
+
+    class Meta:
+        verbose_name = "Événement webhook"
+        verbose_name_plural = "Événements webhook"
+        ordering = ['-received_at']
+        constraints = [
+            models.UniqueConstraint(fields=['provider', 'event_id'], name='stores_webhook_event_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['provider', 'transaction_ref', 'status'], name='stores_webhook_tx_idx'),
+            models.Index(fields=['status', 'received_at'], name='stores_webhook_status_idx'),
+        ]
+
 class Order(models.Model):
     """Système de commande avec localisation"""
     STATUS_CHOICES = [
@@ -619,13 +884,19 @@ class LiveStream(models.Model):
     # Streaming / Reels vidéo
     stream_key = models.CharField(max_length=100, unique=True, blank=True)
     rtmp_url = models.URLField(blank=True)
-    hls_url = models.URLField(blank=True)
+    # URL externe ou chemin de la playlist HLS générée (/media/live_hls/...)
+    hls_url = models.CharField(max_length=500, blank=True)
     video_file = models.FileField(
         upload_to="live_videos/",
         blank=True,
         null=True,
         help_text="Vidéo du reel (MP4, 2–5 minutes)"
     )
+    preview_clip = models.FileField(
+        upload_to="live_previews/",
+        blank=True,
+        help_text="Extrait court et léger pour le feed (généré)"
+    )
     
     # Statut
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='scheduled')
@@ -798,6 +1069,80 @@ class LivePurchase(models.Model):
         ordering = ['-created_at']
 
 
+class VideoTranscodeJob(models.Model):
+    """Conversion de la vidéo d'un live (HLS multi-débits, affiche, extrait)
+
+    Une tâche par live, remise en file quand la vidéo change: voir
+    stores/video_pipeline.py.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'En attente'),
+        ('processing', 'En cours'),
+        ('ready', 'Prête'),
+        ('failed', 'Échouée'),
+    ]
+
+    live_stream = models.OneToOneField(LiveStream, on_delete=models.CASCADE, related_name='transcode_job')
+    source = models.CharField(max_length=255, help_text="Fichier vidéo converti (video_file.name)")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    lease_expires_at = models.DateTimeField(null=True, blank=True, help_text="Fin de réservation par un worker")
+    last_error = models.TextField(blank=True)
+    duration = models.FloatField(null=True, blank=True, help_text="Durée de la vidéo (secondes)")
+    renditions = models.JSONField(default=list, blank=True, help_text="Variantes HLS produites")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Conversion vidéo live #{self.live_stream_id} ({self.get_status_display()})"
+
+    class Meta:
+        verbose_name = "Conversion vidéo"
+        verbose_name_plural = "Conversions vidéo"
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='stores_transcode_due_idx'),
+        ]
+
+
+class ImageDerivative(models.Model):
+    """Variantes redimensionnées (WebP, AVIF) d'une image envoyée
+
+    Une ligne par fichier source (produits, images supplémentaires, logos,
+    avatars), quel que soit le modèle: voir stores/image_pipeline.py.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'En attente'),
+        ('processing', 'En cours'),
+        ('ready', 'Prête'),
+        ('failed', 'Échouée'),
+    ]
+
+    source = models.CharField(max_length=255, unique=True, help_text="Fichier d'origine (ImageField.name)")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    lease_expires_at = models.DateTimeField(null=True, blank=True, help_text="Fin de réservation par un worker")
+    last_error = models.TextField(blank=True)
+    width = models.PositiveIntegerField(null=True, blank=True, help_text="Largeur de l'original (orientation EXIF appliquée)")
+    height = models.PositiveIntegerField(null=True, blank=True)
+    variants = models.JSONField(default=list, blank=True, help_text="Fichiers produits: largeur, format, nom, taille")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Variantes de {self.source} ({self.get_status_display()})"
+
+    class Meta:
+        verbose_name = "Variantes d'image"
+        verbose_name_plural = "Variantes d'images"
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='stores_image_deriv_due_idx'),
+        ]
+
+
 # ============================================================================
 # 📚 FORMATIONS
 # ============================================================================
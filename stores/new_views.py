@@ -21,7 +21,7 @@ import uuid
 
 from .models import (
     # Live Commerce
-    LiveStream, LiveProduct, LiveComment, LivePurchase,
+    LiveStream, LiveProduct, LiveComment,
     # Profil Étudiant
     StudentProfile, Skill, Portfolio, Project, Recommendation,
     # Campus Jobs
@@ -33,7 +33,7 @@ from .models import (
     # Anti-arnaque
     FraudReport, AccountVerification,
     # Existants
-    Store, Product, Order, Notification
+    Store, Product, Notification
 )
 from .algorithms import (
     get_personalized_recommendations, get_geo_products,
@@ -41,6 +41,8 @@ from .algorithms import (
     get_trending_products, calculate_store_trust_score
 )
 from .ai_assistant import process_ai_request
+from .counters import increment
+from .live_checkout import PurchaseRefused, parse_quantity, purchase
 
 
 # ============================================================================
@@ -164,44 +166,28 @@ def add_product_to_live(request, live_id):
 @login_required
 @require_POST
 def purchase_from_live(request, live_id):
-    """Acheter un produit pendant un live"""
+    """
+    Acheter un produit pendant un live: stock réservé et compteurs mis à jour
+    en base dans une transaction courte (live_checkout)
+    """
     live_stream = get_object_or_404(LiveStream, id=live_id, status='live')
-    product_id = request.POST.get('product_id')
-    live_product = get_object_or_404(LiveProduct, id=product_id, live_stream=live_stream)
-    
-    quantity = int(request.POST.get('quantity', 1))
-    price = live_product.live_price or live_product.product.price
-    total = price * quantity
-    
-    # Créer la commande
-    order = Order.objects.create(
-        product=live_product.product,
-        customer=request.user,
-        store=live_stream.store,
-        quantity=quantity,
-        unit_price=price,
-        total_price=total,
-        status='pending'
-    )
-    
-    # Créer l'achat live
-    purchase = LivePurchase.objects.create(
+    data = request.POST
+    if request.content_type == 'application/json':
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError:
+            data = {}
+    live_product = get_object_or_404(
+        LiveProduct.objects.select_related('product'),
+        id=data.get('product_id'),
         live_stream=live_stream,
-        product=live_product.product,
-        customer=request.user,
-        order=order,
-        quantity=quantity,
-        price=price,
-        total=total
     )
     
-    # Mettre à jour les stats
-    live_stream.total_sales += total
-    live_stream.total_orders += 1
-    live_stream.save()
-    
-    live_product.purchases_count += quantity
-    live_product.save()
+    try:
+        quantity = parse_quantity(data.get('quantity', 1))
+        order, _ = purchase(live_stream, live_product, request.user, quantity)
+    except PurchaseRefused as e:
+        return JsonResponse({'success': False, 'error': str(e), 'reason': e.reason})
     
     return JsonResponse({'success': True, 'order_id': order.id})
 
@@ -281,8 +267,7 @@ def student_profile(request, user_id=None):
     
     # Incrémenter les vues
     if request.user != profile_user:
-        profile.profile_views += 1
-        profile.save()
+        profile.profile_views += increment('student_profile.views', profile.pk)
     
     context = {
         'profile': profile,
@@ -457,8 +442,7 @@ def job_detail(request, job_id):
         applications = applications_qs
     
     # Incrémenter les vues
-    job.views_count += 1
-    job.save()
+    job.views_count += increment('job.views', job.pk)
     
     context = {
         'job': job,
@@ -0,0 +1,269 @@
+"""
+⏱️ File de vérification des paiements
+Remplace les threads « sleep puis verify_payment » par des tâches durables:
+l'état est en base (PaymentVerificationJob), l'exécution passe par Celery
+(payments.celery) quand un broker est configuré, sinon par un worker local
+(`manage.py run_payment_jobs`). Relances à délai croissant réglables par
+fournisseur, file des échecs définitifs et plafond de vérifications
+simultanées par fournisseur.
+"""
+
+import logging
+import random
+import zlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Politique de relance par fournisseur (secondes). Surcharge possible via
+# settings.PAYMENT_VERIFICATION_POLICIES = {'wave': {'max_attempts': 20}, ...}
+DEFAULT_POLICY = {
+    'initial_delay': 10,     # première vérification après l'initiation
+    'base_interval': 15,     # délai après le premier échec
+    'factor': 2.0,           # multiplicateur à chaque essai
+    'max_interval': 900,     # délai maximal entre deux essais
+    'max_attempts': 12,      # au-delà: file des échecs définitifs
+    'max_concurrency': 4,    # vérifications simultanées pour ce fournisseur
+    'rate_limit': 5,         # appels de vérification par seconde (rapprochement)
+}
+PROVIDER_POLICIES = {
+    'paydunya': {'initial_delay': 15, 'base_interval': 20},
+    'stripe': {'initial_delay': 5, 'max_attempts': 6},
+    'paypal': {'initial_delay': 5, 'max_attempts': 6},
+    'mtn_money': {'base_interval': 30, 'max_concurrency': 2, 'rate_limit': 2},
+    'orange_money': {'base_interval': 30, 'max_concurrency': 2, 'rate_limit': 2},
+    'moov_money': {'base_interval': 30, 'max_concurrency': 2, 'rate_limit': 2},
+}
+
+# Aléa ajouté aux délais (évite que les relances partent en rafale)
+JITTER = 0.1
+
+# Durée de réservation d'une tâche par un worker (au-delà: reprise)
+LEASE_SECONDS = 120
+
+# Report quand le plafond de concurrence du fournisseur est atteint
+CONCURRENCY_RETRY_DELAY = 5
+
+FINAL_PAYMENT_STATUSES = ('completed', 'failed', 'cancelled', 'refunded')
+
+# Méthodes de Payment vérifiées automatiquement auprès du fournisseur; les
+# anciennes méthodes (orange_money, moov_money...) ne déclenchent pas d'appel API
+AUTO_VERIFIED_METHODS = ('paydunya',)
+
+# Retour de _claim quand le fournisseur est à son plafond de concurrence
+BUSY = 'busy'
+
+
+def get_policy(provider):
+    policy = dict(DEFAULT_POLICY)
+    policy.update(PROVIDER_POLICIES.get(provider, {}))
+    policy.update(getattr(settings, 'PAYMENT_VERIFICATION_POLICIES', {}).get(provider, {}))
+    return policy
+
+
+def backoff_delay(provider, attempts):
+    """Délai avant l'essai suivant, après `attempts` essais infructueux"""
+    policy = get_policy(provider)
+    delay = min(policy['base_interval'] * policy['factor'] ** max(attempts - 1, 0), policy['max_interval'])
+    return delay * (1 + random.uniform(-JITTER, JITTER))
+
+
+def celery_enabled():
+    """Celery n'est utilisé que si un broker est configuré"""
+    return bool(getattr(settings, 'CELERY_BROKER_URL', ''))
+
+
+def _enqueue(job_id, delay):
+    if not celery_enabled():
+        return  # le worker local lit la base
+    from .tasks import run_payment_verification
+    transaction.on_commit(
+        lambda: run_payment_verification.apply_async((job_id,), countdown=max(delay, 0))
+    )
+
+
+def schedule_payment_verification(payment_id, delay=None):
+    """
+    Planifie (ou avance) la vérification d'un paiement. Idempotent: une seule
+    tâche par paiement; une tâche terminée ou abandonnée est relancée.
+    """
+    from .models import Payment, PaymentVerificationJob
+
+    provider = Payment.objects.filter(pk=payment_id).values_list('payment_method', flat=True).first()
+    if provider is None:
+        return None
+    if delay is None:
+        delay = get_policy(provider)['initial_delay']
+    due = timezone.now() + timedelta(seconds=delay)
+
+    with transaction.atomic():
+        job, created = PaymentVerificationJob.objects.select_for_update().get_or_create(
+            payment_id=payment_id,
+            defaults={'provider': provider, 'next_attempt_at': due},
+        )
+        if not created:
+            if job.status in ('completed', 'dead'):
+                job.status, job.attempts, job.last_error = 'scheduled', 0, ''
+                job.next_attempt_at = due
+            elif job.status == 'scheduled':
+                job.next_attempt_at = min(job.next_attempt_at, due)
+            job.provider = provider
+            job.save(update_fields=['status', 'attempts', 'last_error', 'next_attempt_at', 'provider', 'updated_at'])
+
+    _enqueue(job.pk, delay)
+    return job
+
+
+def _provider_lock(provider):
+    """
+    Sérialise les réservations d'un fournisseur jusqu'à la fin de la
+    transaction. PostgreSQL: verrou consultatif; SQLite: inutile, l'UPDATE
+    de réservation prend le verrou d'écriture de la base.
+    """
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_xact_lock(%s)', [zlib.crc32(f'payment_jobs:{provider}'.encode())])
+
+
+def _claim(job_id):
+    """
+    Réserve une tâche due pour ce worker (UPDATE conditionnel).
+    Retourne la tâche, None si elle n'est pas due, déjà prise ou terminée,
+    ou 'busy' si le fournisseur est à son plafond de concurrence. Réservation
+    et comptage des tâches en cours se font sous le verrou du fournisseur:
+    des workers concurrents ne dépassent pas le plafond.
+    """
+    from .models import PaymentVerificationJob
+
+    now = timezone.now()
+    due = PaymentVerificationJob.objects.filter(pk=job_id, status='scheduled', next_attempt_at__lte=now)
+    provider = due.values_list('provider', flat=True).first()
+    if provider is None:
+        return None
+
+    with transaction.atomic():
+        _provider_lock(provider)
+        if not due.update(status='running', lease_expires_at=now + timedelta(seconds=LEASE_SECONDS)):
+            return None
+        running = PaymentVerificationJob.objects.filter(
+            provider=provider, status='running', lease_expires_at__gt=now,
+        ).count()
+        if running > get_policy(provider)['max_concurrency']:
+            # Réservation annulée: la tâche reste planifiée
+            transaction.set_rollback(True)
+            return BUSY
+    return PaymentVerificationJob.objects.get(pk=job_id)
+
+
+def _run_provider_verification(payment_id):
+    """Un appel de vérification (voir payment_views.verify_payment)"""
+    from .payment_views import verify_payment
+    return verify_payment(payment_id)
+
+
+def _finish(job, status, error=''):
+    job.status = status
+    job.last_error = error
+    job.lease_expires_at = None
+    if status == 'completed':
+        job.completed_at = timezone.now()
+    job.save(update_fields=['status', 'attempts', 'last_error', 'lease_expires_at', 'completed_at', 'next_attempt_at', 'updated_at'])
+
+
+def run_verification_job(job_id):
+    """
+    Exécute un essai de vérification. Retourne le statut de la tâche après
+    l'essai ('skipped' si elle n'était pas à exécuter).
+    """
+    from .models import Payment
+
+    job = _claim(job_id)
+    if job is None:
+        return 'skipped'
+    if job is BUSY:
+        from .models import PaymentVerificationJob
+        PaymentVerificationJob.objects.filter(pk=job_id, status='scheduled').update(
+            next_attempt_at=timezone.now() + timedelta(seconds=CONCURRENCY_RETRY_DELAY)
+        )
+        _enqueue(job_id, CONCURRENCY_RETRY_DELAY)
+        return 'scheduled'
+
+    job.attempts += 1
+    result, error = None, ''
+    try:
+        result = _run_provider_verification(job.payment_id)
+        if isinstance(result, dict) and not result.get('success'):
+            error = str(result.get('error') or 'Vérification refusée par le fournisseur')
+    except Exception as e:
+        logger.error(f"Payment verification job #{job.pk} error: {e}", exc_info=True)
+        error = str(e)
+
+    payment_status = Payment.objects.filter(pk=job.payment_id).values_list('status', flat=True).first()
+    if payment_status is None or payment_status in FINAL_PAYMENT_STATUSES:
+        _finish(job, 'completed')
+        return job.status
+    if result is None and not error:
+        # Méthode sans vérification automatique (voir verify_payment)
+        _finish(job, 'completed', "Pas de vérification automatique pour cette méthode")
+        return job.status
+
+    policy = get_policy(job.provider)
+    if job.attempts >= policy['max_attempts']:
+        logger.warning(
+            f"Payment verification job #{job.pk} dead after {job.attempts} attempts "
+            f"(payment #{job.payment_id}, {job.provider}): {error or 'toujours en attente'}"
+        )
+        _finish(job, 'dead', error or "Paiement toujours en attente après le dernier essai")
+        return job.status
+
+    delay = backoff_delay(job.provider, job.attempts)
+    job.next_attempt_at = timezone.now() + timedelta(seconds=delay)
+    _finish(job, 'scheduled', error)
+    _enqueue(job.pk, delay)
+    return job.status
+
+
+def recover_expired_leases():
+    """Tâches réservées par un worker disparu: remises en file"""
+    from .models import PaymentVerificationJob
+
+    return PaymentVerificationJob.objects.filter(
+        status='running', lease_expires_at__lte=timezone.now(),
+    ).update(status='scheduled', lease_expires_at=None, next_attempt_at=timezone.now())
+
+
+def dispatch_due_jobs(limit=100):
+    """
+    Balayage périodique: reprend les réservations expirées et lance les
+    tâches dues (via Celery, ou directement dans ce processus sans broker).
+    Rattrape les messages perdus au redémarrage du broker ou des workers.
+    """
+    from .models import PaymentVerificationJob
+
+    recover_expired_leases()
+    due = list(
+        PaymentVerificationJob.objects.filter(status='scheduled', next_attempt_at__lte=timezone.now())
+        .order_by('next_attempt_at').values_list('id', flat=True)[:limit]
+    )
+    if celery_enabled():
+        from .tasks import run_payment_verification
+        for job_id in due:
+            run_payment_verification.delay(job_id)
+    else:
+        for job_id in due:
+            run_verification_job(job_id)
+    return len(due)
+
+
+def requeue_dead_jobs(provider=None):
+    """Relance les tâches abandonnées (après correction côté fournisseur)"""
+    from .models import PaymentVerificationJob
+
+    dead = PaymentVerificationJob.objects.filter(status='dead')
+    if provider:
+        dead = dead.filter(provider=provider)
+    return dead.update(status='scheduled', attempts=0, next_attempt_at=timezone.now(), last_error='')
@@ -3,7 +3,6 @@ Système de paiement mobile pour MYMEDAGA
 Intégration avec les API officielles des fournisseurs
 """
 
-import requests
 import json
 import hashlib
 import hmac
@@ -14,12 +13,16 @@ import logging
 import paydunya
 from paydunya import Store, Invoice
 from .paydunya_service import configure_paydunya
+from . import payment_transport
 
 logger = logging.getLogger(__name__)
 
 
 class PaymentProvider:
     """Classe de base pour les fournisseurs de paiement"""
+
+    # Nom du fournisseur (sessions, disjoncteurs, latences: voir payment_transport)
+    provider_name = 'default'
     
     def __init__(self, api_key, api_secret, merchant_id=None, environment='production'):
         self.api_key = api_key
@@ -44,9 +47,18 @@ class PaymentProvider:
         """Vérifie le statut d'une transaction"""
         raise NotImplementedError
 
+    def _request(self, endpoint, method, url, **kwargs):
+        """Appel HTTP via la session keep-alive partagée du fournisseur"""
+        return payment_transport.request(self.provider_name, endpoint, method, url, **kwargs)
+
+    def _token_credentials(self):
+        return (self.environment, self.base_url, self.api_key, self.api_secret)
+
 
 class OrangeMoneyProvider(PaymentProvider):
     """Intégration Orange Money API"""
+
+    provider_name = 'orange_money'
     
     def get_base_url(self):
         if self.environment == 'production':
@@ -103,11 +115,11 @@ class OrangeMoneyProvider(PaymentProvider):
             }
             
             # Faire la requête
-            response = requests.post(
+            response = self._request(
+                'initiate', 'post',
                 f'{self.base_url}/cashin',
                 json=payment_data,
                 headers=headers,
-                timeout=30
             )
             
             if response.status_code == 200:
@@ -138,6 +150,8 @@ class OrangeMoneyProvider(PaymentProvider):
 class CinetPayProvider(PaymentProvider):
     """Intégration générique CinetPay (stub configurable plus tard)"""
 
+    provider_name = 'cinetpay'
+
     def get_base_url(self):
         if self.environment == 'production':
             return 'https://api-checkout.cinetpay.com'
@@ -185,10 +199,10 @@ class CinetPayProvider(PaymentProvider):
             # Signature générique (à adapter avec la doc réelle)
             payload['signature'] = self.generate_signature(payload)
 
-            response = requests.post(
+            response = self._request(
+                'initiate', 'post',
                 f'{self.base_url}/v2/payment',
                 json=payload,
-                timeout=30,
             )
 
             if response.status_code in [200, 201]:
@@ -237,6 +251,8 @@ class PayPalProvider(PaymentProvider):
     doit être faite côté serveur via un webhook ou un endpoint séparé.
     """
 
+    provider_name = 'paypal'
+
     def get_base_url(self):
         # Sandbox ou production selon l'environnement
         if self.environment == 'production':
@@ -250,22 +266,29 @@ class PayPalProvider(PaymentProvider):
         """Obtient un access token OAuth2 PayPal à partir du client_id/secret.
 
         On utilise api_key comme client_id et api_secret comme secret.
+        Le jeton est gardé en cache pendant sa durée de validité (expires_in).
         """
+        return payment_transport.get_cached_token(
+            self.provider_name, self._token_credentials(), self._fetch_access_token,
+        )
+
+    def _fetch_access_token(self):
         try:
             auth = (self.api_key, self.api_secret)
-            response = requests.post(
+            response = self._request(
+                'token', 'post',
                 f'{self.base_url}/v1/oauth2/token',
                 data={'grant_type': 'client_credentials'},
                 auth=auth,
-                timeout=30,
             )
             if response.status_code in (200, 201):
-                return response.json().get('access_token')
+                data = response.json()
+                return data.get('access_token'), data.get('expires_in')
             logger.error(f"PayPal OAuth error: {response.status_code} - {response.text}")
-            return None
+            return None, 0
         except Exception as e:
             logger.error(f"PayPal OAuth exception: {str(e)}", exc_info=True)
-            return None
+            return None, 0
 
     def initiate_payment(self, amount, phone_number, transaction_id, description="", currency="EUR"):
         """Crée un ordre PayPal et renvoie l'URL d'approbation.
@@ -310,11 +333,11 @@ class PayPalProvider(PaymentProvider):
                 'Authorization': f'Bearer {access_token}',
             }
 
-            response = requests.post(
+            response = self._request(
+                'initiate', 'post',
                 f'{self.base_url}/v2/checkout/orders',
                 json=payload,
                 headers=headers,
-                timeout=30,
             )
 
             if response.status_code in (200, 201):
@@ -340,6 +363,8 @@ class PayPalProvider(PaymentProvider):
                     'provider_response': data,
                 }
 
+            if response.status_code == 401:
+                payment_transport.invalidate_token(self.provider_name, self._token_credentials())
             logger.error(f"PayPal create order error: {response.status_code} - {response.text}")
             return {
                 'success': False,
@@ -374,6 +399,8 @@ class StripeProvider(PaymentProvider):
     L'intégration complète (Checkout Session, PaymentIntent, etc.) pourra être ajoutée ensuite.
     """
 
+    provider_name = 'stripe'
+
     def get_base_url(self):
         # Stripe utilise une base unique, la distinction test/production se fait par la clé
         return 'https://api.stripe.com'
@@ -415,6 +442,8 @@ class StripeProvider(PaymentProvider):
 class PayDunyaProvider(PaymentProvider):
     """Intégration PayDunya via la librairie officielle"""
 
+    provider_name = 'paydunya'
+
     def get_base_url(self):
         # Géré par la SDK PayDunya, pas besoin d'URL ici
         return ''
@@ -490,10 +519,10 @@ class PayDunyaProvider(PaymentProvider):
                 'Content-Type': 'application/json'
             }
             
-            response = requests.get(
+            response = self._request(
+                'verify', 'get',
                 f'{self.base_url}/transaction/{transaction_id}',
                 headers=headers,
-                timeout=30
             )
             
             if response.status_code == 200:
@@ -528,6 +557,8 @@ class FedaPayProvider(PaymentProvider):
     et renvoie une erreur contrôlée pour éviter tout appel externe non maîtrisé.
     """
 
+    provider_name = 'fedapay'
+
     def get_base_url(self):
         # À adapter avec l'URL officielle sandbox / production de FedaPay
         if self.environment == 'production':
@@ -585,6 +616,8 @@ class PaystackProvider(PaymentProvider):
     une erreur contrôlée pour éviter les appels non maîtrisés.
     """
 
+    provider_name = 'paystack'
+
     def get_base_url(self):
         # À adapter si Paystack a une URL sandbox distincte
         if self.environment == 'production':
@@ -636,6 +669,8 @@ class PaystackProvider(PaymentProvider):
 
 class MoovMoneyProvider(PaymentProvider):
     """Intégration Moov Money API"""
+
+    provider_name = 'moov_money'
     
     def get_base_url(self):
         if self.environment == 'production':
@@ -680,11 +715,11 @@ class MoovMoneyProvider(PaymentProvider):
                 'Content-Type': 'application/json'
             }
             
-            response = requests.post(
+            response = self._request(
+                'initiate', 'post',
                 f'{self.base_url}/payments/initiate',
                 json=payment_data,
                 headers=headers,
-                timeout=30
             )
             
             if response.status_code in [200, 201]:
@@ -719,10 +754,10 @@ class MoovMoneyProvider(PaymentProvider):
                 'Content-Type': 'application/json'
             }
             
-            response = requests.get(
+            response = self._request(
+                'verify', 'get',
                 f'{self.base_url}/payments/{transaction_id}',
                 headers=headers,
-                timeout=30
             )
             
             if response.status_code == 200:
@@ -751,6 +786,8 @@ class MoovMoneyProvider(PaymentProvider):
 
 class MTNMoneyProvider(PaymentProvider):
     """Intégration MTN Mobile Money API"""
+
+    provider_name = 'mtn_money'
     
     def get_base_url(self):
         if self.environment == 'production':
@@ -804,11 +841,11 @@ class MTNMoneyProvider(PaymentProvider):
                 'X-Reference-Id': transaction_id
             }
             
-            response = requests.post(
+            response = self._request(
+                'initiate', 'post',
                 f'{self.base_url}/collection/v1_0/requesttopay',
                 json=payment_data,
                 headers=headers,
-                timeout=30
             )
             
             if response.status_code in [200, 202]:
@@ -819,6 +856,8 @@ class MTNMoneyProvider(PaymentProvider):
                     'provider_response': {'status': 'PENDING'}
                 }
             else:
+                if response.status_code == 401:
+                    payment_transport.invalidate_token(self.provider_name, self._token_credentials())
                 logger.error(f"MTN API Error: {response.status_code} - {response.text}")
                 return {
                     'success': False,
@@ -834,7 +873,12 @@ class MTNMoneyProvider(PaymentProvider):
             }
     
     def get_access_token(self):
-        """Obtient le token d'accès MTN"""
+        """Obtient le token d'accès MTN (gardé en cache jusqu'à son expiration)"""
+        return payment_transport.get_cached_token(
+            self.provider_name, self._token_credentials(), self._fetch_access_token,
+        )
+
+    def _fetch_access_token(self):
         try:
             auth_string = f"{self.api_key}:{self.api_secret}"
             import base64
@@ -844,18 +888,19 @@ class MTNMoneyProvider(PaymentProvider):
                 'Authorization': f'Basic {auth_header}'
             }
             
-            response = requests.post(
+            response = self._request(
+                'token', 'post',
                 f'{self.base_url}/collection/token/',
                 headers=headers,
-                timeout=30
             )
             
             if response.status_code == 200:
-                return response.json().get('access_token')
-            return None
+                data = response.json()
+                return data.get('access_token'), data.get('expires_in')
+            return None, 0
         except Exception as e:
             logger.error(f"MTN Token Error: {str(e)}")
-            return None
+            return None, 0
     
     def verify_payment(self, transaction_id):
         """Vérifie le statut d'une transaction MTN"""
@@ -872,10 +917,10 @@ class MTNMoneyProvider(PaymentProvider):
                 'X-Target-Environment': 'production' if self.environment == 'production' else 'sandbox'
             }
             
-            response = requests.get(
+            response = self._request(
+                'verify', 'get',
                 f'{self.base_url}/collection/v1_0/requesttopay/{transaction_id}',
                 headers=headers,
-                timeout=30
             )
             
             if response.status_code == 200:
@@ -889,6 +934,8 @@ class MTNMoneyProvider(PaymentProvider):
                     'provider_response': data
                 }
             else:
+                if response.status_code == 401:
+                    payment_transport.invalidate_token(self.provider_name, self._token_credentials())
                 return {
                     'success': False,
                     'error': f"Erreur vérification: {response.status_code}"
@@ -904,6 +951,8 @@ class MTNMoneyProvider(PaymentProvider):
 
 class WaveProvider(PaymentProvider):
     """Intégration Wave API"""
+
+    provider_name = 'wave'
     
     def get_base_url(self):
         if self.environment == 'production':
@@ -940,11 +989,11 @@ class WaveProvider(PaymentProvider):
                 'Content-Type': 'application/json'
             }
             
-            response = requests.post(
+            response = self._request(
+                'initiate', 'post',
                 f'{self.base_url}/checkout/initialize',
                 json=payment_data,
                 headers=headers,
-                timeout=30
             )
             
             if response.status_code in [200, 201]:
@@ -979,10 +1028,10 @@ class WaveProvider(PaymentProvider):
                 'Content-Type': 'application/json'
             }
             
-            response = requests.get(
+            response = self._request(
+                'verify', 'get',
                 f'{self.base_url}/checkout/{transaction_id}',
                 headers=headers,
-                timeout=30
             )
             
             if response.status_code == 200:
@@ -0,0 +1,331 @@
+"""
+🔌 Transport HTTP des fournisseurs de paiement
+Une session requests par fournisseur (connexions keep-alive réutilisées, pool
+dimensionné par fournisseur), délais de connexion/lecture par fournisseur,
+disjoncteur qui coupe les appels vers un fournisseur en panne, cache des
+jetons d'accès OAuth (durée de vie = expires_in) et histogrammes de latence
+par fournisseur et par appel.
+"""
+
+import hashlib
+import logging
+import threading
+import time
+from collections import defaultdict
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+# Réglages par fournisseur (secondes). Surcharge possible via
+# settings.PAYMENT_TRANSPORT_POLICIES = {'mtn_money': {'read_timeout': 45}, ...}
+DEFAULT_TRANSPORT = {
+    'connect_timeout': 5,      # établissement TCP/TLS
+    'read_timeout': 30,        # attente de la réponse
+    'pool_maxsize': 10,        # connexions gardées ouvertes vers le fournisseur
+    'failure_threshold': 5,    # échecs consécutifs avant ouverture du disjoncteur
+    'reset_timeout': 30,       # durée d'ouverture avant un appel d'essai
+}
+PROVIDER_TRANSPORT = {
+    'mtn_money': {'read_timeout': 45, 'pool_maxsize': 20},
+    'orange_money': {'read_timeout': 45, 'pool_maxsize': 20},
+    'moov_money': {'read_timeout': 45},
+    'wave': {'read_timeout': 20, 'pool_maxsize': 20},
+    'paypal': {'read_timeout': 20},
+    'cinetpay': {'read_timeout': 20},
+}
+
+# Marge retirée à expires_in avant de considérer un jeton comme expiré
+TOKEN_EXPIRY_MARGIN = 60
+
+# Bornes des histogrammes de latence (millisecondes)
+LATENCY_BUCKETS_MS = (25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+
+class ProviderUnavailable(requests.RequestException):
+    """Disjoncteur ouvert: le fournisseur n'est pas appelé"""
+
+
+def get_transport_policy(provider):
+    policy = dict(DEFAULT_TRANSPORT)
+    policy.update(PROVIDER_TRANSPORT.get(provider, {}))
+    policy.update(getattr(settings, 'PAYMENT_TRANSPORT_POLICIES', {}).get(provider, {}))
+    return policy
+
+
+# ---------------------------------------------------------------------------
+# Sessions
+# ---------------------------------------------------------------------------
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def _build_session(provider):
+    policy = get_transport_policy(provider)
+    # Seules les erreurs de connexion sont rejouées: la requête n'est pas
+    # encore partie, pas de risque de double paiement
+    retries = Retry(total=1, connect=1, read=0, status=0, other=0, redirect=0)
+    adapter = HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=policy['pool_maxsize'],
+        max_retries=retries,
+    )
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_session(provider):
+    """Session partagée (par processus) vers un fournisseur"""
+    session = _sessions.get(provider)
+    if session is None:
+        with _sessions_lock:
+            session = _sessions.get(provider)
+            if session is None:
+                session = _sessions[provider] = _build_session(provider)
+    return session
+
+
+def close_sessions():
+    """Ferme toutes les connexions ouvertes (tests, arrêt du processus)"""
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+
+# ---------------------------------------------------------------------------
+# Disjoncteurs
+# ---------------------------------------------------------------------------
+
+class CircuitBreaker:
+    """
+    Fermé: appels normaux. Ouvert (après `failure_threshold` échecs
+    consécutifs): appels refusés pendant `reset_timeout` secondes.
+    Semi-ouvert: un seul appel d'essai, qui referme ou rouvre le circuit.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def retry_in(self):
+        if self.opened_at is None:
+            return 0
+        return max(0, round(self.reset_timeout - (time.monotonic() - self.opened_at)))
+
+    def record_success(self):
+        with self._lock:
+            self.state, self.failures, self.opened_at = self.CLOSED, 0, None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state, self.opened_at = self.OPEN, time.monotonic()
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(provider):
+    breaker = _breakers.get(provider)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.get(provider)
+            if breaker is None:
+                policy = get_transport_policy(provider)
+                breaker = _breakers[provider] = CircuitBreaker(
+                    policy['failure_threshold'], policy['reset_timeout'],
+                )
+    return breaker
+
+
+# ---------------------------------------------------------------------------
+# Latences
+# ---------------------------------------------------------------------------
+
+class LatencyHistogram:
+    """Histogramme cumulatif (par processus) des durées d'appel"""
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.total_ms = 0.0
+        self.errors = 0
+
+    @property
+    def count(self):
+        return sum(self.counts)
+
+    def observe(self, elapsed_ms, error=False):
+        for i, bound in enumerate(LATENCY_BUCKETS_MS):
+            if elapsed_ms <= bound:
+                break
+        else:
+            i = len(LATENCY_BUCKETS_MS)
+        self.counts[i] += 1
+        self.total_ms += elapsed_ms
+        if error:
+            self.errors += 1
+
+    def percentile(self, q):
+        """Borne supérieure du seau contenant le quantile q (0-1)"""
+        count = self.count
+        if not count:
+            return 0
+        rank, seen = q * count, 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return LATENCY_BUCKETS_MS[i] if i < len(LATENCY_BUCKETS_MS) else float('inf')
+        return float('inf')
+
+    def as_dict(self):
+        count = self.count
+        return {
+            'count': count,
+            'errors': self.errors,
+            'avg_ms': round(self.total_ms / count, 2) if count else 0,
+            'p50_ms': self.percentile(0.5),
+            'p95_ms': self.percentile(0.95),
+            'p99_ms': self.percentile(0.99),
+            'buckets': dict(zip([*LATENCY_BUCKETS_MS, '+inf'], self.counts)),
+        }
+
+
+_histograms = defaultdict(LatencyHistogram)
+_histograms_lock = threading.Lock()
+
+
+def _observe(provider, endpoint, elapsed_ms, error):
+    with _histograms_lock:
+        _histograms[(provider, endpoint)].observe(elapsed_ms, error)
+
+
+def transport_metrics():
+    """
+    Métriques du processus courant:
+    - latency: histogramme par (fournisseur, appel)
+    - breakers: état du disjoncteur de chaque fournisseur appelé
+    """
+    with _histograms_lock:
+        latency = {f'{p}.{e}': h.as_dict() for (p, e), h in sorted(_histograms.items())}
+    return {
+        'latency': latency,
+        'breakers': {
+            provider: {'state': b.state, 'failures': b.failures, 'retry_in': b.retry_in()}
+            for provider, b in sorted(_breakers.items())
+        },
+    }
+
+
+def reset_transport():
+    """Remet à zéro sessions, disjoncteurs et histogrammes (tests, benchmark)"""
+    close_sessions()
+    with _breakers_lock:
+        _breakers.clear()
+    with _histograms_lock:
+        _histograms.clear()
+
+
+# ---------------------------------------------------------------------------
+# Appels
+# ---------------------------------------------------------------------------
+
+def request(provider, endpoint, method, url, **kwargs):
+    """
+    Appel HTTP vers un fournisseur via sa session partagée.
+    `endpoint` nomme l'appel dans les histogrammes ('initiate', 'verify', 'token'...).
+    Lève ProviderUnavailable si le disjoncteur est ouvert; les erreurs réseau
+    et les réponses 5xx comptent comme des échecs du fournisseur.
+    """
+    breaker = get_breaker(provider)
+    if not breaker.allow():
+        raise ProviderUnavailable(
+            f"Fournisseur {provider} indisponible (nouvel essai dans {breaker.retry_in()} s)"
+        )
+
+    if 'timeout' not in kwargs:
+        policy = get_transport_policy(provider)
+        kwargs['timeout'] = (policy['connect_timeout'], policy['read_timeout'])
+
+    started = time.perf_counter()
+    try:
+        response = get_session(provider).request(method, url, **kwargs)
+    except requests.RequestException:
+        _observe(provider, endpoint, (time.perf_counter() - started) * 1000, True)
+        breaker.record_failure()
+        raise
+
+    failed = response.status_code >= 500
+    _observe(provider, endpoint, (time.perf_counter() - started) * 1000, failed)
+    if failed:
+        breaker.record_failure()
+    else:
+        breaker.record_success()
+    return response
+
+
+# ---------------------------------------------------------------------------
+# Jetons d'accès
+# ---------------------------------------------------------------------------
+
+_token_locks = defaultdict(threading.Lock)
+
+
+def _token_key(provider, *credentials):
+    digest = hashlib.sha256(':'.join(str(c) for c in credentials).encode()).hexdigest()[:16]
+    return f'payments:token:{provider}:{digest}'
+
+
+def get_cached_token(provider, credentials, fetch):
+    """
+    Jeton d'accès partagé par tous les appels utilisant les mêmes identifiants.
+    `fetch()` retourne (jeton, expires_in) ou (None, 0); le jeton est gardé
+    expires_in - TOKEN_EXPIRY_MARGIN secondes. Un seul appel à `fetch` par
+    processus à la fois pour une même clé.
+    """
+    key = _token_key(provider, *credentials)
+    token = cache.get(key)
+    if token:
+        return token
+
+    with _token_locks[key]:
+        token = cache.get(key)
+        if token:
+            return token
+        token, expires_in = fetch()
+        try:
+            ttl = int(expires_in or 0) - TOKEN_EXPIRY_MARGIN
+        except (TypeError, ValueError):
+            ttl = 0
+        if token and ttl > 0:
+            cache.set(key, token, ttl)
+        return token
+
+
+def invalidate_token(provider, credentials):
+    """Jeton refusé par le fournisseur (401): redemandé au prochain appel"""
+    cache.delete(_token_key(provider, *credentials))
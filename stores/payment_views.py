@@ -355,7 +355,8 @@ def verify_payment(payment_id):
     # Pour l'instant, on ne vérifie automatiquement que les paiements PayDunya.
     # Les anciens paiements (orange_money, moov_money, etc.) ne sont plus supportés
     # et ne doivent pas déclencher d'appels API.
-    if payment.payment_method != 'paydunya':
+    from .payment_jobs import AUTO_VERIFIED_METHODS
+    if payment.payment_method not in AUTO_VERIFIED_METHODS:
         logger.info(f"Skipping verification for legacy payment method: {payment.payment_method}")
         return
     
@@ -379,13 +380,21 @@ def verify_payment(payment_id):
             if new_status == 'completed':
                 payment.paid_at = timezone.now()
                 
-                # Mettre à jour la commande
-                if payment.order:
-                    with transaction.atomic():
+                with transaction.atomic():
+                    # Verrou sur le paiement: un seul appelant (vue, tâche, webhook)
+                    # le complète et notifie le vendeur
+                    current_status = Payment.objects.select_for_update().filter(
+                        pk=payment.pk
+                    ).values_list('status', flat=True).first()
+                    if current_status in ['completed', 'failed', 'cancelled']:
+                        return result
+                    payment.save()
+                    
+                    # Mettre à jour la commande
+                    if payment.order:
                         payment.order.payment_status = 'completed'
                         payment.order.status = 'confirmed'
                         payment.order.save()
-                        payment.save()
                         
                         # Notification au vendeur
                         from .models import Notification
@@ -410,19 +419,11 @@ def verify_payment(payment_id):
 
 def verify_payment_async(payment_id):
     """
-    Vérifie un paiement de manière asynchrone (à implémenter avec Celery en production)
-    Pour l'instant, on fait une vérification après un délai
+    Planifie la vérification d'un paiement dans la file durable
+    (délai, relances et plafond de concurrence par fournisseur: voir payment_jobs.py)
     """
-    import threading
-    import time
-    
-    def verify_after_delay():
-        time.sleep(10)  # Attendre 10 secondes
-        verify_payment(payment_id)
-    
-    thread = threading.Thread(target=verify_after_delay)
-    thread.daemon = True
-    thread.start()
+    from .payment_jobs import schedule_payment_verification
+    return schedule_payment_verification(payment_id)
 
 
 @csrf_exempt
@@ -430,8 +431,11 @@ def verify_payment_async(payment_id):
 def payment_webhook(request, provider):
     """
     Webhook pour recevoir les notifications des fournisseurs de paiement
-    C'est ici que la vraie validation se fait côté serveur
+    C'est ici que la vraie validation se fait côté serveur: signature vérifiée,
+    événement enregistré une seule fois puis traité en différé (webhook_events.py)
     """
+    from .webhook_events import ingest_webhook
+
     try:
         # Récupérer les données du webhook
         if request.content_type == 'application/json':
@@ -439,9 +443,6 @@ def payment_webhook(request, provider):
         else:
             data = request.POST.dict()
         
-        # Journaliser la requête webhook
-        logger.info(f"Webhook received from {provider}: {json.dumps(data)}")
-        
         # Extraire l'ID de transaction
         transaction_id = data.get('transaction_id') or data.get('order_id') or data.get('reference')
         
@@ -449,90 +450,19 @@ def payment_webhook(request, provider):
             logger.warning(f"Webhook without transaction_id from {provider}")
             return HttpResponse('Missing transaction_id', status=400)
         
-        # Trouver le paiement
-        try:
-            payment = Payment.objects.get(transaction_id=transaction_id)
-        except Payment.DoesNotExist:
-            logger.warning(f"Payment not found for transaction_id: {transaction_id}")
-            return HttpResponse('Payment not found', status=404)
-        
         # Vérifier la signature du webhook (sécurité)
         if not verify_webhook_signature(request, provider, data):
             logger.error(f"Invalid webhook signature from {provider}")
             return HttpResponse('Invalid signature', status=403)
         
-        # Traiter selon le statut du webhook
-        status = data.get('status', '').upper()
-        
-        if status in ['SUCCESS', 'SUCCESSFUL', 'COMPLETED', 'PAID']:
-            # Paiement réussi - VALIDATION CÔTÉ SERVEUR
-            with transaction.atomic():
-                payment.status = 'completed'
-                payment.paid_at = timezone.now()
-                payment.metadata = data
-                payment.save()
-                
-                # Traiter selon le type de paiement
-                if payment.order:
-                    payment.order.payment_status = 'completed'
-                    payment.order.status = 'confirmed'
-                    payment.order.save()
-                    
-                    # Notification
-                    from .models import Notification
-                    Notification.objects.create(
-                        user=payment.order.store.owner,
-                        notification_type='order',
-                        message=f"✅ Paiement confirmé pour la commande #{payment.order.id}",
-                        link=f"/dashboard/"
-                    )
-                
-                elif payment.subscription:
-                    payment.subscription.status = 'completed'
-                    payment.subscription.is_active = True
-                    payment.subscription.store.is_verified = True
-                    payment.subscription.store.save()
-                    payment.subscription.save()
-                    
-                    # Notification
-                    from .models import Notification
-                    Notification.objects.create(
-                        user=payment.subscription.store.owner,
-                        notification_type='order',
-                        message=f"✅ Abonnement activé! Votre boutique est maintenant vérifiée.",
-                        link=f"/dashboard/"
-                    )
-                
-                elif payment.promotion:
-                    payment.promotion.status = 'active'
-                    payment.promotion.save()
-                    
-                    # Activer la promotion
-                    if payment.promotion.promotion_type == 'product' and payment.promotion.product:
-                        payment.promotion.product.is_featured = True
-                        payment.promotion.product.featured_until = payment.promotion.expires_at
-                        payment.promotion.product.save()
-                    elif payment.promotion.promotion_type == 'store' and payment.promotion.store:
-                        payment.promotion.store.is_featured = True
-                        payment.promotion.store.save()
-                    
-                    # Notification
-                    from .models import Notification
-                    Notification.objects.create(
-                        user=payment.promotion.store.owner if payment.promotion.store else payment.promotion.product.store.owner,
-                        notification_type='order',
-                        message=f"✅ Promotion activée!",
-                        link=f"/dashboard/"
-                    )
-            
-            logger.info(f"Payment confirmed via webhook: Payment #{payment.id}")
-            
-        elif status in ['FAILED', 'CANCELLED', 'REJECTED']:
-            payment.status = 'failed'
-            payment.metadata = data
-            payment.save()
-            logger.warning(f"Payment failed via webhook: Payment #{payment.id}")
-        
+        event, created = ingest_webhook(
+            provider,
+            data,
+            event_id=request.headers.get('X-Event-Id') or data.get('event_id'),
+            event_type=str(data.get('status', '')),
+            transaction_ref=str(transaction_id),
+        )
+        logger.info(f"Webhook received from {provider}: {transaction_id} (event #{event.pk}, new: {created})")
         return HttpResponse('OK', status=200)
         
     except Exception as e:
@@ -732,6 +662,12 @@ def create_stripe_promotion_intent(request, promotion_id):
 
 @csrf_exempt
 def stripe_webhook(request):
+    """
+    Webhook Stripe: signature vérifiée, événement enregistré une seule fois
+    (id d'événement Stripe) puis traité en différé (webhook_events.py)
+    """
+    from .webhook_events import ingest_webhook
+
     payload = request.body
     sig_header = request.META.get("HTTP_STRIPE_SIGNATURE", "")
     webhook_secret = getattr(settings, 'STRIPE_WEBHOOK_SECRET', '')
@@ -743,126 +679,14 @@ def stripe_webhook(request):
     except Exception:
         return HttpResponse(status=400)
 
-    if event.get("type") == "payment_intent.succeeded":
-        data_object = event["data"]["object"]
-        metadata = data_object.get("metadata", {}) or {}
-        amount_received = data_object.get("amount_received") or data_object.get("amount")
-        currency = data_object.get("currency", "eur").upper()
-
-        order_id = metadata.get("order_id")
-        subscription_id = metadata.get("subscription_id")
-        promotion_id = metadata.get("promotion_id")
-
-        # Paiement commande (Stripe Connect avec split 1%)
-        if order_id:
-            try:
-                order = Order.objects.get(id=order_id)
-            except Order.DoesNotExist:
-                return HttpResponse(status=200)
-
-            with transaction.atomic():
-                payment = Payment.objects.create(
-                    order=order,
-                    amount=(amount_received or 0) / 100 if amount_received else order.get_total_with_delivery(),
-                    payment_method='stripe',
-                    status='completed',
-                    transaction_id=data_object.get("id", ""),
-                    external_id=data_object.get("id", ""),
-                    metadata=data_object,
-                    paid_at=timezone.now(),
-                )
-
-                order.payment_status = 'completed'
-                order.status = 'confirmed'
-                order.payment_method = 'stripe'
-                order.save()
-
-                from .models import Notification
-                Notification.objects.create(
-                    user=order.store.owner,
-                    notification_type='order',
-                    message=f"Nouvelle commande #{order.id} - Paiement Stripe reçu: {payment.amount} {currency}",
-                    link=f"/dashboard/",
-                )
-
-        # Paiement abonnement (certification boutique)
-        elif subscription_id:
-            try:
-                subscription = Subscription.objects.get(id=subscription_id)
-            except Subscription.DoesNotExist:
-                return HttpResponse(status=200)
-
-            with transaction.atomic():
-                payment = Payment.objects.create(
-                    subscription=subscription,
-                    amount=(amount_received or 0) / 100 if amount_received else float(subscription.amount),
-                    payment_method='stripe',
-                    status='completed',
-                    transaction_id=data_object.get("id", ""),
-                    external_id=data_object.get("id", ""),
-                    metadata=data_object,
-                    paid_at=timezone.now(),
-                )
-
-                subscription.status = 'completed'
-                subscription.is_active = True
-                subscription.store.is_verified = True
-                subscription.store.save()
-                subscription.save()
-
-                from .models import Notification
-                Notification.objects.create(
-                    user=subscription.store.owner,
-                    notification_type='order',
-                    message="Votre abonnement de vérification a été payé et votre boutique est maintenant vérifiée.",
-                    link=f"/dashboard/",
-                )
-
-        # Paiement promotion
-        elif promotion_id:
-            try:
-                promotion = Promotion.objects.get(id=promotion_id)
-            except Promotion.DoesNotExist:
-                return HttpResponse(status=200)
-
-            with transaction.atomic():
-                payment = Payment.objects.create(
-                    promotion=promotion,
-                    amount=(amount_received or 0) / 100 if amount_received else float(promotion.amount),
-                    payment_method='stripe',
-                    status='completed',
-                    transaction_id=data_object.get("id", ""),
-                    external_id=data_object.get("id", ""),
-                    metadata=data_object,
-                    paid_at=timezone.now(),
-                )
-
-                promotion.status = 'active'
-                promotion.save()
-
-                # Activer la mise en avant
-                if promotion.promotion_type == 'product' and promotion.product:
-                    promotion.product.is_featured = True
-                    promotion.product.featured_until = promotion.expires_at
-                    promotion.product.save()
-                    owner = promotion.product.store.owner
-                else:
-                    if promotion.store:
-                        promotion.store.is_featured = True
-                        promotion.store.save()
-                        owner = promotion.store.owner
-                    else:
-                        owner = None
-
-                if owner:
-                    from .models import Notification
-                    Notification.objects.create(
-                        user=owner,
-                        notification_type='order',
-                        message="Votre promotion a été activée avec succès.",
-                        link=f"/dashboard/",
-                    )
-
+    data_object = (event.get("data") or {}).get("object") or {}
+    ingest_webhook(
+        'stripe',
+        json.loads(payload),
+        event_id=event.get("id"),
+        event_type=event.get("type", ""),
+        transaction_ref=data_object.get("id", ""),
+    )
     return HttpResponse(status=200)
 
 
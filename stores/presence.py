@@ -0,0 +1,290 @@
+"""
+👀 Présence des spectateurs des lives
+Chaque connexion WebSocket est un membre du live (`live_{id}`) rafraîchi par
+un battement de cœur; un membre sans battement depuis PRESENCE_TTL secondes
+(processus ASGI disparu) sort du compte. Redis (ensemble trié, score = dernier
+battement) quand REDIS_URL est configuré, sinon mémoire du processus.
+
+Le nombre de spectateurs est poussé aux clients au plus une fois par
+BROADCAST_INTERVAL (dernière valeur toujours envoyée) et écrit en base
+périodiquement (viewers_count, peak_viewers via Greatest), seulement pour les
+lives dont le compte a changé.
+"""
+
+import asyncio
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.models import F, Q, Value
+from django.db.models.functions import Greatest
+
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+# Battement de cœur envoyé par chaque connexion (secondes)
+HEARTBEAT_INTERVAL = getattr(settings, 'PRESENCE_HEARTBEAT_INTERVAL', 25)
+
+# Au-delà, un membre sans battement est retiré du compte
+PRESENCE_TTL = getattr(settings, 'PRESENCE_TTL', 75)
+
+# Intervalle minimal entre deux envois du compte à un live
+BROADCAST_INTERVAL = getattr(settings, 'PRESENCE_BROADCAST_INTERVAL', 2)
+
+# Écriture des comptes en base; en mode mémoire elle se fait directement
+# dans le processus ASGI une fois l'intervalle dépassé
+PERSIST_INTERVAL = getattr(settings, 'PRESENCE_PERSIST_INTERVAL', 15)
+
+
+class MemoryPresence:
+    """Présence locale au processus (développement, tests)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._members = defaultdict(dict)
+        self._peaks = {}
+        self._broadcasts = {}
+        self.persisted_at = time.time()
+
+    def _prune(self, live_id, now):
+        members = self._members[live_id]
+        for channel in [c for c, seen in members.items() if seen < now - PRESENCE_TTL]:
+            del members[channel]
+        return len(members)
+
+    def touch(self, live_id, channel, now):
+        with self._lock:
+            self._members[live_id][channel] = now
+            count = self._prune(live_id, now)
+            self._peaks[live_id] = max(self._peaks.get(live_id, 0), count)
+            return count
+
+    def leave(self, live_id, channel, now):
+        with self._lock:
+            self._members[live_id].pop(channel, None)
+            return self._prune(live_id, now)
+
+    def count(self, live_id, now):
+        with self._lock:
+            return self._prune(live_id, now) if live_id in self._members else 0
+
+    def snapshot(self, now):
+        """{live_id: (spectateurs, pic)} des lives suivis"""
+        with self._lock:
+            return {
+                live_id: (self._prune(live_id, now), self._peaks.get(live_id, 0))
+                for live_id in list(self._members)
+            }
+
+    def forget(self, live_ids):
+        """Lives vides, déjà écrits en base: plus suivis"""
+        with self._lock:
+            for live_id in live_ids:
+                if not self._members.get(live_id):
+                    self._members.pop(live_id, None)
+                    self._peaks.pop(live_id, None)
+
+    def reserve_broadcast(self, live_id, interval, now):
+        with self._lock:
+            last = self._broadcasts.get(live_id)
+            if last is None or now - last >= interval:
+                self._broadcasts[live_id] = now
+                return 0
+            return interval - (now - last)
+
+    def clear(self):
+        with self._lock:
+            self._members.clear()
+            self._peaks.clear()
+            self._broadcasts.clear()
+
+
+class RedisPresence:
+    """Présence partagée entre tous les processus ASGI"""
+
+    PREFIX = 'presence:'
+
+    # Battement + purge des membres expirés + compte + pic, en un aller-retour
+    TOUCH_SCRIPT = """
+    redis.call('ZADD', KEYS[1], ARGV[2], ARGV[1])
+    redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[2] - ARGV[3])
+    redis.call('EXPIRE', KEYS[1], ARGV[3] * 2)
+    redis.call('SADD', KEYS[2], ARGV[4])
+    local count = redis.call('ZCARD', KEYS[1])
+    local peak = tonumber(redis.call('HGET', KEYS[3], ARGV[4]) or 0)
+    if count > peak then redis.call('HSET', KEYS[3], ARGV[4], count) end
+    return count
+    """
+
+    def __init__(self, url):
+        self.client = redis.Redis.from_url(url)
+        self._touch = self.client.register_script(self.TOUCH_SCRIPT)
+        self.persisted_at = time.time()
+
+    def _key(self, live_id):
+        return f'{self.PREFIX}live:{live_id}'
+
+    def touch(self, live_id, channel, now):
+        return self._touch(
+            keys=[self._key(live_id), f'{self.PREFIX}lives', f'{self.PREFIX}peaks'],
+            args=[channel, now, PRESENCE_TTL, live_id],
+        )
+
+    def leave(self, live_id, channel, now):
+        pipe = self.client.pipeline()
+        pipe.zrem(self._key(live_id), channel)
+        pipe.zremrangebyscore(self._key(live_id), '-inf', now - PRESENCE_TTL)
+        pipe.zcard(self._key(live_id))
+        return pipe.execute()[-1]
+
+    def count(self, live_id, now):
+        pipe = self.client.pipeline()
+        pipe.zremrangebyscore(self._key(live_id), '-inf', now - PRESENCE_TTL)
+        pipe.zcard(self._key(live_id))
+        return pipe.execute()[-1]
+
+    def snapshot(self, now):
+        live_ids = sorted(int(live_id) for live_id in self.client.smembers(f'{self.PREFIX}lives'))
+        if not live_ids:
+            return {}
+        pipe = self.client.pipeline()
+        for live_id in live_ids:
+            pipe.zremrangebyscore(self._key(live_id), '-inf', now - PRESENCE_TTL)
+            pipe.zcard(self._key(live_id))
+        counts = pipe.execute()[1::2]
+        peaks = self.client.hmget(f'{self.PREFIX}peaks', live_ids)
+        return {
+            live_id: (count, int(peak or 0))
+            for live_id, count, peak in zip(live_ids, counts, peaks)
+        }
+
+    def forget(self, live_ids):
+        # Un battement arrivé entre-temps remet le live dans l'ensemble
+        if live_ids:
+            self.client.srem(f'{self.PREFIX}lives', *live_ids)
+            self.client.hdel(f'{self.PREFIX}peaks', *live_ids)
+
+    def reserve_broadcast(self, live_id, interval, now):
+        key = f'{self.PREFIX}broadcast:{live_id}'
+        if self.client.set(key, 1, nx=True, px=int(interval * 1000)):
+            return 0
+        return max(self.client.pttl(key), 0) / 1000
+
+    def clear(self):
+        keys = list(self.client.scan_iter(f'{self.PREFIX}*'))
+        if keys:
+            self.client.delete(*keys)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_presence():
+    """Redis si REDIS_URL est configuré, sinon présence en mémoire"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                url = getattr(settings, 'REDIS_URL', '')
+                if url and REDIS_AVAILABLE:
+                    _backend = RedisPresence(url)
+                else:
+                    _backend = MemoryPresence()
+    return _backend
+
+
+def _live_id(live_id):
+    return int(live_id)
+
+
+def touch(live_id, channel):
+    """Connexion ou battement de cœur; retourne le nombre de spectateurs"""
+    return get_presence().touch(_live_id(live_id), channel, time.time())
+
+
+def leave(live_id, channel):
+    return get_presence().leave(_live_id(live_id), channel, time.time())
+
+
+def viewers(live_id):
+    return get_presence().count(_live_id(live_id), time.time())
+
+
+# ---------------------------------------------------------------------------
+# Diffusion du compte
+# ---------------------------------------------------------------------------
+
+# Envois différés en attente dans ce processus (un par live)
+_trailing = {}
+
+
+async def push_viewer_count(channel_layer, live_id):
+    """
+    Envoie le compte au groupe du live, au plus une fois par
+    BROADCAST_INTERVAL; un changement pendant l'intervalle est envoyé à son
+    terme (la dernière valeur n'est jamais perdue)
+    """
+    from asgiref.sync import sync_to_async
+
+    live_id = _live_id(live_id)
+    delay = await sync_to_async(get_presence().reserve_broadcast)(live_id, BROADCAST_INTERVAL, time.time())
+    if delay:
+        if live_id not in _trailing:
+            _trailing[live_id] = asyncio.ensure_future(_push_later(channel_layer, live_id, delay))
+        return False
+
+    count = await sync_to_async(viewers)(live_id)
+    await channel_layer.group_send(f'live_{live_id}', {'type': 'viewer_count', 'count': count})
+    return True
+
+
+async def _push_later(channel_layer, live_id, delay):
+    try:
+        await asyncio.sleep(delay)
+    finally:
+        _trailing.pop(live_id, None)
+    await push_viewer_count(channel_layer, live_id)
+
+
+# ---------------------------------------------------------------------------
+# Écriture en base
+# ---------------------------------------------------------------------------
+
+def persist_presence():
+    """
+    Écrit viewers_count et peak_viewers des lives suivis: un UPDATE par
+    couple (spectateurs, pic) distinct, seulement pour les lignes qui
+    changent; le pic en base ne baisse jamais (Greatest)
+    """
+    from .models import LiveStream
+
+    backend = get_presence()
+    backend.persisted_at = time.time()
+    snapshot = backend.snapshot(time.time())
+
+    groups = defaultdict(list)
+    for live_id, values in snapshot.items():
+        groups[values].append(live_id)
+
+    rows = 0
+    for (count, peak), live_ids in groups.items():
+        rows += LiveStream.objects.filter(
+            ~Q(viewers_count=count) | Q(peak_viewers__lt=peak),
+            pk__in=live_ids,
+        ).update(viewers_count=count, peak_viewers=Greatest(F('peak_viewers'), Value(count), Value(peak)))
+
+    backend.forget([live_id for live_id, (count, _) in snapshot.items() if count == 0])
+    return {'lives': len(snapshot), 'rows': rows}
+
+
+def maybe_persist():
+    """En mode mémoire (pas de tâche périodique partagée): écriture depuis le processus ASGI"""
+    backend = get_presence()
+    if isinstance(backend, MemoryPresence) and time.time() - backend.persisted_at >= PERSIST_INTERVAL:
+        return persist_presence()
+    return None
@@ -1,120 +1,35 @@
-from django.db.models import Count, Q, F, Case, When, Value, IntegerField, BooleanField, Avg, Sum, ExpressionWrapper, DurationField, FloatField
-from django.db.models.functions import Coalesce, ExtractDay
+from django.db.models import Count, Q, F, Case, When, Value, IntegerField, Sum
+from django.db.models.functions import ExtractDay
 from django.utils import timezone
 from datetime import timedelta
-import random
 
-from .models import Product, Store, Promotion, Subscription, Category, SearchHistory, Like, Favorite
+from .models import Product, Store, Promotion, Subscription, SearchHistory, Like, Favorite
 
 
 def get_similar_products(product, limit=5, user=None):
     """Retourne une liste de produits similaires pour les recommandations.
-    
-    Nouvelle logique de scoring :
-    - Même catégorie : +30 points
-    - Même boutique : +20 points
-    - Mots-clés similaires : +10 points par mot-clé correspondant
-    - Produit en vedette : +15 points
-    - Boutique vérifiée : +10 points
-    - Note moyenne : + (note * 5) points
-    - Nombre de vues : + (vues / 100) points
-    - Nombre de likes : + (likes * 2) points
-    - Fraîcheur : + (jours depuis création / 10) points
+
+    Lecture des voisins précalculés (ProductSimilarity, voir stores/similarity.py):
+    une seule requête indexée sur (product, rank). Tant que le produit n'a pas
+    encore été indexé, complète avec les mieux classés de la même catégorie.
     """
-    from django.db.models.functions import Length
-    
-    # Récupérer les mots-clés du produit
-    keywords = set()
-    if product.name:
-        keywords.update(product.name.lower().split()[:5])
-    if product.description:
-        keywords.update(product.description.lower().split()[:10])
-    
-    # Créer une requête de base
-    qs = Product.objects.exclude(id=product.id)
-    
-    # Calculer le score pour chaque produit
-    qs = qs.annotate(
-        # Score de base
-        score=Value(0, output_field=IntegerField()),
-        
-        # Score pour la catégorie
-        category_score=Case(
-            When(category=product.category, then=Value(30)),
-            default=Value(0),
-            output_field=IntegerField()
-        ),
-        
-        # Score pour la boutique
-        store_score=Case(
-            When(store=product.store, then=Value(20)),
-            default=Value(0),
-            output_field=IntegerField()
-        ),
-        
-        # Score pour les mots-clés (à calculer plus tard)
-        keyword_score=Value(0, output_field=IntegerField()),
-        
-        # Score pour les produits en vedette
-        featured_score=Case(
-            When(is_featured=True, then=Value(15)),
-            default=Value(0),
-            output_field=IntegerField()
-        ),
-        
-        # Score pour les boutiques vérifiées
-        verified_score=Case(
-            When(store__is_verified=True, then=Value(10)),
-            default=Value(0),
-            output_field=IntegerField()
-        ),
-        
-        # Score pour la note moyenne
-        rating_score=Coalesce(
-            Avg('reviews__rating') * 5,
-            Value(0),
-            output_field=IntegerField()
-        ),
-        
-        # Score pour les vues
-        views_score=F('views_count') / 100,
-        
-        # Score pour les likes
-        likes_score=F('likes_count') * 2,
-        
-        # Score de fraîcheur (plus récent = meilleur score)
-        # Utilisation d'une approche différente pour calculer les jours écoulés
-        days_since_created=ExpressionWrapper(
-            (timezone.now().date() - F('created_at__date')),
-            output_field=DurationField()
-        ),
-        # Conversion en score (1 jour = 0.1 point)
-        freshness_score=Case(
-            When(created_at__isnull=False, then=Value(10.0)),  # Valeur par défaut pour les nouveaux produits
-            default=Value(0.0),
-            output_field=FloatField()
-        )
+    similar = list(
+        Product.objects.filter(neighbour_of__product=product)
+        .select_related('store')
+        .order_by('neighbour_of__rank')[:limit]
     )
-    
-    # Calculer le score total
-    qs = qs.annotate(
-        total_score=(
-            F('category_score') + 
-            F('store_score') + 
-            F('featured_score') + 
-            F('verified_score') + 
-            F('rating_score') + 
-            F('views_score') + 
-            F('likes_score') + 
-            Coalesce(F('freshness_score'), 0.0)
+    if len(similar) < limit:
+        fallback = Product.objects.exclude(
+            id__in=[product.id] + [p.id for p in similar]
+        ).select_related('store')
+        if product.category_id:
+            fallback = fallback.filter(category_id=product.category_id)
+        else:
+            fallback = fallback.filter(store_id=product.store_id)
+        similar += list(
+            fallback.order_by('-feed_score__score', '-created_at')[:limit - len(similar)]
         )
-    )
-    
-    # Trier par score total
-    qs = qs.order_by('-total_score', '-created_at')
-    
-    # Limiter les résultats
-    return qs[:limit]
+    return similar
 
 
 def get_promoted_products(limit=10):
@@ -137,104 +52,19 @@ def get_verified_store_products(limit=10):
 def get_personalized_feed(user, limit=20):
     """Génère un fil d'actualité personnalisé selon la hiérarchie demandée
     
-    Nouvelle hiérarchie de recommandation :
-    1. Produits des boutiques suivies par l'utilisateur (s'ils existent)
+    Hiérarchie de recommandation (viviers entrelacés, voir feed.py) :
+    1. Produits des boutiques suivies par l'utilisateur
     2. Produits des catégories préférées de l'utilisateur
-    3. Produits similaires aux produits likés/consultés
-    4. Produits tendance (les plus populaires)
+    3. Produits proches des produits likés
+    4. Produits tendance (index ProductScore)
     5. Nouveautés (derniers produits ajoutés)
     
-    Chaque section est limitée pour assurer de la diversité dans les recommandations.
+    Les viviers sont mis en cache par utilisateur et l'ordre est stable
+    sur une période donnée (graine déterministe).
     """
-    from django.db.models import Count, Q, F, Case, When, Value, IntegerField
-    from django.utils import timezone
-    
-    # Initialiser la liste des produits recommandés
-    recommended_products = []
-    
-    # 1. Produits des boutiques suivies
-    if user is not None and user.is_authenticated:
-        followed_stores = user.following.values_list('store_id', flat=True)
-        if followed_stores:
-            followed_products = Product.objects.filter(
-                store_id__in=followed_stores
-            ).annotate(
-                is_followed_store=Value(True, output_field=BooleanField())
-            ).order_by('-created_at')
-            
-            # Prendre jusqu'à 30% des recommandations
-            take = min(limit // 3, followed_products.count())
-            recommended_products.extend(list(followed_products[:take]))
-    
-    # 2. Produits des catégories préférées
-    if user is not None and user.is_authenticated and len(recommended_products) < limit:
-        # Récupérer les catégories préférées de l'utilisateur
-        favorite_categories = Category.objects.filter(
-            products__favorites__user=user
-        ).annotate(
-            fav_count=Count('products__favorites')
-        ).order_by('-fav_count')[:3]
-        
-        if favorite_categories:
-            category_products = Product.objects.filter(
-                category__in=favorite_categories
-            ).exclude(
-                id__in=[p.id for p in recommended_products]
-            ).annotate(
-                is_favorite_category=Value(True, output_field=BooleanField())
-            ).order_by('-created_at')
-            
-            # Prendre jusqu'à 30% des recommandations
-            take = min(limit // 3, category_products.count())
-            recommended_products.extend(list(category_products[:take]))
-    
-    # 3. Produits similaires aux produits likés/consultés
-    if user is not None and user.is_authenticated and len(recommended_products) < limit:
-        # Récupérer les produits likés par l'utilisateur
-        liked_products = Product.objects.filter(
-            likes__user=user
-        ).order_by('-likes__created_at')[:3]
-        
-        similar_products = []
-        for product in liked_products:
-            # Obtenir des produits similaires pour chaque produit aimé
-            similar = get_similar_products(product, limit=3)
-            similar_products.extend([p for p in similar if p not in recommended_products])
-        
-        # Ajouter jusqu'à 20% des recommandations
-        take = min(limit // 5, len(similar_products))
-        recommended_products.extend(similar_products[:take])
-    
-    # 4. Produits tendance (les plus populaires)
-    if len(recommended_products) < limit:
-        needed = limit - len(recommended_products)
-        if needed > 0:
-            # Produits les plus populaires (vues + likes)
-            trending_products = Product.objects.annotate(
-                popularity=Count('likes') * 2 + Count('views_count')
-            ).exclude(
-                id__in=[p.id for p in recommended_products]
-            ).order_by('-popularity', '-created_at')
-            
-            # Prendre jusqu'à 20% des recommandations
-            take = min(needed, trending_products.count())
-            recommended_products.extend(list(trending_products[:take]))
-    
-    # 5. Derniers produits ajoutés (pour compléter)
-    if len(recommended_products) < limit:
-        needed = limit - len(recommended_products)
-        if needed > 0:
-            new_products = Product.objects.exclude(
-                id__in=[p.id for p in recommended_products]
-            ).order_by('-created_at')[:needed]
-            
-            recommended_products.extend(list(new_products))
-    
-    # Mélanger les recommandations pour plus de variété
-    random.shuffle(recommended_products)
+    from .feed import build_feed
     
-    # Retourner le nombre demandé de produits
-    return recommended_products[:limit]
+    return build_feed(user, limit=limit)
 
 
 def get_store_recommendations(store, limit=5):
@@ -0,0 +1,280 @@
+"""
+🧾 Rapprochement des paiements en attente
+Parcourt par pages les Payment et PaymentTransaction restés `pending`, les
+vérifie en parallèle auprès de leur fournisseur (asyncio: plafond de
+concurrence et débit maximal par fournisseur) puis écrit les changements de
+statut par lots (bulk_update), avec les effets d'un paiement confirmé
+(commande confirmée, notification du vendeur, statistiques de la boutique).
+"""
+
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .payment_jobs import AUTO_VERIFIED_METHODS, get_policy
+
+logger = logging.getLogger(__name__)
+
+# Paiements plus récents ignorés (laissés au webhook et à la file de vérification)
+MIN_AGE_SECONDS = 300
+
+# Lignes lues, vérifiées et écrites par passage
+PAGE_SIZE = 200
+
+# Méthode de PaymentTransaction -> fournisseur de payment_providers
+TRANSACTION_PROVIDERS = {
+    'orange': 'orange_money',
+    'mtn': 'mtn_money',
+    'moov': 'moov_money',
+    'wave': 'wave',
+    'paypal': 'paypal',
+}
+
+# Statuts renvoyés par les fournisseurs et reportés en base
+FINAL_STATUSES = ('completed', 'failed', 'cancelled')
+
+METRICS_CACHE_KEY = 'reconciliation:last_run'
+
+
+class RateLimiter:
+    """
+    Espacement asynchrone des appels: au plus `rate` par seconde. Pas de
+    verrou: la réservation d'un créneau ne cède jamais la boucle. Réutilisé
+    d'une page à l'autre pour que le débit tienne sur tout le passage.
+    """
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0
+        self._next = 0.0
+
+    async def acquire(self):
+        now = time.monotonic()
+        wait = self._next - now
+        self._next = max(now, self._next) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+def _get_provider(name, environment):
+    from .payment_providers import get_payment_provider
+    return get_payment_provider(name, environment)
+
+
+def _verify(provider, transaction_id):
+    try:
+        return provider.verify_payment(transaction_id)
+    except Exception as e:
+        logger.error(f"Reconciliation: {provider.provider_name} {transaction_id}: {e}", exc_info=True)
+        return {'success': False, 'error': str(e)}
+
+
+async def _verify_all(items, environment, limiters):
+    """
+    items: [(fournisseur, transaction_id)]. Retourne les résultats dans le
+    même ordre. Les appels HTTP (synchrones, sessions keep-alive partagées de
+    payment_transport) tournent dans un pool de threads.
+    """
+    providers, semaphores = {}, {}
+    for name in {name for name, _ in items}:
+        policy = get_policy(name)
+        providers[name] = _get_provider(name, environment)
+        semaphores[name] = asyncio.Semaphore(policy['max_concurrency'])
+        if name not in limiters:
+            limiters[name] = RateLimiter(policy['rate_limit'])
+
+    loop = asyncio.get_running_loop()
+    workers = sum(get_policy(name)['max_concurrency'] for name in providers) or 1
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='reconcile') as executor:
+        async def verify(name, transaction_id):
+            async with semaphores[name]:
+                await limiters[name].acquire()
+                return await loop.run_in_executor(executor, _verify, providers[name], transaction_id)
+
+        return await asyncio.gather(*(verify(name, tx) for name, tx in items))
+
+
+def _verify_page(items, environment, limiters):
+    if not items:
+        return []
+    return asyncio.run(_verify_all(items, environment, limiters))
+
+
+def _new_status(result):
+    if isinstance(result, dict) and result.get('success') and result.get('status') in FINAL_STATUSES:
+        return result['status']
+    return None
+
+
+def _apply_payments(payments, results):
+    """Écrit les paiements dont le statut a changé; retourne leur nombre"""
+    from .analytics import refresh_store_day
+    from .models import Notification, Order, Payment
+
+    changes = {
+        payment.pk: (payment, result)
+        for payment, result in zip(payments, results)
+        if _new_status(result)
+    }
+    if not changes:
+        return 0
+
+    now = timezone.now()
+    with transaction.atomic():
+        # Verrou: un webhook ou la file de vérification a pu passer entre-temps
+        still_pending = set(
+            Payment.objects.select_for_update()
+            .filter(pk__in=changes, status='pending').values_list('pk', flat=True)
+        )
+        updated = []
+        for pk in still_pending:
+            payment, result = changes[pk]
+            payment.status = _new_status(result)
+            payment.metadata.update(result.get('provider_response') or {})
+            if payment.status == 'completed':
+                payment.paid_at = now
+            payment.updated_at = now
+            updated.append(payment)
+        Payment.objects.bulk_update(updated, ['status', 'metadata', 'paid_at', 'updated_at'], batch_size=500)
+
+        order_ids = [p.order_id for p in updated if p.status == 'completed' and p.order_id]
+        orders = list(Order.objects.filter(pk__in=order_ids).select_related('store'))
+        Order.objects.filter(pk__in=order_ids).update(payment_status='completed', status='confirmed')
+        amounts = {p.order_id: p.amount for p in updated if p.order_id}
+        Notification.objects.bulk_create([
+            Notification(
+                user_id=order.store.owner_id,
+                notification_type='order',
+                message=f"Nouvelle commande #{order.id} - Paiement reçu: {amounts[order.id]}€",
+                link="/dashboard/",
+            )
+            for order in orders
+        ])
+
+        # bulk_update / update ne déclenchent pas les signaux des statistiques
+        for order in orders:
+            refresh_store_day(order.store_id, now)
+            refresh_store_day(order.store_id, order.created_at)
+
+    logger.info(f"Reconciliation: {len(updated)} payments updated ({len(orders)} orders confirmed)")
+    return len(updated)
+
+
+def _apply_transactions(transactions, results):
+    from payments.models import PaymentTransaction
+
+    changes = {
+        tx.pk: (tx, result)
+        for tx, result in zip(transactions, results)
+        if _new_status(result)
+    }
+    if not changes:
+        return 0
+
+    now = timezone.now()
+    with transaction.atomic():
+        still_pending = set(
+            PaymentTransaction.objects.select_for_update()
+            .filter(pk__in=changes, status='pending').values_list('pk', flat=True)
+        )
+        updated = []
+        for pk in still_pending:
+            tx, result = changes[pk]
+            tx.status = _new_status(result)
+            tx.verified_at = now
+            updated.append(tx)
+        PaymentTransaction.objects.bulk_update(updated, ['status', 'verified_at'], batch_size=500)
+    return len(updated)
+
+
+def _pages(queryset, page_size):
+    """Pagination par clé (id croissant): stable pendant que des lignes changent de statut"""
+    last_id = 0
+    while True:
+        page = list(queryset.filter(id__gt=last_id).order_by('id')[:page_size])
+        if not page:
+            return
+        yield page
+        last_id = page[-1].id
+
+
+def _configured_transaction_providers(environment):
+    """Fournisseurs de PaymentTransaction dont les identifiants sont renseignés"""
+    configured = {}
+    for method, name in TRANSACTION_PROVIDERS.items():
+        try:
+            if _get_provider(name, environment).api_key:
+                configured[method] = name
+        except Exception as e:
+            logger.warning(f"Reconciliation: provider {name} unavailable: {e}")
+    return configured
+
+
+def reconcile_pending_payments(min_age=MIN_AGE_SECONDS, page_size=PAGE_SIZE, limit=None,
+                               include_transactions=True):
+    """
+    Vérifie tous les paiements en attente depuis plus de `min_age` secondes
+    (au plus `limit` lignes par modèle). Retourne et met en cache un rapport:
+    lignes vérifiées, mises à jour, erreurs, durée et débit (vérifications/s).
+    """
+    from .models import Payment
+    from payments.models import PaymentTransaction
+
+    environment = getattr(settings, 'PAYMENT_ENVIRONMENT', 'sandbox')
+    cutoff = timezone.now() - timedelta(seconds=min_age)
+    started = time.perf_counter()
+    report = {'checked': 0, 'updated': 0, 'errors': 0, 'by_provider': {}}
+    limiters = {}
+
+    def run(queryset, provider_of, apply):
+        checked = 0
+        for page in _pages(queryset, page_size):
+            if limit is not None:
+                page = page[:limit - checked]
+            items = [(provider_of(row), row.transaction_id) for row in page]
+            results = _verify_page(items, environment, limiters)
+            report['updated'] += apply(page, results)
+            for (name, _), result in zip(items, results):
+                stats = report['by_provider'].setdefault(name, {'checked': 0, 'errors': 0})
+                stats['checked'] += 1
+                if not (isinstance(result, dict) and result.get('success')):
+                    stats['errors'] += 1
+                    report['errors'] += 1
+            checked += len(page)
+            if limit is not None and checked >= limit:
+                break
+        report['checked'] += checked
+
+    payments = (
+        Payment.objects.filter(status='pending', payment_method__in=AUTO_VERIFIED_METHODS, created_at__lte=cutoff)
+        .exclude(transaction_id='')
+        .only('id', 'transaction_id', 'payment_method', 'status', 'metadata', 'order_id', 'amount')
+    )
+    run(payments, lambda payment: payment.payment_method, _apply_payments)
+
+    if include_transactions:
+        providers = _configured_transaction_providers(environment)
+        if providers:
+            transactions = PaymentTransaction.objects.filter(
+                status='pending', payment_method__in=providers, created_at__lte=cutoff,
+            ).only('id', 'transaction_id', 'payment_method', 'status')
+            run(transactions, lambda tx: providers[tx.payment_method], _apply_transactions)
+
+    seconds = time.perf_counter() - started
+    report['seconds'] = round(seconds, 2)
+    report['throughput'] = round(report['checked'] / seconds, 1) if seconds else 0
+    report['finished_at'] = time.time()
+    cache.set(METRICS_CACHE_KEY, report, None)
+    return report
+
+
+def last_reconciliation():
+    """Rapport du dernier passage (None si aucun)"""
+    return cache.get(METRICS_CACHE_KEY)
@@ -0,0 +1,209 @@
+"""
+📈 Index de score du feed (ProductScore)
+Maintenu de façon incrémentale au lieu d'être recalculé à chaque requête
+"""
+
+from datetime import timedelta
+
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+# Poids du score algorithmique (identiques à calculate_product_score)
+LIKE_WEIGHT = 3
+COMMENT_WEIGHT = 2
+SHARE_WEIGHT = 5
+VIEW_WEIGHT = 0.1
+FEATURED_BONUS = 10
+VERIFIED_BONUS = 5
+RATING_WEIGHT = 2
+
+# Fraîcheur: +10 à la création, -0.5 par jour (nul après 20 jours)
+FRESHNESS_MAX = 10
+FRESHNESS_DECAY_PER_DAY = 0.5
+FRESHNESS_WINDOW_DAYS = int(FRESHNESS_MAX / FRESHNESS_DECAY_PER_DAY)
+
+# Champs compteurs de Product déjà répercutés par bump_product_score
+COUNTER_FIELDS = {'views_count', 'likes_count', 'shares_count', 'updated_at'}
+
+
+def compute_freshness(created_at, now=None):
+    """Bonus de fraîcheur pour un produit créé à `created_at`"""
+    now = now or timezone.now()
+    days_old = (now - created_at).days
+    return max(0, FRESHNESS_MAX - days_old * FRESHNESS_DECAY_PER_DAY)
+
+
+def compute_engagement(product, comments_count, rating_sum, rating_count, is_verified):
+    """Partie du score indépendante du temps"""
+    engagement = (
+        product.likes_count * LIKE_WEIGHT
+        + comments_count * COMMENT_WEIGHT
+        + product.shares_count * SHARE_WEIGHT
+        + product.views_count * VIEW_WEIGHT
+    )
+    if product.is_currently_featured():
+        engagement += FEATURED_BONUS
+    if is_verified:
+        engagement += VERIFIED_BONUS
+    if rating_count:
+        engagement += round(rating_sum / rating_count, 1) * RATING_WEIGHT
+    return engagement
+
+
+def bump_product_score(product_id, likes=0, comments=0, shares=0, views=0, create_missing=True):
+    """
+    Applique un delta au score d'un produit avec un UPDATE atomique (F()).
+    Si la ligne n'existe pas encore, elle est calculée entièrement.
+    """
+    updated = bump_product_scores(
+        [product_id], likes=likes, comments=comments, shares=shares, views=views
+    )
+    if not updated and create_missing:
+        refresh_product_score(product_id)
+
+
+def bump_product_scores(product_ids, likes=0, comments=0, shares=0, views=0):
+    """Même delta appliqué à plusieurs produits en un seul UPDATE"""
+    from .models import ProductScore
+
+    delta = (
+        likes * LIKE_WEIGHT
+        + comments * COMMENT_WEIGHT
+        + shares * SHARE_WEIGHT
+        + views * VIEW_WEIGHT
+    )
+    updates = {
+        'engagement': F('engagement') + delta,
+        'score': F('score') + delta,
+        'updated_at': timezone.now(),
+    }
+    if comments:
+        updates['comments_count'] = F('comments_count') + comments
+
+    return ProductScore.objects.filter(product_id__in=product_ids).update(**updates)
+
+
+def refresh_product_score(product_id, create_missing=True):
+    """Recalcule entièrement le score d'un seul produit"""
+    from .models import Product
+
+    return rebuild_product_scores(
+        Product.objects.filter(pk=product_id),
+        create_missing=create_missing,
+    )
+
+
+def rebuild_product_scores(queryset=None, batch_size=500, dry_run=False, create_missing=True):
+    """
+    Recalcule les scores à partir des données sources, par lots.
+    Trois requêtes par lot (produits, commentaires, avis) puis
+    bulk_create/bulk_update.
+
+    Retourne des statistiques: produits traités, lignes créées, mises à jour
+    et lignes dont l'engagement stocké avait divergé (contrôle de cohérence).
+    """
+    from .models import Product, Comment, Review, ProductScore
+
+    if queryset is None:
+        queryset = Product.objects.all()
+
+    queryset = queryset.select_related('store').only(
+        'id', 'likes_count', 'shares_count', 'views_count', 'is_featured',
+        'featured_until', 'created_at', 'store__is_verified',
+    ).order_by('pk')
+
+    stats = {'processed': 0, 'created': 0, 'updated': 0, 'drift': 0}
+    now = timezone.now()
+    last_pk = 0
+
+    while True:
+        batch = list(queryset.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            break
+        last_pk = batch[-1].pk
+        ids = [product.pk for product in batch]
+
+        comments = dict(
+            Comment.objects.filter(product_id__in=ids)
+            .values_list('product_id')
+            .annotate(n=Count('id'))
+        )
+        ratings = {
+            row['product_id']: (row['total'], row['n'])
+            for row in Review.objects.filter(product_id__in=ids)
+            .values('product_id')
+            .annotate(total=Sum('rating'), n=Count('id'))
+        }
+        existing = {
+            score.product_id: score
+            for score in ProductScore.objects.filter(product_id__in=ids)
+        }
+
+        to_create, to_update = [], []
+        for product in batch:
+            comments_count = comments.get(product.pk, 0)
+            rating_sum, rating_count = ratings.get(product.pk, (0, 0))
+            engagement = compute_engagement(
+                product, comments_count, rating_sum, rating_count, product.store.is_verified
+            )
+            freshness = compute_freshness(product.created_at, now)
+
+            score = existing.get(product.pk)
+            if score is None:
+                if create_missing:
+                    to_create.append(ProductScore(
+                        product_id=product.pk,
+                        comments_count=comments_count,
+                        rating_sum=rating_sum,
+                        rating_count=rating_count,
+                        engagement=engagement,
+                        freshness=freshness,
+                        score=engagement + freshness,
+                    ))
+                continue
+
+            if (score.comments_count != comments_count
+                    or abs(score.engagement - engagement) > 0.01):
+                stats['drift'] += 1
+
+            score.comments_count = comments_count
+            score.rating_sum = rating_sum
+            score.rating_count = rating_count
+            score.engagement = engagement
+            score.freshness = freshness
+            score.score = engagement + freshness
+            score.updated_at = now
+            to_update.append(score)
+
+        stats['processed'] += len(batch)
+        stats['created'] += len(to_create)
+        stats['updated'] += len(to_update)
+
+        if dry_run:
+            continue
+        if to_create:
+            ProductScore.objects.bulk_create(to_create, ignore_conflicts=True)
+        if to_update:
+            ProductScore.objects.bulk_update(to_update, [
+                'comments_count', 'rating_sum', 'rating_count',
+                'engagement', 'freshness', 'score', 'updated_at',
+            ])
+
+    return stats
+
+
+def refresh_decaying_scores():
+    """
+    Recalcule les scores qui dépendent du temps: produits encore dans la
+    fenêtre de fraîcheur (ou qui viennent d'en sortir) et mises en vedette
+    limitées dans le temps.
+    """
+    from .models import Product
+
+    since = timezone.now() - timedelta(days=FRESHNESS_WINDOW_DAYS + 1)
+    queryset = Product.objects.filter(
+        Q(created_at__gte=since)
+        | Q(feed_score__freshness__gt=0)
+        | Q(is_featured=True, featured_until__isnull=False)
+    ).distinct()
+    return rebuild_product_scores(queryset)
@@ -0,0 +1,292 @@
+"""
+🔎 Moteur de recherche produits
+FTS5 (SQLite, développement) ou tsvector/GIN + trigrammes (PostgreSQL),
+insensible aux accents, tolérant aux fautes de frappe, avec une pertinence
+mêlée à la popularité (index ProductScore).
+"""
+
+import difflib
+import logging
+import math
+import re
+import unicodedata
+
+from django.db import connection, DatabaseError
+from django.db.models import Case, When, Value, FloatField
+
+logger = logging.getLogger(__name__)
+
+# Pondération finale: pertinence textuelle / popularité
+RELEVANCE_WEIGHT = 0.8
+POPULARITY_WEIGHT = 0.2
+
+# Nombre maximum de candidats classés par requête
+MAX_CANDIDATES = 300
+
+# Poids BM25 des colonnes FTS5 (titre, corps)
+BM25_WEIGHTS = (10.0, 1.0)
+
+# Correction orthographique (SQLite): similarité minimale et longueur minimale
+FUZZY_CUTOFF = 0.75
+FUZZY_MIN_LENGTH = 4
+
+STOPWORDS = {
+    'a', 'au', 'aux', 'avec', 'ce', 'ces', 'dans', 'de', 'des', 'du', 'en',
+    'et', 'la', 'le', 'les', 'ou', 'par', 'pour', 'sur', 'un', 'une',
+}
+
+SQLITE_TABLE = 'stores_product_fts'
+SQLITE_VOCAB_TABLE = 'stores_product_fts_vocab'
+
+_TOKEN_RE = re.compile(r'\w+')
+
+
+def fold_text(value):
+    """Minuscules sans accents: 'Crème brûlée' -> 'creme brulee'"""
+    if not value:
+        return ''
+    value = value.replace('œ', 'oe').replace('Œ', 'oe').replace('æ', 'ae').replace('Æ', 'ae')
+    value = unicodedata.normalize('NFKD', value)
+    return ''.join(c for c in value if not unicodedata.combining(c)).lower()
+
+
+def tokenize(query):
+    """Mots significatifs d'une requête (normalisés, sans mots vides)"""
+    return [
+        token for token in _TOKEN_RE.findall(fold_text(query))
+        if token not in STOPWORDS and (len(token) > 1 or token.isdigit())
+    ][:10]
+
+
+# ----------------------------------------------------------------------------
+# Indexation
+# ----------------------------------------------------------------------------
+
+def build_document(product, tag_names=None):
+    """Titre et corps normalisés d'un produit"""
+    if tag_names is None:
+        tag_names = [tag.name for tag in product.tags.all()]
+    parts = [product.short_description, product.description, ' '.join(tag_names)]
+    if product.category_id:
+        parts.append(product.category.name)
+    return fold_text(product.name)[:255], fold_text(' '.join(p for p in parts if p))
+
+
+def _sqlite_write(rows):
+    """Remplace les lignes FTS5 (rowid = id du produit)"""
+    try:
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"DELETE FROM {SQLITE_TABLE} WHERE rowid = %s", [(row[0],) for row in rows]
+            )
+            cursor.executemany(
+                f"INSERT INTO {SQLITE_TABLE} (rowid, title, body) VALUES (%s, %s, %s)", rows
+            )
+    except DatabaseError as exc:
+        logger.warning("Index FTS5 indisponible: %s", exc)
+
+
+def sync_product_index(product):
+    """Met à jour le document de recherche d'un produit (appelé à la sauvegarde)"""
+    from .models import ProductSearchIndex
+
+    title, body = build_document(product)
+    ProductSearchIndex.objects.update_or_create(
+        product=product, defaults={'title': title, 'body': body}
+    )
+    if connection.vendor == 'sqlite':
+        _sqlite_write([(product.pk, title, body)])
+
+
+def remove_product_index(product_id):
+    """Supprime la ligne FTS5 d'un produit supprimé (PostgreSQL: cascade)"""
+    if connection.vendor != 'sqlite':
+        return
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {SQLITE_TABLE} WHERE rowid = %s", [product_id])
+    except DatabaseError as exc:
+        logger.warning("Index FTS5 indisponible: %s", exc)
+
+
+def rebuild_search_index(batch_size=500):
+    """Reconstruit tout l'index de recherche par lots. Retourne le nombre de produits."""
+    from .models import Product, ProductSearchIndex
+
+    if connection.vendor == 'sqlite':
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(f"DELETE FROM {SQLITE_TABLE}")
+        except DatabaseError as exc:
+            logger.warning("Index FTS5 indisponible: %s", exc)
+
+    products = Product.objects.select_related('category').prefetch_related('tags').order_by('pk')
+    total, last_pk = 0, 0
+    while True:
+        batch = list(products.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            break
+        last_pk = batch[-1].pk
+
+        entries, rows = [], []
+        for product in batch:
+            title, body = build_document(product, [tag.name for tag in product.tags.all()])
+            entries.append(ProductSearchIndex(product=product, title=title, body=body))
+            rows.append((product.pk, title, body))
+
+        ProductSearchIndex.objects.bulk_create(
+            entries, update_conflicts=True, unique_fields=['product'],
+            update_fields=['title', 'body', 'updated_at'],
+        )
+        if connection.vendor == 'sqlite':
+            _sqlite_write(rows)
+        total += len(batch)
+    return total
+
+
+# ----------------------------------------------------------------------------
+# Recherche
+# ----------------------------------------------------------------------------
+
+def _fts_term(token):
+    return f'"{token}"*'
+
+
+def _sqlite_corrections(cursor, token):
+    """Termes proches d'un mot mal orthographié, d'après le vocabulaire FTS5"""
+    if len(token) < FUZZY_MIN_LENGTH or token.isdigit():
+        return []
+    cursor.execute(
+        f"SELECT term FROM {SQLITE_VOCAB_TABLE} "
+        "WHERE term >= %s AND term < %s AND length(term) BETWEEN %s AND %s",
+        [token[0], chr(ord(token[0]) + 1), len(token) - 2, len(token) + 2],
+    )
+    terms = [row[0] for row in cursor.fetchall()]
+    return difflib.get_close_matches(token, terms, n=3, cutoff=FUZZY_CUTOFF)
+
+
+def _restriction(column, queryset):
+    """Clause SQL limitant les candidats aux produits de `queryset` (filtres de l'appelant)"""
+    if queryset is None:
+        return '', []
+    sql, params = queryset.order_by().values('pk').query.sql_with_params()
+    return f" AND {column} IN ({sql})", list(params)
+
+
+def _sqlite_candidates(tokens, limit, queryset=None):
+    restriction, restriction_params = _restriction('rowid', queryset)
+    sql = (
+        f"SELECT rowid, -bm25({SQLITE_TABLE}, %s, %s) FROM {SQLITE_TABLE} "
+        f"WHERE {SQLITE_TABLE} MATCH %s{restriction} ORDER BY bm25({SQLITE_TABLE}, %s, %s) LIMIT %s"
+    )
+
+    def run(cursor, match):
+        cursor.execute(sql, [*BM25_WEIGHTS, match, *restriction_params, *BM25_WEIGHTS, limit])
+        return cursor.fetchall()
+
+    with connection.cursor() as cursor:
+        rows = run(cursor, ' AND '.join(_fts_term(t) for t in tokens))
+        if rows:
+            return rows
+
+        # Tolérance aux fautes: chaque mot peut être remplacé par un terme proche
+        groups = [
+            '(' + ' OR '.join(_fts_term(t) for t in [token, *_sqlite_corrections(cursor, token)]) + ')'
+            for token in tokens
+        ]
+        rows = run(cursor, ' AND '.join(groups))
+        if rows or len(groups) == 1:
+            return rows
+        return run(cursor, ' OR '.join(groups))
+
+
+def _postgres_candidates(tokens, limit, queryset=None):
+    # Plein texte (préfixes, racines françaises) + trigrammes pour les fautes de frappe
+    tsquery = ' & '.join(f'{token}:*' for token in tokens)
+    text = ' '.join(tokens)
+    restriction, restriction_params = _restriction('product_id', queryset)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT product_id,
+                   ts_rank_cd(search_vector, query) + word_similarity(%s, title) AS rank
+            FROM stores_productsearchindex, to_tsquery('french', %s) AS query
+            WHERE (search_vector @@ query OR %s <%% title){restriction}
+            ORDER BY rank DESC
+            LIMIT %s
+            """,
+            [text, tsquery, text, *restriction_params, limit],
+        )
+        return cursor.fetchall()
+
+
+def _fallback_candidates(tokens, limit, queryset=None):
+    """Autres moteurs: recherche simple dans le texte normalisé"""
+    from .models import ProductSearchIndex
+
+    entries = ProductSearchIndex.objects.all()
+    if queryset is not None:
+        entries = entries.filter(product__in=queryset.order_by().values('pk'))
+    for token in tokens:
+        entries = entries.filter(title__contains=token) | entries.filter(body__contains=token)
+    return [(product_id, 1.0) for product_id in entries.values_list('product_id', flat=True)[:limit]]
+
+
+def find_candidates(query, limit=MAX_CANDIDATES, queryset=None):
+    """
+    Liste [(product_id, pertinence)] triée par pertinence décroissante,
+    limitée aux produits de `queryset` s'il est fourni (la limite s'applique
+    après ce filtre)
+    """
+    tokens = tokenize(query)
+    if not tokens:
+        return []
+    try:
+        if connection.vendor == 'sqlite':
+            return _sqlite_candidates(tokens, limit, queryset)
+        if connection.vendor == 'postgresql':
+            return _postgres_candidates(tokens, limit, queryset)
+    except DatabaseError as exc:
+        logger.warning("Recherche plein texte indisponible, repli simple: %s", exc)
+    return _fallback_candidates(tokens, limit, queryset)
+
+
+def search_products(query, queryset=None, limit=MAX_CANDIDATES):
+    """
+    Filtre `queryset` sur les produits correspondant à `query` et annote
+    `search_rank` (pertinence mêlée à la popularité, entre 0 et 1).
+    Les filtres (catégorie, prix...) doivent déjà être appliqués à
+    `queryset`: ils entrent dans la requête des candidats, avant la limite
+    de `limit` résultats. Le tri reste à la charge de l'appelant:
+    `.order_by('-search_rank')` pour le tri par pertinence.
+    """
+    from .models import Product, ProductScore
+
+    if queryset is None:
+        queryset = Product.objects.all()
+
+    candidates = find_candidates(query, limit, queryset)
+    if not candidates:
+        return queryset.none().annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+    ids = [product_id for product_id, _ in candidates]
+    popularity = dict(
+        ProductScore.objects.filter(product_id__in=ids).values_list('product_id', 'score')
+    )
+    max_relevance = max(rank for _, rank in candidates) or 1.0
+    max_popularity = max(
+        (math.log1p(max(score, 0)) for score in popularity.values()), default=0
+    ) or 1.0
+
+    ranking = {
+        product_id: RELEVANCE_WEIGHT * rank / max_relevance
+        + POPULARITY_WEIGHT * math.log1p(max(popularity.get(product_id, 0), 0)) / max_popularity
+        for product_id, rank in candidates
+    }
+    return queryset.filter(pk__in=ids).annotate(
+        search_rank=Case(
+            *[When(pk=product_id, then=Value(rank)) for product_id, rank in ranking.items()],
+            default=Value(0.0),
+            output_field=FloatField(),
+        )
+    )
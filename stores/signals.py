@@ -0,0 +1,169 @@
+"""
+Signaux de l'application stores
+Maintien incrémental de l'index de score du feed (ProductScore),
+de l'index de recherche (ProductSearchIndex), du cache du fil personnalisé
+des sections en cache de la page d'accueil et des statistiques
+quotidiennes des boutiques (StoreDailyStats); mise en file de la
+conversion des vidéos des lives et de la déclinaison des images envoyées
+"""
+
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import (
+    Store, Product, Category, Promotion, Follow, Like, Favorite, Comment, Review,
+    Order, Payment, LiveStream, ProductImage, GeneralProfile, StudentProfile,
+)
+from .analytics import bump_store_stats, refresh_store_day
+from .feed import invalidate_user_feed
+from .image_pipeline import IMAGE_FIELDS, schedule_variants
+from .home_sections import invalidate_home, invalidate_user_home
+from .scoring import (
+    COUNTER_FIELDS, bump_product_score, refresh_product_score, rebuild_product_scores,
+)
+from .search import sync_product_index, remove_product_index
+from .video_pipeline import schedule_transcode
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, created, update_fields=None, **kwargs):
+    """Recalcule le score si un champ pris en compte (vedette, etc.) a pu changer"""
+    if update_fields and set(update_fields) <= COUNTER_FIELDS:
+        # Les compteurs sont déjà répercutés par bump_product_score
+        return
+    refresh_product_score(instance.pk)
+
+
+@receiver(post_save, sender=Product)
+def product_search_sync(sender, instance, update_fields=None, **kwargs):
+    """Garde le document de recherche synchronisé avec le produit"""
+    if update_fields and set(update_fields) <= COUNTER_FIELDS:
+        return
+    sync_product_index(instance)
+
+
+@receiver(post_delete, sender=Product)
+def product_search_remove(sender, instance, **kwargs):
+    remove_product_index(instance.pk)
+
+
+@receiver(m2m_changed, sender=Product.tags.through)
+def product_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Les tags font partie du document de recherche"""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        sync_product_index(instance)
+    elif pk_set:
+        for product in Product.objects.filter(pk__in=pk_set).select_related('category'):
+            sync_product_index(product)
+
+
+@receiver(post_save, sender=Store)
+def store_saved(sender, instance, created, **kwargs):
+    """Le statut vérifié de la boutique entre dans le score de ses produits"""
+    if not created:
+        rebuild_product_scores(instance.products.all(), create_missing=False)
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, **kwargs):
+    if created:
+        bump_product_score(instance.product_id, comments=1)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    bump_product_score(instance.product_id, comments=-1, create_missing=False)
+
+
+@receiver(post_save, sender=Review)
+def review_saved(sender, instance, **kwargs):
+    # La note moyenne n'est pas additive: recalcul complet du produit
+    refresh_product_score(instance.product_id)
+
+
+@receiver(post_delete, sender=Review)
+def review_deleted(sender, instance, **kwargs):
+    refresh_product_score(instance.product_id, create_missing=False)
+
+
+@receiver([post_save, post_delete], sender=Follow)
+@receiver([post_save, post_delete], sender=Like)
+@receiver([post_save, post_delete], sender=Favorite)
+def user_interest_changed(sender, instance, **kwargs):
+    """Les viviers du fil personnalisé dépendent des follows, likes et favoris"""
+    invalidate_user_feed(instance.user_id)
+    invalidate_user_home(instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=Promotion)
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=Store)
+def home_content_changed(sender, instance, update_fields=None, **kwargs):
+    """Les sections de l'accueil listent produits, promotions, catégories et boutiques"""
+    if sender is Product and update_fields and set(update_fields) <= COUNTER_FIELDS:
+        return
+    invalidate_home()
+
+
+def _product_store_id(product_id):
+    return Product.objects.filter(pk=product_id).values_list('store_id', flat=True).first()
+
+
+@receiver(post_save, sender=Like)
+def like_stats_created(sender, instance, created, **kwargs):
+    if created:
+        bump_store_stats(_product_store_id(instance.product_id), timezone.localdate(instance.created_at), likes=1)
+
+
+@receiver(post_delete, sender=Like)
+def like_stats_deleted(sender, instance, **kwargs):
+    # Jamais de création ici: en cascade (suppression de la boutique ou de son
+    # propriétaire), la ligne créée ferait échouer la contrainte de clé étrangère
+    bump_store_stats(
+        _product_store_id(instance.product_id), timezone.localdate(instance.created_at),
+        create_missing=False, likes=-1,
+    )
+
+
+@receiver([post_save, post_delete], sender=Order)
+def order_stats_changed(sender, instance, **kwargs):
+    """Commandes comptées au jour de création, dans la colonne de leur statut"""
+    refresh_store_day(instance.store_id, instance.created_at)
+
+
+@receiver([post_save, post_delete], sender=Payment)
+def payment_stats_changed(sender, instance, **kwargs):
+    """Revenus comptés au jour du paiement"""
+    if instance.order_id:
+        store_id = Order.objects.filter(pk=instance.order_id).values_list('store_id', flat=True).first()
+        refresh_store_day(store_id, instance.paid_at or instance.created_at)
+
+
+@receiver([post_save, post_delete], sender=Review)
+def review_stats_changed(sender, instance, **kwargs):
+    refresh_store_day(_product_store_id(instance.product_id), instance.created_at)
+
+
+@receiver(post_save, sender=LiveStream)
+def live_video_saved(sender, instance, update_fields=None, **kwargs):
+    """Nouvelle vidéo de reel: conversion HLS en file (sans effet si déjà faite)"""
+    if update_fields and 'video_file' not in update_fields:
+        return
+    schedule_transcode(instance)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_save, sender=Store)
+@receiver(post_save, sender=GeneralProfile)
+@receiver(post_save, sender=StudentProfile)
+def image_saved(sender, instance, update_fields=None, **kwargs):
+    """Nouvelle image: variantes WebP/AVIF en file (sans effet si déjà faites)"""
+    field = IMAGE_FIELDS[sender.__name__]
+    if update_fields and field not in update_fields:
+        return
+    schedule_variants(getattr(instance, field))
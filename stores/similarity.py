@@ -0,0 +1,195 @@
+"""
+🧬 Index de similarité produit-produit
+TF-IDF (nom, tags, description) + affinité catégorie/boutique, calculé hors
+ligne avec NumPy/SciPy; les K plus proches voisins de chaque produit sont
+stockés dans ProductSimilarity pour une lecture indexée en ligne.
+"""
+
+import logging
+import math
+import re
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from .search import fold_text, STOPWORDS
+
+try:
+    import numpy as np
+    from scipy import sparse
+    SCIPY_AVAILABLE = True
+except ImportError:
+    SCIPY_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Nombre de voisins conservés par produit
+TOP_K = 20
+
+# Lignes de la matrice de similarité calculées à la fois (mémoire: lot x produits)
+BATCH_SIZE = 64
+
+# Pondération des champs dans le document TF-IDF
+NAME_WEIGHT = 2.0
+TAG_WEIGHT = 1.5
+DESCRIPTION_WEIGHT = 1.0
+MAX_DESCRIPTION_TERMS = 200
+
+# Bonus ajoutés à la similarité cosinus
+CATEGORY_AFFINITY = 0.15
+STORE_AFFINITY = 0.10
+
+# Similarité minimale pour être retenu comme voisin
+MIN_SCORE = 0.05
+
+_WORD_RE = re.compile(r'\w+')
+
+
+def _terms(text, limit=None):
+    terms = [
+        term for term in _WORD_RE.findall(fold_text(text))
+        if len(term) > 2 and term not in STOPWORDS and not term.isdigit()
+    ]
+    return terms[:limit] if limit else terms
+
+
+def _load_corpus():
+    """Produits (id, nom, description, catégorie, boutique) et tags: deux requêtes"""
+    from .models import Product
+
+    products = list(
+        Product.objects.order_by('id')
+        .values_list('id', 'name', 'description', 'category_id', 'store_id')
+    )
+    tags = defaultdict(list)
+    for product_id, tag_name in Product.tags.through.objects.values_list('product_id', 'tag__name'):
+        tags[product_id].append(tag_name)
+    return products, tags
+
+
+def build_tfidf_matrix(products, tags):
+    """Matrice CSR (produits x termes) TF-IDF normalisée L2, en float32"""
+    documents, document_frequency = [], Counter()
+    for product_id, name, description, _, _ in products:
+        weights = Counter()
+        for term in _terms(name):
+            weights[term] += NAME_WEIGHT
+        for term in _terms(' '.join(tags.get(product_id, []))):
+            weights[term] += TAG_WEIGHT
+        for term in _terms(description, MAX_DESCRIPTION_TERMS):
+            weights[term] += DESCRIPTION_WEIGHT
+        documents.append(weights)
+        document_frequency.update(weights.keys())
+
+    total = len(products)
+    vocabulary, rows, cols, data = {}, [], [], []
+    for row, weights in enumerate(documents):
+        for term, weight in weights.items():
+            idf = math.log((1 + total) / (1 + document_frequency[term])) + 1
+            rows.append(row)
+            cols.append(vocabulary.setdefault(term, len(vocabulary)))
+            data.append((1 + math.log(weight)) * idf)
+
+    matrix = sparse.csr_matrix(
+        (np.asarray(data, dtype=np.float32), (rows, cols)),
+        shape=(total, max(len(vocabulary), 1)),
+    )
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return sparse.diags((1 / norms).astype(np.float32)).dot(matrix).tocsr()
+
+
+def _top_neighbours(matrix, row_indices, categories, stores, k):
+    """Pour chaque ligne: [(indice voisin, score)] triés, au plus k"""
+    scores = (matrix[row_indices] @ matrix.T).toarray()
+    row_categories = categories[row_indices][:, None]
+    scores += CATEGORY_AFFINITY * ((row_categories == categories[None, :]) & (row_categories >= 0))
+    scores += STORE_AFFINITY * (stores[row_indices][:, None] == stores[None, :])
+    scores[np.arange(len(row_indices)), row_indices] = -np.inf
+
+    k = min(k, scores.shape[1] - 1)
+    if k <= 0:
+        return [[] for _ in row_indices]
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+
+    results = []
+    for line, candidates in enumerate(top):
+        ordered = candidates[np.argsort(-scores[line, candidates], kind='stable')]
+        results.append([
+            (int(column), float(scores[line, column]))
+            for column in ordered if scores[line, column] >= MIN_SCORE
+        ])
+    return results
+
+
+def build_similarity_index(product_ids=None, k=TOP_K):
+    """
+    Calcule les voisins des produits `product_ids` (tous par défaut) contre
+    tout le catalogue et remplace leurs lignes ProductSimilarity.
+    Retourne le nombre de produits traités.
+    """
+    from .models import ProductSimilarity
+
+    if not SCIPY_AVAILABLE:
+        logger.warning("NumPy/SciPy indisponibles: index de similarité non calculé")
+        return 0
+
+    products, tags = _load_corpus()
+    if len(products) < 2:
+        return 0
+
+    matrix = build_tfidf_matrix(products, tags)
+    ids = np.asarray([p[0] for p in products])
+    categories = np.asarray([p[3] if p[3] is not None else -1 for p in products])
+    stores = np.asarray([p[4] for p in products])
+
+    if product_ids is None:
+        targets = np.arange(len(products))
+    else:
+        position = {product_id: index for index, product_id in enumerate(ids.tolist())}
+        targets = np.asarray(sorted(position[pid] for pid in set(product_ids) if pid in position), dtype=int)
+
+    now = timezone.now()
+    for start in range(0, len(targets), BATCH_SIZE):
+        batch = targets[start:start + BATCH_SIZE]
+        entries = []
+        for row, neighbours in zip(batch, _top_neighbours(matrix, batch, categories, stores, k)):
+            entries.extend(
+                ProductSimilarity(
+                    product_id=int(ids[row]), similar_id=int(ids[column]),
+                    rank=rank, score=score, computed_at=now,
+                )
+                for rank, (column, score) in enumerate(neighbours, start=1)
+            )
+        with transaction.atomic():
+            ProductSimilarity.objects.filter(product_id__in=ids[batch].tolist()).delete()
+            ProductSimilarity.objects.bulk_create(entries)
+    return len(targets)
+
+
+def refresh_similarity_index():
+    """
+    Mise à jour incrémentale: produits modifiés depuis le dernier calcul,
+    produits sans voisins, et produits qui les avaient comme voisins.
+    (Un nouveau produit n'entre dans les listes des autres qu'au recalcul complet.)
+    """
+    from .models import Product, ProductSimilarity
+
+    last_build = ProductSimilarity.objects.aggregate(last=Max('computed_at'))['last']
+    if last_build is None:
+        return build_similarity_index()
+
+    changed = set(
+        Product.objects.filter(
+            Q(updated_at__gt=last_build) | Q(neighbours__isnull=True)
+        ).values_list('id', flat=True).distinct()
+    )
+    if not changed:
+        return 0
+    affected = set(
+        ProductSimilarity.objects.filter(similar_id__in=changed)
+        .values_list('product_id', flat=True).distinct()
+    )
+    return build_similarity_index(changed | affected)
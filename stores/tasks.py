@@ -0,0 +1,189 @@
+from celery import shared_task
+
+from .analytics import refresh_store_stats
+from .collaborative import train_recommender
+from .counters import flush_counters
+from .geo import refresh_store_centroids
+from .image_pipeline import process_pending as process_pending_images
+from .leaderboard import refresh_leaderboard
+from .payment_jobs import dispatch_due_jobs, run_verification_job
+from .presence import persist_presence
+from .reconciliation import reconcile_pending_payments
+from .scoring import refresh_decaying_scores, rebuild_product_scores
+from .similarity import build_similarity_index, refresh_similarity_index
+from .video_pipeline import process_pending
+from .webhook_events import dispatch_pending_events, process_transaction_events
+
+
+@shared_task
+def refresh_feed_scores():
+    """
+    Tâche planifiée: met à jour la partie des scores du feed qui dépend
+    du temps (fraîcheur, fin de mise en vedette)
+    """
+    stats = refresh_decaying_scores()
+    return f"{stats['updated'] + stats['created']} scores de produits rafraîchis"
+
+
+@shared_task
+def rebuild_feed_scores():
+    """
+    Recalcule tout l'index ProductScore depuis les données sources
+    """
+    return rebuild_product_scores()
+
+
+@shared_task
+def flush_counter_buffer():
+    """
+    Tâche planifiée: écrit en base les compteurs tamponnés
+    (vues, likes, partages...)
+    """
+    stats = flush_counters()
+    return f"{stats['increments']} incréments écrits sur {stats['rows']} lignes"
+
+
+@shared_task
+def refresh_geo_centroids():
+    """
+    Tâche planifiée: recalcule la position estimée des boutiques
+    d'après leurs commandes géolocalisées
+    """
+    count = refresh_store_centroids()
+    return f"{count} positions de boutiques recalculées"
+
+
+@shared_task
+def refresh_store_leaderboard():
+    """
+    Tâche planifiée: recalcule l'instantané du classement des boutiques
+    """
+    count = refresh_leaderboard()
+    return f"{count} lignes de classement écrites"
+
+
+@shared_task
+def refresh_similar_products():
+    """
+    Tâche planifiée: recalcule les voisins des produits modifiés
+    depuis le dernier passage
+    """
+    count = refresh_similarity_index()
+    return f"{count} produits réindexés (similarité)"
+
+
+@shared_task
+def rebuild_similar_products():
+    """
+    Tâche planifiée: recalcule tout l'index de similarité
+    (les nouveaux produits entrent dans les listes des autres)
+    """
+    count = build_similarity_index()
+    return f"{count} produits indexés (similarité)"
+
+
+@shared_task
+def retrain_recommender():
+    """
+    Tâche planifiée: réentraîne le filtrage collaboratif sur les
+    dernières interactions
+    """
+    snapshot = train_recommender()
+    if snapshot is None:
+        return "Aucune interaction: recommandeur non entraîné"
+    return (
+        f"Recommandeur entraîné: {snapshot.users_count} utilisateurs, "
+        f"{snapshot.products_count} produits en {snapshot.training_seconds}s"
+    )
+
+
+@shared_task
+def refresh_store_daily_stats():
+    """
+    Tâche planifiée: recalcule les derniers jours des statistiques
+    quotidiennes des boutiques depuis les tables sources
+    """
+    count = refresh_store_stats()
+    return f"{count} lignes de statistiques recalculées"
+
+
+@shared_task
+def run_payment_verification(job_id):
+    """
+    Un essai de vérification d'un paiement (planifié par la file durable,
+    voir payment_jobs.py)
+    """
+    return run_verification_job(job_id)
+
+
+@shared_task
+def dispatch_payment_verifications():
+    """
+    Tâche planifiée: lance les vérifications de paiement dues et reprend
+    celles d'un worker disparu
+    """
+    count = dispatch_due_jobs()
+    return f"{count} vérifications de paiement lancées"
+
+
+@shared_task
+def reconcile_payments():
+    """
+    Tâche planifiée: vérifie par lots les paiements restés en attente
+    (rapprochement avec les fournisseurs)
+    """
+    report = reconcile_pending_payments()
+    return (
+        f"{report['checked']} paiements vérifiés, {report['updated']} mis à jour "
+        f"({report['throughput']} vérifications/s)"
+    )
+
+
+@shared_task
+def process_webhook_events(provider, transaction_ref):
+    """
+    Traite dans l'ordre d'arrivée les webhooks enregistrés d'une transaction
+    (voir webhook_events.py)
+    """
+    return process_transaction_events(provider, transaction_ref)
+
+
+@shared_task
+def dispatch_webhook_events():
+    """
+    Tâche planifiée: reprend les webhooks en retard (message perdu, worker
+    disparu, essai échoué)
+    """
+    count = dispatch_pending_events()
+    return f"{count} transactions avec webhooks en attente relancées"
+
+
+@shared_task
+def persist_live_presence():
+    """
+    Tâche planifiée: écrit en base le nombre de spectateurs et le pic des
+    lives suivis (voir presence.py)
+    """
+    stats = persist_presence()
+    return f"{stats['rows']} lives mis à jour sur {stats['lives']} suivis"
+
+
+@shared_task
+def transcode_live_videos():
+    """
+    Convertit les vidéos de lives en attente (HLS, affiche, extrait); aussi
+    planifiée pour reprendre les conversions interrompues
+    """
+    totals = process_pending()
+    return f"{sum(totals.values())} vidéos traitées: {totals}"
+
+
+@shared_task
+def generate_image_variants():
+    """
+    Décline les images en attente (WebP/AVIF, plusieurs largeurs); le worker
+    Celery est déjà un processus à part, le rendu s'y fait directement. Aussi
+    planifiée pour reprendre les tâches interrompues
+    """
+    totals = process_pending_images(workers=1)
+    return f"{sum(totals.values())} images traitées: {totals}"
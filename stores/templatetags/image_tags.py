@@ -0,0 +1,48 @@
+"""
+Template tags pour les images responsives (variantes de stores/image_pipeline.py)
+"""
+
+from django import template
+from django.forms.utils import flatatt
+from django.utils.html import format_html
+from django.utils.safestring import mark_safe
+
+from ..image_pipeline import MIME_TYPES, srcset
+
+register = template.Library()
+
+# Cartes des grilles de produits: 2 colonnes sur mobile, 3 puis 4
+GRID_SIZES = "(max-width: 767px) 50vw, (max-width: 991px) 33vw, 25vw"
+
+
+@register.simple_tag
+def image_srcset(image, fmt='webp'):
+    """srcset d'une image pour un format ('' tant que les variantes ne sont pas prêtes)"""
+    if not image:
+        return ''
+    return srcset(image.name, fmt)
+
+
+@register.simple_tag
+def responsive_image(image, alt='', sizes=GRID_SIZES, **attrs):
+    """
+    <picture> avec une <source> par format (AVIF puis WebP) et l'original en
+    repli; le navigateur ne télécharge que la largeur utile selon `sizes`.
+    Les autres arguments (class, style...) sont repris sur <img>.
+
+    Usage: {% responsive_image product.image alt=product.name class="card-img-top" %}
+    """
+    if not image:
+        return ''
+    attrs.setdefault('loading', 'lazy')
+    attrs.setdefault('decoding', 'async')
+    img = format_html('<img src="{}" alt="{}"{}>', image.url, alt, flatatt(attrs))
+    sources = [
+        format_html('<source type="{}" srcset="{}" sizes="{}">', mime_type, value, sizes)
+        for fmt, mime_type in MIME_TYPES.items()
+        if (value := srcset(image.name, fmt))
+    ]
+    if not sources:
+        return img
+    # display: contents: <picture> n'ajoute pas de boîte (mise en page des cartes inchangée)
+    return format_html('<picture style="display: contents">{}{}</picture>', mark_safe(''.join(sources)), img)
@@ -0,0 +1,938 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from unittest import mock, skipUnless
+
+from django.template import Context, Template
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+
+from .algorithms import get_personalized_recommendations
+from .analytics import get_store_stats
+from .collaborative import reset_trained_model, train_recommender
+from .feed import build_feed, interleave
+from . import geo, leaderboard
+from .home_sections import _section_key, cached_section, get_home_sections
+from .models import (
+    Store, Product, ProductScore, Category, Comment, Follow, Like, Favorite, Order, Review, Payment,
+    PaymentVerificationJob, Notification, WebhookEvent, LiveStream, LiveComment, LiveProduct,
+    VideoTranscodeJob, ImageDerivative, StoreLeaderboard, StoreDailyStats,
+)
+from . import (
+    counters, image_pipeline, live_chat, live_checkout, payment_jobs, payment_transport, presence, reconciliation,
+    video_pipeline, webhook_events,
+)
+from .recommendations import get_similar_products
+from .search import search_products
+from .scoring import FRESHNESS_MAX, VERIFIED_BONUS, bump_product_score, rebuild_product_scores
+from .similarity import SCIPY_AVAILABLE, build_similarity_index
+
+
+class ProductScoreIndexTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        owner = User.objects.create_user('vendeur', password='x')
+        cls.user = User.objects.create_user('client', password='x')
+        cls.store = Store.objects.create(owner=owner, name='Boutique', whatsapp_number='0000')
+        cls.product = Product.objects.create(store=cls.store, name='Produit', price=1000, image='products/test.jpg')
+
+    def score(self):
+        return ProductScore.objects.get(product=self.product)
+
+    def test_new_product_is_indexed_with_freshness(self):
+        score = self.score()
+        self.assertEqual((score.engagement, score.freshness, score.score), (0, FRESHNESS_MAX, FRESHNESS_MAX))
+
+    def test_signals_keep_the_score_in_step(self):
+        comment = Comment.objects.create(user=self.user, product=self.product, content='Joli')
+        self.assertEqual((self.score().comments_count, self.score().engagement), (1, 2))
+        Review.objects.create(user=self.user, product=self.product, rating=4)
+        self.assertEqual(self.score().engagement, 2 + 4 * 2)
+        comment.delete()
+        self.assertEqual((self.score().comments_count, self.score().engagement), (0, 8))
+
+        self.store.is_verified = True
+        self.store.save()
+        self.assertEqual(self.score().engagement, 8 + VERIFIED_BONUS)
+
+    def test_rebuild_repairs_drift(self):
+        bump_product_score(self.product.pk, likes=5)
+        self.assertEqual(self.score().engagement, 15)
+
+        stats = rebuild_product_scores()
+
+        self.assertEqual((stats['processed'], stats['drift']), (1, 1))
+        self.assertEqual(self.score().engagement, 0)
+        self.assertEqual(rebuild_product_scores(dry_run=True)['drift'], 0)
+
+
+class CounterBufferTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        owner = User.objects.create_user('vendeur', password='x')
+        store = Store.objects.create(owner=owner, name='Boutique', whatsapp_number='0000')
+        cls.products = [
+            Product.objects.create(store=store, name=f'Produit {i}', price=1000, image='products/test.jpg')
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        patcher = mock.patch.object(counters, '_backend', counters.MemoryCounterBackend())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_increments_are_buffered_then_flushed_in_batches(self):
+        first, second, third = self.products
+        with self.assertNumQueries(0):
+            for _ in range(3):
+                counters.increment('product.views', first.pk)
+                counters.increment('product.views', second.pk)
+            counters.increment('product.likes', third.pk)
+        self.assertEqual(counters.pending_delta('product.views', first.pk), 3)
+
+        stats = counters.flush_counters()
+
+        self.assertEqual((stats['rows'], stats['increments']), (3, 7))
+        self.assertEqual(Product.objects.get(pk=first.pk).views_count, 3)
+        self.assertEqual(Product.objects.get(pk=third.pk).likes_count, 1)
+        # Le score du feed suit au même vidage
+        self.assertEqual(ProductScore.objects.get(product=third).engagement, 3)
+        self.assertEqual(counters.counter_metrics()['pending_increments'], 0)
+
+    def test_failed_flush_keeps_increments(self):
+        counters.increment('product.shares', self.products[0].pk, 2)
+        with mock.patch.object(counters, '_apply', side_effect=RuntimeError('db down')):
+            with self.assertRaises(RuntimeError):
+                counters.flush_counters()
+        self.assertEqual(counters.pending_delta('product.shares', self.products[0].pk), 2)
+
+        counters.flush_counters()
+        self.assertEqual(Product.objects.get(pk=self.products[0].pk).shares_count, 2)
+
+
+class ProductSearchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        owner = User.objects.create_user('vendeur', password='x')
+        store = Store.objects.create(owner=owner, name='Boutique', whatsapp_number='0000')
+        cls.mode = Category.objects.create(name='Mode', slug='mode')
+        cls.tech = Category.objects.create(name='Tech', slug='tech')
+
+        def create(name, category, price=1000):
+            return Product.objects.create(
+                store=store, name=name, category=category, price=price, image='products/test.jpg',
+            )
+
+        cls.dessert = create('Crème brûlée', None)
+        cls.shoes = create('Chaussures de sport', cls.mode)
+        cls.dresses = [create(f'Robe robe {i}', cls.mode) for i in range(3)]
+        cls.tech_dress = create('Robe tech', cls.tech, price=5000)
+
+    def names(self, queryset):
+        return sorted(queryset.values_list('name', flat=True))
+
+    def test_accents_and_typos(self):
+        self.assertEqual(self.names(search_products('creme brulee')), ['Crème brûlée'])
+        self.assertEqual(self.names(search_products('chausures')), ['Chaussures de sport'])
+        self.assertFalse(search_products('de').exists())
+
+    def test_caller_filters_apply_before_the_candidate_limit(self):
+        filtered = Product.objects.filter(category=self.tech)
+        self.assertEqual(self.names(search_products('robe', filtered, limit=1)), ['Robe tech'])
+        expensive = Product.objects.filter(price__gte=2000)
+        self.assertEqual(self.names(search_products('robe', expensive, limit=1)), ['Robe tech'])
+        self.assertEqual(search_products('robe', limit=10).count(), 4)
+
+
+class GeoDiscoveryTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        def store(name, lat=None, lng=None):
+            owner = User.objects.create_user(name, password='x')
+            return Store.objects.create(
+                owner=owner, name=name, whatsapp_number='0000', latitude=lat, longitude=lng,
+            )
+
+        cls.plateau = store('plateau', 5.3200, -4.0200)
+        cls.cocody = store('cocody', 5.3600, -3.9800)
+        cls.bouake = store('bouake', 7.6900, -5.0300)
+        # Sans position déclarée: estimée d'après ses commandes
+        cls.marcory = store('marcory')
+        cls.product = Product.objects.create(store=cls.marcory, name='Pagne', price=1000, image='products/test.jpg')
+        for lat in ('5.300000', '5.310000'):
+            Order.objects.create(product=cls.product, store=cls.marcory, latitude=lat, longitude='-3.990000')
+        for i in range(6):
+            Product.objects.create(store=cls.plateau, name=f'Produit {i}', price=1000, image='products/test.jpg')
+
+    def test_haversine_matches_a_known_distance(self):
+        # Paris - Londres: environ 343,5 km
+        distance = geo.haversine_km(48.8566, 2.3522, [51.5074], [-0.1278])[0]
+        self.assertAlmostEqual(distance, 343.5, delta=1)
+        with mock.patch.object(geo, 'NUMPY_AVAILABLE', False):
+            self.assertAlmostEqual(geo.haversine_km(48.8566, 2.3522, [51.5074], [-0.1278])[0], distance, places=6)
+
+    def test_nearby_stores_include_order_centroids(self):
+        self.assertEqual(geo.refresh_store_centroids(), 1)
+
+        nearby = geo.find_nearby_stores(5.33, -4.01, radius_km=20)
+
+        self.assertEqual([store_id for store_id, _ in nearby], [self.plateau.pk, self.marcory.pk, self.cocody.pk])
+        self.assertIn(self.bouake.pk, dict(geo.find_nearby_stores(5.33, -4.01, radius_km=300)))
+
+    def test_geo_stores_group_latest_products(self):
+        with self.assertNumQueries(4):
+            stores = geo.get_geo_stores(5.33, -4.01, radius_km=20)
+        self.assertEqual([store.name for store in stores], ['plateau', 'cocody'])
+        self.assertEqual(len(stores[0].nearby_products), geo.PRODUCTS_PER_STORE)
+        self.assertEqual(stores[0].nearby_products[0].name, 'Produit 5')
+
+
+class StoreLeaderboardTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        mode = Category.objects.create(name='Mode', slug='mode')
+        cls.stores = []
+        for i, (city, views) in enumerate([('Abidjan', 50), ('Bouaké', 10), ('Abidjan', 30)]):
+            owner = User.objects.create_user(f'vendeur{i}', password='x')
+            store = Store.objects.create(owner=owner, name=f'Boutique {i}', whatsapp_number='0000', city=city)
+            # Deux produits de la même catégorie: une seule ligne par classement
+            for j in range(2):
+                Product.objects.create(
+                    store=store, name=f'Produit {j}', category=mode, price=1000,
+                    image='products/test.jpg', views_count=views // 2,
+                )
+            cls.stores.append(store)
+        cls.mode = mode
+
+    def setUp(self):
+        cache.clear()
+
+    def ranking(self, *args):
+        return [entry.store_id for entry in leaderboard.get_leaderboard_page(*args)]
+
+    def test_snapshot_ranks_globally_by_city_and_category(self):
+        first, second, third = self.stores
+        self.assertEqual(leaderboard.refresh_leaderboard(), 3 + 3 + 3)
+
+        self.assertEqual(self.ranking(), [first.pk, third.pk, second.pk])
+        self.assertEqual(self.ranking('city', ' abidjan '), [first.pk, third.pk])
+        self.assertEqual(self.ranking('category', str(self.mode.pk)), [first.pk, third.pk, second.pk])
+        self.assertEqual(
+            leaderboard.get_leaderboard_filters()['cities'], [('abidjan', 'Abidjan'), ('bouake', 'Bouaké')],
+        )
+
+    def test_empty_snapshot_is_scheduled_not_computed_inline(self):
+        with mock.patch.object(leaderboard.threading, 'Thread') as thread:
+            page = leaderboard.get_leaderboard_page()
+            leaderboard.get_leaderboard_page()
+
+        self.assertEqual(len(page), 0)
+        thread.assert_called_once()
+        thread.return_value.start.assert_called_once()
+        self.assertFalse(StoreLeaderboard.objects.exists())
+
+
+class PersonalizedFeedTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('lecteur', password='x')
+        category = Category.objects.create(name='Mode', slug='mode')
+        for i in range(3):
+            owner = User.objects.create_user(f'vendeur{i}', password='x')
+            store = Store.objects.create(owner=owner, name=f'Boutique {i}', whatsapp_number='0000')
+            for j in range(5):
+                Product.objects.create(
+                    store=store, name=f'Produit {i}-{j}', price=1000,
+                    image='products/test.jpg', category=category,
+                )
+        first_store = Store.objects.first()
+        Follow.objects.create(user=cls.user, store=first_store)
+        Like.objects.create(user=cls.user, product=first_store.products.first())
+        Favorite.objects.create(user=cls.user, product=first_store.products.last())
+
+    def setUp(self):
+        cache.clear()
+
+    def test_feed_query_count_is_bounded(self):
+        with self.assertNumQueries(6):
+            feed = build_feed(self.user, limit=12, seed=42)
+        self.assertEqual(len(feed), 12)
+        self.assertEqual(len({p.id for p in feed}), 12)
+
+        # Viviers en cache: une seule requête pour charger les produits
+        with self.assertNumQueries(1):
+            build_feed(self.user, limit=12, seed=42)
+
+    def test_feed_is_deterministic_for_a_seed(self):
+        first = [p.id for p in build_feed(self.user, limit=10, seed=7)]
+        second = [p.id for p in build_feed(self.user, limit=10, seed=7)]
+        self.assertEqual(first, second)
+
+    def test_follow_invalidates_cached_pools(self):
+        build_feed(self.user, limit=5, seed=1)
+        Follow.objects.filter(user=self.user).delete()
+        # Viviers globaux toujours en cache: 3 viviers utilisateur + chargement
+        with self.assertNumQueries(4):
+            build_feed(self.user, limit=5, seed=1)
+
+    def test_interleave_skips_duplicates(self):
+        feed = interleave({'followed': [1, 2, 3], 'trending': [3, 2, 4]}, limit=10, seed=3)
+        self.assertEqual(sorted(feed), [1, 2, 3, 4])
+
+
+@skipUnless(SCIPY_AVAILABLE, "NumPy/SciPy requis")
+class SimilarProductsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        owner = User.objects.create_user('vendeur', password='x')
+        store = Store.objects.create(owner=owner, name='Boutique', whatsapp_number='0000')
+        names = ['Téléphone Samsung Galaxy', 'Téléphone Samsung A12', 'Chaussures Nike', 'Sac en cuir']
+        cls.products = [
+            Product.objects.create(store=store, name=name, price=1000, image='products/test.jpg')
+            for name in names
+        ]
+        build_similarity_index()
+
+    def test_lookup_is_a_single_query(self):
+        with self.assertNumQueries(1):
+            similar = get_similar_products(self.products[0], limit=2)
+        self.assertEqual(similar[0], self.products[1])
+        self.assertNotIn(self.products[0], similar)
+
+
+@skipUnless(SCIPY_AVAILABLE, "NumPy/SciPy requis")
+class CollaborativeRecommendationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        owner = User.objects.create_user('vendeur', password='x')
+        store = Store.objects.create(owner=owner, name='Boutique', whatsapp_number='0000')
+        cls.products = [
+            Product.objects.create(store=store, name=f'Produit {i}', price=1000, image='products/test.jpg')
+            for i in range(6)
+        ]
+        cls.users = [User.objects.create_user(f'client{i}', password='x') for i in range(3)]
+        # Les deux premiers clients aiment les produits 0 à 2, le troisième seulement 0 et 1
+        for user in cls.users[:2]:
+            for product in cls.products[:3]:
+                Like.objects.create(user=user, product=product)
+        for product in cls.products[:2]:
+            Like.objects.create(user=cls.users[2], product=product)
+
+    def setUp(self):
+        reset_trained_model()
+        train_recommender(factors=4, iterations=5)
+
+    def test_recommends_what_similar_users_liked(self):
+        recommendations = list(get_personalized_recommendations(self.users[2], limit=3))
+        self.assertEqual(recommendations[0], self.products[2])
+        self.assertNotIn(self.products[0], recommendations)
+
+    def test_cold_start_falls_back_to_popularity(self):
+        newcomer = User.objects.create_user('nouveau', password='x')
+        self.assertEqual(len(get_personalized_recommendations(newcomer, limit=4)), 4)
+
+
+class HomeSectionsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        owner = User.objects.create_user('vendeur', password='x')
+        cls.store = Store.objects.create(owner=owner, name='Boutique', whatsapp_number='0000')
+        for i in range(3):
+            Product.objects.create(store=cls.store, name=f'Produit {i}', price=1000, image='products/test.jpg')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_sections_are_served_from_cache(self):
+        get_home_sections()
+        with self.assertNumQueries(0):
+            sections = get_home_sections()
+        self.assertEqual(len(sections['latest_products']), 3)
+
+    def test_product_change_invalidates_sections(self):
+        get_home_sections()
+        Product.objects.create(store=self.store, name='Nouveau', price=1000, image='products/test.jpg')
+        self.assertEqual(get_home_sections()['latest_products'][0].name, 'Nouveau')
+
+    def test_concurrent_rebuild_serves_stale_value(self):
+        cache.set('home:stale:all:test', 'ancien')
+        # Un autre processus détient le verrou de recalcul
+        cache.add(f"{_section_key('test')}:lock", 1)
+        self.assertEqual(cached_section('test', lambda: 'nouveau'), 'ancien')
+
+
+class StoreDailyStatsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        owner = User.objects.create_user('vendeur', password='x')
+        cls.customer = User.objects.create_user('client', password='x')
+        cls.store = Store.objects.create(owner=owner, name='Boutique', whatsapp_number='0000')
+        cls.product = Product.objects.create(
+            store=cls.store, name='Produit', price=1000, image='products/test.jpg', views_count=40,
+        )
+
+    def test_signals_feed_the_daily_rollup(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Like.objects.create(user=self.customer, product=self.product)
+            order = Order.objects.create(product=self.product, store=self.store, customer=self.customer)
+            Review.objects.create(user=self.customer, product=self.product, rating=4)
+        with self.captureOnCommitCallbacks(execute=True):
+            order.status = 'delivered'
+            order.save()
+
+        with self.assertNumQueries(1):
+            stats = get_store_stats(self.store)
+        self.assertEqual(stats['total_likes'], 1)
+        self.assertEqual(stats['total_orders'], 1)
+        self.assertEqual(stats['pending_orders'], 0)
+        self.assertEqual(stats['completed_orders'], 1)
+        self.assertEqual(stats['average_rating'], 4.0)
+
+    def test_store_with_liked_products_can_be_deleted(self):
+        Like.objects.create(user=self.customer, product=self.product)
+        Order.objects.create(product=self.product, store=self.store, customer=self.customer)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.store.owner.delete()
+
+        self.assertFalse(Store.objects.filter(pk=self.store.pk).exists())
+        self.assertFalse(StoreDailyStats.objects.filter(store_id=self.store.pk).exists())
+
+    def test_first_read_backfills_from_source_tables(self):
+        stats = get_store_stats(self.store)
+        self.assertEqual(stats['total_views'], 40)
+        self.assertEqual(get_store_stats(self.store, days=7)['total_views'], 40)
+
+
+class PaymentVerificationJobTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        owner = User.objects.create_user('vendeur', password='x')
+        store = Store.objects.create(owner=owner, name='Boutique', whatsapp_number='0000')
+        product = Product.objects.create(store=store, name='Produit', price=1000, image='products/test.jpg')
+        order = Order.objects.create(product=product, store=store)
+        cls.payment = Payment.objects.create(
+            order=order, amount=1000, payment_method='paydunya', transaction_id='ORD1_TEST',
+        )
+
+    def run_due(self, job):
+        PaymentVerificationJob.objects.filter(pk=job.pk, status='scheduled').update(next_attempt_at=timezone.now())
+        return payment_jobs.run_verification_job(job.pk)
+
+    def test_schedule_is_idempotent_and_delayed(self):
+        job = payment_jobs.schedule_payment_verification(self.payment.pk)
+        payment_jobs.schedule_payment_verification(self.payment.pk)
+        self.assertEqual(PaymentVerificationJob.objects.count(), 1)
+        self.assertGreater(job.next_attempt_at, timezone.now())
+        self.assertEqual(payment_jobs.run_verification_job(job.pk), 'skipped')
+
+    @mock.patch.object(payment_jobs, '_run_provider_verification', return_value={'success': True, 'status': 'pending'})
+    def test_pending_payment_backs_off_then_goes_to_dead_letter(self, verify):
+        job = payment_jobs.schedule_payment_verification(self.payment.pk)
+        self.assertEqual(self.run_due(job), 'scheduled')
+        job.refresh_from_db()
+        self.assertGreater(job.next_attempt_at, timezone.now() + timedelta(seconds=10))
+
+        max_attempts = payment_jobs.get_policy('paydunya')['max_attempts']
+        for _ in range(max_attempts - 1):
+            status = self.run_due(job)
+        self.assertEqual(status, 'dead')
+        self.assertEqual(verify.call_count, max_attempts)
+
+    def test_completed_payment_completes_the_job(self):
+        job = payment_jobs.schedule_payment_verification(self.payment.pk)
+
+        def complete(payment_id):
+            Payment.objects.filter(pk=payment_id).update(status='completed')
+            return {'success': True, 'status': 'completed'}
+
+        with mock.patch.object(payment_jobs, '_run_provider_verification', side_effect=complete):
+            self.assertEqual(self.run_due(job), 'completed')
+            # Un message en double n'exécute plus rien
+            self.assertEqual(payment_jobs.run_verification_job(job.pk), 'skipped')
+
+
+    def test_claim_respects_provider_concurrency(self):
+        job = payment_jobs.schedule_payment_verification(self.payment.pk)
+        PaymentVerificationJob.objects.filter(pk=job.pk).update(next_attempt_at=timezone.now())
+
+        with self.settings(PAYMENT_VERIFICATION_POLICIES={'paydunya': {'max_concurrency': 1}}):
+            other = Payment.objects.create(
+                order=self.payment.order, amount=1000, payment_method='paydunya', transaction_id='ORD1_OTHER',
+            )
+            PaymentVerificationJob.objects.create(
+                payment=other, provider='paydunya', status='running', next_attempt_at=timezone.now(),
+                lease_expires_at=timezone.now() + timedelta(seconds=60),
+            )
+            self.assertIs(payment_jobs._claim(job.pk), payment_jobs.BUSY)
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.lease_expires_at), ('scheduled', None))
+
+            PaymentVerificationJob.objects.filter(payment=other).update(status='completed')
+            self.assertEqual(payment_jobs._claim(job.pk).status, 'running')
+
+
+class PaymentReconciliationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        owner = User.objects.create_user('vendeur', password='x')
+        store = Store.objects.create(owner=owner, name='Boutique', whatsapp_number='0000')
+        product = Product.objects.create(store=store, name='Produit', price=1000, image='products/test.jpg')
+        for i in range(5):
+            order = Order.objects.create(product=product, store=store)
+            Payment.objects.create(order=order, amount=1000, payment_method='paydunya', transaction_id=f'RECON{i}')
+        Payment.objects.create(amount=500, payment_method='orange_money', transaction_id='LEGACY')
+        Payment.objects.update(created_at=timezone.now() - timedelta(hours=1))
+        # Trop récent: laissé à la file de vérification
+        Payment.objects.create(amount=500, payment_method='paydunya', transaction_id='FRESH')
+
+    def test_pending_payments_are_verified_and_written_in_bulk(self):
+        provider = mock.Mock(provider_name='paydunya')
+        provider.verify_payment.side_effect = lambda tx: {
+            'success': True,
+            'status': 'completed' if tx in ('RECON1', 'RECON3') else 'pending',
+            'provider_response': {'checked': tx},
+        }
+
+        with mock.patch.object(reconciliation, '_get_provider', return_value=provider):
+            report = reconciliation.reconcile_pending_payments(page_size=2, include_transactions=False)
+
+        self.assertEqual(report['checked'], 5)
+        self.assertEqual(report['updated'], 2)
+        self.assertEqual(report['by_provider'], {'paydunya': {'checked': 5, 'errors': 0}})
+        self.assertNotIn(mock.call('FRESH'), provider.verify_payment.call_args_list)
+        self.assertNotIn(mock.call('LEGACY'), provider.verify_payment.call_args_list)
+
+        completed = Payment.objects.filter(status='completed')
+        self.assertEqual(sorted(completed.values_list('transaction_id', flat=True)), ['RECON1', 'RECON3'])
+        self.assertTrue(all(p.paid_at and p.metadata['checked'] == p.transaction_id for p in completed))
+        self.assertEqual(Order.objects.filter(status='confirmed', payment_status='completed').count(), 2)
+        self.assertEqual(Notification.objects.filter(notification_type='order').count(), 2)
+        self.assertEqual(reconciliation.last_reconciliation()['updated'], 2)
+
+
+class WebhookEventTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        owner = User.objects.create_user('vendeur', password='x')
+        store = Store.objects.create(owner=owner, name='Boutique', whatsapp_number='0000')
+        product = Product.objects.create(store=store, name='Produit', price=1000, image='products/test.jpg')
+        cls.order = Order.objects.create(product=product, store=store)
+        cls.payment = Payment.objects.create(
+            order=cls.order, amount=1000, payment_method='wave', transaction_id='WAVE_TX',
+        )
+
+    def ingest(self, status, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return webhook_events.ingest_webhook(
+                'wave', {'transaction_id': 'WAVE_TX', 'status': status},
+                event_type=status, transaction_ref='WAVE_TX', **kwargs,
+            )
+
+    def test_duplicate_deliveries_are_processed_once(self):
+        event, created = self.ingest('SUCCESSFUL')
+        duplicate, duplicate_created = self.ingest('SUCCESSFUL')
+
+        self.assertTrue(created)
+        self.assertFalse(duplicate_created)
+        self.assertEqual(duplicate.pk, event.pk)
+        self.assertEqual(WebhookEvent.objects.get().status, 'processed')
+        self.payment.refresh_from_db()
+        self.order.refresh_from_db()
+        self.assertEqual(self.payment.status, 'completed')
+        self.assertEqual(self.order.status, 'confirmed')
+        self.assertEqual(Notification.objects.count(), 1)
+
+        # Même statut renvoyé sous un autre identifiant: paiement déjà finalisé
+        self.ingest('SUCCESSFUL', event_id='retry-2')
+        self.assertEqual(WebhookEvent.objects.get(event_id='retry-2').status, 'ignored')
+        self.assertEqual(Notification.objects.count(), 1)
+
+    def test_events_of_a_transaction_wait_for_a_failed_predecessor(self):
+        with mock.patch.object(webhook_events, '_handle_mobile_money_event', side_effect=RuntimeError('boom')):
+            first, _ = self.ingest('PENDING')
+            # Le nouvel événement relance d'abord le précédent, qui échoue encore
+            second, _ = self.ingest('SUCCESSFUL')
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.status, first.attempts, first.last_error), ('pending', 2, 'boom'))
+        self.assertEqual((second.status, second.attempts), ('pending', 0))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(webhook_events.replay_events(WebhookEvent.objects.filter(pk=first.pk)), 1)
+        self.assertEqual(
+            list(WebhookEvent.objects.order_by('id').values_list('status', flat=True)),
+            ['ignored', 'processed'],
+        )
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, 'completed')
+
+
+class PaymentTransportTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        payment_transport.reset_transport()
+        self.addCleanup(payment_transport.reset_transport)
+
+    def test_token_is_cached_until_expiry(self):
+        fetch = mock.Mock(return_value=('jeton', 3600))
+        for _ in range(3):
+            self.assertEqual(payment_transport.get_cached_token('mtn_money', ('sandbox', 'key'), fetch), 'jeton')
+        self.assertEqual(fetch.call_count, 1)
+
+        payment_transport.invalidate_token('mtn_money', ('sandbox', 'key'))
+        payment_transport.get_cached_token('mtn_money', ('sandbox', 'key'), fetch)
+        self.assertEqual(fetch.call_count, 2)
+
+        # Durée de vie plus courte que la marge: jamais mis en cache
+        short = mock.Mock(return_value=('court', payment_transport.TOKEN_EXPIRY_MARGIN))
+        payment_transport.get_cached_token('paypal', ('sandbox', 'key'), short)
+        payment_transport.get_cached_token('paypal', ('sandbox', 'key'), short)
+        self.assertEqual(short.call_count, 2)
+
+    def test_breaker_opens_after_failures_and_records_latency(self):
+        session = payment_transport.get_session('wave')
+        threshold = payment_transport.get_transport_policy('wave')['failure_threshold']
+        with mock.patch.object(session, 'request', return_value=mock.Mock(status_code=503)) as call:
+            for _ in range(threshold):
+                payment_transport.request('wave', 'verify', 'get', 'https://wave.test/checkout/1')
+            with self.assertRaises(payment_transport.ProviderUnavailable):
+                payment_transport.request('wave', 'verify', 'get', 'https://wave.test/checkout/1')
+        self.assertEqual(call.call_count, threshold)
+        self.assertEqual(call.call_args.kwargs['timeout'], (5, 20))
+
+        metrics = payment_transport.transport_metrics()
+        self.assertEqual(metrics['breakers']['wave']['state'], 'open')
+        self.assertEqual(metrics['latency']['wave.verify']['count'], threshold)
+        self.assertEqual(metrics['latency']['wave.verify']['errors'], threshold)
+
+        # Après reset_timeout: un appel d'essai réussi referme le circuit
+        breaker = payment_transport.get_breaker('wave')
+        breaker.opened_at -= breaker.reset_timeout
+        with mock.patch.object(session, 'request', return_value=mock.Mock(status_code=200)):
+            payment_transport.request('wave', 'verify', 'get', 'https://wave.test/checkout/1')
+        self.assertEqual(breaker.state, 'closed')
+
+
+class LivePresenceTests(TestCase):
+
+    def setUp(self):
+        presence.get_presence().clear()
+        self.addCleanup(presence.get_presence().clear)
+        owner = User.objects.create_user('vendeur', password='x')
+        store = Store.objects.create(owner=owner, name='Boutique', whatsapp_number='0000')
+        self.live = LiveStream.objects.create(store=store, title='Vente flash', stream_key='k1', peak_viewers=10)
+
+    def test_viewers_expire_without_heartbeat(self):
+        backend, now = presence.get_presence(), time.time()
+        for channel in ('a', 'b', 'c'):
+            backend.touch(self.live.pk, channel, now)
+        self.assertEqual(backend.leave(self.live.pk, 'a', now), 2)
+
+        backend.touch(self.live.pk, 'b', now + presence.PRESENCE_TTL)
+        self.assertEqual(backend.count(self.live.pk, now + presence.PRESENCE_TTL + 1), 1)
+        self.assertEqual(backend.snapshot(now + presence.PRESENCE_TTL + 1), {self.live.pk: (1, 3)})
+
+    def test_counts_persisted_only_when_changed(self):
+        for channel in ('a', 'b', 'c'):
+            presence.touch(self.live.pk, channel)
+
+        self.assertEqual(presence.persist_presence(), {'lives': 1, 'rows': 1})
+        self.live.refresh_from_db()
+        # Le pic en base (10) n'est pas écrasé par le pic observé (3)
+        self.assertEqual((self.live.viewers_count, self.live.peak_viewers), (3, 10))
+        self.assertEqual(presence.persist_presence()['rows'], 0)
+
+        for channel in ('a', 'b', 'c'):
+            presence.leave(self.live.pk, channel)
+        presence.persist_presence()
+        self.live.refresh_from_db()
+        self.assertEqual(self.live.viewers_count, 0)
+        self.assertEqual(presence.persist_presence(), {'lives': 0, 'rows': 0})
+
+    def test_viewer_count_broadcast_is_throttled(self):
+        class Layer:
+            def __init__(self):
+                self.sent = []
+
+            async def group_send(self, group, event):
+                self.sent.append((group, event))
+
+        layer = Layer()
+
+        async def churn():
+            for channel in ('a', 'b', 'c'):
+                presence.touch(self.live.pk, channel)
+                await presence.push_viewer_count(layer, self.live.pk)
+            await asyncio.sleep(0.1)
+
+        with mock.patch.object(presence, 'BROADCAST_INTERVAL', 0.05):
+            asyncio.run(churn())
+
+        group = f'live_{self.live.pk}'
+        self.assertEqual(layer.sent, [
+            (group, {'type': 'viewer_count', 'count': 1}),
+            (group, {'type': 'viewer_count', 'count': 3}),
+        ])
+
+
+class LiveChatTests(TestCase):
+
+    def setUp(self):
+        live_chat.reset_pipeline()
+        self.addCleanup(live_chat.reset_pipeline)
+        self.user = User.objects.create_user('spectateur', password='x')
+        owner = User.objects.create_user('vendeur', password='x')
+        store = Store.objects.create(owner=owner, name='Boutique', whatsapp_number='0000')
+        self.live = LiveStream.objects.create(store=store, title='Vente flash', stream_key='k1')
+
+    def test_slow_mode_token_bucket(self):
+        slow_mode = live_chat.SlowMode(burst=3, interval=2)
+        key = (self.live.pk, self.user.pk)
+        self.assertEqual([slow_mode.take(key, now=100) for _ in range(3)], [0, 0, 0])
+        self.assertEqual(slow_mode.take(key, now=100), 2)
+        self.assertEqual(slow_mode.take(key, now=101), 1)
+        self.assertEqual(slow_mode.take(key, now=102), 0)
+        # Un autre spectateur a son propre seau
+        self.assertEqual(slow_mode.take((self.live.pk, 0), now=102), 0)
+
+    def test_comments_coalesced_and_written_behind(self):
+        class Layer:
+            def __init__(self):
+                self.sent = []
+
+            async def group_send(self, group, event):
+                self.sent.append((group, event))
+
+        layer = Layer()
+        pipeline = live_chat.get_pipeline()
+
+        async def chat():
+            # user_id du message ignoré: l'auteur est l'utilisateur de la connexion
+            for content in ('Bonjour', ' Prix ? ', 'Merci'):
+                await pipeline.post(layer, self.live.pk, self.user, {'content': content, 'user_id': 0})
+            with self.assertRaises(live_chat.CommentRejected) as rejected:
+                await pipeline.post(layer, self.live.pk, self.user, {'content': 'Encore'})
+            self.assertEqual(rejected.exception.reason, 'slow_mode')
+            await asyncio.sleep(0.1)
+
+        with mock.patch.object(live_chat, 'FANOUT_INTERVAL', 0.01), \
+                mock.patch.object(live_chat, 'FLUSH_INTERVAL', 60):
+            asyncio.run(chat())
+
+        self.assertEqual(len(layer.sent), 1)
+        group, event = layer.sent[0]
+        self.assertEqual((group, event['type']), (f'live_{self.live.pk}', 'comment_batch'))
+        frame = json.loads(event['text'])
+        self.assertEqual([c['content'] for c in frame['comments']], ['Bonjour', 'Prix ?', 'Merci'])
+
+        self.assertFalse(LiveComment.objects.exists())
+        self.assertEqual(pipeline.buffer.flush(), 3)
+        self.assertEqual(
+            set(LiveComment.objects.values_list('user', 'live_stream')), {(self.user.pk, self.live.pk)}
+        )
+
+
+class LiveCheckoutTests(TestCase):
+
+    def setUp(self):
+        self.customer = User.objects.create_user('acheteur', password='x')
+        owner = User.objects.create_user('vendeur', password='x')
+        store = Store.objects.create(owner=owner, name='Boutique', whatsapp_number='0000')
+        self.product = Product.objects.create(
+            store=store, name='Sac', price=5000, image='products/test.jpg', stock=3,
+        )
+        self.live = LiveStream.objects.create(store=store, title='Vente flash', stream_key='k1', status='live')
+        self.live_product = LiveProduct.objects.create(live_stream=self.live, product=self.product, live_price=4000)
+
+    def test_stock_reserved_and_counters_incremented(self):
+        with mock.patch.object(live_checkout, 'broadcast_purchase') as broadcast, \
+                self.captureOnCommitCallbacks(execute=True):
+            order, _ = live_checkout.purchase(self.live, self.live_product, self.customer, 2)
+            with self.assertRaises(live_checkout.PurchaseRefused) as refused:
+                live_checkout.purchase(self.live, self.live_product, self.customer, 2)
+
+        self.assertEqual(refused.exception.reason, 'out_of_stock')
+        self.assertEqual((order.quantity, order.total_price), (2, 8000))
+        self.product.refresh_from_db()
+        self.live.refresh_from_db()
+        self.live_product.refresh_from_db()
+        self.assertEqual(self.product.stock, 1)
+        self.assertEqual((self.live.total_orders, self.live.total_sales), (1, 8000))
+        self.assertEqual(self.live_product.purchases_count, 2)
+        self.assertEqual(Order.objects.count(), 1)
+        broadcast.assert_called_once_with(
+            self.live.pk, {'user': 'acheteur', 'product_id': self.product.pk, 'product': 'Sac', 'quantity': 2}
+        )
+
+    def test_purchase_view_accepts_json(self):
+        from .new_views import purchase_from_live
+
+        def post(data, **kwargs):
+            request = RequestFactory().post(f'/live/{self.live.pk}/purchase/', data, **kwargs)
+            request.user = self.customer
+            return json.loads(purchase_from_live(request, self.live.pk).content)
+
+        payload = json.dumps({'product_id': self.live_product.pk, 'quantity': 3})
+        self.assertTrue(post(payload, content_type='application/json')['success'])
+        self.assertEqual(post({'product_id': self.live_product.pk, 'quantity': 1})['reason'], 'out_of_stock')
+        self.assertEqual(post({'product_id': self.live_product.pk, 'quantity': 0})['reason'], 'invalid_quantity')
+
+
+class VideoPipelineTests(TestCase):
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root, MEDIA_URL='/media/')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        owner = User.objects.create_user('vendeur', password='x')
+        self.store = Store.objects.create(owner=owner, name='Boutique', whatsapp_number='0000')
+
+    def test_hls_command_skips_renditions_above_source(self):
+        renditions = video_pipeline.select_renditions(480)
+        self.assertEqual([name for name, *_ in renditions], ['240p', '360p', '480p'])
+        self.assertEqual(video_pipeline.select_renditions(144)[0][0], '240p')
+
+        command = video_pipeline.hls_command('in.mp4', '/out', renditions, has_audio=False)
+        self.assertEqual(command.count('-map'), 3)
+        self.assertEqual(command[command.index('-var_stream_map') + 1], 'v:0,name:240p v:1,name:360p v:2,name:480p')
+        self.assertIn("[0:v]split=3[s0][s1][s2]", command[command.index('-filter_complex') + 1])
+
+    def test_upload_scheduled_then_converted(self):
+        live = LiveStream.objects.create(store=self.store, title='Reel', stream_key='k1', video_file='live_videos/a.mp4')
+        job = live.transcode_job
+        self.assertEqual((job.status, job.source), ('pending', 'live_videos/a.mp4'))
+
+        def fake_transcode(source, out_dir):
+            os.makedirs(out_dir)
+            return {'duration': 12.5, 'renditions': [{'name': '240p', 'height': 240, 'bitrate': 464}]}
+
+        with mock.patch.object(video_pipeline, 'transcode', side_effect=fake_transcode):
+            self.assertEqual(video_pipeline.run_job(video_pipeline.claim_jobs(5)[0]), 'ready')
+
+        live.refresh_from_db()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.duration), ('ready', 1, 12.5))
+        self.assertTrue(live.hls_url.startswith('/media/live_hls/'))
+        self.assertTrue(live.hls_url.endswith('/master.m3u8'))
+        self.assertTrue(live.thumbnail.name.endswith('/poster.jpg'))
+        self.assertTrue(live.preview_clip.name.endswith('/preview.mp4'))
+        self.assertEqual(video_pipeline.claim_jobs(5), [])
+
+        # Enregistrement sans changement de vidéo: pas de nouvelle conversion
+        live.title = 'Reel modifié'
+        live.save()
+        self.assertEqual(VideoTranscodeJob.objects.get(pk=job.pk).status, 'ready')
+        live.video_file = 'live_videos/b.mp4'
+        live.save()
+        self.assertEqual(VideoTranscodeJob.objects.get(pk=job.pk).status, 'pending')
+
+    def test_failed_conversion_retried_then_given_up(self):
+        LiveStream.objects.create(store=self.store, title='Reel', stream_key='k1', video_file='live_videos/a.mp4')
+        error = video_pipeline.TranscodeError('moov atom not found')
+
+        with mock.patch.object(video_pipeline, 'transcode', side_effect=error):
+            statuses = [video_pipeline.run_job(video_pipeline.claim_jobs(1)[0]) for _ in range(video_pipeline.MAX_ATTEMPTS)]
+
+        self.assertEqual(statuses, ['pending'] * (video_pipeline.MAX_ATTEMPTS - 1) + ['failed'])
+        job = VideoTranscodeJob.objects.get()
+        self.assertEqual(job.last_error, 'moov atom not found')
+        self.assertEqual(video_pipeline.retry_failed(), 1)
+
+
+@skipUnless(image_pipeline.PIL_AVAILABLE, "Pillow requis")
+class ImagePipelineTests(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root, MEDIA_URL='/media/')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        cache.clear()
+        owner = User.objects.create_user('vendeur', password='x')
+        self.store = Store.objects.create(owner=owner, name='Boutique', whatsapp_number='0000')
+
+    def _photo(self, name, size=(1000, 600), orientation=1):
+        from PIL import Image
+
+        path = os.path.join(self.media_root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        exif = Image.Exif()
+        exif[0x0112] = orientation
+        exif[0x010F] = 'Téléphone'
+        Image.new('RGB', size, (200, 30, 30)).save(path, 'JPEG', exif=exif.tobytes())
+        return name
+
+    def test_variants_resized_oriented_and_stripped(self):
+        from PIL import Image
+
+        source = os.path.join(self.media_root, self._photo('products/a.jpg', orientation=6))
+        out_dir = os.path.join(self.media_root, 'out')
+        result = image_pipeline.render_variants(source, out_dir, widths=(320, 640, 1280), formats=('webp',))
+
+        # Orientation 6: photo tournée, 600 px de large une fois redressée
+        self.assertEqual((result['width'], result['height']), (600, 1000))
+        self.assertEqual([(v['width'], v['format']) for v in result['variants']], [(320, 'webp'), (600, 'webp')])
+        with Image.open(os.path.join(out_dir, '320w.webp')) as variant:
+            self.assertEqual(variant.size, (320, 533))
+            self.assertEqual(dict(variant.getexif()), {})
+
+    def test_formats_and_directories(self):
+        self.assertIn('webp', image_pipeline.available_formats())
+        self.assertNotEqual(image_pipeline.variant_dir('products/a.jpg'), image_pipeline.variant_dir('products/a.png'))
+
+    def test_upload_scheduled_then_rendered_in_process_pool(self):
+        product = Product.objects.create(store=self.store, name='Sac', price=10, image=self._photo('products/sac.jpg'))
+        self.assertEqual(ImageDerivative.objects.get().status, 'pending')
+        template = Template('{% load image_tags %}{% responsive_image product.image alt=product.name class="card-img-top" %}')
+        self.assertNotIn('<picture', template.render(Context({'product': product})))
+
+        self.assertEqual(image_pipeline.process_pending(workers=2), {'ready': 1})
+
+        job = ImageDerivative.objects.get()
+        self.assertEqual((job.width, job.attempts), (1000, 1))
+        self.assertTrue(os.path.exists(os.path.join(self.media_root, job.variants[0]['name'])))
+        html = template.render(Context({'product': product}))
+        self.assertIn('srcset="/media/variants/products/sac.jpg/320w.webp 320w, /media/variants/products/sac.jpg/640w.webp 640w', html)
+        self.assertIn('<img src="/media/products/sac.jpg" alt="Sac" class="card-img-top" decoding="async" loading="lazy">', html)
+
+        # Compteurs ou image inchangée: pas de nouvelle déclinaison
+        product.views_count = 3
+        product.save(update_fields=['views_count'])
+        product.save()
+        self.assertEqual(ImageDerivative.objects.get().status, 'ready')
+
+    def test_unreadable_image_retried_then_given_up(self):
+        Product.objects.create(store=self.store, name='Sac', price=10, image='products/absente.jpg')
+
+        statuses = [
+            image_pipeline.process_pending(limit=1, workers=1) for _ in range(image_pipeline.MAX_ATTEMPTS)
+        ]
+
+        self.assertEqual(statuses, [{'pending': 1}] * (image_pipeline.MAX_ATTEMPTS - 1) + [{'failed': 1}])
+        self.assertIn('Image illisible', ImageDerivative.objects.get().last_error)
+        self.assertEqual(image_pipeline.retry_failed(), 1)
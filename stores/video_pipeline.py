@@ -0,0 +1,314 @@
+"""
+🎬 Conversion des vidéos des lives (reels)
+Une vidéo envoyée n'est plus servie telle quelle: un worker la convertit avec
+ffmpeg (installé localement) en
+- HLS multi-débits (240p à 720p selon la source, segments de
+  SEGMENT_SECONDS alignés entre variantes, playlist maîtresse);
+- une affiche (thumbnail) et un extrait court, muet et léger (preview_clip)
+  pour le feed.
+Les fichiers sont écrits sous MEDIA_ROOT/live_hls/<live>/<version>/, puis
+hls_url, thumbnail et preview_clip sont mis à jour d'un seul UPDATE.
+
+L'état est en base (VideoTranscodeJob): une tâche par live, remise en file
+quand la vidéo change. Exécution par Celery quand un broker est configuré,
+sinon `manage.py run_video_pipeline`. Chaque conversion tourne dans des
+processus ffmpeg; au plus WORKERS conversions simultanées par worker.
+"""
+
+import json
+import logging
+import os
+import shutil
+import subprocess
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+FFMPEG = getattr(settings, 'FFMPEG_BINARY', 'ffmpeg')
+FFPROBE = getattr(settings, 'FFPROBE_BINARY', 'ffprobe')
+
+# Conversions simultanées (chacune lance ses propres processus ffmpeg)
+WORKERS = getattr(settings, 'VIDEO_TRANSCODE_WORKERS', 2)
+
+# (nom, hauteur, débit vidéo kb/s, débit audio kb/s); les variantes plus
+# hautes que la source sont omises
+RENDITIONS = [
+    ('240p', 240, 400, 64),
+    ('360p', 360, 800, 96),
+    ('480p', 480, 1400, 128),
+    ('720p', 720, 2800, 128),
+]
+
+SEGMENT_SECONDS = 4
+PREVIEW_SECONDS = 6
+PREVIEW_HEIGHT = 360
+POSTER_HEIGHT = 720
+
+# Sous-dossier de MEDIA_ROOT
+OUTPUT_DIR = 'live_hls'
+
+MAX_ATTEMPTS = 3
+
+# Réservation d'une tâche par un worker (au-delà: reprise)
+LEASE_SECONDS = 3600
+
+# Durée maximale d'une commande ffmpeg
+FFMPEG_TIMEOUT = 1800
+
+
+class TranscodeError(Exception):
+    pass
+
+
+def ffmpeg_available():
+    return bool(shutil.which(FFMPEG) and shutil.which(FFPROBE))
+
+
+def _run(command):
+    try:
+        subprocess.run(command, check=True, capture_output=True, timeout=FFMPEG_TIMEOUT)
+    except subprocess.CalledProcessError as e:
+        raise TranscodeError(e.stderr.decode(errors='replace')[-500:] or str(e))
+    except subprocess.TimeoutExpired:
+        raise TranscodeError(f"ffmpeg interrompu après {FFMPEG_TIMEOUT} s")
+
+
+def probe(source):
+    """Durée, dimensions et présence d'une piste audio"""
+    try:
+        output = subprocess.run(
+            [FFPROBE, '-v', 'error', '-print_format', 'json', '-show_format', '-show_streams', source],
+            check=True, capture_output=True, timeout=60,
+        ).stdout
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
+        raise TranscodeError(f"Vidéo illisible: {e}")
+    data = json.loads(output or b'{}')
+    streams = data.get('streams', [])
+    video = next((s for s in streams if s.get('codec_type') == 'video'), None)
+    if video is None:
+        raise TranscodeError("Aucune piste vidéo")
+    return {
+        'duration': float(data.get('format', {}).get('duration') or 0),
+        'width': int(video.get('width') or 0),
+        'height': int(video.get('height') or 0),
+        'has_audio': any(s.get('codec_type') == 'audio' for s in streams),
+    }
+
+
+def select_renditions(height):
+    return [r for r in RENDITIONS if r[1] <= height] or RENDITIONS[:1]
+
+
+def hls_command(source, out_dir, renditions, has_audio):
+    """Une seule lecture de la source pour toutes les variantes"""
+    count = len(renditions)
+    graph = f"[0:v]split={count}" + ''.join(f'[s{i}]' for i in range(count)) + ';' + ';'.join(
+        # 4:2:0: seul format lu par tous les décodeurs matériels des mobiles
+        f'[s{i}]scale=-2:{height},format=yuv420p[v{i}]' for i, (_, height, _, _) in enumerate(renditions)
+    )
+    command = [FFMPEG, '-y', '-v', 'error', '-i', source, '-filter_complex', graph]
+    streams = []
+    for i, (name, _, video_kbps, audio_kbps) in enumerate(renditions):
+        command += [
+            '-map', f'[v{i}]', f'-c:v:{i}', 'libx264', f'-b:v:{i}', f'{video_kbps}k',
+            f'-maxrate:v:{i}', f'{int(video_kbps * 1.1)}k', f'-bufsize:v:{i}', f'{video_kbps * 2}k',
+        ]
+        if has_audio:
+            command += ['-map', 'a:0', f'-c:a:{i}', 'aac', f'-b:a:{i}', f'{audio_kbps}k']
+            streams.append(f'v:{i},a:{i},name:{name}')
+        else:
+            streams.append(f'v:{i},name:{name}')
+    command += [
+        '-preset', 'veryfast', '-profile:v', 'main', '-sc_threshold', '0',
+        # Images clés alignées: même découpage pour toutes les variantes
+        '-force_key_frames', f'expr:gte(t,n_forced*{SEGMENT_SECONDS})',
+        '-f', 'hls', '-hls_time', str(SEGMENT_SECONDS), '-hls_playlist_type', 'vod',
+        '-hls_flags', 'independent_segments',
+        '-hls_segment_filename', os.path.join(out_dir, '%v', 'seg_%03d.ts'),
+        '-master_pl_name', 'master.m3u8',
+        '-var_stream_map', ' '.join(streams),
+        os.path.join(out_dir, '%v', 'index.m3u8'),
+    ]
+    return command
+
+
+def poster_command(source, path, at, height):
+    return [
+        FFMPEG, '-y', '-v', 'error', '-ss', f'{at:.2f}', '-i', source,
+        '-frames:v', '1', '-vf', f'scale=-2:{min(height, POSTER_HEIGHT)}', '-q:v', '3', path,
+    ]
+
+
+def preview_command(source, path, at, height):
+    return [
+        FFMPEG, '-y', '-v', 'error', '-ss', f'{at:.2f}', '-t', str(PREVIEW_SECONDS), '-i', source,
+        '-vf', f'scale=-2:{min(height, PREVIEW_HEIGHT)},format=yuv420p', '-an',
+        '-c:v', 'libx264', '-preset', 'veryfast', '-crf', '28', '-movflags', '+faststart', path,
+    ]
+
+
+def transcode(source, out_dir):
+    """
+    Convertit `source` dans `out_dir` (vidé au préalable). Retourne la durée
+    et les variantes produites; lève TranscodeError.
+    """
+    info = probe(source)
+    renditions = select_renditions(info['height'])
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.makedirs(out_dir)
+
+    _run(hls_command(source, out_dir, renditions, info['has_audio']))
+    # Affiche et extrait pris un peu après le début (évite l'écran noir)
+    at = min(info['duration'] * 0.1, 5)
+    _run(poster_command(source, os.path.join(out_dir, 'poster.jpg'), at, info['height']))
+    _run(preview_command(source, os.path.join(out_dir, 'preview.mp4'), at, info['height']))
+    return {
+        'duration': info['duration'],
+        'renditions': [
+            {'name': name, 'height': height, 'bitrate': video_kbps + (audio_kbps if info['has_audio'] else 0)}
+            for name, height, video_kbps, audio_kbps in renditions
+        ],
+    }
+
+
+# ---------------------------------------------------------------------------
+# File des conversions
+# ---------------------------------------------------------------------------
+
+def _wake_worker():
+    from .payment_jobs import celery_enabled
+
+    if celery_enabled():
+        from .tasks import transcode_live_videos
+        transaction.on_commit(lambda: transcode_live_videos.delay())
+
+
+def schedule_transcode(live_stream, force=False):
+    """
+    Met la vidéo du live en file si elle n'a pas déjà été convertie (ou si
+    `force`). Retourne la tâche, ou None sans vidéo.
+    """
+    from .models import VideoTranscodeJob
+
+    if not live_stream.video_file:
+        return None
+    source = live_stream.video_file.name
+    job, created = VideoTranscodeJob.objects.get_or_create(live_stream=live_stream, defaults={'source': source})
+    if not created:
+        if job.source == source and not force:
+            return job
+        job.source, job.status, job.attempts, job.last_error = source, 'pending', 0, ''
+        job.lease_expires_at = None
+        job.save(update_fields=['source', 'status', 'attempts', 'last_error', 'lease_expires_at', 'updated_at'])
+    _wake_worker()
+    return job
+
+
+def claim_jobs(limit):
+    """Réserve des tâches en attente (ou dont la réservation a expiré)"""
+    from .models import VideoTranscodeJob
+
+    now = timezone.now()
+    due = Q(status='pending') | Q(status='processing', lease_expires_at__lte=now)
+    claimed = []
+    for job_id in VideoTranscodeJob.objects.filter(due).order_by('created_at').values_list('pk', flat=True)[:limit]:
+        # UPDATE conditionnel: un autre worker a pu prendre la tâche entre-temps
+        if VideoTranscodeJob.objects.filter(due, pk=job_id).update(
+            status='processing', attempts=F('attempts') + 1,
+            lease_expires_at=now + timedelta(seconds=LEASE_SECONDS),
+        ):
+            claimed.append(job_id)
+    return list(VideoTranscodeJob.objects.filter(pk__in=claimed).select_related('live_stream'))
+
+
+def _media_path(name):
+    return os.path.join(settings.MEDIA_ROOT, name)
+
+
+def run_job(job):
+    """Convertit la vidéo d'une tâche réservée et met à jour le live; retourne le statut"""
+    from .models import LiveStream, VideoTranscodeJob
+
+    live_stream = job.live_stream
+    output = f'{OUTPUT_DIR}/{live_stream.pk}/{uuid.uuid4().hex[:8]}'
+    try:
+        if live_stream.video_file.name != job.source:
+            raise TranscodeError("La vidéo a changé depuis la mise en file")
+        result = transcode(live_stream.video_file.path, _media_path(output))
+    except Exception as e:
+        shutil.rmtree(_media_path(output), ignore_errors=True)
+        status = 'failed' if job.attempts >= MAX_ATTEMPTS else 'pending'
+        logger.warning(f"Video transcode job #{job.pk} (live #{live_stream.pk}) attempt {job.attempts}: {e}")
+        VideoTranscodeJob.objects.filter(pk=job.pk, status='processing').update(
+            status=status, last_error=str(e)[:2000], lease_expires_at=None, updated_at=timezone.now(),
+        )
+        return status
+
+    # Source remplacée pendant la conversion: la nouvelle tâche fera foi
+    if not LiveStream.objects.filter(pk=live_stream.pk, video_file=job.source).update(
+        hls_url=settings.MEDIA_URL + f'{output}/master.m3u8',
+        thumbnail=f'{output}/poster.jpg',
+        preview_clip=f'{output}/preview.mp4',
+    ):
+        shutil.rmtree(_media_path(output), ignore_errors=True)
+        return 'skipped'
+    VideoTranscodeJob.objects.filter(pk=job.pk).update(
+        status='ready', last_error='', lease_expires_at=None, duration=result['duration'],
+        renditions=result['renditions'], completed_at=timezone.now(), updated_at=timezone.now(),
+    )
+
+    # Versions précédentes
+    parent = _media_path(f'{OUTPUT_DIR}/{live_stream.pk}')
+    current = os.path.basename(output)
+    for name in os.listdir(parent):
+        if name != current:
+            shutil.rmtree(os.path.join(parent, name), ignore_errors=True)
+    return 'ready'
+
+
+def _run_in_thread(job):
+    try:
+        return run_job(job)
+    finally:
+        close_old_connections()
+
+
+def process_pending(limit=None, workers=None):
+    """
+    Convertit les vidéos en attente, `workers` à la fois. Sans ffmpeg, rien
+    n'est fait (les tâches restent en file). Retourne le nombre de tâches
+    par statut final.
+    """
+    if not ffmpeg_available():
+        logger.warning("Video pipeline: ffmpeg/ffprobe not found, transcode jobs kept queued")
+        return {}
+
+    workers = workers or WORKERS
+    totals = {}
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='transcode') as executor:
+        while limit is None or sum(totals.values()) < limit:
+            batch = workers if limit is None else min(workers, limit - sum(totals.values()))
+            jobs = claim_jobs(batch)
+            if not jobs:
+                break
+            for status in executor.map(_run_in_thread, jobs):
+                totals[status] = totals.get(status, 0) + 1
+    if totals:
+        logger.info(f"Video pipeline: {totals}")
+    return totals
+
+
+def retry_failed():
+    """Relance les conversions échouées (après correction de la source ou de ffmpeg)"""
+    from .models import VideoTranscodeJob
+
+    return VideoTranscodeJob.objects.filter(status='failed').update(
+        status='pending', attempts=0, last_error='', updated_at=timezone.now(),
+    )
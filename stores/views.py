@@ -5,18 +5,21 @@ from django.contrib import messages
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from django.utils import timezone
 from django.http import JsonResponse
-from django.db.models import Q, Count, Avg, F, Case, When, IntegerField, Sum
+from django.db.models import Q, Count, Avg, F, Case, When, IntegerField
 from django.views.decorators.http import require_POST, require_http_methods
 from django.utils import translation
 from django.utils.text import slugify
 import json
 from .recommendations import get_similar_products
+from .counters import increment
+from .search import search_products
+from .analytics import PERIOD_CHOICES, get_store_stats, parse_period
 
 # Les vues de paiement sont importées directement dans urls.py
 from .models import (
     Store, Product, ProductImage, Subscription, Promotion, Category, Tag,
     Follow, Like, Comment, Share, Review, Favorite, Notification, SearchHistory,
-    Payment, Order, GeneralProfile
+    Order, GeneralProfile
 )
 from .forms import (
     UserRegisterForm, StoreForm, ProductForm, SubscriptionForm, PromotionForm, 
@@ -29,35 +32,11 @@ from django.conf import settings
 
 def home(request):
     """Page d'accueil avec les produits en vedette et les catégories populaires"""
-    from .recommendations import get_personalized_feed, get_promoted_products
+    from .home_sections import get_home_sections
     
-    # Récupérer les produits recommandés (système intelligent)
-    recommended_products = get_personalized_feed(request.user if request.user.is_authenticated else None, limit=12)
-    
-    # Derniers produits ajoutés (tous les produits)
-    latest_products = Product.objects.all().order_by('-created_at')[:12]
-    
-    # Produits en vedette (ceux qui ont is_featured=True)
-    featured_products = Product.objects.filter(
-        is_featured=True
-    ).order_by('-featured_until', '-created_at')[:12]
-    
-    # Si pas de produits en vedette, on utilise les recommandés
-    if not featured_products.exists():
-        featured_products = recommended_products[:8]
-    
-    # Produits en promotion (pour la section spéciale)
-    promoted_products = get_promoted_products(limit=4)
-    
-    # Catégories populaires (toutes les catégories avec produits)
-    categories = Category.objects.annotate(
-        product_count=Count('products')
-    ).filter(product_count__gt=0).order_by('-product_count')[:8]
-    
-    # Boutiques populaires (avec le plus de produits)
-    popular_stores = Store.objects.annotate(
-        product_count=Count('products')
-    ).filter(product_count__gt=0).order_by('-product_count', '-created_at')[:6]
+    # Sections en cache (communes + recommandations par utilisateur)
+    sections = get_home_sections(request.user)
+    featured_products = sections['featured_products']
     
     # Pour la pagination, on utilise les produits en vedette
     page = request.GET.get('page', 1)
@@ -72,12 +51,12 @@ def home(request):
     
     context = {
         'featured_products': featured_products,  # Produits en vedette
-        'categories': categories,  # Catégories populaires
-        'popular_stores': popular_stores,  # Boutiques populaires
-        'latest_products': latest_products,  # Derniers produits
+        'categories': sections['categories'],  # Catégories populaires
+        'popular_stores': sections['popular_stores'],  # Boutiques populaires
+        'latest_products': sections['latest_products'],  # Derniers produits
         'page_obj': page_obj,  # Pour la pagination
-        'recommended_products': recommended_products,  # Recommandations personnalisées
-        'promoted_products': promoted_products,  # Produits en promotion
+        'recommended_products': sections['recommended_products'],  # Recommandations personnalisées
+        'promoted_products': sections['promoted_products'],  # Produits en promotion
     }
     
     return render(request, 'stores/home.html', context)
@@ -128,40 +107,13 @@ def dashboard(request):
         messages.warning(request, 'Vous devez d\'abord créer une boutique.')
         return redirect('create_store')
     
-    # Statistiques pour un profil vendeur plus riche
+    # Statistiques lues dans l'agrégat quotidien (tout l'historique ou ?days=7|30|90)
+    period = parse_period(request.GET.get('days'))
     total_products = products.count()
-    stats = products.aggregate(
-        total_views=Sum('views_count'),
-        total_likes=Sum('likes_count'),
-    )
-    total_views = stats['total_views'] or 0
-    total_likes = stats['total_likes'] or 0
-
-    # Nombre total d'avis et note moyenne de la boutique
-    all_reviews = []
-    for product in products:
-        all_reviews.extend(list(product.reviews.all()))
-    total_reviews = len(all_reviews)
-    if total_reviews:
-        average_rating = round(sum(r.rating for r in all_reviews) / total_reviews, 1)
-    else:
-        average_rating = 0
-    
-    # Statistiques de commandes et paiements
-    orders = Order.objects.filter(store=store)
-    total_orders = orders.count()
-    pending_orders = orders.filter(status='pending').count()
-    completed_orders = orders.filter(status='delivered').count()
-    
-    # Revenus (paiements complétés)
-    completed_payments = Payment.objects.filter(
-        order__store=store,
-        status='completed'
-    )
-    total_revenue = completed_payments.aggregate(Sum('amount'))['amount__sum'] or 0
+    stats = get_store_stats(store, days=period)
     
     # Commandes récentes
-    recent_orders = orders.order_by('-created_at')[:5]
+    recent_orders = Order.objects.filter(store=store).order_by('-created_at')[:5]
 
     # Promotions actives (produits ou boutique) réellement en cours
     active_promotions = Promotion.objects.filter(
@@ -183,14 +135,16 @@ def dashboard(request):
         'store': store,
         'products': products,
         'total_products': total_products,
-        'total_views': total_views,
-        'total_likes': total_likes,
-        'total_reviews': total_reviews,
-        'average_rating': average_rating,
-        'total_orders': total_orders,
-        'pending_orders': pending_orders,
-        'completed_orders': completed_orders,
-        'total_revenue': total_revenue,
+        'period': period,
+        'period_choices': PERIOD_CHOICES,
+        'total_views': stats['total_views'],
+        'total_likes': stats['total_likes'],
+        'total_reviews': stats['total_reviews'],
+        'average_rating': stats['average_rating'],
+        'total_orders': stats['total_orders'],
+        'pending_orders': stats['pending_orders'],
+        'completed_orders': stats['completed_orders'],
+        'total_revenue': stats['total_revenue'],
         'recent_orders': recent_orders,
         'active_promotions': active_promotions,
         'active_subscription': active_subscription,
@@ -491,10 +445,10 @@ def toggle_like(request, product_id):
     
     if not created:
         like.delete()
-        product.likes_count = max(0, product.likes_count - 1)
+        pending = increment('product.likes', product.id, -1)
         is_liked = False
     else:
-        product.likes_count += 1
+        pending = increment('product.likes', product.id)
         is_liked = True
         # Notification au propriétaire
         if product.store.owner != request.user:
@@ -505,12 +459,11 @@ def toggle_like(request, product_id):
                 link=f"/store/{product.store.id}/"
             )
     
-    product.save()
-    
+    # Compteur tamponné (écrit en base par lots avec le score du feed)
     return JsonResponse({
         'success': True,
         'is_liked': is_liked,
-        'likes_count': product.likes_count
+        'likes_count': max(0, product.likes_count + pending)
     })
 
 
@@ -562,12 +515,11 @@ def share_product(request, product_id):
         platform=platform
     )
     
-    product.shares_count += 1
-    product.save()
+    pending = increment('product.shares', product.id)
     
     return JsonResponse({
         'success': True,
-        'shares_count': product.shares_count
+        'shares_count': product.shares_count + pending
     })
 
 
@@ -660,9 +612,8 @@ def product_detail(request, product_id):
     
     product = get_object_or_404(Product, id=product_id)
     
-    # Incrémenter les vues
-    product.views_count += 1
-    product.save()
+    # Incrémenter les vues (tampon écrit en base par lots, score du feed inclus)
+    product.views_count += increment('product.views', product.id)
     
     # Vérifier si l'utilisateur a liké/favorisé
     is_liked = False
@@ -714,21 +665,7 @@ def search(request):
     max_price = request.GET.get('max_price', '')
     sort_by = request.GET.get('sort', 'relevance')
     
-    products = Product.objects.all()
-    
-    # Recherche textuelle
-    if query:
-        products = products.filter(
-            Q(name__icontains=query) |
-            Q(description__icontains=query) |
-            Q(tags__name__icontains=query)
-        ).distinct()
-        
-        # Enregistrer la recherche
-        if request.user.is_authenticated:
-            SearchHistory.objects.create(user=request.user, query=query)
-        else:
-            SearchHistory.objects.create(query=query)
+    products = Product.objects.select_related('store', 'feed_score')
     
     # Filtre par catégorie
     if category_id:
@@ -740,21 +677,30 @@ def search(request):
     if max_price:
         products = products.filter(price__lte=max_price)
     
+    # Recherche plein texte (sans accents, tolérante aux fautes), après les
+    # filtres: ils font partie de la requête des candidats
+    if query:
+        products = search_products(query, products)
+        
+        # Enregistrer la recherche
+        if request.user.is_authenticated:
+            SearchHistory.objects.create(user=request.user, query=query)
+        else:
+            SearchHistory.objects.create(query=query)
+    
     # Tri
     if sort_by == 'price_asc':
         products = products.order_by('price')
     elif sort_by == 'price_desc':
         products = products.order_by('-price')
     elif sort_by == 'popular':
-        products = products.annotate(
-            popularity=Count('likes') + Count('comments') * 2
-        ).order_by('-popularity')
+        products = products.order_by(F('feed_score__score').desc(nulls_last=True), '-created_at')
     elif sort_by == 'newest':
         products = products.order_by('-created_at')
-    else:  # relevance
-        products = products.annotate(
-            relevance=Count('likes') * 3 + Count('comments') * 2
-        ).order_by('-relevance', '-created_at')
+    elif query:  # relevance
+        products = products.order_by('-search_rank', '-created_at')
+    else:
+        products = products.order_by(F('feed_score__score').desc(nulls_last=True), '-created_at')
     
     # Pagination
     paginator = Paginator(products, 20)
@@ -888,44 +834,25 @@ def notifications(request):
 
 
 def top_stores(request):
-    """Classement des boutiques les plus performantes"""
-    # On part de toutes les boutiques qui ont au moins un produit
-    stores = Store.objects.all()
-
-    # Calculer un score basé sur les vues et likes de tous les produits de chaque boutique
-    stores_with_stats = []
-    for store in stores:
-        products = store.products.all()
-        stats = products.aggregate(
-            total_views=Sum('views_count'),
-            total_likes=Sum('likes_count'),
-        )
-        total_views = stats['total_views'] or 0
-        total_likes = stats['total_likes'] or 0
-        followers = store.get_followers_count()
-
-        # Score simple : vues + 3*likes + 5*followers + bonus si vérifié/en vedette
-        score = (
-            total_views +
-            total_likes * 3 +
-            followers * 5 +
-            (20 if store.is_verified else 0) +
-            (10 if store.is_featured else 0)
-        )
-
-        stores_with_stats.append({
-            'store': store,
-            'total_views': total_views,
-            'total_likes': total_likes,
-            'followers': followers,
-            'score': score,
-        })
-
-    # Trier par score décroissant
-    stores_with_stats.sort(key=lambda s: s['score'], reverse=True)
-
+    """Classement des boutiques les plus performantes (général, par ville ou catégorie)"""
+    from .leaderboard import get_leaderboard_page, get_leaderboard_filters
+    
+    city = request.GET.get('city', '')
+    category = request.GET.get('category', '')
+    
+    if category:
+        page_obj = get_leaderboard_page('category', category, request.GET.get('page', 1))
+    elif city:
+        page_obj = get_leaderboard_page('city', city, request.GET.get('page', 1))
+    else:
+        page_obj = get_leaderboard_page(page=request.GET.get('page', 1))
+    
     return render(request, 'stores/top_stores.html', {
-        'stores_with_stats': stores_with_stats,
+        'stores_with_stats': page_obj,
+        'page_obj': page_obj,
+        'selected_city': city,
+        'selected_category': category,
+        **get_leaderboard_filters(),
     })
 
 
@@ -1226,8 +1153,7 @@ def user_profile(request, user_id=None):
     
     # Incrémenter le compteur de vues si ce n'est pas le propriétaire
     if not is_own_profile:
-        general_profile.profile_views += 1
-        general_profile.save()
+        general_profile.profile_views += increment('general_profile.views', general_profile.pk)
     
     # Récupérer les produits de l'utilisateur (s'il a une boutique)
     user_products = []
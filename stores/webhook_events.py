@@ -0,0 +1,347 @@
+"""
+📨 Réception des webhooks de paiement
+La vue vérifie la signature, enregistre l'événement brut (WebhookEvent,
+unique par fournisseur + identifiant d'événement: les renvois du fournisseur
+sont écartés) et répond aussitôt. Le traitement (paiement, commande,
+abonnement, promotion, notifications) se fait ensuite via Celery, dans
+l'ordre d'arrivée pour une même transaction; un balayage périodique reprend
+les événements en retard et `manage.py replay_webhooks` rejoue les événements
+enregistrés.
+"""
+
+import hashlib
+import json
+import logging
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .payment_jobs import FINAL_PAYMENT_STATUSES, celery_enabled
+
+logger = logging.getLogger(__name__)
+
+# Statuts de paiement envoyés par les fournisseurs mobile money
+SUCCESS_STATUSES = ('SUCCESS', 'SUCCESSFUL', 'COMPLETED', 'PAID')
+FAILURE_STATUSES = ('FAILED', 'CANCELLED', 'REJECTED')
+
+# Essais avant de classer un événement en échec
+MAX_ATTEMPTS = 5
+
+# Durée de réservation d'un événement par un worker (au-delà: reprise)
+LEASE_SECONDS = 120
+
+# Âge à partir duquel un événement en attente est repris par le balayage
+SWEEP_DELAY = 30
+
+UNFINISHED_STATUSES = ('pending', 'processing')
+
+
+def webhook_event_id(payload):
+    """Empreinte du contenu, pour les fournisseurs sans identifiant d'événement"""
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _enqueue(provider, transaction_ref):
+    """
+    Traitement après validation de la transaction: via Celery si un broker
+    est configuré, sinon dans le processus courant (développement)
+    """
+    if celery_enabled():
+        from .tasks import process_webhook_events
+        transaction.on_commit(lambda: process_webhook_events.delay(provider, transaction_ref))
+    else:
+        transaction.on_commit(lambda: process_transaction_events(provider, transaction_ref))
+
+
+def ingest_webhook(provider, payload, event_id=None, event_type='', transaction_ref=''):
+    """
+    Enregistre un événement déjà authentifié et planifie son traitement.
+    Retourne (événement, créé); un doublon n'est ni réenregistré ni retraité.
+    """
+    from .models import WebhookEvent
+
+    event_id = str(event_id or webhook_event_id(payload))
+    try:
+        with transaction.atomic():
+            event = WebhookEvent.objects.create(
+                provider=provider,
+                event_id=event_id,
+                event_type=event_type[:100],
+                transaction_ref=transaction_ref[:200],
+                payload=payload,
+            )
+    except IntegrityError:
+        logger.info(f"Duplicate webhook ignored: {provider} {event_id}")
+        return WebhookEvent.objects.filter(provider=provider, event_id=event_id).first(), False
+
+    _enqueue(provider, event.transaction_ref)
+    return event, True
+
+
+# ---------------------------------------------------------------------------
+# Traitement
+# ---------------------------------------------------------------------------
+
+def _notify(user, message):
+    from .models import Notification
+    Notification.objects.create(user=user, notification_type='order', message=message, link="/dashboard/")
+
+
+def _complete_payment(payment, metadata):
+    """Paiement confirmé: commande, abonnement ou promotion activés, vendeur notifié"""
+    payment.status = 'completed'
+    payment.paid_at = timezone.now()
+    payment.metadata = metadata
+    payment.save()
+
+    if payment.order:
+        payment.order.payment_status = 'completed'
+        payment.order.status = 'confirmed'
+        payment.order.save()
+        _notify(payment.order.store.owner, f"✅ Paiement confirmé pour la commande #{payment.order.id}")
+
+    elif payment.subscription:
+        payment.subscription.status = 'completed'
+        payment.subscription.is_active = True
+        payment.subscription.store.is_verified = True
+        payment.subscription.store.save()
+        payment.subscription.save()
+        _notify(payment.subscription.store.owner, "✅ Abonnement activé! Votre boutique est maintenant vérifiée.")
+
+    elif payment.promotion:
+        promotion = payment.promotion
+        promotion.status = 'active'
+        promotion.save()
+
+        if promotion.promotion_type == 'product' and promotion.product:
+            promotion.product.is_featured = True
+            promotion.product.featured_until = promotion.expires_at
+            promotion.product.save()
+        elif promotion.promotion_type == 'store' and promotion.store:
+            promotion.store.is_featured = True
+            promotion.store.save()
+
+        _notify(
+            promotion.store.owner if promotion.store else promotion.product.store.owner,
+            "✅ Promotion activée!",
+        )
+
+
+def _handle_mobile_money_event(event):
+    """Orange, MTN, Moov, Wave...: statut du paiement `transaction_ref`"""
+    from .models import Payment
+
+    data = event.payload
+    status = str(data.get('status', '')).upper()
+
+    payment = Payment.objects.select_for_update().filter(transaction_id=event.transaction_ref).first()
+    if payment is None:
+        logger.warning(f"Payment not found for webhook transaction_id: {event.transaction_ref}")
+        return 'ignored'
+    if payment.status in FINAL_PAYMENT_STATUSES:
+        return 'ignored'  # déjà traité (renvoi, vérification, autre webhook)
+
+    if status in SUCCESS_STATUSES:
+        _complete_payment(payment, data)
+        logger.info(f"Payment confirmed via webhook: Payment #{payment.id}")
+        return 'processed'
+
+    if status in FAILURE_STATUSES:
+        payment.status = 'failed'
+        payment.metadata = data
+        payment.save()
+        logger.warning(f"Payment failed via webhook: Payment #{payment.id}")
+        return 'processed'
+
+    return 'ignored'
+
+
+def _handle_stripe_event(event):
+    """payment_intent.succeeded: crée le paiement de la commande, de l'abonnement ou de la promotion"""
+    from .models import Order, Payment, Promotion, Subscription
+
+    if event.event_type != 'payment_intent.succeeded':
+        return 'ignored'
+
+    data_object = event.payload.get('data', {}).get('object', {})
+    intent_id = data_object.get('id', '')
+    if Payment.objects.filter(transaction_id=intent_id).exists():
+        return 'ignored'  # paiement déjà enregistré
+
+    metadata = data_object.get('metadata', {}) or {}
+    amount_received = data_object.get('amount_received') or data_object.get('amount')
+    currency = data_object.get('currency', 'eur').upper()
+
+    def create_payment(default_amount, **target):
+        return Payment.objects.create(
+            amount=amount_received / 100 if amount_received else default_amount(),
+            payment_method='stripe',
+            status='completed',
+            transaction_id=intent_id,
+            external_id=intent_id,
+            metadata=data_object,
+            paid_at=timezone.now(),
+            **target,
+        )
+
+    # Paiement commande (Stripe Connect avec split 1%)
+    if metadata.get('order_id'):
+        order = Order.objects.filter(id=metadata['order_id']).select_related('store').first()
+        if order is None:
+            return 'ignored'
+        payment = create_payment(order.get_total_with_delivery, order=order)
+        order.payment_status = 'completed'
+        order.status = 'confirmed'
+        order.payment_method = 'stripe'
+        order.save()
+        _notify(order.store.owner, f"Nouvelle commande #{order.id} - Paiement Stripe reçu: {payment.amount} {currency}")
+        return 'processed'
+
+    # Paiement abonnement (certification boutique)
+    if metadata.get('subscription_id'):
+        subscription = Subscription.objects.filter(id=metadata['subscription_id']).select_related('store').first()
+        if subscription is None:
+            return 'ignored'
+        create_payment(lambda: float(subscription.amount), subscription=subscription)
+        subscription.status = 'completed'
+        subscription.is_active = True
+        subscription.store.is_verified = True
+        subscription.store.save()
+        subscription.save()
+        _notify(
+            subscription.store.owner,
+            "Votre abonnement de vérification a été payé et votre boutique est maintenant vérifiée.",
+        )
+        return 'processed'
+
+    # Paiement promotion
+    if metadata.get('promotion_id'):
+        promotion = Promotion.objects.filter(id=metadata['promotion_id']).first()
+        if promotion is None:
+            return 'ignored'
+        create_payment(lambda: float(promotion.amount), promotion=promotion)
+        promotion.status = 'active'
+        promotion.save()
+
+        owner = None
+        if promotion.promotion_type == 'product' and promotion.product:
+            promotion.product.is_featured = True
+            promotion.product.featured_until = promotion.expires_at
+            promotion.product.save()
+            owner = promotion.product.store.owner
+        elif promotion.store:
+            promotion.store.is_featured = True
+            promotion.store.save()
+            owner = promotion.store.owner
+        if owner:
+            _notify(owner, "Votre promotion a été activée avec succès.")
+        return 'processed'
+
+    return 'ignored'
+
+
+HANDLERS = {
+    'stripe': _handle_stripe_event,
+}
+
+
+def _claim_next(provider, transaction_ref):
+    """
+    Réserve le plus ancien événement non terminé de la transaction. None si
+    la transaction n'a plus rien en attente ou si un autre worker la traite
+    (il enchaînera les événements suivants).
+    """
+    from .models import WebhookEvent
+
+    now = timezone.now()
+    head = (
+        WebhookEvent.objects.filter(provider=provider, transaction_ref=transaction_ref, status__in=UNFINISHED_STATUSES)
+        .order_by('id').first()
+    )
+    if head is None:
+        return None
+    if head.status == 'processing' and head.lease_expires_at and head.lease_expires_at > now:
+        return None
+
+    claimed = WebhookEvent.objects.filter(
+        pk=head.pk, status=head.status, lease_expires_at=head.lease_expires_at,
+    ).update(status='processing', lease_expires_at=now + timedelta(seconds=LEASE_SECONDS))
+    if not claimed:
+        return None
+    head.refresh_from_db()
+    return head
+
+
+def process_event(event):
+    """
+    Traite un événement réservé. Retourne son statut final; 'pending' si
+    l'essai a échoué et sera repris (les événements suivants attendent).
+    """
+    handler = HANDLERS.get(event.provider, _handle_mobile_money_event)
+    event.attempts += 1
+    try:
+        with transaction.atomic():
+            event.status = handler(event)
+        event.last_error = ''
+    except Exception as e:
+        logger.error(f"Webhook event #{event.pk} ({event.provider}) error: {e}", exc_info=True)
+        event.status = 'pending' if event.attempts < MAX_ATTEMPTS else 'failed'
+        event.last_error = str(e)
+
+    event.lease_expires_at = None
+    if event.status in ('processed', 'ignored'):
+        event.processed_at = timezone.now()
+    event.save(update_fields=['status', 'attempts', 'last_error', 'lease_expires_at', 'processed_at'])
+    return event.status
+
+
+def process_transaction_events(provider, transaction_ref):
+    """Traite dans l'ordre d'arrivée les événements en attente d'une transaction"""
+    handled = 0
+    while True:
+        event = _claim_next(provider, transaction_ref)
+        if event is None:
+            return handled
+        handled += 1
+        if process_event(event) == 'pending':
+            return handled
+
+
+def dispatch_pending_events(limit=100):
+    """
+    Balayage périodique: reprend les réservations expirées et relance les
+    transactions dont des événements attendent depuis plus de SWEEP_DELAY.
+    """
+    from .models import WebhookEvent
+
+    now = timezone.now()
+    WebhookEvent.objects.filter(status='processing', lease_expires_at__lte=now).update(
+        status='pending', lease_expires_at=None,
+    )
+    streams = list(
+        WebhookEvent.objects.filter(status='pending', received_at__lte=now - timedelta(seconds=SWEEP_DELAY))
+        .order_by('provider', 'transaction_ref').values_list('provider', 'transaction_ref').distinct()[:limit]
+    )
+    if celery_enabled():
+        from .tasks import process_webhook_events
+        for provider, transaction_ref in streams:
+            process_webhook_events.delay(provider, transaction_ref)
+    else:
+        for provider, transaction_ref in streams:
+            process_transaction_events(provider, transaction_ref)
+    return len(streams)
+
+
+def replay_events(queryset):
+    """
+    Remet des événements enregistrés en file et les retraite (les gestionnaires
+    ignorent un paiement déjà finalisé). Retourne le nombre d'événements rejoués.
+    """
+    streams = set(queryset.values_list('provider', 'transaction_ref'))
+    count = queryset.exclude(status='processing').update(
+        status='pending', attempts=0, last_error='', processed_at=None, lease_expires_at=None,
+    )
+    for provider, transaction_ref in sorted(streams):
+        _enqueue(provider, transaction_ref)
+    return count